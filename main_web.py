@@ -27,6 +27,7 @@ from pathlib import Path
 project_root = Path(__file__).parent
 sys.path.insert(0, str(project_root))
 
+from src.core.config import HTTP_ENGINE, HTTP_ENGINES, HTTP_MAX_QUEUE, HTTP_WORKERS
 from src.ui.web_preview.server import WebPreviewServer
 
 
@@ -41,6 +42,8 @@ def parse_arguments():
   python main_web.py --port 8080       # 指定端口8080启动
   python main_web.py --no-browser      # 启动但不自动打开浏览器
   python main_web.py --dev             # 开发模式（不自动监控关闭）
+  python main_web.py --workers 32      # 使用32个工作线程处理请求
+  python main_web.py --engine asyncio  # 使用事件循环引擎（长连接、预览事件流）
 
 功能说明:
   🎯 跑团管理：创建、删除、切换跑团
@@ -76,6 +79,27 @@ def parse_arguments():
         help='服务器主机地址（默认：localhost）'
     )
     
+    parser.add_argument(
+        '--workers', '-w',
+        type=int,
+        default=HTTP_WORKERS,
+        help=f'处理请求的工作线程数（默认：{HTTP_WORKERS}）'
+    )
+    
+    parser.add_argument(
+        '--max-queue',
+        type=int,
+        default=HTTP_MAX_QUEUE,
+        help=f'等待工作线程的最大连接数，超出时返回 503（默认：{HTTP_MAX_QUEUE}）'
+    )
+    
+    parser.add_argument(
+        '--engine',
+        choices=HTTP_ENGINES,
+        default=HTTP_ENGINE,
+        help=f'服务器引擎：threaded 为工作线程池，asyncio 为事件循环（默认：{HTTP_ENGINE}）'
+    )
+    
     return parser.parse_args()
 
 
@@ -145,7 +169,8 @@ def start_web_server(args):
     print("🚀 正在启动Web服务器...")
     
     # 创建服务器实例
-    server = WebPreviewServer(project_root)
+    server = WebPreviewServer(project_root, workers=args.workers, max_queue=args.max_queue,
+                              engine=args.engine)
     
     # 如果指定了端口，设置端口
     if args.port:
@@ -194,6 +219,8 @@ def print_server_info(server, args):
     print(f"   🔧 API接口: {server.get_url('api/')}")
     print(f"   📡 端口: {server.get_port()}")
     print(f"   🏠 主机: {args.host}")
+    print(f"   🧵 工作线程: {args.workers}（排队上限 {args.max_queue}）")
+    print(f"   ⚙️ 引擎: {args.engine}")
     
     if args.dev:
         print("   🔧 模式: 开发模式（手动关闭）")
@@ -8,6 +8,7 @@ from .file_manager import FileManagerService
 from .story_parser import StoryGraphService
 from .story_editor_service import StoryEditorService
 from .models import Campaign, StoryNode, StoryGraph
+from .columnar_graph import ColumnarStoryGraph
 
 __all__ = [
     'CampaignService',
@@ -16,5 +17,6 @@ __all__ = [
     'StoryEditorService',
     'Campaign',
     'StoryNode',
-    'StoryGraph'
+    'StoryGraph',
+    'ColumnarStoryGraph'
 ]
\ No newline at end of file
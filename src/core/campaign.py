@@ -5,8 +5,10 @@
 
 import os
 import shutil
+import threading
+from dataclasses import replace
 from pathlib import Path
-from typing import List, Optional, Dict, Set
+from typing import List, Optional, Dict, FrozenSet, Set, Tuple
 from functools import lru_cache
 
 from .models import Campaign
@@ -14,18 +16,20 @@ from .config import DATA_DIR, CATEGORIES, HIDDEN_FILES_LIST, ensure_data_dir
 
 
 class CampaignService:
-    """跑团管理服务"""
+    """跑团管理服务
+    
+    服务本身不保存“当前跑团”：调用方通过 get_campaign 获取跑团对象并显式传给其他服务，
+    同一实例可以被多个请求线程同时使用
+    """
     
     def __init__(self):
         ensure_data_dir()
-        self._current_campaign: Optional[Campaign] = None
+        self._lock = threading.RLock()
         # 添加缓存以提高性能
         self._campaigns_cache = None
         self._cache_timestamp = 0
-    
-    def get_current_campaign(self) -> Optional[Campaign]:
-        """获取当前选中的跑团"""
-        return self._current_campaign
+        # 跑团对象缓存：名称 -> (隐藏文件列表的修改时间, 跑团对象)
+        self._campaign_objects: Dict[str, Tuple[Optional[int], Campaign]] = {}
     
     def list_campaigns(self) -> List[str]:
         """获取所有跑团列表（带缓存优化）"""
@@ -35,9 +39,10 @@ class CampaignService:
         # 检查缓存是否有效（1秒内）
         import time
         current_time = time.time()
-        if (self._campaigns_cache is not None and 
-            current_time - self._cache_timestamp < 1.0):
-            return self._campaigns_cache
+        with self._lock:
+            if (self._campaigns_cache is not None and 
+                current_time - self._cache_timestamp < 1.0):
+                return list(self._campaigns_cache)
         
         campaigns = []
         for item in DATA_DIR.iterdir():
@@ -47,15 +52,17 @@ class CampaignService:
         campaigns = sorted(campaigns)
         
         # 更新缓存
-        self._campaigns_cache = campaigns
-        self._cache_timestamp = current_time
+        with self._lock:
+            self._campaigns_cache = campaigns
+            self._cache_timestamp = current_time
         
-        return campaigns
+        return list(campaigns)
     
     def _invalidate_cache(self):
         """使缓存失效"""
-        self._campaigns_cache = None
-        self._cache_timestamp = 0
+        with self._lock:
+            self._campaigns_cache = None
+            self._cache_timestamp = 0
     
     def create_campaign(self, name: str) -> bool:
         """创建新跑团
@@ -113,19 +120,19 @@ class CampaignService:
         try:
             shutil.rmtree(campaign_path)
             
-            # 如果删除的是当前跑团，清空当前选择
-            if self._current_campaign and self._current_campaign.name == name:
-                self._current_campaign = None
-            
             # 使缓存失效
+            with self._lock:
+                self._campaign_objects.pop(name, None)
             self._invalidate_cache()
             
             return True
         except Exception:
             return False
     
-    def select_campaign(self, name: str) -> Optional[Campaign]:
-        """选择跑团
+    def get_campaign(self, name: str) -> Optional[Campaign]:
+        """获取跑团对象
+        
+        返回的对象不可变，隐藏文件列表未变化时直接复用缓存
         
         Args:
             name: 跑团名称
@@ -133,33 +140,47 @@ class CampaignService:
         Returns:
             Campaign: 跑团对象，失败返回None
         """
-        if not name:
+        if not name or name != Path(name).name:
             return None
         
         campaign_path = DATA_DIR / name
         
-        if not campaign_path.exists():
+        if not campaign_path.is_dir():
             return None
         
-        # 创建跑团对象
-        campaign = Campaign(name=name, path=campaign_path)
-        
-        # 加载隐藏文件列表
-        campaign.hidden_files = self._load_hidden_files(campaign_path)
-        
-        self._current_campaign = campaign
-        return campaign
+        stamp = self._hidden_files_stamp(campaign_path)
+        with self._lock:
+            cached = self._campaign_objects.get(name)
+            if cached and cached[0] == stamp:
+                return cached[1]
+            
+            # 创建跑团对象并加载隐藏文件列表
+            campaign = Campaign(name=name, path=campaign_path,
+                                hidden_files=self._load_hidden_files(campaign_path))
+            self._campaign_objects[name] = (stamp, campaign)
+            return campaign
     
-    def _load_hidden_files(self, campaign_path: Path) -> Dict[str, Set[str]]:
+    def _hidden_files_stamp(self, campaign_path: Path) -> Optional[int]:
+        """隐藏文件列表的修改时间，文件不存在时为None"""
+        try:
+            return (campaign_path / HIDDEN_FILES_LIST).stat().st_mtime_ns
+        except OSError:
+            return None
+    
+    def get_hidden_files_stamp(self, campaign: Campaign) -> Optional[int]:
+        """获取隐藏文件列表的修改时间（纳秒），列表变化时改变，文件不存在时为None"""
+        return self._hidden_files_stamp(campaign.path)
+    
+    def _load_hidden_files(self, campaign_path: Path) -> Dict[str, FrozenSet[str]]:
         """加载隐藏文件列表
         
         Args:
             campaign_path: 跑团路径
             
         Returns:
-            Dict[str, Set[str]]: 隐藏文件映射
+            Dict[str, FrozenSet[str]]: 隐藏文件映射
         """
-        hidden_files = {}
+        hidden_files: Dict[str, Set[str]] = {}
         hidden_file_path = campaign_path / HIDDEN_FILES_LIST
         
         if not hidden_file_path.exists():
@@ -171,17 +192,15 @@ class CampaignService:
                     line = line.strip()
                     if line and ':' in line:
                         key, filename = line.split(':', 1)
-                        if key not in hidden_files:
-                            hidden_files[key] = set()
-                        hidden_files[key].add(filename)
+                        hidden_files.setdefault(key, set()).add(filename)
         except Exception:
             # 读取失败时返回空字典
             pass
         
-        return hidden_files
+        return {key: frozenset(filenames) for key, filenames in hidden_files.items()}
     
     def save_hidden_files(self, campaign: Campaign) -> bool:
-        """保存隐藏文件列表
+        """保存隐藏文件列表，并以该对象替换缓存中的跑团
         
         Args:
             campaign: 跑团对象
@@ -193,16 +212,42 @@ class CampaignService:
             return False
         
         hidden_file_path = campaign.path / HIDDEN_FILES_LIST
+        temp_path = hidden_file_path.with_name(HIDDEN_FILES_LIST + ".tmp")
         
         try:
-            with open(hidden_file_path, 'w', encoding='utf-8') as f:
-                for key, filenames in campaign.hidden_files.items():
-                    for filename in filenames:
-                        f.write(f"{key}:{filename}\n")
+            with self._lock:
+                # 先写临时文件再替换，并发读取时不会读到写了一半的列表
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    for key, filenames in campaign.hidden_files.items():
+                        for filename in sorted(filenames):
+                            f.write(f"{key}:{filename}\n")
+                os.replace(temp_path, hidden_file_path)
+                self._campaign_objects[campaign.name] = (self._hidden_files_stamp(campaign.path), campaign)
             return True
         except Exception:
             return False
     
+    def _update_hidden_files(self, campaign: Campaign, category_key: str, filename: str, hidden: bool) -> bool:
+        """基于最新的隐藏文件列表添加或移除一项，生成新的跑团对象并保存"""
+        with self._lock:
+            current = self.get_campaign(campaign.name) or campaign
+            hidden_files = {key: set(filenames) for key, filenames in current.hidden_files.items()}
+            filenames = hidden_files.setdefault(category_key, set())
+            if (filename in filenames) == hidden:
+                return True
+            if hidden:
+                filenames.add(filename)
+            else:
+                filenames.discard(filename)
+            
+            # 如果集合为空，删除键
+            if not filenames:
+                del hidden_files[category_key]
+            
+            return self.save_hidden_files(replace(current, hidden_files={
+                key: frozenset(names) for key, names in hidden_files.items()
+            }))
+    
     def add_hidden_file(self, campaign: Campaign, category_key: str, filename: str) -> bool:
         """添加隐藏文件
         
@@ -217,11 +262,7 @@ class CampaignService:
         if not campaign or not category_key or not filename:
             return False
         
-        if category_key not in campaign.hidden_files:
-            campaign.hidden_files[category_key] = set()
-        
-        campaign.hidden_files[category_key].add(filename)
-        return self.save_hidden_files(campaign)
+        return self._update_hidden_files(campaign, category_key, filename, True)
     
     def remove_hidden_file(self, campaign: Campaign, category_key: str, filename: str) -> bool:
         """移除隐藏文件
@@ -237,16 +278,7 @@ class CampaignService:
         if not campaign or not category_key or not filename:
             return False
         
-        if category_key not in campaign.hidden_files:
-            return True
-        
-        campaign.hidden_files[category_key].discard(filename)
-        
-        # 如果集合为空，删除键
-        if not campaign.hidden_files[category_key]:
-            del campaign.hidden_files[category_key]
-        
-        return self.save_hidden_files(campaign)
+        return self._update_hidden_files(campaign, category_key, filename, False)
     
     def is_file_hidden(self, campaign: Campaign, category_key: str, filename: str) -> bool:
         """检查文件是否被隐藏
@@ -265,7 +297,7 @@ class CampaignService:
         return (category_key in campaign.hidden_files and 
                 filename in campaign.hidden_files[category_key])
     
-    def get_hidden_files_for_category(self, campaign: Campaign, category_key: str) -> Set[str]:
+    def get_hidden_files_for_category(self, campaign: Campaign, category_key: str) -> FrozenSet[str]:
         """获取指定分类的隐藏文件列表
         
         Args:
@@ -273,9 +305,9 @@ class CampaignService:
             category_key: 分类键
             
         Returns:
-            Set[str]: 隐藏文件集合
+            FrozenSet[str]: 隐藏文件集合
         """
         if not campaign or not category_key:
-            return set()
+            return frozenset()
         
-        return campaign.hidden_files.get(category_key, set())
\ No newline at end of file
+        return campaign.hidden_files.get(category_key, frozenset())
\ No newline at end of file
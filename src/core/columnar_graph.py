@@ -0,0 +1,446 @@
+"""
+列式剧情图
+用数组存储大型剧情图：节点ID表、next 索引列、类型字节列以及 CSR 格式的分支连线，
+避免为每个节点创建 StoryNode 对象；可选 NumPy 视图用于向量化分析
+"""
+
+import sys
+from array import array
+from collections import deque
+from collections.abc import Sequence
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+from .models import StoryBranch, StoryGraph, StoryNode
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+# 节点类型编码
+NODE_TYPE_MAIN = 0
+NODE_TYPE_BRANCH = 1
+NODE_TYPE_OTHER = 2
+
+# 引用不存在时的索引
+NO_NODE = -1
+
+# 视为“未命名”的标题
+_DEFAULT_TITLES = ("新节点", "未命名节点", "未命名")
+
+
+class _NodeSequence(Sequence):
+    """按需构造 StoryNode 的只读节点序列"""
+
+    def __init__(self, graph: "ColumnarStoryGraph", indexes: Optional[List[int]] = None):
+        self._graph = graph
+        self._indexes = indexes
+
+    def __len__(self) -> int:
+        if self._indexes is None:
+            return self._graph.node_count
+        return len(self._indexes)
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            indexes = range(len(self))[item] if self._indexes is None else self._indexes[item]
+            return [self._graph.build_node(i) for i in indexes]
+        if self._indexes is None:
+            if item < 0:
+                item += self._graph.node_count
+            if not 0 <= item < self._graph.node_count:
+                raise IndexError(item)
+            return self._graph.build_node(item)
+        return self._graph.build_node(self._indexes[item])
+
+
+class ColumnarStoryGraph:
+    """列式剧情图
+
+    与 StoryGraph 提供相同的查询与统计接口，可直接用于统计、DOT 生成和结构验证
+    """
+
+    def __init__(self, title: str = ""):
+        self.title = title
+        # 节点列（按节点顺序）
+        self.ids: List[str] = []
+        self.titles: List[str] = []
+        self.contents: List[str] = []
+        self.node_types = bytearray()
+        self.other_type_names: Dict[int, str] = {}  # 非 main/branch 类型的原始名称
+        self.next_index = array('i')
+        # CSR 分支：节点 i 的分支为 branch_offsets[i]:branch_offsets[i+1]
+        self.branch_offsets = array('i', [0])
+        self.branch_entry = array('i')
+        self.branch_exit = array('i')
+        self.branch_choices: List[str] = []
+        # ID -> 首次出现的节点索引
+        self.index_of: Dict[str, int] = {}
+        # 指向不存在节点的引用：(源节点索引, 连线类型, 分支位置) -> 目标ID，next 的分支位置为 -1
+        self.missing_refs: Dict[Tuple[int, str, int], str] = {}
+        self._adjacency: Optional[Tuple[array, array]] = None
+
+    # ---- 构建与转换 ----
+
+    @classmethod
+    def from_story_data(cls, data: Dict[str, Any]) -> "ColumnarStoryGraph":
+        """直接从剧情 JSON 数据构建，不创建 StoryNode 对象"""
+        graph = cls(title=data.get("title", ""))
+        node_list = [node for node in data.get("nodes", []) if node.get("id")]
+
+        for node in node_list:
+            graph._append_node(node["id"], node.get("title", ""), node.get("content", ""),
+                               node.get("type", "main"))
+
+        for i, node in enumerate(node_list):
+            graph.next_index.append(graph._resolve(i, "next", node.get("next")))
+            for branch in node.get("branches", []) or []:
+                graph._append_branch(i, branch.get("choice", ""), branch.get("entry"), branch.get("exit"))
+            graph.branch_offsets.append(len(graph.branch_choices))
+
+        return graph
+
+    @classmethod
+    def from_story_graph(cls, story: StoryGraph) -> "ColumnarStoryGraph":
+        """从 StoryGraph 构建"""
+        graph = cls(title=story.title)
+
+        for node in story.nodes:
+            graph._append_node(node.id, node.title, node.content, node.node_type)
+
+        for i, node in enumerate(story.nodes):
+            graph.next_index.append(graph._resolve(i, "next", node.next_id))
+            for branch in node.branches:
+                graph._append_branch(i, branch.choice, branch.entry, branch.exit)
+            graph.branch_offsets.append(len(graph.branch_choices))
+
+        return graph
+
+    def to_story_graph(self) -> StoryGraph:
+        """转换为 StoryGraph"""
+        return StoryGraph(title=self.title, nodes=[self.build_node(i) for i in range(self.node_count)])
+
+    def _append_node(self, node_id: str, title: str, content: str, node_type: str):
+        """追加节点列数据"""
+        node_id = sys.intern(node_id)
+        self.index_of.setdefault(node_id, len(self.ids))
+        self.ids.append(node_id)
+        self.titles.append(title or "")
+        self.contents.append(content or "")
+
+        if node_type == "main":
+            self.node_types.append(NODE_TYPE_MAIN)
+        elif node_type == "branch":
+            self.node_types.append(NODE_TYPE_BRANCH)
+        else:
+            self.other_type_names[len(self.node_types)] = node_type
+            self.node_types.append(NODE_TYPE_OTHER)
+
+    def _append_branch(self, source: int, choice: str, entry: Optional[str], exit_id: Optional[str]):
+        """追加分支列数据"""
+        pos = len(self.branch_choices)
+        self.branch_choices.append(choice or "")
+        self.branch_entry.append(self._resolve(source, "entry", entry, pos))
+        self.branch_exit.append(self._resolve(source, "exit", exit_id, pos))
+
+    def _resolve(self, source: int, edge_type: str, target: Optional[str], pos: int = -1) -> int:
+        """将目标ID解析为节点索引，记录不存在的引用"""
+        if not target:
+            return NO_NODE
+        index = self.index_of.get(target)
+        if index is None:
+            self.missing_refs[(source, edge_type, pos)] = target
+            return NO_NODE
+        return index
+
+    def build_node(self, index: int) -> StoryNode:
+        """构造指定索引的 StoryNode"""
+        node_type = self.node_types[index]
+        if node_type == NODE_TYPE_MAIN:
+            type_name = "main"
+        elif node_type == NODE_TYPE_BRANCH:
+            type_name = "branch"
+        else:
+            type_name = self.other_type_names.get(index, "main")
+
+        ids = self.ids
+        branches = []
+        for pos in range(self.branch_offsets[index], self.branch_offsets[index + 1]):
+            entry = self.branch_entry[pos]
+            exit_index = self.branch_exit[pos]
+            branches.append(StoryBranch(
+                choice=self.branch_choices[pos],
+                entry=ids[entry] if entry != NO_NODE else self._missing_target(index, "entry", pos),
+                exit=ids[exit_index] if exit_index != NO_NODE else self._missing_target(index, "exit", pos)
+            ))
+
+        next_index = self.next_index[index]
+        return StoryNode(
+            id=ids[index],
+            title=self.titles[index],
+            content=self.contents[index],
+            node_type=type_name,
+            next_id=ids[next_index] if next_index != NO_NODE else self._missing_target(index, "next"),
+            branches=branches
+        )
+
+    def _missing_target(self, source: int, edge_type: str, pos: int = -1) -> Optional[str]:
+        """获取指向不存在节点的原始目标ID"""
+        return self.missing_refs.get((source, edge_type, pos))
+
+    # ---- StoryGraph 兼容接口 ----
+
+    @property
+    def node_count(self) -> int:
+        """节点数量"""
+        return len(self.ids)
+
+    @property
+    def nodes(self) -> _NodeSequence:
+        """节点序列（按需构造 StoryNode）"""
+        return _NodeSequence(self)
+
+    def get_node_by_id(self, node_id: str) -> Optional[StoryNode]:
+        """根据ID获取节点"""
+        index = self.index_of.get(node_id)
+        return self.build_node(index) if index is not None else None
+
+    def get_main_nodes(self) -> _NodeSequence:
+        """获取主线节点"""
+        return _NodeSequence(self, [i for i, t in enumerate(self.node_types) if t == NODE_TYPE_MAIN])
+
+    def get_branch_nodes(self) -> _NodeSequence:
+        """获取分支节点"""
+        return _NodeSequence(self, [i for i, t in enumerate(self.node_types) if t == NODE_TYPE_BRANCH])
+
+    def get_connected_node_ids(self) -> Set[str]:
+        """获取所有被连接的节点ID"""
+        connected = {self.ids[i] for i, count in enumerate(self.fan_in()) if count > 0}
+        connected.update(self.missing_refs.values())
+        return connected
+
+    def get_orphaned_nodes(self) -> List[str]:
+        """获取孤立节点（除第一个节点外）"""
+        if not self.ids:
+            return []
+        fan_in = self.fan_in()
+        index_of = self.index_of
+        return [node_id for node_id in self.ids[1:] if fan_in[index_of[node_id]] == 0]
+
+    def calculate_statistics(self) -> Dict:
+        """计算剧情统计信息（与 StoryGraph.calculate_statistics 结果一致）"""
+        node_types = self.node_types
+        main_count = node_types.count(NODE_TYPE_MAIN)
+        branch_count = node_types.count(NODE_TYPE_BRANCH)
+
+        total_branches = 0
+        nodes_with_branches = 0
+        offsets = self.branch_offsets
+        for i, node_type in enumerate(node_types):
+            if node_type == NODE_TYPE_MAIN:
+                count = offsets[i + 1] - offsets[i]
+                total_branches += count
+                if count:
+                    nodes_with_branches += 1
+
+        meaningful = 0
+        empty_title_count = 0
+        for title in self.titles:
+            stripped = title.strip()
+            if stripped and title not in _DEFAULT_TITLES:
+                meaningful += 1
+            if not title or stripped in _DEFAULT_TITLES:
+                empty_title_count += 1
+
+        return {
+            "total_nodes": self.node_count,
+            "main_nodes": main_count,
+            "branch_nodes": branch_count,
+            "meaningful_nodes": meaningful,
+            "total_branches": total_branches,
+            "nodes_with_branches": nodes_with_branches,
+            "avg_branches": total_branches / nodes_with_branches if nodes_with_branches > 0 else 0,
+            "empty_title_count": empty_title_count,
+            "empty_content_count": sum(1 for content in self.contents if not content.strip()),
+            "orphaned_nodes": self.get_orphaned_nodes()
+        }
+
+    def validate_structure(self) -> Dict[str, List[str]]:
+        """验证剧情结构（与 StoryGraphService.validate_story_structure 结果一致）"""
+        errors: List[str] = []
+        warnings: List[str] = []
+
+        if not self.ids:
+            errors.append("剧情中没有任何节点")
+            return {"errors": errors, "warnings": warnings}
+
+        if len(self.index_of) != len(self.ids):
+            errors.append("存在重复的节点ID")
+
+        # 按节点、分支顺序输出引用错误（next 在前，同一分支入口在出口前）
+        order = {"next": 0, "entry": 1, "exit": 2}
+        for (source, edge_type, pos), target in sorted(self.missing_refs.items(),
+                                                       key=lambda item: (item[0][0], item[0][2], order[item[0][1]])):
+            node_id = self.ids[source]
+            if edge_type == "next":
+                errors.append(f"节点 {node_id} 引用了不存在的节点 {target}")
+            elif edge_type == "entry":
+                errors.append(f"节点 {node_id} 的分支引用了不存在的入口节点 {target}")
+            else:
+                errors.append(f"节点 {node_id} 的分支引用了不存在的出口节点 {target}")
+
+        orphaned = self.get_orphaned_nodes()
+        if orphaned:
+            warnings.append(f"发现 {len(orphaned)} 个孤立节点: {', '.join(orphaned[:3])}")
+
+        empty_count = sum(1 for title in self.titles if not title.strip())
+        if empty_count:
+            warnings.append(f"发现 {empty_count} 个空标题节点")
+
+        return {"errors": errors, "warnings": warnings}
+
+    # ---- 图分析 ----
+
+    def edge_arrays(self) -> Tuple[array, array]:
+        """获取所有连线的 (源索引, 目标索引) 数组
+
+        连线与 DOT 图一致：节点 -> next、节点 -> 分支入口、分支入口 -> 分支出口
+        """
+        sources = array('i')
+        targets = array('i')
+        for i, target in enumerate(self.next_index):
+            if target != NO_NODE:
+                sources.append(i)
+                targets.append(target)
+
+        offsets = self.branch_offsets
+        for i in range(self.node_count):
+            for pos in range(offsets[i], offsets[i + 1]):
+                entry = self.branch_entry[pos]
+                if entry == NO_NODE:
+                    continue
+                sources.append(i)
+                targets.append(entry)
+                exit_index = self.branch_exit[pos]
+                if exit_index != NO_NODE:
+                    sources.append(entry)
+                    targets.append(exit_index)
+        return sources, targets
+
+    def adjacency(self) -> Tuple[array, array]:
+        """获取 CSR 邻接表 (offsets, targets)，结果会被缓存"""
+        if self._adjacency is None:
+            sources, targets = self.edge_arrays()
+            n = self.node_count
+            counts = array('i', [0]) * (n + 1)
+            for source in sources:
+                counts[source + 1] += 1
+            for i in range(n):
+                counts[i + 1] += counts[i]
+            cursor = array('i', counts)
+            adjacent = array('i', [0]) * len(targets)
+            for source, target in zip(sources, targets):
+                adjacent[cursor[source]] = target
+                cursor[source] += 1
+            self._adjacency = (counts, adjacent)
+        return self._adjacency
+
+    def fan_in(self) -> array:
+        """每个节点被引用的次数（next、分支入口、分支出口）"""
+        n = self.node_count
+        if np is not None and n:
+            views = self.numpy_views()
+            refs = np.concatenate((views["next_index"], views["branch_entry"], views["branch_exit"]))
+            return array('i', np.bincount(refs[refs >= 0], minlength=n).astype(np.intc).tobytes())
+
+        counts = array('i', [0]) * n
+        for column in (self.next_index, self.branch_entry, self.branch_exit):
+            for target in column:
+                if target != NO_NODE:
+                    counts[target] += 1
+        return counts
+
+    def out_degree(self) -> array:
+        """每个节点的出边数量（与 DOT 连线一致）"""
+        offsets, _ = self.adjacency()
+        return array('i', (offsets[i + 1] - offsets[i] for i in range(self.node_count)))
+
+    def reachable_from(self, start: int = 0) -> bytearray:
+        """从指定节点出发可到达的节点
+
+        Returns:
+            bytearray: 每个节点一个字节，1 表示可到达
+        """
+        n = self.node_count
+        visited = bytearray(n)
+        if not 0 <= start < n:
+            return visited
+
+        offsets, adjacent = self.adjacency()
+        if np is not None:
+            np_offsets = np.frombuffer(offsets, dtype=np.intc)
+            np_adjacent = np.frombuffer(adjacent, dtype=np.intc)
+            mask = np.zeros(n, dtype=bool)
+            mask[start] = True
+            frontier = np.array([start], dtype=np.intc)
+            while frontier.size:
+                starts = np_offsets[frontier]
+                counts = np_offsets[frontier + 1] - starts
+                total = int(counts.sum())
+                if total == 0:
+                    break
+                # 批量收集前沿节点的所有后继
+                shifts = np.repeat(starts - np.concatenate(([0], np.cumsum(counts)[:-1])), counts)
+                successors = np_adjacent[np.arange(total) + shifts]
+                successors = np.unique(successors[~mask[successors]])
+                mask[successors] = True
+                frontier = successors.astype(np.intc)
+            return bytearray(mask.astype(np.uint8).tobytes())
+
+        visited[start] = 1
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for pos in range(offsets[node], offsets[node + 1]):
+                target = adjacent[pos]
+                if not visited[target]:
+                    visited[target] = 1
+                    queue.append(target)
+        return visited
+
+    def get_unreachable_nodes(self, start: int = 0) -> List[str]:
+        """获取从起始节点无法到达的节点ID"""
+        visited = self.reachable_from(start)
+        return [self.ids[i] for i in range(self.node_count) if not visited[i]]
+
+    def numpy_views(self) -> Dict[str, Any]:
+        """获取各数组列的 NumPy 零拷贝视图
+
+        Raises:
+            ImportError: 未安装 NumPy
+        """
+        if np is None:
+            raise ImportError("需要安装 NumPy 才能使用向量化视图")
+        return {
+            "node_types": np.frombuffer(self.node_types, dtype=np.uint8),
+            "next_index": np.frombuffer(self.next_index, dtype=np.intc),
+            "branch_offsets": np.frombuffer(self.branch_offsets, dtype=np.intc),
+            "branch_entry": np.frombuffer(self.branch_entry, dtype=np.intc),
+            "branch_exit": np.frombuffer(self.branch_exit, dtype=np.intc),
+        }
+
+    def iter_edges(self) -> Iterator[Tuple[str, str, str, str]]:
+        """遍历连线 (源ID, 目标ID, 连线类型, 分支选项)"""
+        for i, target in enumerate(self.next_index):
+            if target != NO_NODE:
+                yield self.ids[i], self.ids[target], "next", ""
+        offsets = self.branch_offsets
+        for i in range(self.node_count):
+            for pos in range(offsets[i], offsets[i + 1]):
+                entry = self.branch_entry[pos]
+                if entry == NO_NODE:
+                    continue
+                yield self.ids[i], self.ids[entry], "entry", self.branch_choices[pos]
+                exit_index = self.branch_exit[pos]
+                if exit_index != NO_NODE:
+                    yield self.ids[entry], self.ids[exit_index], "exit", ""
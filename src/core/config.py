@@ -5,7 +5,46 @@
 
 import os
 from pathlib import Path
-from typing import Dict
+from typing import Dict, Tuple
+
+
+def _env_choice(name: str, choices: Tuple[str, ...], default: str) -> str:
+    """读取取值限定在 choices 中的环境变量，取值无效时给出警告并使用默认值"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    if value not in choices:
+        print(f"[WARNING] 环境变量 {name}={value!r} 无效（可选 {', '.join(choices)}），使用默认值 {default}")
+        return default
+    return value
+
+
+def _env_int(name: str, default: int, minimum: int = 1) -> int:
+    """读取整数环境变量，无法解析时给出警告并使用默认值，小于 minimum 时取 minimum"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        return max(minimum, int(value))
+    except ValueError:
+        print(f"[WARNING] 环境变量 {name}={value!r} 不是整数，使用默认值 {default}")
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    """读取正数环境变量，无法解析或不是正数时给出警告并使用默认值"""
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    try:
+        number = float(value)
+    except ValueError:
+        number = 0.0
+    if not number > 0 or number == float("inf"):
+        print(f"[WARNING] 环境变量 {name}={value!r} 不是正数，使用默认值 {default}")
+        return default
+    return number
+
 
 # 基础路径配置
 BASE_DIR = Path(__file__).parent.parent.parent
@@ -32,6 +71,102 @@ SUPPORTED_IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
 SUPPORTED_TEXT_EXTENSIONS = {'.txt', '.md'}
 SUPPORTED_JSON_EXTENSIONS = {'.json'}
 
+# 剧情存储格式
+# pretty: 缩进 JSON（默认）；compact: 紧凑 JSON；gzip: 紧凑 JSON 并压缩为 .json.gz
+STORY_STORAGE_FORMATS = ("pretty", "compact", "gzip")
+STORY_STORAGE_FORMAT = _env_choice("DND_STORY_FORMAT", STORY_STORAGE_FORMATS, "pretty")
+STORY_JSON_SUFFIX = ".json"
+STORY_GZIP_SUFFIX = ".json.gz"
+# 内置布局的坐标缓存（用于增量布局）
+STORY_LAYOUT_SUFFIX = ".layout"
+
+# 节点数达到该值时，统计分析使用列式剧情图
+COLUMNAR_GRAPH_THRESHOLD = 5000
+# 节点数达到该值时，静态预览只渲染概览图（线性链、封闭分支合并为组节点），
+# 完整结构在预览页的概览模式中逐级展开
+STORY_OVERVIEW_THRESHOLD = 2000
+
+# 剧情图配色（DOT 与内置 SVG 渲染共用）
+STORY_GRAPH_COLORS = {
+    "main": "#4CAF50",    # 主线节点：绿色
+    "branch": "#2196F3",  # 分支节点：蓝色
+    "fail": "#9E9E9E",    # 虚线/失败：灰色
+    "choice": "#FF9800",  # 分支连线：橙色
+}
+STORY_GRAPH_FONT = "Microsoft YaHei"
+
+# 预览渲染器
+# graphviz: 调用 dot 命令（默认）；builtin: 内置分层布局，进程内直接生成 SVG，无需安装 Graphviz，
+# 但长回跳连线很多的超大剧情（数千节点）耗时明显长于 dot
+PREVIEW_RENDERERS = ("builtin", "graphviz")
+PREVIEW_RENDERER = _env_choice("DND_PREVIEW_RENDERER", PREVIEW_RENDERERS, "graphviz")
+# 预览渲染器版本：SVG 输出格式变化时递增，使已有预览全部过期
+PREVIEW_RENDERER_VERSION = 2
+# SVG 后处理时坐标保留的小数位数
+SVG_COORD_PRECISION = 1
+# 保存剧情后重建预览的防抖间隔（秒），以及长轮询预览状态的最长等待时间（秒）
+PREVIEW_REBUILD_DELAY = 2.0
+PREVIEW_STATUS_MAX_WAIT = 30.0
+# 预览清单文件（位于 notes 目录，记录各剧情预览的输入哈希）
+PREVIEW_MANIFEST_NAME = ".preview_manifest"
+
+# 静态站点导出：输出目录（每个跑团一个子目录）与页面模板目录
+SITE_EXPORT_DIR = BASE_DIR / "build" / "site"
+SITE_TEMPLATE_DIR = BASE_DIR / "tools" / "site"
+
+# Graphviz 进程限制
+# 同时运行的 dot 进程数、排队上限、单次转换的超时（秒）与内存上限（MB，仅 POSIX 系统生效）
+GRAPHVIZ_MAX_WORKERS = _env_int("DND_GRAPHVIZ_WORKERS", 2)
+GRAPHVIZ_MAX_QUEUE = 32
+GRAPHVIZ_TIMEOUT = _env_float("DND_GRAPHVIZ_TIMEOUT", 30.0)
+GRAPHVIZ_MEMORY_LIMIT_MB = 1024
+# 超出时间或资源限制时依次尝试的更廉价的连线方式
+GRAPHVIZ_SPLINES_FALLBACK = ("polyline", "false")
+
+# Web 服务器
+# 工作线程数、等待工作线程的连接上限（超出返回 503）、读取请求的超时（秒）
+# 以及连接建立后等待客户端发送请求的最长时间（秒）
+HTTP_WORKERS = _env_int("DND_HTTP_WORKERS", 16)
+HTTP_MAX_QUEUE = _env_int("DND_HTTP_MAX_QUEUE", 64)
+HTTP_READ_TIMEOUT = 30.0
+HTTP_IDLE_TIMEOUT = 15.0
+# 服务器引擎：threaded 为工作线程池，asyncio 为事件循环（大量空闲长连接和事件流订阅不占用线程）
+HTTP_ENGINES = ("threaded", "asyncio")
+HTTP_ENGINE = _env_choice("DND_HTTP_ENGINE", HTTP_ENGINES, "threaded")
+# 长连接：两次请求之间的最长空闲时间（秒）与单个连接最多处理的请求数
+HTTP_KEEPALIVE_TIMEOUT = 120.0
+HTTP_KEEPALIVE_MAX_REQUESTS = 1000
+# 预览事件流（/api/story/preview-events）的心跳间隔（秒）
+PREVIEW_EVENTS_PING_INTERVAL = 15.0
+# 响应压缩：小于 GZIP_MIN_SIZE 字节的响应不压缩，静态文件的压缩结果在内存中最多缓存 GZIP_CACHE_MAX_BYTES
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+GZIP_CACHE_MAX_BYTES = 32 * 1024 * 1024
+GZIP_COMPRESSIBLE_TYPES = (
+    "application/json", "application/javascript", "text/javascript", "text/css",
+    "text/html", "text/plain", "text/markdown", "image/svg+xml",
+)
+# 条件请求：API 响应和静态文件带 ETag，浏览器每次使用缓存前向服务器验证（未修改时返回 304）
+API_CACHE_CONTROL = "no-cache"
+STATIC_CACHE_CONTROL = "no-cache"
+# 请求体的最大字节数：超出的请求体不读取，直接返回 413；压缩的请求体解压后同样不能超过
+MAX_REQUEST_BODY_SIZE = 64 * 1024 * 1024
+
+# 地图缩略图（需要 Pillow）
+# 磁盘缓存目录、可生成的宽度（请求的宽度取不小于它的最近一档）、导入地图后在后台预生成的宽度、
+# 有损压缩质量与后台生成的线程数
+MAP_IMAGE_CACHE_DIR = BASE_DIR / "build" / "map_cache"
+MAP_THUMBNAIL_WIDTHS = (128, 256, 512, 1024, 2048)
+MAP_THUMBNAIL_PREGENERATE_WIDTHS = (128, 512)
+MAP_THUMBNAIL_QUALITY = 80
+MAP_THUMBNAIL_WORKERS = 2
+# 地图瓦片（深度缩放）：瓦片边长（像素）。最大一级为原图尺寸，每降一级缩小一半，第 0 级整张图不超过一个瓦片；
+# 瓦片缓存在 MAP_IMAGE_CACHE_DIR/tiles，压缩质量与缩略图相同
+MAP_TILE_SIZE = 256
+# 地图图片的像素上限。地图是用户导入的本地文件，放宽 Pillow 默认的解压炸弹限制（约 1.79 亿像素即拒绝打开）；
+# 超过该值时 Pillow 只给出警告，超过两倍时拒绝处理
+MAP_MAX_IMAGE_PIXELS = _env_int("DND_MAP_MAX_IMAGE_PIXELS", 500_000_000)
+
 # 模板内容
 TEMPLATES = {
     "characters": """姓名: 
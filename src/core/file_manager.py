@@ -3,12 +3,13 @@
 处理文件的创建、删除、导入、列表等操作
 """
 
+import hashlib
 import os
 import shutil
+import threading
 from pathlib import Path
-from typing import List, Optional, Dict
+from typing import List, Optional, Dict, FrozenSet
 from functools import lru_cache
-import time
 
 from .models import Campaign, FileInfo
 from .config import (
@@ -16,10 +17,16 @@ from .config import (
     is_valid_filename, get_file_type,
     SUPPORTED_IMAGE_EXTENSIONS, SUPPORTED_TEXT_EXTENSIONS, SUPPORTED_JSON_EXTENSIONS
 )
+from .map_images import image_size, map_thumbnails
+from .story_chapters import CHAPTER_DIR_SUFFIX
+from .story_storage import find_story_file, is_story_file, read_story_bytes, story_name_from_path
 
 
 class FileManagerService:
-    """文件管理服务"""
+    """文件管理服务
+    
+    所有操作都显式传入跑团对象（由 CampaignService.get_campaign 获取），服务可被多个请求线程共享
+    """
     
     def __init__(self, campaign_service):
         """初始化文件管理服务
@@ -28,9 +35,9 @@ class FileManagerService:
             campaign_service: 跑团管理服务实例
         """
         self.campaign_service = campaign_service
-        # 添加文件列表缓存
+        # 文件列表缓存：缓存键 -> (列表版本号, 文件列表)
+        self._cache_lock = threading.Lock()
         self._file_cache = {}
-        self._cache_timestamps = {}
     
     def _get_cache_key(self, campaign_name: str, category: str, sub_path: str = "") -> str:
         """生成缓存键"""
@@ -39,56 +46,123 @@ class FileManagerService:
     def _invalidate_cache(self, campaign_name: str, category: str, sub_path: str = ""):
         """使指定缓存失效"""
         cache_key = self._get_cache_key(campaign_name, category, sub_path)
-        if cache_key in self._file_cache:
-            del self._file_cache[cache_key]
-        if cache_key in self._cache_timestamps:
-            del self._cache_timestamps[cache_key]
+        with self._cache_lock:
+            self._file_cache.pop(cache_key, None)
+    
+    def _target_path(self, campaign: Campaign, category: str, sub_path: str = "") -> Path:
+        """分类（或 notes 子目录）的目录路径"""
+        if category == "notes" and sub_path:
+            return campaign.get_notes_path(sub_path)
+        return campaign.get_category_path(category)
+    
+    def get_catalog_version(self, campaign: Campaign, category: str, sub_path: str = "") -> Optional[str]:
+        """获取文件列表的版本号
+        
+        由目录和隐藏文件列表的修改时间组成，文件的增删、改名和隐藏/恢复都会改变它；
+        地图列表记录了图片尺寸，原地覆盖图片不改变目录的修改时间，因此还包含各文件的修改时间和大小
+        
+        Args:
+            campaign: 跑团对象
+            category: 分类名称
+            sub_path: 子路径（用于notes分类）
+            
+        Returns:
+            Optional[str]: 版本号，目录不存在时返回None
+        """
+        if not campaign:
+            return None
+        try:
+            directory_stamp = self._target_path(campaign, category, sub_path).stat().st_mtime_ns
+        except OSError:
+            return None
+        hidden_stamp = self.campaign_service.get_hidden_files_stamp(campaign) or 0
+        version = f"{directory_stamp:x}-{hidden_stamp:x}"
+        if category == "maps":
+            files_stamp = self._files_stamp(self._target_path(campaign, category, sub_path))
+            if files_stamp is None:
+                return None
+            version = f"{version}-{files_stamp}"
+        return version
+    
+    @staticmethod
+    def _files_stamp(directory: Path) -> Optional[str]:
+        """目录中各文件的名称、修改时间和大小的摘要（只读取目录项，不打开文件）"""
+        digest = hashlib.sha1()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in sorted(entries, key=lambda entry: entry.name):
+                    if entry.is_file():
+                        stat = entry.stat()
+                        line = f"{entry.name}\0{stat.st_mtime_ns:x}\0{stat.st_size:x}\n"
+                        digest.update(line.encode("utf-8", "surrogatepass"))
+        except OSError:
+            return None
+        return digest.hexdigest()[:16]
     
-    def list_files(self, category: str, sub_path: str = "") -> List[FileInfo]:
-        """获取文件列表（带缓存优化）
+    def get_file_version(self, campaign: Campaign, category: str, display_name: str, sub_path: str = "") -> Optional[str]:
+        """获取文件的版本号（修改时间和大小）
         
         Args:
+            campaign: 跑团对象
+            category: 分类名称
+            display_name: 显示名称（可能是去掉扩展名的）
+            sub_path: 子路径（用于notes分类）
+            
+        Returns:
+            Optional[str]: 版本号，文件不存在时返回None
+        """
+        file_path = self.get_file_path(campaign, category, display_name, sub_path)
+        if not file_path:
+            return None
+        try:
+            stat = file_path.stat()
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    
+    def list_files(self, campaign: Campaign, category: str, sub_path: str = "") -> List[FileInfo]:
+        """获取文件列表（按列表版本号缓存，目录或隐藏文件列表变化后重新扫描）
+        
+        Args:
+            campaign: 跑团对象
             category: 分类名称
             sub_path: 子路径（用于notes分类）
             
         Returns:
             List[FileInfo]: 文件信息列表
         """
-        campaign = self.campaign_service.get_current_campaign()
         if not campaign:
             return []
         
         # 检查缓存
         cache_key = self._get_cache_key(campaign.name, category, sub_path)
-        current_time = time.time()
+        version = self.get_catalog_version(campaign, category, sub_path)
+        if version is None:
+            return []
         
-        if (cache_key in self._file_cache and 
-            cache_key in self._cache_timestamps and
-            current_time - self._cache_timestamps[cache_key] < 2.0):  # 2秒缓存
-            return self._file_cache[cache_key]
+        with self._cache_lock:
+            cached = self._file_cache.get(cache_key)
+            if cached and cached[0] == version:
+                return cached[1]
         
-        # 构建目标路径
-        if category == "notes" and sub_path:
-            target_path = campaign.get_notes_path(sub_path)
-        else:
-            target_path = campaign.get_category_path(category)
-        
-        if not target_path.exists():
-            result = []
-        else:
-            result = self._scan_files(campaign, category, sub_path, target_path)
+        result = self._scan_files(campaign, category, sub_path, self._target_path(campaign, category, sub_path))
         
         # 更新缓存
-        self._file_cache[cache_key] = result
-        self._cache_timestamps[cache_key] = current_time
+        with self._cache_lock:
+            self._file_cache[cache_key] = (version, result)
         
         return result
     
+    def _current_hidden_files(self, campaign: Campaign, hidden_key: str) -> FrozenSet[str]:
+        """以最新的隐藏文件列表为准（传入的跑团对象可能是删除/恢复文件之前获取的）"""
+        latest = self.campaign_service.get_campaign(campaign.name) or campaign
+        return self.campaign_service.get_hidden_files_for_category(latest, hidden_key)
+    
     def _scan_files(self, campaign: Campaign, category: str, sub_path: str, target_path: Path) -> List[FileInfo]:
         """扫描文件目录"""
         files = []
         hidden_key = f"{category}:{sub_path}" if category == "notes" and sub_path else category
-        hidden_files = self.campaign_service.get_hidden_files_for_category(campaign, hidden_key)
+        hidden_files = self._current_hidden_files(campaign, hidden_key)
         
         try:
             for item in target_path.iterdir():
@@ -102,7 +176,10 @@ class FileManagerService:
                 
                 # 对于notes分类，进行特殊过滤
                 if category == "notes":
-                    if item.is_dir():
+                    if item.is_dir() and item.name.endswith(CHAPTER_DIR_SUFFIX):
+                        # 分章节剧情的章节目录由清单文件代表，不单独显示
+                        continue
+                    elif item.is_dir():
                         # 目录始终显示
                         file_info = FileInfo(
                             name=item.name,
@@ -111,9 +188,9 @@ class FileManagerService:
                             file_type=None
                         )
                         files.append(file_info)
-                    elif item.suffix.lower() == '.json':
-                        # 只显示JSON文件，且去掉后缀
-                        display_name = item.stem  # 不含扩展名的文件名
+                    elif is_story_file(item):
+                        # 只显示JSON剧情文件（含 .json.gz），且去掉后缀
+                        display_name = story_name_from_path(item)  # 不含扩展名的文件名
                         file_info = FileInfo(
                             name=display_name,
                             path=item,
@@ -131,6 +208,11 @@ class FileManagerService:
                         is_directory=item.is_dir(),
                         file_type=get_file_type(item) if item.is_file() else None
                     )
+                    # 图片记录尺寸（只读取文件头）
+                    if file_info.file_type == "image":
+                        size = image_size(item)
+                        if size:
+                            file_info.width, file_info.height = size
                     files.append(file_info)
         except Exception:
             return []
@@ -139,10 +221,11 @@ class FileManagerService:
         files.sort(key=lambda x: (not x.is_directory, x.name.lower()))
         return files
     
-    def create_file(self, category: str, filename: str, sub_path: str = "") -> bool:
+    def create_file(self, campaign: Campaign, category: str, filename: str, sub_path: str = "") -> bool:
         """创建文件
         
         Args:
+            campaign: 跑团对象
             category: 分类名称
             filename: 文件名（不含扩展名）
             sub_path: 子路径（用于notes分类）
@@ -150,7 +233,6 @@ class FileManagerService:
         Returns:
             bool: 创建是否成功
         """
-        campaign = self.campaign_service.get_current_campaign()
         if not campaign:
             return False
         
@@ -207,10 +289,11 @@ class FileManagerService:
         except Exception:
             return False
     
-    def delete_file(self, category: str, display_name: str, sub_path: str = "") -> bool:
+    def delete_file(self, campaign: Campaign, category: str, display_name: str, sub_path: str = "") -> bool:
         """删除文件（软删除，添加到隐藏列表）
         
         Args:
+            campaign: 跑团对象
             category: 分类名称
             display_name: 显示名称（可能是去掉扩展名的）
             sub_path: 子路径（用于notes分类）
@@ -218,7 +301,6 @@ class FileManagerService:
         Returns:
             bool: 删除是否成功
         """
-        campaign = self.campaign_service.get_current_campaign()
         if not campaign:
             return False
         
@@ -227,8 +309,10 @@ class FileManagerService:
         
         # 对于notes分类，需要还原实际文件名
         if category == "notes" and not display_name.startswith("[DIR] "):
-            # 获取实际文件名
-            actual_filename = f"{display_name}.json"
+            # 获取实际文件名（可能是 .json.gz）
+            notes_dir = campaign.get_notes_path(sub_path) if sub_path else campaign.get_category_path(category)
+            story_file = find_story_file(notes_dir, display_name)
+            actual_filename = story_file.name if story_file else f"{display_name}.json"
         else:
             # 其他分类或目录，使用显示名称
             actual_filename = display_name.replace("[DIR] ", "") if display_name.startswith("[DIR] ") else display_name
@@ -242,10 +326,11 @@ class FileManagerService:
         
         return success
     
-    def restore_file(self, category: str, filename: str, sub_path: str = "") -> bool:
+    def restore_file(self, campaign: Campaign, category: str, filename: str, sub_path: str = "") -> bool:
         """恢复文件（从隐藏列表移除）
         
         Args:
+            campaign: 跑团对象
             category: 分类名称
             filename: 文件名
             sub_path: 子路径（用于notes分类）
@@ -253,7 +338,6 @@ class FileManagerService:
         Returns:
             bool: 恢复是否成功
         """
-        campaign = self.campaign_service.get_current_campaign()
         if not campaign:
             return False
         
@@ -261,12 +345,19 @@ class FileManagerService:
         hidden_key = f"{category}:{sub_path}" if category == "notes" and sub_path else category
         
         # 从隐藏列表移除
-        return self.campaign_service.remove_hidden_file(campaign, hidden_key, filename)
+        success = self.campaign_service.remove_hidden_file(campaign, hidden_key, filename)
+        
+        if success:
+            # 清理缓存
+            self._invalidate_cache(campaign.name, category, sub_path)
+        
+        return success
     
-    def import_file(self, category: str, source_path: str, sub_path: str = "") -> bool:
+    def import_file(self, campaign: Campaign, category: str, source_path: str, sub_path: str = "") -> bool:
         """导入文件
         
         Args:
+            campaign: 跑团对象
             category: 分类名称
             source_path: 源文件路径
             sub_path: 子路径（用于notes分类）
@@ -274,7 +365,6 @@ class FileManagerService:
         Returns:
             bool: 导入是否成功
         """
-        campaign = self.campaign_service.get_current_campaign()
         if not campaign:
             return False
         
@@ -299,9 +389,13 @@ class FileManagerService:
         
         try:
             shutil.copy2(source, target_path)
-            return True
         except Exception:
             return False
+        
+        # 地图在后台预生成常用尺寸的缩略图，列表第一次显示时不需要等待
+        if category == "maps" and get_file_type(target_path) == "image":
+            map_thumbnails.pregenerate(target_path)
+        return True
     
     def read_text_file(self, file_path: Path) -> Optional[str]:
         """读取文本文件内容
@@ -316,15 +410,19 @@ class FileManagerService:
             return None
         
         try:
+            # 压缩的剧情文件需要先解压
+            if is_story_file(file_path):
+                return read_story_bytes(file_path).decode('utf-8')
             with open(file_path, 'r', encoding='utf-8') as f:
                 return f.read()
         except Exception:
             return None
     
-    def get_file_path(self, category: str, display_name: str, sub_path: str = "") -> Optional[Path]:
+    def get_file_path(self, campaign: Campaign, category: str, display_name: str, sub_path: str = "") -> Optional[Path]:
         """获取文件完整路径
         
         Args:
+            campaign: 跑团对象
             category: 分类名称
             display_name: 显示名称（可能是去掉扩展名的）
             sub_path: 子路径（用于notes分类）
@@ -332,7 +430,6 @@ class FileManagerService:
         Returns:
             Optional[Path]: 文件路径，失败返回None
         """
-        campaign = self.campaign_service.get_current_campaign()
         if not campaign:
             return None
         
@@ -344,9 +441,9 @@ class FileManagerService:
         
         # 对于notes分类，需要还原完整文件名
         if category == "notes" and not display_name.startswith("[DIR] "):
-            # 尝试找到对应的JSON文件
-            json_file = target_dir / f"{display_name}.json"
-            if json_file.exists():
+            # 尝试找到对应的JSON文件（.json 或 .json.gz）
+            json_file = find_story_file(target_dir, display_name)
+            if json_file:
                 return json_file
             # 如果没找到，可能是完整文件名
             direct_file = target_dir / display_name
@@ -379,29 +476,30 @@ class FileManagerService:
         
         return False
     
-    def get_hidden_files(self, category: str, sub_path: str = "") -> List[str]:
+    def get_hidden_files(self, campaign: Campaign, category: str, sub_path: str = "") -> List[str]:
         """获取隐藏文件列表
         
         Args:
+            campaign: 跑团对象
             category: 分类名称
             sub_path: 子路径（用于notes分类）
             
         Returns:
             List[str]: 隐藏文件名列表
         """
-        campaign = self.campaign_service.get_current_campaign()
         if not campaign:
             return []
         
         hidden_key = f"{category}:{sub_path}" if category == "notes" and sub_path else category
-        hidden_files = self.campaign_service.get_hidden_files_for_category(campaign, hidden_key)
+        hidden_files = self._current_hidden_files(campaign, hidden_key)
         
         return sorted(list(hidden_files))
     
-    def read_file_content(self, category: str, display_name: str, sub_path: str = "") -> Optional[str]:
+    def read_file_content(self, campaign: Campaign, category: str, display_name: str, sub_path: str = "") -> Optional[str]:
         """读取文件内容
         
         Args:
+            campaign: 跑团对象
             category: 分类名称
             display_name: 显示名称（可能是去掉扩展名的）
             sub_path: 子路径（用于notes分类）
@@ -409,17 +507,17 @@ class FileManagerService:
         Returns:
             Optional[str]: 文件内容，失败返回None
         """
-        file_path = self.get_file_path(category, display_name, sub_path)
+        file_path = self.get_file_path(campaign, category, display_name, sub_path)
         if not file_path:
             return None
         
         return self.read_text_file(file_path)
     
-    def save_file_content(self, campaign_name: str, category: str, filename: str, content: str) -> tuple[bool, str]:
+    def save_file_content(self, campaign: Campaign, category: str, filename: str, content: str) -> tuple[bool, str]:
         """保存文件内容
         
         Args:
-            campaign_name: 跑团名称
+            campaign: 跑团对象
             category: 分类名称
             filename: 文件名
             content: 文件内容
@@ -427,36 +525,27 @@ class FileManagerService:
         Returns:
             tuple[bool, str]: (是否成功, 消息)
         """
-        # 切换到指定跑团
-        original_campaign = self.campaign_service.get_current_campaign()
-        campaign = self.campaign_service.select_campaign(campaign_name)
-        
         if not campaign:
-            return False, f"跑团 '{campaign_name}' 不存在"
+            return False, "跑团不存在"
         
-        try:
-            # 获取文件路径
-            file_path = self.get_file_path(category, filename)
-            if not file_path:
-                # 如果文件不存在，尝试创建
-                if category == "notes" and not filename.endswith('.json') and not filename.endswith('.txt'):
-                    # 对于notes分类，如果没有扩展名，默认添加.txt
-                    filename = filename + '.txt'
-                
-                # 构建目标路径
-                target_dir = campaign.get_category_path(category)
-                target_dir.mkdir(parents=True, exist_ok=True)
-                file_path = target_dir / filename
+        # 获取文件路径
+        file_path = self.get_file_path(campaign, category, filename)
+        if not file_path:
+            # 如果文件不存在，尝试创建
+            if category == "notes" and not filename.endswith('.json') and not filename.endswith('.txt'):
+                # 对于notes分类，如果没有扩展名，默认添加.txt
+                filename = filename + '.txt'
             
-            # 保存文件内容
-            try:
-                with open(file_path, 'w', encoding='utf-8') as f:
-                    f.write(content)
-                return True, f"文件 '{filename}' 保存成功"
-            except Exception as e:
-                return False, f"保存文件失败: {str(e)}"
-                
-        finally:
-            # 恢复原来的跑团
-            if original_campaign:
-                self.campaign_service.select_campaign(original_campaign.name)
\ No newline at end of file
+            # 构建目标路径
+            target_dir = campaign.get_category_path(category)
+            target_dir.mkdir(parents=True, exist_ok=True)
+            file_path = target_dir / filename
+            self._invalidate_cache(campaign.name, category)
+        
+        # 保存文件内容
+        try:
+            with open(file_path, 'w', encoding='utf-8') as f:
+                f.write(content)
+            return True, f"文件 '{filename}' 保存成功"
+        except Exception as e:
+            return False, f"保存文件失败: {str(e)}"
\ No newline at end of file
@@ -0,0 +1,271 @@
+"""
+Graphviz 调用
+查找 dot 可执行文件（结果缓存，只探测一次），并通过标准输入/输出直接转换 DOT 内容，
+不需要写临时 .dot 文件。
+
+dot 进程由 GraphvizPool 统一调度：限制并发数和排队长度，每次转换有超时以及
+CPU 时间 / 内存上限；超出限制时依次改用更廉价的连线方式重试
+"""
+
+import math
+import re
+import subprocess
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Sequence, Tuple
+
+try:
+    import resource
+except ImportError:  # Windows 没有 resource 模块，只使用超时限制
+    resource = None
+
+from .config import (
+    GRAPHVIZ_MAX_WORKERS, GRAPHVIZ_MAX_QUEUE, GRAPHVIZ_TIMEOUT,
+    GRAPHVIZ_MEMORY_LIMIT_MB, GRAPHVIZ_SPLINES_FALLBACK
+)
+
+# 常见的Graphviz安装路径
+DOT_CANDIDATES = (
+    "dot",  # 如果在PATH中
+    "C:\\Program Files\\Graphviz\\bin\\dot.exe",
+    "C:\\Program Files (x86)\\Graphviz\\bin\\dot.exe",
+    "C:\\Graphviz\\bin\\dot.exe",
+    "/usr/bin/dot",  # Linux
+    "/usr/local/bin/dot",  # macOS
+    "/opt/homebrew/bin/dot",  # macOS with Homebrew
+)
+
+_NOT_SEARCHED = object()
+_dot_executable = _NOT_SEARCHED
+_lookup_lock = threading.Lock()
+
+_SPLINES_PATTERN = re.compile(r"^[ \t]*splines[ \t]*=[^;\n]*;?[ \t]*$\n?", re.MULTILINE)
+_GRAPH_HEADER_PATTERN = re.compile(r"^([ \t]*(?:strict[ \t]+)?(?:di)?graph\b[^{\n]*\{)", re.MULTILINE)
+
+
+def find_dot_executable(refresh: bool = False) -> Optional[str]:
+    """查找dot可执行文件的路径，结果在进程内缓存
+
+    Args:
+        refresh: 是否忽略缓存重新探测（例如安装 Graphviz 之后）
+
+    Returns:
+        Optional[str]: 可执行文件路径，未找到返回None
+    """
+    global _dot_executable
+    with _lookup_lock:
+        if refresh or _dot_executable is _NOT_SEARCHED:
+            _dot_executable = _probe_dot_executable()
+        return _dot_executable
+
+
+def _probe_dot_executable() -> Optional[str]:
+    for path in DOT_CANDIDATES:
+        try:
+            # 测试是否可以执行
+            result = subprocess.run([path, "-V"], capture_output=True, timeout=5)
+            if result.returncode == 0:
+                return path
+        except (OSError, subprocess.SubprocessError):
+            continue
+    return None
+
+
+def set_splines(dot_content: str, splines: str) -> str:
+    """替换 DOT 内容中所有图的 splines 设置"""
+    dot_content = _SPLINES_PATTERN.sub("", dot_content)
+    return _GRAPH_HEADER_PATTERN.sub(lambda match: f"{match.group(1)}\n    splines={splines};", dot_content)
+
+
+def _apply_limits(process: subprocess.Popen, cpu_seconds: Optional[int], memory_bytes: Optional[int]):
+    """为已启动的 dot 进程设置 CPU 时间和地址空间上限
+
+    dot 在读完标准输入之前不会开始布局，因此进程启动后再设置限制不会漏掉计算
+    （使用 prlimit 而不是 preexec_fn，多线程环境下 fork 后执行 Python 代码并不安全）
+    """
+    if resource is None or not hasattr(resource, "prlimit"):
+        return
+    try:
+        if cpu_seconds:
+            resource.prlimit(process.pid, resource.RLIMIT_CPU, (cpu_seconds, cpu_seconds + 1))
+        if memory_bytes:
+            resource.prlimit(process.pid, resource.RLIMIT_AS, (memory_bytes, memory_bytes))
+    except (OSError, ValueError):
+        pass
+
+
+def _execute_dot(dot_content: str, output_format: str, executable: str,
+                 timeout: Optional[float] = None,
+                 memory_limit_mb: Optional[int] = None) -> Tuple[Optional[bytes], str, bool]:
+    """执行一次 dot 转换
+
+    Returns:
+        Tuple[Optional[bytes], str, bool]: (输出内容, 错误信息, 是否因超出时间/资源限制而失败)
+    """
+    cpu_seconds = math.ceil(timeout) + 1 if timeout else None
+    memory_bytes = memory_limit_mb * 1024 * 1024 if memory_limit_mb else None
+    try:
+        process = subprocess.Popen(
+            [executable, f"-T{output_format}"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+    except OSError as e:
+        return None, f"执行 dot 失败: {e}", False
+
+    _apply_limits(process, cpu_seconds, memory_bytes)
+    try:
+        stdout, stderr = process.communicate(dot_content.encode("utf-8"), timeout=timeout)
+    except subprocess.TimeoutExpired:
+        process.kill()
+        process.communicate()
+        return None, f"dot 超时（{timeout:g} 秒）", True
+
+    if process.returncode != 0:
+        message = stderr.decode("utf-8", errors="replace").strip()
+        # 被信号终止（超出 CPU 时间）或内存分配失败（out of memory 等）都视为超出限制
+        exceeded = process.returncode < 0 or "memory" in message.lower()
+        return None, f"dot 转换失败: {message or process.returncode}", exceeded
+    return stdout, "", False
+
+
+class GraphvizPool:
+    """Graphviz 转换进程池
+
+    同时运行的 dot 进程不超过 max_workers，排队的任务不超过 max_queue，
+    队列已满时直接拒绝，避免大图阻塞所有请求
+    """
+
+    def __init__(self, max_workers: int = GRAPHVIZ_MAX_WORKERS, max_queue: int = GRAPHVIZ_MAX_QUEUE,
+                 timeout: Optional[float] = GRAPHVIZ_TIMEOUT,
+                 memory_limit_mb: Optional[int] = GRAPHVIZ_MEMORY_LIMIT_MB,
+                 fallback_splines: Sequence[str] = GRAPHVIZ_SPLINES_FALLBACK):
+        self.timeout = timeout
+        self.memory_limit_mb = memory_limit_mb
+        self.fallback_splines = tuple(fallback_splines)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="graphviz")
+        self._slots = threading.BoundedSemaphore(max_workers + max_queue)
+
+    def submit(self, dot_content: str, output_format: str = "svg", executable: Optional[str] = None,
+               fallback: bool = True, timeout: Optional[float] = None) -> Optional[Future]:
+        """提交转换任务
+
+        Returns:
+            Optional[Future]: 结果为 (输出内容, 错误信息)；队列已满时返回None
+        """
+        if not self._slots.acquire(blocking=False):
+            return None
+        try:
+            future = self._executor.submit(self._render, dot_content, output_format, executable, fallback,
+                                           timeout or self.timeout)
+        except RuntimeError:
+            self._slots.release()
+            return None
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def run(self, dot_content: str, output_format: str = "svg", executable: Optional[str] = None,
+            fallback: bool = True, timeout: Optional[float] = None) -> Tuple[Optional[bytes], str]:
+        """提交转换任务并等待结果
+
+        Args:
+            dot_content: DOT格式内容
+            output_format: 输出格式（对应 dot 的 -T 参数）
+            executable: dot 可执行文件路径，未提供时使用缓存的查找结果
+            fallback: 超出限制时是否改用更廉价的连线方式重试
+            timeout: 本次转换的超时秒数，未提供时使用进程池的设置
+
+        Returns:
+            Tuple[Optional[bytes], str]: (输出内容, 错误信息)，失败时输出内容为None
+        """
+        future = self.submit(dot_content, output_format, executable, fallback, timeout)
+        if future is None:
+            return None, "Graphviz 任务队列已满，请稍后重试"
+        return future.result()
+
+    def _render(self, dot_content: str, output_format: str, executable: Optional[str],
+                fallback: bool, timeout: Optional[float]) -> Tuple[Optional[bytes], str]:
+        executable = executable or find_dot_executable()
+        if not executable:
+            return None, "未找到 Graphviz 的 dot 命令"
+
+        attempts = [dot_content]
+        if fallback:
+            attempts.extend(set_splines(dot_content, splines) for splines in self.fallback_splines)
+
+        error = ""
+        for i, content in enumerate(attempts):
+            output, error, exceeded = _execute_dot(content, output_format, executable,
+                                                   timeout, self.memory_limit_mb)
+            if output is not None:
+                if i > 0:
+                    print(f"dot 超出限制，已改用 splines={self.fallback_splines[i - 1]} 生成")
+                return output, ""
+            if not exceeded:
+                break
+        return None, error
+
+    def shutdown(self, wait: bool = True):
+        """关闭进程池"""
+        self._executor.shutdown(wait=wait)
+
+
+_pool: Optional[GraphvizPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_graphviz_pool() -> GraphvizPool:
+    """获取进程内共享的 Graphviz 转换池"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = GraphvizPool()
+        return _pool
+
+
+def run_dot(dot_content: str, output_format: str = "svg",
+            executable: Optional[str] = None) -> Tuple[Optional[bytes], str]:
+    """将DOT内容通过标准输入交给 dot 转换（经由共享的 Graphviz 转换池）
+
+    Args:
+        dot_content: DOT格式内容
+        output_format: 输出格式（对应 dot 的 -T 参数）
+        executable: dot 可执行文件路径，未提供时使用缓存的查找结果
+
+    Returns:
+        Tuple[Optional[bytes], str]: (输出内容, 错误信息)，失败时输出内容为None
+    """
+    return get_graphviz_pool().run(dot_content, output_format, executable)
+
+
+def run_dot_batch(dot_contents: List[str], output_format: str = "svg",
+                  executable: Optional[str] = None) -> Tuple[Optional[List[bytes]], str]:
+    """用同一个 dot 进程转换多个图
+
+    dot 会依次处理输入流中的每个图，输出按顺序拼接；SVG 输出以 XML 声明开头，据此拆分。
+    超时按图计算（单图超时 × 图的数量），与逐个转换时每个图可用的时间相同。
+    任一图出错、超出限制或拆分结果数量不一致时返回失败，由调用方逐个转换（逐个转换时才降级连线方式）
+
+    Args:
+        dot_contents: DOT格式内容列表
+        output_format: 输出格式，目前只支持能按 XML 声明拆分的 svg
+        executable: dot 可执行文件路径，未提供时使用缓存的查找结果
+
+    Returns:
+        Tuple[Optional[List[bytes]], str]: (各图的输出内容, 错误信息)，失败时输出内容为None
+    """
+    if output_format != "svg":
+        return None, f"不支持批量转换为 {output_format}"
+    if not dot_contents:
+        return [], ""
+
+    pool = get_graphviz_pool()
+    timeout = pool.timeout * len(dot_contents) if pool.timeout else None
+    output, error = pool.run("\n".join(dot_contents), output_format, executable, fallback=False, timeout=timeout)
+    if output is None:
+        return None, error
+
+    marker = b"<?xml"
+    parts = [marker + part for part in output.split(marker)[1:]]
+    if len(parts) != len(dot_contents):
+        return None, f"dot 输出了 {len(parts)} 个图，预期 {len(dot_contents)} 个"
+    return parts, ""
@@ -0,0 +1,343 @@
+"""
+地图图片处理
+读取图片尺寸（只解析文件头，不解码像素），按宽度生成 WebP / JPEG 缩略图，
+以及供深度缩放浏览的瓦片金字塔，都缓存在磁盘上：缓存以源文件的内容哈希命名，
+相同内容的地图共用缓存，修改后的地图（修改时间变化时重新计算哈希）自动使用新的缓存
+"""
+
+import hashlib
+import math
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+try:
+    from PIL import Image, features
+except ImportError:  # 启动时会检查 Pillow，缺少时只是不提供尺寸和缩略图
+    Image = None
+    features = None
+
+from .config import (
+    MAP_IMAGE_CACHE_DIR, MAP_MAX_IMAGE_PIXELS, MAP_THUMBNAIL_PREGENERATE_WIDTHS, MAP_THUMBNAIL_QUALITY,
+    MAP_THUMBNAIL_WIDTHS, MAP_THUMBNAIL_WORKERS, MAP_TILE_SIZE
+)
+
+if Image is not None:
+    Image.MAX_IMAGE_PIXELS = MAP_MAX_IMAGE_PIXELS
+
+# 缩略图格式：扩展名 → Pillow 格式名
+THUMBNAIL_FORMATS = {"webp": "WEBP", "jpg": "JPEG"}
+
+# 计算内容哈希时每次读取的字节数
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+# Image.reduce 支持的模式；调色板、二值等其他模式需要先转换再缩小
+_REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "CMYK")
+
+# 同时生成瓦片级别的数量上限：每次都要把整张大图解码到内存，与缩略图生成线程数一致
+_level_render_slots = threading.BoundedSemaphore(max(1, MAP_THUMBNAIL_WORKERS))
+
+
+def is_available() -> bool:
+    """是否可以处理图片（已安装 Pillow）"""
+    return Image is not None
+
+
+def webp_supported() -> bool:
+    """Pillow 是否支持输出 WebP"""
+    return Image is not None and features.check("webp")
+
+
+class _StatMemo:
+    """按文件的修改时间和大小缓存计算结果，文件变化后重新计算"""
+
+    def __init__(self):
+        self._entries: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, compute) -> Any:
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key, stamp = str(path), (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == stamp:
+                return entry[1]
+        value = compute(path)
+        if value is not None:
+            with self._lock:
+                self._entries[key] = (stamp, value)
+        return value
+
+
+def _read_size(path: Path) -> Optional[Tuple[int, int]]:
+    try:
+        with Image.open(path) as image:
+            return image.size
+    except (OSError, ValueError, Image.DecompressionBombError):
+        return None
+
+
+def _read_hash(path: Path) -> Optional[str]:
+    digest = hashlib.sha1()
+    try:
+        with open(path, "rb") as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b""):
+                digest.update(chunk)
+    except OSError:
+        return None
+    return digest.hexdigest()
+
+
+_sizes = _StatMemo()
+_hashes = _StatMemo()
+
+
+def image_size(path: Path) -> Optional[Tuple[int, int]]:
+    """图片的 (宽, 高)，无法识别或未安装 Pillow 时返回 None"""
+    if Image is None:
+        return None
+    return _sizes.get(path, _read_size)
+
+
+def source_hash(path: Path) -> Optional[str]:
+    """源文件的内容哈希（按修改时间和大小缓存，大地图只在变化后重新计算）"""
+    return _hashes.get(path, _read_hash)
+
+
+def thumbnail_width(requested: int) -> int:
+    """请求的宽度取不小于它的最近一档（超出时取最大档），缓存文件的数量因此有限"""
+    for width in MAP_THUMBNAIL_WIDTHS:
+        if width >= requested:
+            return width
+    return MAP_THUMBNAIL_WIDTHS[-1]
+
+
+def thumbnail_format(accept: Optional[str]) -> str:
+    """按 Accept 选择缩略图格式：浏览器接受且 Pillow 支持时用 WebP，否则用 JPEG"""
+    if accept and "image/webp" in accept and webp_supported():
+        return "webp"
+    return "jpg"
+
+
+def max_zoom(size: Tuple[int, int], tile_size: int = MAP_TILE_SIZE) -> int:
+    """瓦片金字塔的最大级别（原图尺寸），第 0 级整张图不超过一个瓦片"""
+    longest = max(size)
+    return math.ceil(math.log2(longest / tile_size)) if longest > tile_size else 0
+
+
+def level_size(size: Tuple[int, int], zoom: int, tile_size: int = MAP_TILE_SIZE) -> Tuple[int, int]:
+    """第 zoom 级的图片尺寸（每降一级宽高减半，向上取整）"""
+    factor = 2 ** (max_zoom(size, tile_size) - zoom)
+    return -(-size[0] // factor), -(-size[1] // factor)
+
+
+def tile_in_range(size: Tuple[int, int], zoom: int, x: int, y: int, tile_size: int = MAP_TILE_SIZE) -> bool:
+    """瓦片坐标是否在金字塔范围内"""
+    if not 0 <= zoom <= max_zoom(size, tile_size) or x < 0 or y < 0:
+        return False
+    width, height = level_size(size, zoom, tile_size)
+    return x * tile_size < width and y * tile_size < height
+
+
+def _convert_mode(image, ext: str):
+    """WebP 保留透明通道；JPEG 不支持透明，铺在白色背景上"""
+    has_alpha = image.mode in ("RGBA", "LA") or (image.mode == "P" and "transparency" in image.info)
+    if not has_alpha:
+        return image if image.mode == "RGB" else image.convert("RGB")
+    image = image.convert("RGBA")
+    if ext == "webp":
+        return image
+    background = Image.new("RGB", image.size, (255, 255, 255))
+    background.paste(image, mask=image.getchannel("A"))
+    return background
+
+
+def _save_atomic(image, target: Path, ext: str):
+    """写入临时文件后原子替换，不会读到写了一半的文件"""
+    temp = target.with_name(f"{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        image.save(temp, THUMBNAIL_FORMATS[ext], quality=MAP_THUMBNAIL_QUALITY)
+        os.replace(temp, target)
+    except Exception:
+        try:
+            temp.unlink()
+        except OSError:
+            pass
+        raise
+
+
+class _KeyedLocks:
+    """按键加锁：同一缓存项同时只由一个线程生成，其他线程等待后直接使用结果"""
+
+    def __init__(self):
+        self._locks: Dict[str, threading.Lock] = {}
+        self._guard = threading.Lock()
+
+    @contextmanager
+    def hold(self, key: str):
+        with self._guard:
+            lock = self._locks.setdefault(key, threading.Lock())
+        try:
+            with lock:
+                yield
+        finally:
+            with self._guard:
+                self._locks.pop(key, None)
+
+
+class ThumbnailCache:
+    """地图缩略图的磁盘缓存
+
+    缓存文件为 <缓存目录>/<哈希前两位>/<内容哈希>-<宽度>.<扩展名>，同一缩略图同时只生成一次
+    """
+
+    def __init__(self, cache_dir: Path = MAP_IMAGE_CACHE_DIR, workers: int = MAP_THUMBNAIL_WORKERS):
+        self.cache_dir = Path(cache_dir)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="map-thumbnail")
+        self._locks = _KeyedLocks()
+
+    def cache_path(self, digest: str, width: int, ext: str) -> Path:
+        return self.cache_dir / digest[:2] / f"{digest}-{width}.{ext}"
+
+    def get(self, source: Path, width: int, ext: str = "jpg") -> Optional[Path]:
+        """获取缩略图文件，不存在时生成
+
+        Args:
+            source: 地图文件
+            width: 缩略图宽度（应为 MAP_THUMBNAIL_WIDTHS 中的一档，不超过原图宽度）
+            ext: 格式（THUMBNAIL_FORMATS 的键）
+
+        Returns:
+            Optional[Path]: 缓存的缩略图路径，未安装 Pillow 或生成失败时返回 None
+        """
+        if Image is None or ext not in THUMBNAIL_FORMATS:
+            return None
+        digest = source_hash(source)
+        if digest is None:
+            return None
+        target = self.cache_path(digest, width, ext)
+        if target.is_file():
+            return target
+
+        with self._locks.hold(str(target)):
+            if not target.is_file() and not self._render(source, target, width, ext):
+                return None
+        return target
+
+    def pregenerate(self, source: Path, widths: Iterable[int] = MAP_THUMBNAIL_PREGENERATE_WIDTHS):
+        """在后台生成常用宽度的缩略图（导入地图后调用）"""
+        if Image is None:
+            return
+        formats = ["webp", "jpg"] if webp_supported() else ["jpg"]
+        for width in widths:
+            for ext in formats:
+                self._executor.submit(self.get, Path(source), width, ext)
+
+    def _render(self, source: Path, target: Path, width: int, ext: str) -> bool:
+        try:
+            with Image.open(source) as image:
+                # JPEG 源图按 DCT 缩放解码，不需要解码完整尺寸
+                image.draft("RGB", (width, max(1, image.height * width // image.width)))
+                # 只限制宽度；不放大比缩略图还小的原图
+                image.thumbnail((width, image.height), Image.Resampling.LANCZOS, reducing_gap=3.0)
+                image = _convert_mode(image, ext)
+                target.parent.mkdir(parents=True, exist_ok=True)
+                _save_atomic(image, target, ext)
+            return True
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"[ERROR] 生成地图缩略图失败 {source}: {e}")
+            return False
+
+
+class TileCache:
+    """地图瓦片金字塔的磁盘缓存
+
+    瓦片为 <缓存目录>/<内容哈希>/<级别>/<x>_<y>.<扩展名>。第一次请求某一级的瓦片时，
+    把原图缩小到该级尺寸后一次切出整级瓦片（PNG 等格式无法只解码局部，逐个瓦片生成需要反复解码整张图），
+    再逐级缩小一半切出尚未生成的更低级别，切完每一级后写入完成标记；比请求级别更高的级别不会生成
+    """
+
+    def __init__(self, cache_dir: Path = MAP_IMAGE_CACHE_DIR / "tiles", tile_size: int = MAP_TILE_SIZE):
+        self.cache_dir = Path(cache_dir)
+        self.tile_size = tile_size
+        self._locks = _KeyedLocks()
+
+    def get(self, source: Path, zoom: int, x: int, y: int, ext: str = "jpg") -> Optional[Path]:
+        """获取瓦片文件，所在级别尚未生成时先生成整级
+
+        Args:
+            source: 地图文件
+            zoom: 级别（0 为整张图一个瓦片，max_zoom 为原图尺寸）
+            x: 列号
+            y: 行号
+            ext: 格式（THUMBNAIL_FORMATS 的键）
+
+        Returns:
+            Optional[Path]: 瓦片路径，坐标超出范围、未安装 Pillow 或生成失败时返回 None
+        """
+        if Image is None or ext not in THUMBNAIL_FORMATS:
+            return None
+        size = image_size(source)
+        digest = source_hash(source)
+        if size is None or digest is None or not tile_in_range(size, zoom, x, y, self.tile_size):
+            return None
+
+        level_dir = self.cache_dir / digest / str(zoom)
+        tile = level_dir / f"{x}_{y}.{ext}"
+        marker = level_dir / f".done-{ext}"
+        if not marker.exists():
+            with self._locks.hold(str(marker)):
+                if not marker.exists() and not self._render_level(source, size, zoom, level_dir, ext):
+                    return None
+        return tile if tile.is_file() else None
+
+    def _render_level(self, source: Path, size: Tuple[int, int], zoom: int, level_dir: Path, ext: str) -> bool:
+        """生成第 zoom 级的瓦片，并由它逐级缩小生成更低的级别（不再重新解码原图）
+
+        同时解码原图的数量受 _level_render_slots 限制
+        """
+        factor = 2 ** (max_zoom(size, self.tile_size) - zoom)
+        try:
+            with _level_render_slots, Image.open(source) as image:
+                # 先缩小再转换模式，转换（如 JPEG 铺白色背景）只处理缩小后的像素
+                if factor > 1:
+                    if image.mode not in _REDUCIBLE_MODES:
+                        image = _convert_mode(image, ext)
+                    image = image.reduce(factor)
+                image = _convert_mode(image, ext)
+                self._write_level(image, level_dir, ext)
+
+                # 更低级别的宽高为上一级的一半（向上取整），与 level_size 一致；
+                # 已有完成标记的级别跳过写入，但仍需缩小以得到下一级
+                for lower in range(zoom - 1, -1, -1):
+                    image = image.reduce(2)
+                    lower_dir = level_dir.parent / str(lower)
+                    if not (lower_dir / f".done-{ext}").exists():
+                        self._write_level(image, lower_dir, ext)
+            return True
+        except (OSError, ValueError, Image.DecompressionBombError) as e:
+            print(f"[ERROR] 生成地图瓦片失败 {source} (级别 {zoom}): {e}")
+            return False
+
+    def _write_level(self, image, level_dir: Path, ext: str):
+        """把一级的整张图切成瓦片写入目录，最后写入完成标记"""
+        level_dir.mkdir(parents=True, exist_ok=True)
+        width, height = image.size
+        for top in range(0, height, self.tile_size):
+            for left in range(0, width, self.tile_size):
+                tile = image.crop((left, top, min(left + self.tile_size, width),
+                                   min(top + self.tile_size, height)))
+                name = f"{left // self.tile_size}_{top // self.tile_size}.{ext}"
+                _save_atomic(tile, level_dir / name, ext)
+        (level_dir / f".done-{ext}").touch()
+
+
+# Web 服务和文件导入共用的缩略图缓存与瓦片缓存
+map_thumbnails = ThumbnailCache()
+map_tiles = TileCache()
@@ -4,13 +4,16 @@
 """
 
 from dataclasses import dataclass, field
-from typing import List, Dict, Optional, Set
+from typing import Any, List, Dict, FrozenSet, Optional, Set, Tuple
 from pathlib import Path
 
 
-@dataclass
+@dataclass(frozen=True)
 class Campaign:
-    """跑团数据模型"""
+    """跑团数据模型
+    
+    不可变对象：由 CampaignService 缓存并在并发请求间共享，隐藏文件列表变化时替换为新对象
+    """
     name: str
     path: Path
     categories: Dict[str, str] = field(default_factory=lambda: {
@@ -19,7 +22,7 @@ class Campaign:
         "地图": "maps",
         "剧情": "notes"
     })
-    hidden_files: Dict[str, Set[str]] = field(default_factory=dict)
+    hidden_files: Dict[str, FrozenSet[str]] = field(default_factory=dict)
     
     def get_category_path(self, category: str) -> Path:
         """获取分类目录路径"""
@@ -62,6 +65,89 @@ class StoryNode:
                 self.title not in ["新节点", "未命名节点", "未命名"])
 
 
+class StoryBranchView:
+    """剧情分支只读视图，直接读取原始分支字典"""
+    
+    __slots__ = ('_data',)
+    
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+    
+    @property
+    def choice(self) -> str:
+        return self._data.get("choice", "")
+    
+    @property
+    def entry(self) -> Optional[str]:
+        return self._data.get("entry")
+    
+    @property
+    def exit(self) -> Optional[str]:
+        return self._data.get("exit")
+
+
+class StoryNodeView:
+    """剧情节点只读视图
+    
+    与 StoryNode 字段兼容，但不复制数据，访问时才从原始节点字典读取；
+    用于预览、统计、DOT 生成等只读场景。分支视图在第一次访问时创建并缓存
+    """
+    
+    __slots__ = ('_data', '_branches')
+    
+    def __init__(self, data: Dict[str, Any]):
+        self._data = data
+        self._branches: Optional[Tuple[StoryBranchView, ...]] = None
+    
+    @property
+    def id(self) -> str:
+        return self._data.get("id")
+    
+    @property
+    def title(self) -> str:
+        return self._data.get("title", "")
+    
+    @property
+    def content(self) -> str:
+        return self._data.get("content", "")
+    
+    @property
+    def node_type(self) -> str:
+        return self._data.get("type", "main")
+    
+    @property
+    def next_id(self) -> Optional[str]:
+        return self._data.get("next")
+    
+    @property
+    def branches(self) -> Tuple[StoryBranchView, ...]:
+        if self._branches is None:
+            self._branches = tuple(StoryBranchView(branch) for branch in self._data.get("branches") or ())
+        return self._branches
+    
+    def has_branches(self) -> bool:
+        """是否有分支"""
+        return bool(self._data.get("branches"))
+    
+    def is_meaningful(self) -> bool:
+        """是否是有意义的节点（非空标题且非默认值）"""
+        title = self.title
+        return (title and 
+                title.strip() and 
+                title not in ["新节点", "未命名节点", "未命名"])
+    
+    def to_node(self) -> StoryNode:
+        """复制为可修改的 StoryNode"""
+        return StoryNode(
+            id=self.id,
+            title=self.title,
+            content=self.content,
+            node_type=self.node_type,
+            next_id=self.next_id,
+            branches=[StoryBranch(choice=b.choice, entry=b.entry, exit=b.exit) for b in self.branches]
+        )
+
+
 @dataclass
 class StoryGraph:
     """剧情图"""
@@ -154,6 +240,8 @@ class FileInfo:
     is_hidden: bool = False
     file_type: Optional[str] = None
     original_name: Optional[str] = None  # 保存原始文件名（含扩展名）
+    width: Optional[int] = None  # 图片的宽度（像素）
+    height: Optional[int] = None  # 图片的高度（像素）
     
     def get_display_name(self) -> str:
         """获取显示名称"""
@@ -0,0 +1,313 @@
+"""
+静态站点导出
+将跑团预渲染为静态 HTML / JSON / SVG：人物卡、怪物卡和笔记生成独立页面，地图直接复制，
+剧情输出 SVG 与节点数据，并预先建立搜索索引。除入口 index.html 外所有文件名都带内容哈希，
+可以长期缓存；导出清单记录每个源文件的输入，再次导出时只重新生成有变化的部分。
+
+导出结果由任何静态文件服务器（或内置服务器的 /site/ 路径）直接提供，不需要后端逻辑
+"""
+
+import hashlib
+import json
+import os
+import re
+from html import escape
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+from .config import (
+    SITE_EXPORT_DIR, SITE_TEMPLATE_DIR, STORY_GRAPH_COLORS, STORY_OVERVIEW_THRESHOLD,
+    SUPPORTED_IMAGE_EXTENSIONS, SUPPORTED_TEXT_EXTENSIONS
+)
+from .models import Campaign
+from .story_layout import LAYOUT_VERSION
+from .story_parser import StoryGraphService
+from .story_storage import list_story_files, story_name_from_path
+from .story_svg import render_svg
+from .svg_optimize import optimize_svg
+
+# 导出格式版本：页面结构或数据格式变化时递增，使已导出的内容全部重新生成
+SITE_EXPORT_VERSION = 1
+SITE_MANIFEST_NAME = ".export_manifest"
+
+# 导出的分类：(分类目录, 显示名称)
+SITE_CATEGORIES = (
+    ("characters", "人物卡"),
+    ("monsters", "怪物卡"),
+    ("maps", "地图"),
+    ("notes", "剧情与笔记"),
+)
+# 每个文档参与搜索的最大字符数（超大剧情只索引开头部分）
+SEARCH_TEXT_LIMIT = 20000
+HASH_LENGTH = 12
+
+_CJK_RUN = re.compile(r"[㐀-鿿豈-﫿]+")
+_WORD = re.compile(r"[0-9a-z]+")
+
+
+def search_terms(text: str) -> Set[str]:
+    """提取搜索词：连续汉字取单字和相邻两字，其余按字母数字切分为小写单词
+
+    预览页面的 site.js 使用相同的规则切分查询
+    """
+    text = text.lower()
+    terms: Set[str] = set()
+    for run in _CJK_RUN.findall(text):
+        terms.update(run)
+        terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    terms.update(word for word in _WORD.findall(text) if len(word) >= 2)
+    return terms
+
+
+def build_search_index(docs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """建立倒排索引
+
+    Args:
+        docs: 文档列表，需包含 title、category、url，text 为参与搜索的正文
+
+    Returns:
+        Dict: {"docs": [[标题, 分类, 地址]...], "terms": {搜索词: [文档下标...]}}
+    """
+    postings: Dict[str, List[int]] = {}
+    for i, doc in enumerate(docs):
+        for term in search_terms(f"{doc['title']}\n{doc.get('text', '')}"):
+            postings.setdefault(term, []).append(i)
+    return {
+        "docs": [[doc["title"], doc["category"], doc["url"]] for doc in docs],
+        "terms": dict(sorted(postings.items())),
+    }
+
+
+def _content_hash(content: bytes) -> str:
+    return hashlib.sha1(content).hexdigest()[:HASH_LENGTH]
+
+
+def _json_bytes(data: Any) -> bytes:
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+class CampaignSiteExporter:
+    """单个跑团的静态站点导出器"""
+
+    def __init__(self, campaign: Campaign, output_dir: Optional[Path] = None,
+                 template_dir: Path = SITE_TEMPLATE_DIR):
+        self.campaign = campaign
+        self.output_dir = output_dir or SITE_EXPORT_DIR / campaign.name
+        self.template_dir = template_dir
+        self.story_service = StoryGraphService()
+        self._manifest_path = self.output_dir / SITE_MANIFEST_NAME
+
+    # ---- 清单 ----
+
+    def _load_manifest(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self._manifest_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != SITE_EXPORT_VERSION:
+                return {}
+            return dict(data.get("sources", {}))
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def _save_manifest(self, sources: Dict[str, Dict[str, Any]]):
+        data = {"version": SITE_EXPORT_VERSION, "sources": sources}
+        temp_path = self._manifest_path.with_name(self._manifest_path.name + ".tmp")
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+        os.replace(temp_path, self._manifest_path)
+
+    # ---- 源文件 ----
+
+    def _is_hidden(self, category: str, file_name: str) -> bool:
+        return file_name in self.campaign.hidden_files.get(category, set())
+
+    def _iter_sources(self) -> Iterable[Tuple[str, str, Path]]:
+        """遍历需要导出的源文件：(分类, 类型, 路径)，类型为 card / map / story"""
+        for category, _ in SITE_CATEGORIES:
+            category_dir = self.campaign.get_category_path(category)
+            if not category_dir.is_dir():
+                continue
+            if category == "notes":
+                for story_path in list_story_files(category_dir):
+                    if not self._is_hidden(category, story_path.name):
+                        yield category, "story", story_path
+            for path in sorted(category_dir.iterdir()):
+                if not path.is_file() or path.name.startswith(".") or self._is_hidden(category, path.name):
+                    continue
+                suffix = path.suffix.lower()
+                if category == "maps" and suffix in SUPPORTED_IMAGE_EXTENSIONS:
+                    yield category, "map", path
+                elif suffix in SUPPORTED_TEXT_EXTENSIONS:
+                    yield category, "card", path
+
+    def _input_key(self, kind: str, path: Path, assets: Dict[str, str]) -> str:
+        """源文件的输入标识：文件大小和修改时间，剧情另含布局与配色参数，
+        卡片页面另含引用的样式文件地址（样式变化后旧地址的文件会被删除，卡片必须重新生成）
+
+        分章节剧情保存任一章节时都会重写清单文件，因此清单的修改时间即可代表整个剧情
+        """
+        stat = path.stat()
+        inputs: List[Any] = [SITE_EXPORT_VERSION, kind, stat.st_size, stat.st_mtime_ns]
+        if kind == "story":
+            inputs.extend([LAYOUT_VERSION, STORY_OVERVIEW_THRESHOLD, STORY_GRAPH_COLORS])
+        elif kind == "card":
+            inputs.append(assets["site.css"])
+        return _content_hash(json.dumps(inputs, sort_keys=True).encode("utf-8"))
+
+    # ---- 输出 ----
+
+    def _write_hashed(self, directory: str, content: bytes, suffix: str) -> str:
+        """按内容哈希命名写入文件（同名文件已存在时内容必然相同，直接复用）
+
+        Returns:
+            str: 相对于站点根目录的路径
+        """
+        relative = f"{directory}/{_content_hash(content)}{suffix}"
+        target = self.output_dir / relative
+        if not target.exists():
+            target.parent.mkdir(parents=True, exist_ok=True)
+            temp_path = target.with_name(target.name + ".tmp")
+            temp_path.write_bytes(content)
+            os.replace(temp_path, target)
+        return relative
+
+    def _render_card(self, category: str, path: Path, css_url: str) -> Dict[str, Any]:
+        text = path.read_text(encoding="utf-8", errors="replace")
+        title = path.stem
+        page = (
+            "<!DOCTYPE html>\n<html lang=\"zh\">\n<head>\n<meta charset=\"UTF-8\">\n"
+            f"<title>{escape(title)}</title>\n<link rel=\"stylesheet\" href=\"../{css_url}\">\n"
+            "</head>\n<body class=\"card-page\">\n"
+            f"<h1>{escape(title)}</h1>\n<pre class=\"card-text\">{escape(text)}</pre>\n"
+            "</body>\n</html>\n"
+        )
+        url = self._write_hashed(category, page.encode("utf-8"), ".html")
+        return {"kind": "card", "title": title, "category": category, "url": url,
+                "text": text[:SEARCH_TEXT_LIMIT], "files": [url]}
+
+    def _render_map(self, category: str, path: Path) -> Dict[str, Any]:
+        url = self._write_hashed(category, path.read_bytes(), path.suffix.lower())
+        return {"kind": "map", "title": path.stem, "category": category, "url": url,
+                "text": "", "files": [url]}
+
+    def _render_story(self, category: str, path: Path) -> Dict[str, Any]:
+        data = self.story_service.load_story_data(path)
+        if data is None:
+            raise ValueError("无法解析剧情文件")
+
+        story, overview = self.story_service.parse_preview_data(data)
+        svg_url = self._write_hashed(category, optimize_svg(render_svg(self.story_service.compute_layout(story))), ".svg")
+        nodes = {
+            node["id"]: {"title": node.get("title", ""), "content": node.get("content", ""),
+                         "type": node.get("type", "main")}
+            for node in data.get("nodes", []) if node.get("id")
+        }
+        title = data.get("title") or story_name_from_path(path)
+        data_url = self._write_hashed(category, _json_bytes({
+            "title": title, "overview": overview, "svg": svg_url, "nodes": nodes
+        }), ".json")
+        text = "\n".join(f"{node['title']}\n{node['content']}" for node in nodes.values())
+        return {"kind": "story", "title": title, "category": category, "url": data_url,
+                "text": text[:SEARCH_TEXT_LIMIT], "files": [svg_url, data_url]}
+
+    def _copy_assets(self) -> Dict[str, str]:
+        """复制页面脚本和样式，返回 {原文件名: 带哈希的相对路径}"""
+        assets = {}
+        for name in ("site.css", "site.js"):
+            content = (self.template_dir / name).read_bytes()
+            assets[name] = self._write_hashed("assets", content, Path(name).suffix)
+        return assets
+
+    def _write_index(self, assets: Dict[str, str], catalog_url: str) -> bool:
+        """生成入口页面（唯一不带哈希的文件），内容不变时不改写
+
+        Returns:
+            bool: 是否写入了新内容
+        """
+        template = (self.template_dir / "index.html").read_text(encoding="utf-8")
+        content = (template
+                   .replace("{{title}}", escape(self.campaign.name))
+                   .replace("{{css}}", assets["site.css"])
+                   .replace("{{js}}", assets["site.js"])
+                   .replace("{{catalog}}", catalog_url)).encode("utf-8")
+        index_path = self.output_dir / "index.html"
+        if index_path.exists() and index_path.read_bytes() == content:
+            return False
+        index_path.write_bytes(content)
+        return True
+
+    def _remove_unreferenced(self, keep: Set[str]) -> int:
+        """删除不再被引用的旧文件（源文件删除或修改后遗留的哈希文件）"""
+        removed = 0
+        for path in self.output_dir.rglob("*"):
+            if not path.is_file():
+                continue
+            relative = path.relative_to(self.output_dir).as_posix()
+            if relative in keep or relative in ("index.html", SITE_MANIFEST_NAME):
+                continue
+            path.unlink()
+            removed += 1
+        return removed
+
+    def export(self, force: bool = False) -> Dict[str, Any]:
+        """导出站点
+
+        Args:
+            force: 是否忽略导出清单全部重新生成
+
+        Returns:
+            Dict: rendered（重新生成）、reused（未变化复用）、failed（失败）、removed（删除的旧文件数）
+                  以及 errors（失败的源文件及原因）
+        """
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        previous = {} if force else self._load_manifest()
+        sources: Dict[str, Dict[str, Any]] = {}
+        summary: Dict[str, Any] = {"rendered": 0, "reused": 0, "failed": 0, "removed": 0, "errors": {}}
+
+        assets = self._copy_assets()
+        for category, kind, path in self._iter_sources():
+            key = f"{category}/{path.name}"
+            input_key = self._input_key(kind, path, assets)
+            entry = previous.get(key)
+            if (entry and entry.get("input") == input_key
+                    and all((self.output_dir / name).exists() for name in entry.get("files", []))):
+                sources[key] = entry
+                summary["reused"] += 1
+                continue
+            try:
+                if kind == "card":
+                    doc = self._render_card(category, path, assets["site.css"])
+                elif kind == "map":
+                    doc = self._render_map(category, path)
+                else:
+                    doc = self._render_story(category, path)
+            except (OSError, ValueError) as e:
+                summary["failed"] += 1
+                summary["errors"][key] = str(e)
+                continue
+            doc["input"] = input_key
+            sources[key] = doc
+            summary["rendered"] += 1
+
+        docs = sorted(sources.values(), key=lambda doc: (doc["category"], doc["title"]))
+        search_url = self._write_hashed("data", _json_bytes(build_search_index(docs)), ".json")
+        catalog = {
+            "campaign": self.campaign.name,
+            "search": search_url,
+            "categories": [
+                {"id": category, "title": title, "items": [
+                    {"kind": doc["kind"], "title": doc["title"], "url": doc["url"]}
+                    for doc in docs if doc["category"] == category
+                ]}
+                for category, title in SITE_CATEGORIES
+            ],
+        }
+        catalog_url = self._write_hashed("data", _json_bytes(catalog), ".json")
+        self._write_index(assets, catalog_url)
+
+        keep = set(assets.values()) | {search_url, catalog_url}
+        for entry in sources.values():
+            keep.update(entry["files"])
+        summary["removed"] = self._remove_unreferenced(keep)
+        self._save_manifest(sources)
+        return summary
@@ -0,0 +1,311 @@
+"""
+剧情批量变换
+在剧情数据上一次性执行多项结构调整（重命名、改类型、改连线、删除子树、批量插入），
+借助反向引用索引避免每项操作都全量扫描节点
+"""
+
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+# 节点引用位置：(持有引用的字典, 字段名)，字典为节点本身（next）或分支（entry/exit）
+NodeRef = Tuple[Dict[str, Any], str]
+
+
+class NodeIdAllocator:
+    """节点ID分配器
+
+    按前缀查找已有的最大序号并递增，删除节点后也不会生成重复ID
+    """
+
+    def __init__(self, existing_ids: Iterable[str], prefix: str = "node_", width: int = 2):
+        self.prefix = prefix
+        self.width = width
+        self._used: Set[str] = {node_id for node_id in existing_ids if node_id}
+        pattern = re.compile(rf"^{re.escape(prefix)}(\d+)$")
+        numbers = [int(match.group(1)) for match in map(pattern.match, self._used) if match]
+        self._next = max(numbers, default=0) + 1
+
+    def allocate(self) -> str:
+        """分配一个未使用的节点ID"""
+        while True:
+            node_id = f"{self.prefix}{self._next:0{self.width}d}"
+            self._next += 1
+            if node_id not in self._used:
+                self._used.add(node_id)
+                return node_id
+
+
+class StoryBulkTransformer:
+    """剧情批量变换器
+
+    直接修改传入的剧情数据；调用方负责在变换前复制数据、变换后统一验证和保存
+    """
+
+    def __init__(self, story_data: Dict[str, Any]):
+        self.story_data = story_data
+        self.nodes: List[Dict[str, Any]] = story_data.setdefault("nodes", [])
+        self._nodes_by_id: Dict[str, Dict[str, Any]] = {}
+        self._refs: Dict[str, List[NodeRef]] = {}
+        self.summary: Dict[str, Any] = {}
+
+        for node in self.nodes:
+            if node.get("id"):
+                self._nodes_by_id.setdefault(node["id"], node)
+            for ref in self._iter_node_refs(node):
+                self._add_ref(ref)
+
+    # ---- 反向引用索引 ----
+
+    @staticmethod
+    def _iter_node_refs(node: Dict[str, Any]) -> Iterable[NodeRef]:
+        """遍历节点持有的所有引用"""
+        if node.get("next"):
+            yield node, "next"
+        for branch in node.get("branches") or []:
+            if branch.get("entry"):
+                yield branch, "entry"
+            if branch.get("exit"):
+                yield branch, "exit"
+
+    def _add_ref(self, ref: NodeRef):
+        holder, key = ref
+        self._refs.setdefault(holder[key], []).append(ref)
+
+    def _remove_ref(self, ref: NodeRef):
+        holder, key = ref
+        refs = self._refs.get(holder[key], [])
+        for i, (other_holder, other_key) in enumerate(refs):
+            if other_holder is holder and other_key == key:
+                del refs[i]
+                break
+        if not refs:
+            self._refs.pop(holder[key], None)
+
+    def _retarget_refs(self, old_id: str, new_id: Optional[str]) -> int:
+        """将指向 old_id 的所有引用改为 new_id（None 表示清除引用）"""
+        refs = self._refs.pop(old_id, [])
+        for holder, key in refs:
+            if new_id:
+                holder[key] = new_id
+            else:
+                # 与 StoryEditorService._cleanup_node_references 保持一致
+                holder[key] = None if key == "next" else ""
+        if new_id and refs:
+            self._refs.setdefault(new_id, []).extend(refs)
+        return len(refs)
+
+    def _count(self, key: str, amount: int = 1):
+        self.summary[key] = self.summary.get(key, 0) + amount
+
+    def _require_node(self, node_id: str) -> Dict[str, Any]:
+        node = self._nodes_by_id.get(node_id)
+        if node is None:
+            raise ValueError(f"节点 '{node_id}' 不存在")
+        return node
+
+    def _select_ids(self, operation: Dict[str, Any]) -> List[str]:
+        """根据 ids 列表或 pattern 正则选择节点"""
+        if "ids" in operation:
+            ids = list(operation["ids"])
+            for node_id in ids:
+                self._require_node(node_id)
+            return ids
+        if "pattern" in operation:
+            pattern = re.compile(operation["pattern"])
+            return [node["id"] for node in self.nodes if node.get("id") and pattern.search(node["id"])]
+        raise ValueError("需要提供 ids 或 pattern 参数")
+
+    # ---- 操作 ----
+
+    def apply(self, operations: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """依次执行操作
+
+        Args:
+            operations: 操作列表，每项包含 op 字段
+
+        Returns:
+            Dict[str, Any]: 各类变更的计数及新插入的节点ID
+
+        Raises:
+            ValueError: 操作参数无效
+        """
+        handlers = {
+            "rename": self.rename,
+            "retype": self.retype,
+            "rewire": self.rewire,
+            "delete_subtree": self.delete_subtree,
+            "insert": self.insert,
+        }
+        for i, operation in enumerate(operations):
+            if not isinstance(operation, dict):
+                raise ValueError(f"操作 {i} 必须是字典格式")
+            handler = handlers.get(operation.get("op"))
+            if handler is None:
+                raise ValueError(f"操作 {i} 的类型 '{operation.get('op')}' 不受支持")
+            try:
+                handler(operation)
+            except (KeyError, TypeError, re.error) as e:
+                raise ValueError(f"操作 {i} ({operation.get('op')}) 参数无效: {e}")
+            except ValueError as e:
+                raise ValueError(f"操作 {i} ({operation.get('op')}) 失败: {e}")
+        return self.summary
+
+    def rename(self, operation: Dict[str, Any]):
+        """重命名节点ID：{"mapping": {旧: 新}} 或 {"pattern": 正则, "replace": 替换串}"""
+        if "mapping" in operation:
+            mapping = dict(operation["mapping"])
+            for old_id in mapping:
+                self._require_node(old_id)
+        else:
+            pattern = re.compile(operation["pattern"])
+            replace = operation["replace"]
+            mapping = {}
+            for node in self.nodes:
+                node_id = node.get("id")
+                if node_id and pattern.search(node_id):
+                    new_id = pattern.sub(replace, node_id)
+                    if new_id != node_id:
+                        mapping[node_id] = new_id
+
+        # 检查重命名后ID是否冲突
+        remaining = set(self._nodes_by_id) - set(mapping)
+        new_ids = list(mapping.values())
+        if len(set(new_ids)) != len(new_ids):
+            raise ValueError("重命名后存在重复的节点ID")
+        for new_id in new_ids:
+            if not new_id or not isinstance(new_id, str):
+                raise ValueError("新节点ID必须是非空字符串")
+            if new_id in remaining:
+                raise ValueError(f"节点ID '{new_id}' 已存在")
+
+        # 先整体取出引用再重新挂接，支持 a->b、b->a 这类交换
+        moved = {old_id: self._refs.pop(old_id, []) for old_id in mapping}
+        nodes = {old_id: self._nodes_by_id.pop(old_id) for old_id in mapping}
+        for old_id, new_id in mapping.items():
+            nodes[old_id]["id"] = new_id
+            self._nodes_by_id[new_id] = nodes[old_id]
+            for holder, key in moved[old_id]:
+                holder[key] = new_id
+            if moved[old_id]:
+                self._refs.setdefault(new_id, []).extend(moved[old_id])
+        self._count("renamed", len(mapping))
+
+    def retype(self, operation: Dict[str, Any]):
+        """修改节点类型：{"ids": [...] 或 "pattern": 正则, "type": "main"/"branch"}"""
+        node_type = operation["type"]
+        if node_type not in ("main", "branch"):
+            raise ValueError("节点类型必须是 'main' 或 'branch'")
+        for node_id in self._select_ids(operation):
+            node = self._nodes_by_id[node_id]
+            if node.get("type", "main") != node_type:
+                node["type"] = node_type
+                if node_type == "main":
+                    node.setdefault("branches", [])
+                self._count("retyped")
+
+    def rewire(self, operation: Dict[str, Any]):
+        """将所有指向 from 的连线改为指向 to：{"from": A, "to": B}"""
+        source = operation["from"]
+        target = operation["to"]
+        if target:
+            self._require_node(target)
+        self._count("rewired", self._retarget_refs(source, target))
+
+    def delete_subtree(self, operation: Dict[str, Any]):
+        """删除以 root 为根的子树：{"root": 节点ID}
+
+        只删除从根可到达、且不被子树以外节点引用的节点
+        """
+        root = operation["root"]
+        self._require_node(root)
+
+        # 收集从根可到达的节点
+        subtree = {root}
+        stack = [root]
+        while stack:
+            node = self._nodes_by_id.get(stack.pop())
+            if node is None:
+                continue
+            for holder, key in self._iter_node_refs(node):
+                target = holder[key]
+                if target in self._nodes_by_id and target not in subtree:
+                    subtree.add(target)
+                    stack.append(target)
+
+        # 逐步剔除被子树外部引用的节点（它们属于共享的汇合点）
+        owner = {}
+        for node_id in subtree:
+            node = self._nodes_by_id[node_id]
+            for holder, _ in self._iter_node_refs(node):
+                owner[id(holder)] = node_id
+        changed = True
+        while changed:
+            changed = False
+            for node_id in list(subtree):
+                if node_id == root:
+                    continue
+                for holder, _ in self._refs.get(node_id, []):
+                    if owner.get(id(holder)) not in subtree:
+                        subtree.discard(node_id)
+                        changed = True
+                        break
+
+        for node_id in subtree:
+            node = self._nodes_by_id.pop(node_id)
+            for ref in list(self._iter_node_refs(node)):
+                self._remove_ref(ref)
+        for node_id in subtree:
+            self._retarget_refs(node_id, None)
+
+        self.nodes[:] = [node for node in self.nodes if node.get("id") not in subtree]
+        self._count("deleted", len(subtree))
+
+    def insert(self, operation: Dict[str, Any]):
+        """批量插入节点
+
+        {"count": N, "type": "main", "prefix": "node_", "title": "新节点",
+         "after": 节点ID（可选，插入到该节点的 next 之前）, "chain": true（依次串联）}
+        """
+        count = int(operation["count"])
+        if count <= 0:
+            raise ValueError("count 必须大于 0")
+        node_type = operation.get("type", "main")
+        if node_type not in ("main", "branch"):
+            raise ValueError("节点类型必须是 'main' 或 'branch'")
+
+        allocator = NodeIdAllocator(self._nodes_by_id, prefix=operation.get("prefix", "node_"))
+        chain = operation.get("chain", True)
+        title = operation.get("title", "新节点")
+
+        new_nodes = []
+        for _ in range(count):
+            node = {"id": allocator.allocate(), "type": node_type, "title": title, "content": "", "next": None}
+            if node_type == "main":
+                node["branches"] = []
+            new_nodes.append(node)
+        if chain:
+            for current, following in zip(new_nodes, new_nodes[1:]):
+                current["next"] = following["id"]
+
+        after = operation.get("after")
+        insert_at = len(self.nodes)
+        if after:
+            after_node = self._require_node(after)
+            insert_at = next(i for i, node in enumerate(self.nodes) if node is after_node) + 1
+            if chain:
+                # after -> 新节点链 -> after 原来的 next
+                new_nodes[-1]["next"] = after_node.get("next")
+                if after_node.get("next"):
+                    self._remove_ref((after_node, "next"))
+                after_node["next"] = new_nodes[0]["id"]
+                self._add_ref((after_node, "next"))
+
+        for node in new_nodes:
+            self._nodes_by_id[node["id"]] = node
+            for ref in self._iter_node_refs(node):
+                self._add_ref(ref)
+        self.nodes[insert_at:insert_at] = new_nodes
+
+        self.summary.setdefault("inserted_ids", [])
+        self.summary["inserted_ids"].extend(node["id"] for node in new_nodes)
+        self._count("inserted", count)
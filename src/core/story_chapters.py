@@ -0,0 +1,465 @@
+"""
+分章节剧情
+将一个剧情拆分为多个章节文件，由清单文件记录章节、节点索引和跨章节连线；
+章节只在其节点被访问时才加载，保存时只重写发生变化的章节
+"""
+
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from .config import is_valid_filename
+from .story_storage import find_story_file, read_story_data, write_story_data
+
+# 清单格式标识
+CHAPTER_MANIFEST_FORMAT = "chapters"
+# 章节目录后缀：notes/<剧情>.chapters/<章节>.json
+CHAPTER_DIR_SUFFIX = ".chapters"
+# 自动拆分时每章的默认节点数
+DEFAULT_CHAPTER_SIZE = 50
+
+
+def is_chapter_manifest(data: Any) -> bool:
+    """检查剧情数据是否为分章节清单"""
+    return isinstance(data, dict) and data.get("format") == CHAPTER_MANIFEST_FORMAT
+
+
+def get_chapter_dir(notes_dir: Path, story_name: str) -> Path:
+    """获取剧情的章节目录"""
+    return notes_dir / f"{story_name}{CHAPTER_DIR_SUFFIX}"
+
+
+def iter_node_edges(node: Dict[str, Any]) -> Iterator[Tuple[str, str]]:
+    """遍历节点的出边
+
+    Yields:
+        Tuple[str, str]: (连线类型 next/entry/exit, 目标节点ID)
+    """
+    if node.get("next"):
+        yield "next", node["next"]
+    for branch in node.get("branches") or []:
+        if branch.get("entry"):
+            yield "entry", branch["entry"]
+        if branch.get("exit"):
+            yield "exit", branch["exit"]
+
+
+def _chapter_hash(chapter_data: Dict[str, Any]) -> str:
+    """计算章节内容哈希（与存储格式无关）"""
+    canonical = json.dumps(chapter_data, ensure_ascii=False, sort_keys=True, separators=(',', ':'))
+    return hashlib.md5(canonical.encode('utf-8')).hexdigest()
+
+
+class ChapteredStory:
+    """分章节剧情"""
+
+    def __init__(self, notes_dir: Path, story_name: str):
+        """
+        初始化分章节剧情
+
+        Args:
+            notes_dir: 剧情目录
+            story_name: 剧情名称（清单文件名，不含扩展名）
+        """
+        self.notes_dir = notes_dir
+        self.story_name = story_name
+        self.chapter_dir = get_chapter_dir(notes_dir, story_name)
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._manifest_mtime = 0.0
+        # 已加载章节缓存：chapter_id -> (内容哈希, 章节数据)
+        self._chapters: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+
+    @classmethod
+    def open(cls, notes_dir: Path, story_name: str) -> Optional["ChapteredStory"]:
+        """打开分章节剧情，清单不存在或不是分章节格式时返回None"""
+        manifest_path = find_story_file(notes_dir, story_name)
+        if not manifest_path:
+            return None
+        try:
+            if not is_chapter_manifest(read_story_data(manifest_path)):
+                return None
+        except Exception:
+            return None
+        return cls(notes_dir, story_name)
+
+    @classmethod
+    def create_from_story(cls, notes_dir: Path, story_name: str, story_data: Dict[str, Any],
+                          chapter_size: int = DEFAULT_CHAPTER_SIZE) -> "ChapteredStory":
+        """将单文件剧情拆分为分章节剧情
+
+        节点的 chapter 字段指定所属章节；未指定时按顺序每 chapter_size 个节点一章
+
+        Args:
+            notes_dir: 剧情目录
+            story_name: 剧情名称
+            story_data: 单文件剧情数据
+            chapter_size: 每章节点数
+
+        Returns:
+            ChapteredStory: 分章节剧情对象
+        """
+        chapters: Dict[str, List[Dict[str, Any]]] = {}
+        for i, node in enumerate(story_data.get("nodes", [])):
+            node = dict(node)
+            chapter_id = node.pop("chapter", None) or f"ch{i // max(chapter_size, 1) + 1:02d}"
+            if not is_valid_filename(chapter_id):
+                raise ValueError(f"章节ID '{chapter_id}' 包含非法字符")
+            chapters.setdefault(chapter_id, []).append(node)
+
+        story = cls(notes_dir, story_name)
+        story._manifest = {
+            "title": story_data.get("title", ""),
+            "format": CHAPTER_MANIFEST_FORMAT,
+            "chapters": [],
+            "node_index": {},
+            "cross_edges": []
+        }
+
+        # 章节先全部写入临时目录，再换到章节目录；清单最后原子替换原单文件剧情。
+        # 任一步失败都删除临时输出，原剧情文件保持不变
+        temp_dir = notes_dir / f".{story.chapter_dir.name}.{os.getpid()}.tmp"
+        stale_dir = notes_dir / f".{story.chapter_dir.name}.{os.getpid()}.old"
+        stale_moved = False
+        try:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            temp_dir.mkdir()
+            for chapter_id, nodes in chapters.items():
+                chapter_data = {"title": chapter_id, "nodes": nodes}
+                write_story_data(temp_dir, chapter_id, chapter_data)
+                content_hash = _chapter_hash(chapter_data)
+                story._manifest["chapters"].append({"id": chapter_id, "title": chapter_id, "hash": content_hash})
+                story._chapters[chapter_id] = (content_hash, chapter_data)
+            story._rebuild_indexes()
+
+            # 残留的章节目录或同名文件（如之前中断的拆分）先移开，失败时恢复
+            if os.path.lexists(story.chapter_dir):
+                os.replace(story.chapter_dir, stale_dir)
+                stale_moved = True
+            os.replace(temp_dir, story.chapter_dir)
+            try:
+                story._write_manifest()
+            except BaseException:
+                os.replace(story.chapter_dir, temp_dir)
+                raise
+        except BaseException:
+            shutil.rmtree(temp_dir, ignore_errors=True)
+            if stale_moved:
+                os.replace(stale_dir, story.chapter_dir)
+            raise
+
+        if stale_moved:
+            if stale_dir.is_dir() and not stale_dir.is_symlink():
+                shutil.rmtree(stale_dir, ignore_errors=True)
+            else:
+                stale_dir.unlink()
+        return story
+
+    # ---- 清单 ----
+
+    @property
+    def manifest(self) -> Dict[str, Any]:
+        """获取清单（文件修改后自动重新读取）"""
+        manifest_path = find_story_file(self.notes_dir, self.story_name)
+        if manifest_path is None:
+            # 新建剧情尚未写入清单时使用内存中的清单
+            if self._manifest is not None:
+                return self._manifest
+            raise FileNotFoundError(f"剧情清单不存在: {self.story_name}")
+
+        mtime = manifest_path.stat().st_mtime
+        if self._manifest is None or mtime != self._manifest_mtime:
+            self._manifest = read_story_data(manifest_path)
+            self._manifest_mtime = mtime
+        return self._manifest
+
+    def _write_manifest(self):
+        """写入清单"""
+        manifest_path = write_story_data(self.notes_dir, self.story_name, self._manifest)
+        self._manifest_mtime = manifest_path.stat().st_mtime
+
+    def _get_chapter_entry(self, chapter_id: str) -> Optional[Dict[str, Any]]:
+        """获取清单中的章节条目"""
+        for entry in self.manifest.get("chapters", []):
+            if entry.get("id") == chapter_id:
+                return entry
+        return None
+
+    def list_chapters(self) -> List[Dict[str, Any]]:
+        """获取章节列表
+
+        Returns:
+            List[Dict]: 章节信息（id, title, node_count）
+        """
+        node_counts: Dict[str, int] = {}
+        for chapter_id in self.manifest.get("node_index", {}).values():
+            node_counts[chapter_id] = node_counts.get(chapter_id, 0) + 1
+
+        return [
+            {
+                "id": entry["id"],
+                "title": entry.get("title", entry["id"]),
+                "node_count": node_counts.get(entry["id"], 0)
+            }
+            for entry in self.manifest.get("chapters", [])
+        ]
+
+    def get_cross_edges(self, chapter_id: Optional[str] = None) -> List[Dict[str, str]]:
+        """获取跨章节连线，可按章节过滤（出边或入边涉及该章节）"""
+        edges = self.manifest.get("cross_edges", [])
+        if chapter_id is None:
+            return list(edges)
+        return [edge for edge in edges
+                if edge.get("from_chapter") == chapter_id or edge.get("to_chapter") == chapter_id]
+
+    # ---- 章节读写 ----
+
+    def load_chapter(self, chapter_id: str) -> Optional[Dict[str, Any]]:
+        """加载章节数据（按清单中的哈希缓存）"""
+        entry = self._get_chapter_entry(chapter_id)
+        if entry is None:
+            return None
+
+        cached = self._chapters.get(chapter_id)
+        if cached and cached[0] == entry.get("hash"):
+            return cached[1]
+
+        chapter_path = find_story_file(self.chapter_dir, chapter_id)
+        if chapter_path is None:
+            chapter_data = {"title": entry.get("title", chapter_id), "nodes": []}
+        else:
+            chapter_data = read_story_data(chapter_path)
+
+        self._chapters[chapter_id] = (entry.get("hash", ""), chapter_data)
+        return chapter_data
+
+    def get_node(self, node_id: str) -> Optional[Dict[str, Any]]:
+        """获取节点数据，只加载节点所在的章节"""
+        chapter_id = self.manifest.get("node_index", {}).get(node_id)
+        if chapter_id is None:
+            return None
+
+        chapter_data = self.load_chapter(chapter_id)
+        if chapter_data is None:
+            return None
+
+        for node in chapter_data.get("nodes", []):
+            if node.get("id") == node_id:
+                return node
+        return None
+
+    def _write_chapter(self, chapter_id: str, chapter_data: Dict[str, Any]) -> bool:
+        """写入章节文件（内容未变化时跳过）
+
+        Returns:
+            bool: 是否实际写入了文件
+        """
+        entry = self._get_chapter_entry(chapter_id)
+        content_hash = _chapter_hash(chapter_data)
+        if entry is not None and entry.get("hash") == content_hash:
+            return False
+
+        self.chapter_dir.mkdir(parents=True, exist_ok=True)
+        write_story_data(self.chapter_dir, chapter_id, chapter_data)
+
+        if entry is None:
+            self._manifest.setdefault("chapters", []).append(
+                {"id": chapter_id, "title": chapter_data.get("title", chapter_id), "hash": content_hash})
+        else:
+            entry["hash"] = content_hash
+            entry["title"] = chapter_data.get("title", entry.get("title", chapter_id))
+        self._chapters[chapter_id] = (content_hash, chapter_data)
+        return True
+
+    def save_chapter(self, chapter_id: str, chapter_data: Dict[str, Any]) -> Tuple[bool, str]:
+        """保存单个章节，只重写该章节文件和清单
+
+        Args:
+            chapter_id: 章节ID
+            chapter_data: 章节数据（title, nodes）
+
+        Returns:
+            Tuple[bool, str]: (是否成功, 消息)
+        """
+        if not chapter_id or not is_valid_filename(chapter_id):
+            return False, f"章节ID '{chapter_id}' 无效"
+
+        result = self.validate_chapter(chapter_id, chapter_data)
+        if result["errors"]:
+            return False, f"数据验证失败: {result['errors'][0]}"
+
+        self.manifest  # 确保清单为最新
+        if self._write_chapter(chapter_id, chapter_data):
+            self._rebuild_indexes()
+            self._write_manifest()
+            return True, "保存成功"
+        return True, "内容未变化"
+
+    def save_full(self, story_data: Dict[str, Any]) -> List[str]:
+        """保存完整剧情数据，只重写内容有变化的章节
+
+        节点按清单中的节点索引归入原章节；新节点使用其 chapter 字段，
+        未指定时归入最后一章
+
+        Args:
+            story_data: 完整剧情数据（title, nodes）
+
+        Returns:
+            List[str]: 实际写入的章节ID列表
+        """
+        manifest = self.manifest
+        node_index = manifest.get("node_index", {})
+        chapter_ids = [entry["id"] for entry in manifest.get("chapters", [])]
+        default_chapter = chapter_ids[-1] if chapter_ids else "ch01"
+
+        grouped: Dict[str, List[Dict[str, Any]]] = {chapter_id: [] for chapter_id in chapter_ids}
+        for node in story_data.get("nodes", []):
+            node = dict(node)
+            chapter_id = node.pop("chapter", None) or node_index.get(node.get("id")) or default_chapter
+            grouped.setdefault(chapter_id, []).append(node)
+
+        written = []
+        for chapter_id, nodes in grouped.items():
+            entry = self._get_chapter_entry(chapter_id)
+            title = entry.get("title", chapter_id) if entry else chapter_id
+            if self._write_chapter(chapter_id, {"title": title, "nodes": nodes}):
+                written.append(chapter_id)
+
+        title_changed = manifest.get("title") != story_data.get("title", manifest.get("title"))
+        manifest["title"] = story_data.get("title", manifest.get("title", ""))
+        if written or title_changed:
+            self._rebuild_indexes()
+            self._write_manifest()
+        return written
+
+    def to_story_data(self) -> Dict[str, Any]:
+        """合并所有章节为单文件剧情格式（会加载全部章节）"""
+        nodes = []
+        for entry in self.manifest.get("chapters", []):
+            chapter_data = self.load_chapter(entry["id"]) or {}
+            nodes.extend(chapter_data.get("nodes", []))
+        return {"title": self.manifest.get("title", ""), "nodes": nodes}
+
+    def _rebuild_indexes(self):
+        """重建节点索引和跨章节连线索引
+
+        只读取已缓存的章节；未缓存的章节沿用清单中的原索引，避免加载全部章节
+        """
+        manifest = self._manifest
+        old_index = manifest.get("node_index", {})
+        old_edges = manifest.get("cross_edges", [])
+        loaded = {chapter_id: data for chapter_id, (_, data) in self._chapters.items()}
+
+        node_index: Dict[str, str] = {
+            node_id: chapter_id for node_id, chapter_id in old_index.items() if chapter_id not in loaded
+        }
+        for chapter_id, chapter_data in loaded.items():
+            for node in chapter_data.get("nodes", []):
+                if node.get("id"):
+                    node_index[node["id"]] = chapter_id
+
+        # 未加载章节的出边保持不变，只需更新目标章节
+        cross_edges = []
+        for edge in old_edges:
+            if edge.get("from_chapter") in loaded:
+                continue
+            to_chapter = node_index.get(edge.get("to"))
+            if to_chapter and to_chapter != edge.get("from_chapter"):
+                cross_edges.append(dict(edge, to_chapter=to_chapter))
+
+        for chapter_id, chapter_data in loaded.items():
+            for node in chapter_data.get("nodes", []):
+                for edge_type, target in iter_node_edges(node):
+                    to_chapter = node_index.get(target)
+                    if to_chapter and to_chapter != chapter_id:
+                        cross_edges.append({
+                            "from": node["id"], "to": target, "type": edge_type,
+                            "from_chapter": chapter_id, "to_chapter": to_chapter
+                        })
+
+        manifest["node_index"] = node_index
+        manifest["cross_edges"] = cross_edges
+
+    # ---- 验证与统计 ----
+
+    def validate_chapter(self, chapter_id: str, chapter_data: Optional[Dict[str, Any]] = None) -> Dict[str, List[str]]:
+        """验证单个章节，跨章节引用通过节点索引检查，不加载其他章节
+
+        Args:
+            chapter_id: 章节ID
+            chapter_data: 章节数据，默认读取已保存的章节
+
+        Returns:
+            Dict[str, List[str]]: 验证结果，包含errors和warnings
+        """
+        errors: List[str] = []
+        warnings: List[str] = []
+
+        if chapter_data is None:
+            chapter_data = self.load_chapter(chapter_id)
+            if chapter_data is None:
+                return {"errors": [f"章节 {chapter_id} 不存在"], "warnings": warnings}
+
+        nodes = chapter_data.get("nodes", [])
+        if not isinstance(nodes, list):
+            return {"errors": ["nodes 必须是数组格式"], "warnings": warnings}
+
+        node_index = self.manifest.get("node_index", {})
+        local_ids = set()
+        for i, node in enumerate(nodes):
+            node_id = node.get("id") if isinstance(node, dict) else None
+            if not node_id or not isinstance(node_id, str):
+                errors.append(f"节点 {i} 的 id 必须是非空字符串")
+                continue
+            if node_id in local_ids:
+                errors.append(f"节点 ID '{node_id}' 重复")
+            elif node_index.get(node_id, chapter_id) != chapter_id:
+                errors.append(f"节点 ID '{node_id}' 已存在于章节 {node_index[node_id]}")
+            local_ids.add(node_id)
+
+        # 本章节之外的节点由索引提供（排除本章节旧节点，以当前数据为准）
+        known_ids = {node_id for node_id, owner in node_index.items() if owner != chapter_id} | local_ids
+        for node in nodes:
+            if not isinstance(node, dict) or not node.get("id"):
+                continue
+            for edge_type, target in iter_node_edges(node):
+                if target not in known_ids:
+                    errors.append(f"节点 {node['id']} 引用了不存在的节点 {target}")
+
+        incoming = {edge["to"] for edge in self.get_cross_edges(chapter_id) if edge.get("to_chapter") == chapter_id}
+        if nodes and not incoming and chapter_id != self._first_chapter_id():
+            warnings.append(f"章节 {chapter_id} 没有来自其他章节的入口连线")
+
+        return {"errors": errors, "warnings": warnings}
+
+    def chapter_statistics(self, chapter_id: str) -> Optional[Dict[str, Any]]:
+        """计算单个章节的统计信息
+
+        Returns:
+            Optional[Dict]: 统计信息，章节不存在返回None
+        """
+        from .story_parser import StoryGraphService
+
+        chapter_data = self.load_chapter(chapter_id)
+        if chapter_data is None:
+            return None
+
+        story = StoryGraphService().parse_story_data(chapter_data, lazy=True)
+        stats = story.calculate_statistics()
+
+        # 由其他章节连入的节点不算孤立节点
+        entry_ids = {edge["to"] for edge in self.get_cross_edges(chapter_id) if edge.get("to_chapter") == chapter_id}
+        stats["orphaned_nodes"] = [node_id for node_id in stats["orphaned_nodes"] if node_id not in entry_ids]
+        stats["chapter"] = chapter_id
+        stats["cross_edges_in"] = sum(1 for edge in self.get_cross_edges(chapter_id)
+                                      if edge.get("to_chapter") == chapter_id)
+        stats["cross_edges_out"] = sum(1 for edge in self.get_cross_edges(chapter_id)
+                                       if edge.get("from_chapter") == chapter_id)
+        return stats
+
+    def _first_chapter_id(self) -> Optional[str]:
+        """获取第一个章节ID"""
+        chapters = self.manifest.get("chapters", [])
+        return chapters[0]["id"] if chapters else None
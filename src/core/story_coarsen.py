@@ -0,0 +1,432 @@
+"""
+剧情图粗化（多层次细节）
+将线性的 next 链合并为一个节点，把封闭的分支子图（entry → … → exit）折叠为摘要节点，
+还可以按章节或强连通分量聚类，得到规模与决策点数量相当的概览图；
+概览中的任一组都可以按需展开为子图。
+
+粗化结果仍是普通的剧情数据（nodes / next / branches），可以直接交给现有的
+布局、DOT 生成和 SVG 渲染
+"""
+
+from dataclasses import dataclass
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+# 组类型
+GROUP_KINDS = ("chain", "branch", "chapter", "scc")
+# 聚类方式
+GROUP_BY_OPTIONS = ("chapter", "scc")
+# 分支子图超过该节点数时不再尝试折叠（避免无出口的大分支反复遍历）
+MAX_BRANCH_REGION = 5000
+
+
+@dataclass
+class CoarseGroup:
+    """概览图中由多个原始节点合并而成的节点"""
+    id: str
+    kind: str
+    title: str
+    members: List[str]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {"id": self.id, "kind": self.kind, "title": self.title, "size": len(self.members)}
+
+
+class StoryCoarsener:
+    """剧情图粗化器
+
+    不修改传入的剧情数据；节点合并后，指向被合并节点的引用通过别名表解析到新节点
+    """
+
+    def __init__(self, story_data: Dict[str, Any]):
+        self.title = story_data.get("title", "")
+        self._nodes: Dict[str, Dict[str, Any]] = {}
+        self._order: Dict[str, int] = {}
+        self._alias: Dict[str, str] = {}
+        self._titles: Dict[str, str] = {}
+        self.groups: Dict[str, CoarseGroup] = {}
+
+        for raw in story_data.get("nodes", []):
+            node_id = raw.get("id")
+            if not node_id or node_id in self._nodes:
+                continue
+            self._order[node_id] = len(self._order)
+            self._titles[node_id] = raw.get("title", "")
+            self._nodes[node_id] = {
+                "id": node_id,
+                "type": raw.get("type", "main"),
+                "title": raw.get("title", ""),
+                "next": raw.get("next"),
+                "branches": [
+                    {"choice": branch.get("choice", ""), "entry": branch.get("entry"), "exit": branch.get("exit")}
+                    for branch in raw.get("branches") or []
+                ],
+                "members": [node_id],
+            }
+
+    # ---- 引用解析与邻接表 ----
+
+    def _resolve(self, node_id: Optional[str]) -> Optional[str]:
+        """将（可能已被合并的）节点ID解析为当前节点ID，不存在时返回None"""
+        if not node_id:
+            return None
+        path = []
+        while node_id in self._alias:
+            path.append(node_id)
+            node_id = self._alias[node_id]
+        for alias in path[:-1]:
+            self._alias[alias] = node_id
+        return node_id if node_id in self._nodes else None
+
+    def _iter_edges(self, node: Dict[str, Any]) -> Iterable[Tuple[str, str]]:
+        """按 iter_story_edges 的规则遍历节点产生的连线（已解析别名）"""
+        target = self._resolve(node["next"])
+        if target:
+            yield node["id"], target
+        for branch in node["branches"]:
+            entry = self._resolve(branch["entry"])
+            if entry:
+                yield node["id"], entry
+                exit_id = self._resolve(branch["exit"])
+                if exit_id:
+                    yield entry, exit_id
+
+    def _adjacency(self) -> Tuple[Dict[str, List[str]], Dict[str, List[str]]]:
+        succ: Dict[str, List[str]] = {node_id: [] for node_id in self._nodes}
+        preds: Dict[str, List[str]] = {node_id: [] for node_id in self._nodes}
+        for node in self._nodes.values():
+            for source, target in self._iter_edges(node):
+                succ[source].append(target)
+                preds[target].append(source)
+        return succ, preds
+
+    def _merge(self, node_ids: Sequence[str], group_id: str, kind: str, title: str,
+               node_type: str) -> Dict[str, Any]:
+        """将多个当前节点合并为一个新节点（连线由调用方设置）"""
+        members = []
+        for node_id in node_ids:
+            node = self._nodes.pop(node_id)
+            members.extend(node["members"])
+            self.groups.pop(node_id, None)
+            self._alias[node_id] = group_id
+        self._order[group_id] = min(self._order[node_id] for node_id in node_ids)
+        node = {"id": group_id, "type": node_type, "title": title, "next": None,
+                "branches": [], "members": members}
+        self._nodes[group_id] = node
+        self.groups[group_id] = CoarseGroup(group_id, kind, title, members)
+        return node
+
+    # ---- 粗化操作 ----
+
+    def fold_branches(self) -> int:
+        """将封闭的分支子图折叠为摘要节点
+
+        分支子图为从 entry 出发、不经过 exit 可到达的所有节点；只有除父节点进入 entry 之外
+        没有其他外部连线进入时才折叠
+
+        Returns:
+            int: 折叠的分支数
+        """
+        succ, preds = self._adjacency()
+        folded = 0
+        for parent_id in list(self._nodes):
+            parent = self._nodes.get(parent_id)
+            if parent is None:
+                continue
+            for branch in parent["branches"]:
+                entry = self._resolve(branch["entry"])
+                exit_id = self._resolve(branch["exit"])
+                if not entry or entry in (parent_id, exit_id):
+                    continue
+                region = self._branch_region(parent_id, entry, exit_id, succ, preds)
+                if region is None:
+                    continue
+
+                ordered = sorted(region, key=self._order.__getitem__)
+                group_id = f"branch:{entry}"
+                title = branch["choice"] or self._nodes[entry]["title"]
+                self._merge(ordered, group_id, "branch", title, "branch")
+
+                # 子图只会通向 exit，父节点分支的虚线连线已表示返回
+                for node_id in region:
+                    for target in succ.pop(node_id):
+                        if target not in region:
+                            preds[target] = [p for p in preds[target] if p not in region]
+                    del preds[node_id]
+                succ[parent_id] = [group_id if target in region else target for target in succ[parent_id]]
+                preds[group_id] = [parent_id] * succ[parent_id].count(group_id)
+                succ[group_id] = []
+                if exit_id:
+                    succ[group_id].append(exit_id)
+                    preds[exit_id].append(group_id)
+                folded += 1
+        return folded
+
+    def _branch_region(self, parent_id: str, entry: str, exit_id: Optional[str],
+                       succ: Dict[str, List[str]], preds: Dict[str, List[str]]) -> Optional[Set[str]]:
+        region = {entry}
+        stack = [entry]
+        while stack:
+            for target in succ[stack.pop()]:
+                if target == exit_id or target in region:
+                    continue
+                if target == parent_id or len(region) >= MAX_BRANCH_REGION:
+                    return None
+                region.add(target)
+                stack.append(target)
+        if len(region) < 2:
+            return None
+        for node_id in region:
+            for source in preds[node_id]:
+                if source not in region and not (node_id == entry and source == parent_id):
+                    return None
+        return region
+
+    def collapse_chains(self) -> int:
+        """将线性的 next 链合并为一个节点
+
+        链内除最后一个节点外只有一条出线（next），除第一个节点外只有一条入线
+
+        Returns:
+            int: 合并的链数
+        """
+        succ, preds = self._adjacency()
+        next_of = {node_id: self._resolve(node["next"]) for node_id, node in self._nodes.items()}
+
+        def chainable(source: str, target: Optional[str]) -> bool:
+            return (target is not None and target != source and next_of[source] == target
+                    and len(succ[source]) == 1 and len(preds[target]) == 1)
+
+        chains = []
+        chained: Set[str] = set()
+        for node_id in self._nodes:
+            if node_id in chained:
+                continue
+            if len(preds[node_id]) == 1 and chainable(preds[node_id][0], node_id):
+                continue  # 不是链头
+            chain = [node_id]
+            while chainable(chain[-1], next_of[chain[-1]]) and next_of[chain[-1]] not in chained:
+                chain.append(next_of[chain[-1]])
+                chained.add(chain[-1])
+            if len(chain) >= 2:
+                chained.add(node_id)
+                chains.append(chain)
+
+        for chain in chains:
+            first, last = self._nodes[chain[0]], self._nodes[chain[-1]]
+            title = f"{first['title']} … {last['title']}"
+            group = self._merge(chain, f"chain:{chain[0]}", "chain", title, first["type"])
+            group["next"] = last["next"]
+            group["branches"] = [dict(branch) for branch in last["branches"]]
+        return len(chains)
+
+    def cluster(self, assignment: Dict[str, str], kind: str,
+                titles: Optional[Dict[str, str]] = None) -> int:
+        """按给定的归属将节点聚类，簇之间的连线不再区分类型
+
+        Args:
+            assignment: 原始节点ID -> 簇标识，节点按其第一个成员归属
+            kind: 组类型（chapter / scc）
+            titles: 簇标识 -> 显示标题，未提供时使用同名原始节点的标题
+
+        Returns:
+            int: 簇的数量
+        """
+        clusters: Dict[str, List[str]] = {}
+        for node_id, node in self._nodes.items():
+            key = assignment.get(node["members"][0])
+            if key is not None:
+                clusters.setdefault(key, []).append(node_id)
+
+        merged = []
+        for key, node_ids in clusters.items():
+            outgoing: Dict[str, int] = {}
+            for node_id in node_ids:
+                for _, target in self._iter_edges(self._nodes[node_id]):
+                    outgoing[target] = outgoing.get(target, 0) + 1
+            title = (titles or {}).get(key) or self._titles.get(key) or key
+            group = self._merge(node_ids, f"{kind}:{key}", kind, title, "main")
+            merged.append((group, outgoing))
+
+        # 所有簇合并完成后再解析目标，簇之间的连线才能指向簇节点
+        for group, outgoing in merged:
+            counts: Dict[str, int] = {}
+            for target, count in outgoing.items():
+                target = self._resolve(target)
+                if target and target != group["id"]:
+                    counts[target] = counts.get(target, 0) + count
+            group["branches"] = [
+                {"choice": f"{count} 条连线" if count > 1 else "", "entry": target, "exit": None}
+                for target, count in counts.items()
+            ]
+        return len(merged)
+
+    def strongly_connected_components(self) -> Dict[str, str]:
+        """计算强连通分量（迭代式 Tarjan），只返回包含多个节点的分量
+
+        Returns:
+            Dict[str, str]: 原始节点ID（各节点的第一个成员）-> 分量标识（分量中第一个节点ID）
+        """
+        succ, _ = self._adjacency()
+        index: Dict[str, int] = {}
+        low: Dict[str, int] = {}
+        on_stack: Set[str] = set()
+        stack: List[str] = []
+        assignment: Dict[str, str] = {}
+
+        for root in self._nodes:
+            if root in index:
+                continue
+            work = [(root, 0)]
+            while work:
+                node_id, i = work.pop()
+                if i == 0:
+                    index[node_id] = low[node_id] = len(index)
+                    stack.append(node_id)
+                    on_stack.add(node_id)
+                targets = succ[node_id]
+                if i < len(targets):
+                    work.append((node_id, i + 1))
+                    target = targets[i]
+                    if target not in index:
+                        work.append((target, 0))
+                    elif target in on_stack:
+                        low[node_id] = min(low[node_id], index[target])
+                    continue
+                if work:
+                    parent = work[-1][0]
+                    low[parent] = min(low[parent], low[node_id])
+                if low[node_id] == index[node_id]:
+                    component = []
+                    while True:
+                        member = stack.pop()
+                        on_stack.discard(member)
+                        component.append(member)
+                        if member == node_id:
+                            break
+                    if len(component) > 1:
+                        component.sort(key=self._order.__getitem__)
+                        key = self._nodes[component[0]]["members"][0]
+                        for member in component:
+                            assignment[self._nodes[member]["members"][0]] = key
+        return assignment
+
+    # ---- 输出 ----
+
+    def to_story_data(self) -> Dict[str, Any]:
+        """输出粗化后的剧情数据，组节点附带 group（组类型）和 size（包含的原始节点数）"""
+        nodes = []
+        for node_id in sorted(self._nodes, key=self._order.__getitem__):
+            node = self._nodes[node_id]
+            target = self._resolve(node["next"])
+            branches = []
+            for branch in node["branches"]:
+                entry = self._resolve(branch["entry"])
+                exit_id = self._resolve(branch["exit"])
+                if entry == node_id:
+                    continue
+                if entry or exit_id:
+                    branches.append({"choice": branch["choice"], "entry": entry or "", "exit": exit_id or ""})
+            data = {
+                "id": node_id,
+                "type": node["type"],
+                "title": node["title"],
+                "content": "",
+                "next": target if target != node_id else None,
+                "branches": branches,
+            }
+            group = self.groups.get(node_id)
+            if group:
+                data["content"] = f"包含 {len(group.members)} 个节点"
+                data["group"] = group.kind
+                data["size"] = len(group.members)
+            nodes.append(data)
+        return {"title": self.title, "nodes": nodes}
+
+
+def coarsen_story(story_data: Dict[str, Any], fold_branches: bool = True, collapse_chains: bool = True,
+                  group_by: Optional[str] = None, chapters: Optional[Dict[str, str]] = None,
+                  chapter_titles: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, Any], Dict[str, CoarseGroup]]:
+    """生成剧情概览
+
+    Args:
+        story_data: 剧情数据
+        fold_branches: 是否折叠封闭的分支子图
+        collapse_chains: 是否合并线性链
+        group_by: 聚类方式，chapter（按章节）或 scc（按强连通分量），None 表示不聚类
+        chapters: 节点ID -> 章节ID（group_by 为 chapter 时使用）
+        chapter_titles: 章节ID -> 章节标题
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, CoarseGroup]]: (概览剧情数据, 组ID -> 组)
+
+    Raises:
+        ValueError: 聚类方式无效，或按章节聚类但没有章节信息
+    """
+    if group_by is not None and group_by not in GROUP_BY_OPTIONS:
+        raise ValueError(f"不支持的聚类方式: {group_by}")
+
+    coarsener = StoryCoarsener(story_data)
+    if group_by == "chapter":
+        if not chapters:
+            raise ValueError("剧情没有章节信息")
+        coarsener.cluster(chapters, "chapter", chapter_titles)
+    else:
+        if fold_branches:
+            coarsener.fold_branches()
+        if collapse_chains:
+            coarsener.collapse_chains()
+        if group_by == "scc":
+            coarsener.cluster(coarsener.strongly_connected_components(), "scc")
+    return coarsener.to_story_data(), coarsener.groups
+
+
+def extract_subgraph(story_data: Dict[str, Any], members: Iterable[str]) -> Dict[str, Any]:
+    """提取由指定节点组成的子图，指向子图以外节点的引用被清除"""
+    member_set = set(members)
+    nodes = []
+    for node in story_data.get("nodes", []):
+        if node.get("id") not in member_set:
+            continue
+        node = dict(node)
+        if node.get("next") not in member_set:
+            node["next"] = None
+        branches = []
+        for branch in node.get("branches") or []:
+            entry = branch.get("entry") if branch.get("entry") in member_set else ""
+            exit_id = branch.get("exit") if branch.get("exit") in member_set else ""
+            if entry or exit_id:
+                branches.append(dict(branch, entry=entry, exit=exit_id))
+        node["branches"] = branches
+        nodes.append(node)
+    return {"title": story_data.get("title", ""), "nodes": nodes}
+
+
+def drill_down(story_data: Dict[str, Any], path: Sequence[str], group_by: Optional[str] = None,
+               chapters: Optional[Dict[str, str]] = None,
+               chapter_titles: Optional[Dict[str, str]] = None) -> Tuple[Dict[str, Any], Dict[str, CoarseGroup]]:
+    """逐级展开概览中的组
+
+    第一级按 group_by 生成概览，之后每一级在上一级组的子图上重新粗化；
+    子图粗化后只剩一个节点（例如展开一条线性链）时直接返回原始子图
+
+    Args:
+        story_data: 剧情数据
+        path: 从概览开始逐级展开的组ID，空列表表示概览本身
+
+    Returns:
+        Tuple[Dict[str, Any], Dict[str, CoarseGroup]]: (当前层级的剧情数据, 组ID -> 组)
+
+    Raises:
+        ValueError: 路径中的组不存在
+    """
+    current, groups = coarsen_story(story_data, group_by=group_by, chapters=chapters,
+                                    chapter_titles=chapter_titles)
+    for group_id in path:
+        group = groups.get(group_id)
+        if group is None:
+            raise ValueError(f"组 '{group_id}' 不存在")
+        story_data = extract_subgraph(story_data, group.members)
+        current, groups = coarsen_story(story_data)
+        if len(current["nodes"]) <= 1:
+            current, groups = story_data, {}
+    return current, groups
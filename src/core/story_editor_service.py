@@ -3,28 +3,103 @@
 为 Web 编辑器提供后端服务，处理剧情数据的 CRUD 操作
 """
 
+import copy
+import functools
 import json
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
 from pathlib import Path
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Callable, Dict, List, Optional, Any, Tuple
 from functools import lru_cache
 import time
 import hashlib
 
 from .models import StoryGraph, StoryNode, StoryBranch
 from .story_parser import StoryGraphService
+from .config import COLUMNAR_GRAPH_THRESHOLD, PREVIEW_RENDERER, STORY_OVERVIEW_THRESHOLD
 from .campaign import CampaignService
+from .story_chapters import ChapteredStory, is_chapter_manifest, DEFAULT_CHAPTER_SIZE
+from .story_bulk import NodeIdAllocator, StoryBulkTransformer
+from .story_coarsen import GROUP_BY_OPTIONS, drill_down
+from .story_storage import (
+    find_story_file, list_story_files, read_story_bytes,
+    story_name_from_path, story_revision, write_story_data
+)
+
+
+def _story_locked(method):
+    """同一剧情上的读写串行执行（方法的前两个参数为跑团名称和剧情名称）"""
+    @functools.wraps(method)
+    def wrapper(self, campaign_name, story_name, *args, **kwargs):
+        with self._story_lock(campaign_name, story_name):
+            return method(self, campaign_name, story_name, *args, **kwargs)
+    return wrapper
 
 
 class StoryEditorService:
-    """剧情编辑服务"""
+    """剧情编辑服务
+    
+    不依赖“当前跑团”，每次调用都显式指定跑团名称；同一剧情的读写由逐剧情的锁串行化，
+    实例可以被多个请求线程共享
+    """
     
     def __init__(self, campaign_service: CampaignService):
         self.campaign_service = campaign_service
+        self._locks_guard = threading.Lock()
+        # 逐剧情的锁：键为 跑团:剧情，值为 [锁, 持有或等待的次数]，计数归零时移除
+        self._story_locks: Dict[str, List[Any]] = {}
         self.story_parser = StoryGraphService()
         # 添加文件内容缓存
         self._story_cache = {}
         self._cache_timestamps = {}
         self._file_hashes = {}
+        # 分章节剧情对象缓存（保留已加载的章节）
+        self._chaptered_stories: Dict[str, ChapteredStory] = {}
+        # 布局坐标缓存：键为 跑团:剧情，值为 (修订号, 紧凑布局数据)
+        self._layout_cache: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        # 正在计算的布局：键为 跑团:剧情:修订号，同一剧情的并发请求等待同一次计算
+        self._layout_inflight: Dict[str, Future] = {}
+        self._layout_inflight_lock = threading.Lock()
+        # 概览布局缓存：键为 跑团:剧情，值为 (修订号, {聚类方式/展开路径: 概览数据})
+        self._overview_cache: Dict[str, Tuple[str, Dict[str, Dict[str, Any]]]] = {}
+        # 剧情保存成功后的回调（参数为跑团名称、剧情名称），用于触发预览重建等
+        self._save_callback: Optional[Callable[[str, str], None]] = None
+    
+    @contextmanager
+    def _story_lock(self, campaign_name: str, story_name: str):
+        """持有剧情对应的锁（可重入，保存时会在持锁状态下重新加载）
+        
+        名称来自客户端请求，锁按引用计数管理：最后一个持有或等待的线程释放后即移除，
+        字典大小只取决于正在处理的剧情数
+        """
+        cache_key = f"{campaign_name}:{story_name}"
+        with self._locks_guard:
+            entry = self._story_locks.get(cache_key)
+            if entry is None:
+                entry = self._story_locks[cache_key] = [threading.RLock(), 0]
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._locks_guard:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._story_locks[cache_key]
+    
+    def set_save_callback(self, callback: Optional[Callable[[str, str], None]]):
+        """设置剧情保存成功后的回调"""
+        self._save_callback = callback
+    
+    def _notify_saved(self, campaign_name: str, story_name: str):
+        """通知剧情已保存，回调出错不影响保存结果"""
+        if self._save_callback is None:
+            return
+        try:
+            self._save_callback(campaign_name, story_name)
+        except Exception as e:
+            print(f"保存回调执行失败: {e}")
     
     def _get_file_hash(self, file_path: Path) -> str:
         """获取文件内容哈希值"""
@@ -51,6 +126,32 @@ class StoryEditorService:
         
         return True
     
+    def get_story_version(self, campaign_name: str, story_name: str) -> Optional[str]:
+        """
+        获取剧情的版本号（剧情文件的修改时间和大小，不读取内容）
+        
+        分章节剧情保存任一章节时都会重写清单，因此清单文件的版本号代表整个剧情
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            
+        Returns:
+            Optional[str]: 版本号，剧情不存在时返回 None
+        """
+        campaign = self.campaign_service.get_campaign(campaign_name)
+        if not campaign:
+            return None
+        story_path = find_story_file(campaign.get_notes_path(), story_name)
+        if not story_path:
+            return None
+        try:
+            stat = story_path.stat()
+        except OSError:
+            return None
+        return f"{stat.st_mtime_ns:x}-{stat.st_size:x}"
+    
+    @_story_locked
     def load_story(self, campaign_name: str, story_name: str) -> Optional[Dict[str, Any]]:
         """
         加载剧情数据（带缓存优化）
@@ -63,14 +164,14 @@ class StoryEditorService:
             Dict: 剧情数据，失败返回 None
         """
         try:
-            # 选择跑团
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 return None
             
-            # 构建文件路径
-            story_path = campaign.get_notes_path() / f"{story_name}.json"
-            if not story_path.exists():
+            # 查找文件路径（.json 或 .json.gz）
+            story_path = find_story_file(campaign.get_notes_path(), story_name)
+            if not story_path:
                 return None
             
             # 检查缓存
@@ -78,9 +179,12 @@ class StoryEditorService:
             if self._is_cache_valid(cache_key, story_path):
                 return self._story_cache[cache_key]
             
-            # 读取文件
-            with open(story_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            # 读取文件（自动解压）
+            data = json.loads(read_story_bytes(story_path).decode('utf-8'))
+            
+            # 分章节剧情：合并各章节为完整剧情
+            if is_chapter_manifest(data):
+                data = self._get_chaptered_story(campaign_name, story_name).to_story_data()
             
             # 更新缓存
             self._story_cache[cache_key] = data
@@ -93,6 +197,7 @@ class StoryEditorService:
             print(f"加载剧情失败: {e}")
             return None
     
+    @_story_locked
     def save_story(self, campaign_name: str, story_name: str, story_data: Dict[str, Any]) -> Tuple[bool, str]:
         """
         保存剧情数据
@@ -106,8 +211,8 @@ class StoryEditorService:
             Tuple[bool, str]: (是否成功, 错误信息)
         """
         try:
-            # 选择跑团
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 return False, "跑团不存在"
             
@@ -116,19 +221,48 @@ class StoryEditorService:
             if not validation_result[0]:
                 return False, f"数据验证失败: {validation_result[1]}"
             
-            # 构建文件路径
-            story_path = campaign.get_notes_path() / f"{story_name}.json"
+            return self._write_story(campaign, campaign_name, story_name, story_data)
+                
+        except Exception as e:
+            print(f"保存剧情失败: {e}")
+            return False, f"保存失败: {str(e)}"
+    
+    def _write_story(self, campaign, campaign_name: str, story_name: str,
+                     story_data: Dict[str, Any]) -> Tuple[bool, str]:
+        """
+        写入已通过验证的剧情数据（调用方负责验证并持有剧情锁），更新缓存并通知保存
+        
+        Args:
+            campaign: 跑团对象
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            story_data: 剧情数据
+            
+        Returns:
+            Tuple[bool, str]: (是否成功, 错误信息)
+        """
+        try:
+            # 分章节剧情：只重写内容变化的章节
+            chaptered = self._get_chaptered_story(campaign_name, story_name)
+            if chaptered:
+                written = chaptered.save_full(story_data)
+                self._invalidate_story_cache(campaign_name, story_name)
+                self._notify_saved(campaign_name, story_name)
+                return True, f"保存成功（更新 {len(written)} 个章节）"
+            
+            # 查找原文件（可能是另一种存储格式）
+            notes_path = campaign.get_notes_path()
+            existing_path = find_story_file(notes_path, story_name)
             
             # 备份原文件（如果存在）
             backup_path = None
-            if story_path.exists():
-                backup_path = story_path.with_suffix('.json.backup')
-                story_path.rename(backup_path)
+            if existing_path:
+                backup_path = existing_path.with_name(existing_path.name + '.backup')
+                existing_path.rename(backup_path)
             
             try:
-                # 保存新文件
-                with open(story_path, 'w', encoding='utf-8') as f:
-                    json.dump(story_data, f, ensure_ascii=False, indent=2)
+                # 按配置的存储格式保存新文件
+                story_path = write_story_data(notes_path, story_name, story_data)
                 
                 # 删除备份文件
                 if backup_path and backup_path.exists():
@@ -140,18 +274,417 @@ class StoryEditorService:
                 self._cache_timestamps[cache_key] = time.time()
                 self._file_hashes[cache_key] = self._get_file_hash(story_path)
                 
+                self._notify_saved(campaign_name, story_name)
                 return True, "保存成功"
                 
             except Exception as e:
                 # 保存失败，恢复备份
                 if backup_path and backup_path.exists():
-                    backup_path.rename(story_path)
+                    backup_path.rename(existing_path)
                 raise e
                 
         except Exception as e:
             print(f"保存剧情失败: {e}")
             return False, f"保存失败: {str(e)}"
     
+    def _invalidate_story_cache(self, campaign_name: str, story_name: str):
+        """使剧情缓存失效"""
+        cache_key = f"{campaign_name}:{story_name}"
+        self._story_cache.pop(cache_key, None)
+        self._cache_timestamps.pop(cache_key, None)
+        self._file_hashes.pop(cache_key, None)
+    
+    @_story_locked
+    def _get_chaptered_story(self, campaign_name: str, story_name: str) -> Optional[ChapteredStory]:
+        """获取分章节剧情对象，非分章节剧情返回None"""
+        campaign = self.campaign_service.get_campaign(campaign_name)
+        if not campaign:
+            return None
+        
+        cache_key = f"{campaign_name}:{story_name}"
+        chaptered = self._chaptered_stories.get(cache_key)
+        if chaptered is None:
+            chaptered = ChapteredStory.open(campaign.get_notes_path(), story_name)
+            if chaptered is None:
+                return None
+            self._chaptered_stories[cache_key] = chaptered
+        elif not find_story_file(campaign.get_notes_path(), story_name):
+            # 清单已被删除
+            del self._chaptered_stories[cache_key]
+            return None
+        
+        return chaptered
+    
+    @_story_locked
+    def list_story_chapters(self, campaign_name: str, story_name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取分章节剧情的章节列表和跨章节连线
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            
+        Returns:
+            Dict: 章节信息，非分章节剧情返回 None
+        """
+        chaptered = self._get_chaptered_story(campaign_name, story_name)
+        if not chaptered:
+            return None
+        
+        return {
+            "title": chaptered.manifest.get("title", ""),
+            "chapters": chaptered.list_chapters(),
+            "cross_edges": chaptered.get_cross_edges()
+        }
+    
+    @_story_locked
+    def load_story_chapter(self, campaign_name: str, story_name: str, chapter_id: str) -> Optional[Dict[str, Any]]:
+        """
+        加载单个章节（不加载其他章节）
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            chapter_id: 章节ID
+            
+        Returns:
+            Dict: 章节数据，失败返回 None
+        """
+        chaptered = self._get_chaptered_story(campaign_name, story_name)
+        if not chaptered:
+            return None
+        
+        chapter_data = chaptered.load_chapter(chapter_id)
+        if chapter_data is None:
+            return None
+        
+        return dict(chapter_data, cross_edges=chaptered.get_cross_edges(chapter_id))
+    
+    @_story_locked
+    def get_story_node(self, campaign_name: str, story_name: str, node_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单个节点，分章节剧情只加载节点所在章节
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            node_id: 节点ID
+            
+        Returns:
+            Dict: 节点数据，未找到返回 None
+        """
+        chaptered = self._get_chaptered_story(campaign_name, story_name)
+        if chaptered:
+            return chaptered.get_node(node_id)
+        
+        story_data = self.load_story(campaign_name, story_name)
+        if not story_data:
+            return None
+        return next((node for node in story_data.get('nodes', []) if node.get('id') == node_id), None)
+    
+    @_story_locked
+    def save_story_chapter(self, campaign_name: str, story_name: str, chapter_id: str,
+                           chapter_data: Dict[str, Any]) -> Tuple[bool, str]:
+        """
+        保存单个章节（只重写该章节文件和清单）
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            chapter_id: 章节ID
+            chapter_data: 章节数据
+            
+        Returns:
+            Tuple[bool, str]: (是否成功, 消息)
+        """
+        try:
+            chaptered = self._get_chaptered_story(campaign_name, story_name)
+            if not chaptered:
+                return False, "剧情不存在或不是分章节剧情"
+            
+            if not isinstance(chapter_data, dict) or not isinstance(chapter_data.get('nodes'), list):
+                return False, "数据验证失败: nodes 必须是数组格式"
+            
+            chapter_data = {"title": chapter_data.get('title', chapter_id), "nodes": chapter_data['nodes']}
+            success, message = chaptered.save_chapter(chapter_id, chapter_data)
+            if success:
+                self._invalidate_story_cache(campaign_name, story_name)
+                self._notify_saved(campaign_name, story_name)
+            return success, message
+            
+        except Exception as e:
+            print(f"保存章节失败: {e}")
+            return False, f"保存失败: {str(e)}"
+    
+    @_story_locked
+    def get_chapter_statistics(self, campaign_name: str, story_name: str, chapter_id: str) -> Optional[Dict[str, Any]]:
+        """
+        获取单个章节的统计和验证结果
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            chapter_id: 章节ID
+            
+        Returns:
+            Dict: 统计信息（含 validation），失败返回 None
+        """
+        chaptered = self._get_chaptered_story(campaign_name, story_name)
+        if not chaptered:
+            return None
+        
+        stats = chaptered.chapter_statistics(chapter_id)
+        if stats is None:
+            return None
+        
+        stats["validation"] = chaptered.validate_chapter(chapter_id)
+        return stats
+    
+    @_story_locked
+    def split_story_into_chapters(self, campaign_name: str, story_name: str,
+                                  chapter_size: int = DEFAULT_CHAPTER_SIZE) -> Tuple[bool, str]:
+        """
+        将单文件剧情拆分为分章节剧情
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            chapter_size: 未指定 chapter 字段时每章的节点数
+            
+        Returns:
+            Tuple[bool, str]: (是否成功, 消息)
+        """
+        try:
+            if self._get_chaptered_story(campaign_name, story_name):
+                return False, "剧情已经是分章节格式"
+            
+            story_data = self.load_story(campaign_name, story_name)
+            if story_data is None:
+                return False, "剧情不存在"
+            
+            campaign = self.campaign_service.get_campaign(campaign_name)
+            chaptered = ChapteredStory.create_from_story(
+                campaign.get_notes_path(), story_name, story_data, chapter_size
+            )
+            self._chaptered_stories[f"{campaign_name}:{story_name}"] = chaptered
+            self._invalidate_story_cache(campaign_name, story_name)
+            self._notify_saved(campaign_name, story_name)
+            
+            return True, f"已拆分为 {len(chaptered.list_chapters())} 个章节"
+            
+        except Exception as e:
+            print(f"拆分剧情失败: {e}")
+            return False, f"拆分失败: {str(e)}"
+    
+    def get_story_layout(self, campaign_name: str, story_name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取剧情图的布局坐标（紧凑格式），按剧情修订号缓存
+        
+        同一剧情同一修订号的并发请求只计算一次，其余请求等待结果；
+        节点数达到 STORY_OVERVIEW_THRESHOLD 时返回概览图（含 groups，overview 为 True），
+        预览渲染器为 graphviz 时使用 dot 计算的布局
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            
+        Returns:
+            Dict: 布局数据（含 revision），剧情不存在或无法解析时返回 None
+        """
+        try:
+            campaign = self.campaign_service.get_campaign(campaign_name)
+            if not campaign:
+                return None
+            
+            file_path = find_story_file(campaign.get_notes_path(), story_name)
+            if not file_path:
+                return None
+            
+            cache_key = f"{campaign_name}:{story_name}"
+            revision = story_revision(file_path)
+            cached = self._layout_cache.get(cache_key)
+            if cached and cached[0] == revision:
+                return cached[1]
+            
+            flight_key = f"{cache_key}:{revision}"
+            with self._layout_inflight_lock:
+                future = self._layout_inflight.get(flight_key)
+                leader = future is None
+                if leader:
+                    future = self._layout_inflight[flight_key] = Future()
+            if not leader:
+                return future.result()
+            
+            layout_data = None
+            try:
+                layout_data = self._compute_story_layout(campaign_name, story_name, file_path, revision)
+                if layout_data is not None:
+                    self._layout_cache[cache_key] = (revision, layout_data)
+            finally:
+                with self._layout_inflight_lock:
+                    self._layout_inflight.pop(flight_key, None)
+                future.set_result(layout_data)
+            return layout_data
+            
+        except Exception as e:
+            print(f"获取剧情布局失败: {e}")
+            return None
+    
+    def _compute_story_layout(self, campaign_name: str, story_name: str, file_path: Path,
+                              revision: str) -> Optional[Dict[str, Any]]:
+        """计算 get_story_layout 返回的布局数据，超大剧情返回概览图"""
+        story_data = self.load_story(campaign_name, story_name)
+        if story_data is None:
+            return None
+        
+        if len(story_data.get("nodes", [])) >= STORY_OVERVIEW_THRESHOLD:
+            success, error, overview = self.get_story_overview(campaign_name, story_name)
+            if not success:
+                print(f"[WARNING] 生成概览布局失败: {error}")
+                return None
+            layout_data = dict(overview)
+            layout_data["overview"] = True
+            return layout_data
+        
+        layout = None
+        if PREVIEW_RENDERER == "graphviz":
+            layout, error = self.story_parser.compute_dot_layout(
+                self.story_parser.parse_story_data(story_data, lazy=True))
+            if layout is None:
+                print(f"[WARNING] dot 布局不可用，改用内置布局: {error}")
+        if layout is None:
+            layout, _ = self.story_parser.get_cached_layout(file_path, revision)
+        if layout is None:
+            return None
+        
+        layout_data = layout.to_compact_dict()
+        layout_data["revision"] = revision
+        return layout_data
+    
+    def get_story_overview(self, campaign_name: str, story_name: str,
+                           path: Optional[List[str]] = None,
+                           group_by: Optional[str] = None) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """
+        获取剧情概览图的布局（紧凑格式）：线性链、封闭分支以及可选的章节/强连通分量
+        合并为组节点；path 指定逐级展开的组，按剧情修订号缓存
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            path: 从概览开始逐级展开的组ID
+            group_by: 聚类方式（chapter / scc），None 表示不聚类
+            
+        Returns:
+            Tuple[bool, str, Optional[Dict]]: (是否成功, 错误信息, 布局数据（含 revision 和 groups）)
+        """
+        try:
+            if group_by is not None and group_by not in GROUP_BY_OPTIONS:
+                return False, f"不支持的聚类方式: {group_by}", None
+            
+            campaign = self.campaign_service.get_campaign(campaign_name)
+            if not campaign:
+                return False, "跑团不存在", None
+            
+            file_path = find_story_file(campaign.get_notes_path(), story_name)
+            if not file_path:
+                return False, "剧情不存在", None
+            
+            path = list(path or [])
+            cache_key = f"{campaign_name}:{story_name}"
+            variant = json.dumps([group_by, path], ensure_ascii=False)
+            revision = story_revision(file_path)
+            cached = self._overview_cache.get(cache_key)
+            if not cached or cached[0] != revision:
+                cached = (revision, {})
+                self._overview_cache[cache_key] = cached
+            if variant in cached[1]:
+                return True, "", cached[1][variant]
+            
+            story_data = self.load_story(campaign_name, story_name)
+            if story_data is None:
+                return False, "剧情不存在", None
+            
+            chapters, chapter_titles = None, None
+            if group_by == "chapter":
+                chaptered = self._get_chaptered_story(campaign_name, story_name)
+                if chaptered:
+                    chapters = dict(chaptered.manifest.get("node_index", {}))
+                    chapter_titles = {chapter["id"]: chapter["title"] for chapter in chaptered.list_chapters()}
+                else:
+                    chapters = {node["id"]: node["chapter"] for node in story_data.get("nodes", [])
+                                if node.get("id") and node.get("chapter")}
+            
+            try:
+                overview_data, groups = drill_down(story_data, path, group_by, chapters, chapter_titles)
+            except ValueError as e:
+                return False, str(e), None
+            
+            story = self.story_parser.parse_story_data(overview_data, lazy=True)
+            layout_data = self.story_parser.compute_layout(story).to_compact_dict()
+            layout_data["revision"] = revision
+            layout_data["path"] = path
+            layout_data["groups"] = {group_id: group.to_dict() for group_id, group in groups.items()}
+            cached[1][variant] = layout_data
+            return True, "", layout_data
+            
+        except Exception as e:
+            print(f"获取剧情概览失败: {e}")
+            return False, f"获取概览失败: {str(e)}", None
+    
+    @_story_locked
+    def apply_bulk_operations(self, campaign_name: str, story_name: str,
+                              operations: List[Dict[str, Any]],
+                              dry_run: bool = False) -> Tuple[bool, str, Optional[Dict[str, Any]]]:
+        """
+        对剧情批量执行结构变换，全部操作完成后只验证和保存一次
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            operations: 操作列表（rename / retype / rewire / delete_subtree / insert）
+            dry_run: 为 True 时只返回变换结果，不写入文件
+            
+        Returns:
+            Tuple[bool, str, Optional[Dict]]: (是否成功, 消息, 变更摘要)
+        """
+        try:
+            if not isinstance(operations, list) or not operations:
+                return False, "operations 必须是非空数组", None
+            
+            story_data = self.load_story(campaign_name, story_name)
+            if story_data is None:
+                return False, "剧情不存在", None
+            
+            # 在副本上变换，任何一步失败都不影响原数据
+            story_data = copy.deepcopy(story_data)
+            try:
+                summary = StoryBulkTransformer(story_data).apply(operations)
+            except ValueError as e:
+                return False, str(e), None
+            
+            is_valid, error_msg = self.validate_story_data(story_data)
+            if not is_valid:
+                return False, f"变换后数据验证失败: {error_msg}", None
+            
+            summary["node_count"] = len(story_data["nodes"])
+            if dry_run:
+                return True, "预演完成，未保存", {"summary": summary, "story": story_data}
+            
+            campaign = self.campaign_service.get_campaign(campaign_name)
+            if not campaign:
+                return False, "跑团不存在", None
+            
+            # 上面已完成完整验证，直接写入，不再经过 save_story 的重复验证
+            success, message = self._write_story(campaign, campaign_name, story_name, story_data)
+            if not success:
+                return False, message, None
+            
+            return True, f"已执行 {len(operations)} 项操作", {"summary": summary}
+            
+        except Exception as e:
+            print(f"批量变换失败: {e}")
+            return False, f"批量变换失败: {str(e)}", None
+    
     def _quick_validate_story_data(self, story_data: Dict[str, Any]) -> Tuple[bool, str]:
         """
         快速验证剧情数据格式（优化版本）
@@ -307,9 +840,10 @@ class StoryEditorService:
         Returns:
             Dict: 新节点数据
         """
-        node_count = len(story_data.get('nodes', []))
+        # 按已有最大序号分配，避免删除节点后按数量生成的ID与现有节点重复
+        allocator = NodeIdAllocator(node.get('id') for node in story_data.get('nodes', []))
         new_node = {
-            "id": f"node_{node_count + 1:02d}",
+            "id": allocator.allocate(),
             "type": node_type,
             "title": "新节点",
             "content": "",
@@ -401,8 +935,11 @@ class StoryEditorService:
             Dict: 统计信息
         """
         try:
-            # 转换为 StoryGraph 对象进行统计
-            story_graph = self.story_parser.parse_story_data(story_data)
+            # 转换为 StoryGraph 对象进行统计，超大剧情使用列式表示
+            if len(story_data.get('nodes', [])) >= COLUMNAR_GRAPH_THRESHOLD:
+                story_graph = self.story_parser.parse_story_data_columnar(story_data)
+            else:
+                story_graph = self.story_parser.parse_story_data(story_data, lazy=True)
             return story_graph.calculate_statistics()
         except Exception:
             # 如果解析失败，返回基本统计
@@ -431,7 +968,7 @@ class StoryEditorService:
             List[str]: 剧情文件名列表（不含扩展名）
         """
         try:
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 return []
             
@@ -439,11 +976,7 @@ class StoryEditorService:
             if not notes_path.exists():
                 return []
             
-            stories = []
-            for file_path in notes_path.glob("*.json"):
-                stories.append(file_path.stem)
-            
-            return sorted(stories)
+            return [story_name_from_path(file_path) for file_path in list_story_files(notes_path)]
             
         except Exception:
             return []
\ No newline at end of file
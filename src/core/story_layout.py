@@ -0,0 +1,979 @@
+"""
+剧情图分层布局
+纯 Python 实现的 Sugiyama 式分层布局：破环、分层、重心法减少交叉、坐标分配，
+不依赖 Graphviz，可直接用于生成 SVG 预览
+"""
+
+import json
+import os
+import threading
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+# 坐标单位为 pt（1 英寸 = 72pt），与 Graphviz 一致
+POINTS_PER_INCH = 72.0
+
+# 布局算法版本，算法调整后递增以废弃已保存的布局
+LAYOUT_VERSION = 1
+
+# 增量布局时未受影响节点的定位权重（相对受影响节点）
+PINNED_WEIGHT = 50.0
+
+# 减少交叉和坐标对齐每轮扫描都要遍历全部顶点（含长连线的虚拟节点），
+# 顶点数超过 预算 / sweeps 时相应减少扫描轮数，大图的耗时随顶点数线性增长
+SWEEP_VERTEX_BUDGET = 400_000
+
+Point = Tuple[float, float]
+
+
+@dataclass
+class LayoutNode:
+    """布局后的节点"""
+    id: str
+    title: str
+    node_type: str
+    x: float = 0.0          # 中心点坐标
+    y: float = 0.0
+    width: float = 0.0
+    height: float = 0.0
+    layer: int = 0
+    order: int = 0
+
+
+@dataclass
+class LayoutEdge:
+    """布局后的连线
+
+    kind: next（主线）、choice（分支选项）、exit（分支出口）
+    """
+    source: str
+    target: str
+    kind: str
+    label: str = ""
+    points: List[Point] = field(default_factory=list)
+    label_pos: Optional[Point] = None
+
+
+@dataclass
+class StoryLayout:
+    """剧情图布局结果"""
+    title: str
+    nodes: Dict[str, LayoutNode] = field(default_factory=dict)
+    edges: List[LayoutEdge] = field(default_factory=list)
+    width: float = 0.0
+    height: float = 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为可序列化的字典"""
+        return {
+            "title": self.title,
+            "width": round(self.width, 2),
+            "height": round(self.height, 2),
+            "nodes": [
+                {
+                    "id": node.id,
+                    "title": node.title,
+                    "type": node.node_type,
+                    "x": round(node.x, 2),
+                    "y": round(node.y, 2),
+                    "width": round(node.width, 2),
+                    "height": round(node.height, 2),
+                    "layer": node.layer,
+                }
+                for node in self.nodes.values()
+            ],
+            "edges": [
+                {
+                    "source": edge.source,
+                    "target": edge.target,
+                    "kind": edge.kind,
+                    "label": edge.label,
+                    "points": [[round(x, 2), round(y, 2)] for x, y in edge.points],
+                    "label_pos": [round(c, 2) for c in edge.label_pos] if edge.label_pos else None,
+                }
+                for edge in self.edges
+            ],
+        }
+
+    def to_compact_dict(self) -> Dict[str, Any]:
+        """转换为列式紧凑格式（用于前端 canvas 渲染）
+
+        节点与连线各字段分别存为数组，连线端点用节点下标表示，折线坐标展平为一维数组
+        """
+        index = {node_id: i for i, node_id in enumerate(self.nodes)}
+        nodes = list(self.nodes.values())
+        kinds = {"next": 0, "choice": 1, "exit": 2}
+        return {
+            "title": self.title,
+            "width": round(self.width, 1),
+            "height": round(self.height, 1),
+            "nodes": {
+                "id": [node.id for node in nodes],
+                "title": [node.title for node in nodes],
+                "type": [0 if node.node_type == "main" else 1 for node in nodes],
+                "x": [round(node.x, 1) for node in nodes],
+                "y": [round(node.y, 1) for node in nodes],
+                "w": [round(node.width, 1) for node in nodes],
+                "h": [round(node.height, 1) for node in nodes],
+            },
+            "edges": {
+                "source": [index[edge.source] for edge in self.edges],
+                "target": [index[edge.target] for edge in self.edges],
+                "kind": [kinds.get(edge.kind, 0) for edge in self.edges],
+                "label": [edge.label for edge in self.edges],
+                "label_x": [round(edge.label_pos[0], 1) if edge.label_pos else None for edge in self.edges],
+                "label_y": [round(edge.label_pos[1], 1) if edge.label_pos else None for edge in self.edges],
+                "points": [[round(c, 1) for point in edge.points for c in point] for edge in self.edges],
+            },
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "StoryLayout":
+        """从 to_dict 的结果恢复布局"""
+        layout = cls(title=data.get("title", ""), width=data.get("width", 0.0), height=data.get("height", 0.0))
+        for item in data.get("nodes", []):
+            layout.nodes[item["id"]] = LayoutNode(
+                item["id"], item.get("title", ""), item.get("type", "main"),
+                x=item["x"], y=item["y"], width=item["width"], height=item["height"],
+                layer=item.get("layer", 0),
+            )
+        for item in data.get("edges", []):
+            layout.edges.append(LayoutEdge(
+                item["source"], item["target"], item["kind"], item.get("label", ""),
+                points=[tuple(point) for point in item.get("points", [])],
+                label_pos=tuple(item["label_pos"]) if item.get("label_pos") else None,
+            ))
+        return layout
+
+
+def measure_text(text: str, font_size: float) -> float:
+    """估算文本宽度：全角字符按字号计，其余按 0.55 倍字号计"""
+    width = 0.0
+    for char in text:
+        if unicodedata.east_asian_width(char) in ("W", "F"):
+            width += font_size
+        else:
+            width += font_size * 0.55
+    return width
+
+
+def iter_story_edges(story) -> List[Tuple[str, str, str, str]]:
+    """按 generate_dot_content 的规则列出连线：(起点, 终点, 类型, 标签)"""
+    edges = []
+    for node in story.nodes:
+        if node.next_id:
+            edges.append((node.id, node.next_id, "next", ""))
+    for node in story.nodes:
+        for branch in node.branches:
+            if branch.entry:
+                edges.append((node.id, branch.entry, "choice", branch.choice or ""))
+            if branch.exit and branch.entry:
+                edges.append((branch.entry, branch.exit, "exit", ""))
+    return edges
+
+
+def _parse_dot_point(text: str) -> Point:
+    """解析 Graphviz 的 "x,y" 坐标"""
+    x, y = text.split(",")[:2]
+    return float(x), float(y)
+
+
+def layout_from_dot_json(story, output: bytes) -> StoryLayout:
+    """将 `dot -Tjson` 的输出转换为布局，坐标系与内置布局一致（原点在左上角）
+
+    节点按剧情中的顺序排列；dot 为不存在的连线终点自动创建的节点被忽略，
+    连线按 (起点, 终点) 与 iter_story_edges 的结果依次对应以取回类型和标签
+
+    Args:
+        story: 生成 DOT 内容所用的剧情图
+        output: dot 输出的 JSON 字节
+
+    Returns:
+        StoryLayout: 布局结果
+    """
+    data = json.loads(output.decode("utf-8"))
+    left, bottom, right, top = (float(c) for c in data.get("bb", "0,0,0,0").split(","))
+
+    def flip(point: Point) -> Point:
+        return point[0] - left, top - point[1]
+
+    # 子图也在 objects 中，只有带 pos 的对象才是节点
+    positioned = {obj["_gvid"]: obj for obj in data.get("objects", []) if "pos" in obj and "nodes" not in obj}
+    names = {gvid: obj["name"] for gvid, obj in positioned.items()}
+
+    result = StoryLayout(title=story.title, width=right - left, height=top - bottom)
+    by_name = {obj["name"]: obj for obj in positioned.values()}
+    for node in story.nodes:
+        obj = by_name.get(node.id)
+        if obj is None or node.id in result.nodes:
+            continue
+        x, y = flip(_parse_dot_point(obj["pos"]))
+        result.nodes[node.id] = LayoutNode(
+            node.id, node.title, node.node_type, x=x, y=y,
+            width=float(obj.get("width", 0)) * POINTS_PER_INCH,
+            height=float(obj.get("height", 0)) * POINTS_PER_INCH,
+        )
+
+    # dot 不输出层号，按纵坐标排名代替
+    ranks = {y: i for i, y in enumerate(sorted({node.y for node in result.nodes.values()}))}
+    for node in result.nodes.values():
+        node.layer = ranks[node.y]
+
+    pending: Dict[Tuple[str, str], List[Tuple[str, str]]] = {}
+    for source, target, kind, label in iter_story_edges(story):
+        pending.setdefault((source, target), []).append((kind, label))
+
+    for edge in data.get("edges", []):
+        source, target = names.get(edge.get("tail")), names.get(edge.get("head"))
+        candidates = pending.get((source, target))
+        if source not in result.nodes or target not in result.nodes or not candidates:
+            continue
+        kind, label = candidates.pop(0)
+
+        # pos 形如 "e,x,y s,x,y x1,y1 ..."，s/e 为箭头两端，其余为样条控制点
+        start, end, points = None, None, []
+        for token in edge.get("pos", "").replace(";", " ").split():
+            if token.startswith("s,"):
+                start = _parse_dot_point(token[2:])
+            elif token.startswith("e,"):
+                end = _parse_dot_point(token[2:])
+            else:
+                points.append(_parse_dot_point(token))
+        points = ([start] if start else []) + points + ([end] if end else [])
+        points = [flip(point) for point in points]
+
+        label_pos = None
+        # 正交连线不支持 label，dot 会改为 xlabel（位置在 xlp）
+        if edge.get("lp") or edge.get("xlp"):
+            label_pos = flip(_parse_dot_point(edge.get("lp") or edge["xlp"]))
+        elif label and points:
+            label_pos = points[len(points) // 2]
+        result.edges.append(LayoutEdge(source, target, kind, label, points=points, label_pos=label_pos))
+    return result
+
+
+def read_layout_file(layout_path: Path) -> Tuple[Optional[str], Optional[StoryLayout]]:
+    """读取已保存的布局
+
+    Returns:
+        Tuple[Optional[str], Optional[StoryLayout]]: (剧情修订号, 布局)，
+        文件不存在、损坏或算法版本不一致时返回 (None, None)
+    """
+    try:
+        with open(layout_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if data.get("version") != LAYOUT_VERSION:
+            return None, None
+        return data.get("revision"), StoryLayout.from_dict(data["layout"])
+    except (OSError, ValueError, KeyError, TypeError):
+        return None, None
+
+
+def write_layout_file(layout_path: Path, layout: StoryLayout, revision: str):
+    """保存布局及其对应的剧情修订号
+
+    先写入同目录下的临时文件再原子替换：API 线程和预览生成可能同时写同一个布局文件，
+    读取方只会看到完整的旧文件或新文件
+    """
+    data = {"version": LAYOUT_VERSION, "revision": revision, "layout": layout.to_dict()}
+    temp_path = layout_path.with_name(f"{layout_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, separators=(",", ":"))
+        os.replace(temp_path, layout_path)
+    except BaseException:
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+
+class LayeredLayoutEngine:
+    """分层布局引擎
+
+    参数默认值与 generate_dot_content 中的 nodesep / ranksep 对应
+    """
+
+    def __init__(self, nodesep: float = 0.6, ranksep: float = 0.8,
+                 font_size: float = 14.0, sweeps: int = 8, margin: float = 8.0):
+        self.nodesep = nodesep * POINTS_PER_INCH
+        self.ranksep = ranksep * POINTS_PER_INCH
+        self.font_size = font_size
+        self.sweeps = sweeps
+        self.margin = margin
+        self.dummy_width = font_size
+
+    def node_size(self, title: str, node_id: str) -> Tuple[float, float]:
+        """计算节点尺寸（两行文本：标题与 [id]）"""
+        text_width = max(measure_text(title, self.font_size),
+                         measure_text(f"[{node_id}]", self.font_size))
+        width = max(54.0, text_width + 2 * self.font_size)
+        height = max(36.0, 2 * self.font_size * 1.2 + self.font_size)
+        return width, height
+
+    def _sweep_count(self, vertices: int) -> int:
+        """按顶点数限制的扫描轮数，至少上下各扫描一次"""
+        return max(2, min(self.sweeps, SWEEP_VERTEX_BUDGET // max(1, vertices)))
+
+    # ---- 主流程 ----
+
+    def layout(self, story, previous: Optional[StoryLayout] = None) -> StoryLayout:
+        """计算布局
+
+        Args:
+            story: 剧情图（StoryGraph、节点视图或列式剧情图）
+            previous: 上一版本的布局；提供时只重排受修改影响的层，其余节点保持原位
+
+        Returns:
+            StoryLayout: 布局结果
+        """
+        result = StoryLayout(title=story.title)
+        for node in story.nodes:
+            if node.id in result.nodes:
+                continue
+            width, height = self.node_size(node.title, node.id)
+            result.nodes[node.id] = LayoutNode(node.id, node.title, node.node_type,
+                                               width=width, height=height)
+
+        # 指向不存在节点的连线无法绘制，直接忽略
+        for source, target, kind, label in iter_story_edges(story):
+            if source in result.nodes and target in result.nodes:
+                result.edges.append(LayoutEdge(source, target, kind, label))
+
+        if not result.nodes:
+            return result
+        if previous is not None and previous.nodes:
+            if not self._reuse_previous(result, previous):
+                self._compute(result, previous)
+        else:
+            self._compute(result)
+        return result
+
+    # ---- 增量布局 ----
+
+    @staticmethod
+    def _edge_key(edge: LayoutEdge) -> Tuple[str, str, str]:
+        return edge.source, edge.target, edge.kind
+
+    def _same_structure(self, result: StoryLayout, previous: StoryLayout) -> bool:
+        """节点集合与连线都没有变化"""
+        return (result.nodes.keys() == previous.nodes.keys()
+                and Counter(map(self._edge_key, result.edges)) == Counter(map(self._edge_key, previous.edges)))
+
+    def _reuse_previous(self, result: StoryLayout, previous: StoryLayout) -> bool:
+        """结构与节点尺寸都没有变化时（如只修改了正文），直接沿用上一版坐标"""
+        if not self._same_structure(result, previous):
+            return False
+        for node_id, node in result.nodes.items():
+            old = previous.nodes[node_id]
+            if abs(node.width - old.width) > 0.01 or abs(node.height - old.height) > 0.01:
+                return False
+
+        for node_id, node in result.nodes.items():
+            old = previous.nodes[node_id]
+            node.x, node.y, node.layer, node.order = old.x, old.y, old.layer, old.order
+        old_edges: Dict[Tuple[str, str, str], List[LayoutEdge]] = {}
+        for edge in previous.edges:
+            old_edges.setdefault(self._edge_key(edge), []).append(edge)
+        for edge in result.edges:
+            old = old_edges[self._edge_key(edge)].pop(0)
+            edge.points = list(old.points)
+            edge.label_pos = old.label_pos if edge.label else None
+            if edge.label and edge.label_pos is None and len(edge.points) >= 2:
+                (x0, y0), (x1, y1) = edge.points[0], edge.points[1]
+                edge.label_pos = ((x0 + x1) / 2 + 4, (y0 + y1) / 2)
+        self._normalize(result, keep_origin=True)
+        return True
+
+    def _affected_nodes(self, result: StoryLayout, previous: StoryLayout) -> Set[str]:
+        """找出新增、尺寸变化或连线有增删的节点"""
+        affected = set()
+        for node_id, node in result.nodes.items():
+            old = previous.nodes.get(node_id)
+            if old is None or abs(node.width - old.width) > 0.01 or abs(node.height - old.height) > 0.01:
+                affected.add(node_id)
+        changed = Counter(map(self._edge_key, result.edges))
+        changed.subtract(Counter(map(self._edge_key, previous.edges)))
+        for (source, target, _), count in changed.items():
+            if count:
+                affected.update((source, target))
+        # 删除节点时，原来与之相连的节点也要重排
+        return {node_id for node_id in affected if node_id in result.nodes}
+
+    def _previous_keys(self, result: StoryLayout, chains: List[Optional[List[int]]], layers_of: List[int],
+                       layer_count: int, up: List[List[int]], down: List[List[int]],
+                       n: int, ids: List[str], previous: StoryLayout) -> List[Optional[float]]:
+        """上一版横坐标
+
+        虚拟节点从旧连线经过该层的竖直线段取得坐标；新节点取相邻已知节点的平均值
+        """
+        keys: List[Optional[float]] = [None] * len(layers_of)
+        for v in range(n):
+            old = previous.nodes.get(ids[v])
+            if old is not None:
+                keys[v] = old.x
+
+        layer_y: Dict[int, float] = {}
+        for node in previous.nodes.values():
+            layer_y.setdefault(node.layer, node.y)
+        old_edges: Dict[Tuple[str, str, str], List[LayoutEdge]] = {}
+        for edge in previous.edges:
+            old_edges.setdefault(self._edge_key(edge), []).append(edge)
+        for edge, chain in zip(result.edges, chains):
+            candidates = old_edges.get(self._edge_key(edge))
+            if not chain or len(chain) <= 2 or not candidates:
+                continue
+            points = candidates.pop(0).points
+            # 旧连线是单调的正交折线，竖直线段按纵坐标排序后与虚拟节点一一对应
+            segments = sorted((min(y0, y1), max(y0, y1), x0)
+                              for (x0, y0), (x1, y1) in zip(points, points[1:]) if abs(x0 - x1) < 1e-6)
+            dummies = sorted((layer_y[layers_of[v]], v) for v in chain[1:-1] if layers_of[v] in layer_y)
+            j = 0
+            for y, v in dummies:
+                while j < len(segments) and segments[j][1] < y:
+                    j += 1
+                if j < len(segments) and segments[j][0] <= y:
+                    keys[v] = segments[j][2]
+        by_layer: List[List[int]] = [[] for _ in range(layer_count)]
+        for v, layer in enumerate(layers_of):
+            by_layer[layer].append(v)
+        for order, neighbors in ((by_layer, up), (list(reversed(by_layer)), down)):
+            for layer in order:
+                for v in layer:
+                    if keys[v] is None:
+                        known = [keys[w] for w in neighbors[v] if keys[w] is not None]
+                        if known:
+                            keys[v] = sum(known) / len(known)
+        return keys
+
+    def _compute(self, result: StoryLayout, previous: Optional[StoryLayout] = None):
+        """依次执行布局各阶段，结果写回 result"""
+        ids = list(result.nodes)
+        index = {node_id: i for i, node_id in enumerate(ids)}
+        n = len(ids)
+
+        edge_pairs = [(index[e.source], index[e.target]) for e in result.edges]
+        # 增量布局时两端都已存在的连线沿用上一版的方向，新的环才重新选择反转哪条连线
+        flipped = set()
+        if previous is not None:
+            for i, (u, v) in enumerate(edge_pairs):
+                old_u, old_v = previous.nodes.get(ids[u]), previous.nodes.get(ids[v])
+                if old_u is not None and old_v is not None and old_u.layer > old_v.layer:
+                    flipped.add(i)
+        oriented = [(v, u) if i in flipped else (u, v) for i, (u, v) in enumerate(edge_pairs)]
+        reversed_edges = self._break_cycles(n, oriented) ^ flipped
+        dag_edges = []
+        for i, (u, v) in enumerate(edge_pairs):
+            if u == v:
+                dag_edges.append(None)
+            elif i in reversed_edges:
+                dag_edges.append((v, u))
+            else:
+                dag_edges.append((u, v))
+
+        minimum = None
+        if previous is not None:
+            minimum = [previous.nodes[node_id].layer if node_id in previous.nodes else None for node_id in ids]
+        layers_of = self._assign_layers(n, [e for e in dag_edges if e is not None], minimum)
+
+        # 跨越多层的连线插入虚拟节点
+        widths = [result.nodes[node_id].width for node_id in ids]
+        heights = [result.nodes[node_id].height for node_id in ids]
+        chains: List[Optional[List[int]]] = []
+        up: List[List[int]] = [[] for _ in range(n)]
+        down: List[List[int]] = [[] for _ in range(n)]
+        for edge in dag_edges:
+            if edge is None:
+                chains.append(None)
+                continue
+            u, v = edge
+            chain = [u]
+            for layer in range(layers_of[u] + 1, layers_of[v]):
+                dummy = len(layers_of)
+                layers_of.append(layer)
+                widths.append(self.dummy_width)
+                heights.append(0.0)
+                up.append([])
+                down.append([])
+                chain.append(dummy)
+            chain.append(v)
+            for a, b in zip(chain, chain[1:]):
+                down[a].append(b)
+                up[b].append(a)
+            chains.append(chain)
+
+        layer_count = max(layers_of) + 1
+        layers = self._initial_order(layers_of, layer_count, down, n)
+        if previous is None:
+            self._reduce_crossings(layers, down, up)
+            xs = self._assign_x(layers, up, down, widths, n)
+        else:
+            affected = {index[node_id] for node_id in self._affected_nodes(result, previous)}
+            moved = {v for v in range(n) if ids[v] in previous.nodes and previous.nodes[ids[v]].layer != layers_of[v]}
+            affected.update(moved)
+            for chain in chains:
+                if chain and (chain[0] in affected or chain[-1] in affected):
+                    affected.update(chain)
+            affected_layers = {layers_of[v] for v in affected}
+
+            # 沿用上一版的层内顺序；只有增删节点或连线、节点换层时才在受影响的层上重新减少交叉，
+            # 只修改尺寸（如标题）时顺序不变
+            keys = self._previous_keys(result, chains, layers_of, layer_count, up, down, n, ids, previous)
+            for layer in layers:
+                position = {v: i for i, v in enumerate(layer)}
+                layer.sort(key=lambda v: (keys[v] is None, keys[v] or 0.0, position[v]))
+            if moved or not self._same_structure(result, previous):
+                self._reduce_crossings(layers, down, up, only=affected_layers)
+            xs = self._assign_x_incremental(layers, widths, n, keys, affected)
+        layer_y, layer_height = self._assign_y(layers, heights, result, dag_edges, layers_of, previous)
+
+        for order_layer in layers:
+            for order, v in enumerate(order_layer):
+                if v < n:
+                    node = result.nodes[ids[v]]
+                    node.x = xs[v]
+                    node.y = layer_y[layers_of[v]]
+                    node.layer = layers_of[v]
+                    node.order = order
+
+        self._route_edges(result, ids, chains, reversed_edges, xs, layers_of, layer_y, layer_height, n)
+        self._normalize(result, keep_origin=previous is not None)
+
+    # ---- 1. 破环 ----
+
+    @staticmethod
+    def _break_cycles(n: int, edges: List[Tuple[int, int]]) -> set:
+        """深度优先搜索标记回边，返回需要反转的连线下标"""
+        outgoing: List[List[Tuple[int, int]]] = [[] for _ in range(n)]
+        indegree = [0] * n
+        for i, (u, v) in enumerate(edges):
+            if u != v:
+                outgoing[u].append((v, i))
+                indegree[v] += 1
+
+        state = [0] * n  # 0 未访问，1 在栈中，2 已完成
+        reversed_edges = set()
+        # 先从入度为 0 的节点出发，使起始节点位于顶部
+        roots = [v for v in range(n) if indegree[v] == 0] + list(range(n))
+        for root in roots:
+            if state[root]:
+                continue
+            state[root] = 1
+            stack = [(root, iter(outgoing[root]))]
+            while stack:
+                v, it = stack[-1]
+                advanced = False
+                for w, edge_index in it:
+                    if state[w] == 1:
+                        reversed_edges.add(edge_index)
+                    elif state[w] == 0:
+                        state[w] = 1
+                        stack.append((w, iter(outgoing[w])))
+                        advanced = True
+                        break
+                if not advanced:
+                    state[v] = 2
+                    stack.pop()
+        return reversed_edges
+
+    # ---- 2. 分层 ----
+
+    @staticmethod
+    def _assign_layers(n: int, edges: List[Tuple[int, int]],
+                       minimum: Optional[List[Optional[int]]] = None) -> List[int]:
+        """最长路径分层，并把没有前驱的节点下移到紧挨后继的位置
+
+        minimum 为上一版的层号：节点不低于原来的层，只在连线约束要求时才下移
+        """
+        outgoing: List[List[int]] = [[] for _ in range(n)]
+        indegree = [0] * n
+        for u, v in edges:
+            outgoing[u].append(v)
+            indegree[v] += 1
+
+        layer = [0] * n
+        if minimum is not None:
+            layer = [value or 0 for value in minimum]
+        remaining = indegree[:]
+        queue = [v for v in range(n) if remaining[v] == 0]
+        topo = []
+        while queue:
+            v = queue.pop()
+            topo.append(v)
+            for w in outgoing[v]:
+                if layer[v] + 1 > layer[w]:
+                    layer[w] = layer[v] + 1
+                remaining[w] -= 1
+                if remaining[w] == 0:
+                    queue.append(w)
+
+        for v in topo:
+            if indegree[v] == 0 and outgoing[v] and (minimum is None or minimum[v] is None):
+                layer[v] = max(layer[v], min(layer[w] for w in outgoing[v]) - 1)
+        return layer
+
+    # ---- 3. 减少交叉 ----
+
+    @staticmethod
+    def _initial_order(layers_of: List[int], layer_count: int, down: List[List[int]],
+                       n: int) -> List[List[int]]:
+        """按深度优先遍历顺序给出初始排列"""
+        layers: List[List[int]] = [[] for _ in range(layer_count)]
+        seen = [False] * len(layers_of)
+        for root in range(n):
+            if seen[root]:
+                continue
+            stack = [root]
+            while stack:
+                v = stack.pop()
+                if seen[v]:
+                    continue
+                seen[v] = True
+                layers[layers_of[v]].append(v)
+                stack.extend(reversed(down[v]))
+        return layers
+
+    def _reduce_crossings(self, layers: List[List[int]], down: List[List[int]], up: List[List[int]],
+                          only: Optional[Set[int]] = None):
+        """重心法上下扫描，保留交叉数最少的排列；only 指定时只调整这些层
+
+        每对相邻层的交叉数分别记录，每轮只重新统计顺序有变化的层两侧；
+        连续两轮（上下各一次）没有任何层变化时提前结束
+        """
+        if len(layers) < 2:
+            return
+        counted = [only is None or i in only or i + 1 in only for i in range(len(layers) - 1)]
+        pair_crossings = [self._count_crossings(layers[i], layers[i + 1], down) if counted[i] else 0
+                          for i in range(len(layers) - 1)]
+        best = [layer[:] for layer in layers]
+        best_crossings = sum(pair_crossings)
+        if best_crossings == 0:
+            return
+
+        idle = 0
+        for sweep in range(self._sweep_count(sum(map(len, layers)))):
+            if sweep % 2 == 0:
+                order, neighbors, step = range(1, len(layers)), up, -1
+            else:
+                order, neighbors, step = range(len(layers) - 2, -1, -1), down, 1
+            changed = set()
+            for i in order:
+                if (only is None or i in only) and self._order_by_barycenter(layers[i], layers[i + step], neighbors):
+                    changed.update((i - 1, i))
+            if not changed:
+                idle += 1
+                if idle == 2:
+                    break
+                continue
+            idle = 0
+            for i in changed:
+                if 0 <= i < len(pair_crossings) and counted[i]:
+                    pair_crossings[i] = self._count_crossings(layers[i], layers[i + 1], down)
+            crossings = sum(pair_crossings)
+            if crossings < best_crossings:
+                best_crossings = crossings
+                best = [layer[:] for layer in layers]
+                if crossings == 0:
+                    break
+        layers[:] = best
+
+    @staticmethod
+    def _order_by_barycenter(layer: List[int], fixed: List[int], neighbors: List[List[int]]) -> bool:
+        """按相邻层的重心排序，返回顺序是否有变化"""
+        position = {v: i for i, v in enumerate(fixed)}
+        keys = []
+        for i, v in enumerate(layer):
+            adjacent = [position[w] for w in neighbors[v] if w in position]
+            # 没有相邻节点的保持原位置
+            keys.append(sum(adjacent) / len(adjacent) if adjacent else float(i))
+        order = sorted(range(len(layer)), key=lambda i: (keys[i], i))
+        if all(i == j for i, j in enumerate(order)):
+            return False
+        layer[:] = [layer[i] for i in order]
+        return True
+
+    @staticmethod
+    def _count_crossings(upper: List[int], lower: List[int], down: List[List[int]]) -> int:
+        """统计两个相邻层之间的连线交叉数（树状数组求逆序对）"""
+        position = {v: i for i, v in enumerate(lower)}
+        targets = []
+        for v in upper:
+            targets.extend(sorted(position[w] for w in down[v] if w in position))
+        size = len(lower)
+        tree = [0] * (size + 1)
+        total = 0
+        for count, target in enumerate(targets):
+            # 已插入的、目标位置大于当前目标的数量即为交叉数
+            i = target + 1
+            smaller_or_equal = 0
+            while i > 0:
+                smaller_or_equal += tree[i]
+                i -= i & -i
+            total += count - smaller_or_equal
+            i = target + 1
+            while i <= size:
+                tree[i] += 1
+                i += i & -i
+        return total
+
+    # ---- 4. 坐标分配 ----
+
+    def _assign_x(self, layers: List[List[int]], up: List[List[int]], down: List[List[int]],
+                  widths: List[float], n: int) -> List[float]:
+        """在保持层内顺序和最小间距的前提下，使节点尽量对齐相邻节点"""
+        xs = [0.0] * len(widths)
+        for layer in layers:
+            x = 0.0
+            for i, v in enumerate(layer):
+                if i:
+                    x += self._separation(layer[i - 1], v, widths, n)
+                xs[v] = x
+
+        for sweep in range(self._sweep_count(len(widths))):
+            if sweep % 2 == 0:
+                order, neighbors = range(1, len(layers)), up
+            else:
+                order, neighbors = range(len(layers) - 2, -1, -1), down
+            for i in order:
+                desired, weights = self._desired_positions(layers[i], neighbors, xs, n)
+                self._place_layer(layers[i], desired, weights, xs, widths, n)
+        return xs
+
+    def _assign_x_incremental(self, layers: List[List[int]], widths: List[float], n: int,
+                              keys: List[Optional[float]], affected: Set[int]) -> List[float]:
+        """增量布局的横坐标：每个节点以上一版坐标为目标，只消除受影响节点造成的重叠
+
+        未受影响的节点以 PINNED_WEIGHT 定位，所在层没有受影响节点时坐标与上一版完全相同；
+        不做对齐扫描，也不越过左边距，归一化时整体不会平移
+        """
+        xs = [0.0] * len(widths)
+        for layer in layers:
+            desired, weights = [], []
+            for i, v in enumerate(layer):
+                if keys[v] is not None:
+                    desired.append(keys[v])
+                elif i:
+                    desired.append(desired[-1] + self._separation(layer[i - 1], v, widths, n))
+                else:
+                    desired.append(self.margin + self._left_extent(v, widths, n))
+                weights.append(1.0 if v in affected else PINNED_WEIGHT)
+            self._place_layer(layer, desired, weights, xs, widths, n, lower=self.margin)
+        return xs
+
+    @staticmethod
+    def _left_extent(v: int, widths: List[float], n: int) -> float:
+        """节点中心到左边界的距离；虚拟节点只有连线经过其中心"""
+        return widths[v] / 2 if v < n else 0.0
+
+    def _separation(self, left: int, right: int, widths: List[float], n: int) -> float:
+        gap = self.nodesep if left < n and right < n else self.nodesep / 2
+        return (widths[left] + widths[right]) / 2 + gap
+
+    @staticmethod
+    def _desired_positions(layer: List[int], neighbors: List[List[int]], xs: List[float],
+                           n: int) -> Tuple[List[float], List[float]]:
+        """每个节点的期望横坐标（相邻节点的中位数）及权重"""
+        desired, weights = [], []
+        for v in layer:
+            adjacent = [xs[w] for w in neighbors[v]]
+            if adjacent:
+                adjacent.sort()
+                middle = len(adjacent) // 2
+                desired.append(adjacent[middle] if len(adjacent) % 2 else (adjacent[middle - 1] + adjacent[middle]) / 2)
+                # 虚拟节点权重更高，使长连线保持竖直
+                weights.append(4.0 if v >= n else 1.0)
+            else:
+                desired.append(xs[v])
+                weights.append(0.5)
+        return desired, weights
+
+    def _place_layer(self, layer: List[int], desired: List[float], weights: List[float],
+                     xs: List[float], widths: List[float], n: int, lower: Optional[float] = None):
+        """保序回归：在最小间距约束下最小化与期望位置的加权平方误差
+
+        lower 给出时，超出左边界的节点（及被其推动的右侧节点）右移到边界内
+        """
+        if not layer:
+            return
+        offsets = [0.0]
+        for a, b in zip(layer, layer[1:]):
+            offsets.append(offsets[-1] + self._separation(a, b, widths, n))
+
+        # 每个块：[加权和, 权重, 包含的节点数]
+        blocks: List[List[float]] = []
+        for i in range(len(layer)):
+            weight = weights[i]
+            blocks.append([(desired[i] - offsets[i]) * weight, weight, 1])
+            while len(blocks) > 1 and blocks[-2][0] / blocks[-2][1] > blocks[-1][0] / blocks[-1][1]:
+                total, w, count = blocks.pop()
+                blocks[-1][0] += total
+                blocks[-1][1] += w
+                blocks[-1][2] += count
+
+        i = 0
+        for total, weight, count in blocks:
+            value = total / weight
+            for _ in range(int(count)):
+                xs[layer[i]] = value + offsets[i]
+                i += 1
+
+        if lower is not None:
+            shift = lower + self._left_extent(layer[0], widths, n) - xs[layer[0]]
+            for i, v in enumerate(layer):
+                if shift <= 0:
+                    break
+                xs[v] += shift
+                if i + 1 < len(layer):
+                    shift = xs[v] + offsets[i + 1] - offsets[i] - xs[layer[i + 1]]
+
+    def _assign_y(self, layers: List[List[int]], heights: List[float], result: StoryLayout,
+                  dag_edges: List[Optional[Tuple[int, int]]], layers_of: List[int],
+                  previous: Optional[StoryLayout] = None) -> Tuple[List[float], List[float]]:
+        """计算每层中心线纵坐标；有选项标签离开的层额外留出标签空间
+
+        增量布局时层间距不小于上一版，避免删除节点后下方整体上移
+        """
+        layer_height = [max((heights[v] for v in layer), default=0.0) for layer in layers]
+        labeled = [False] * len(layers)
+        for edge, dag_edge in zip(result.edges, dag_edges):
+            if edge.label and dag_edge is not None:
+                labeled[layers_of[dag_edge[0]]] = True
+
+        previous_y: Dict[int, float] = {}
+        if previous is not None:
+            for node in previous.nodes.values():
+                previous_y.setdefault(node.layer, node.y)
+
+        layer_y = []
+        y = 0.0
+        for i, height in enumerate(layer_height):
+            if i:
+                gap = layer_height[i - 1] / 2 + self.ranksep + height / 2
+                if labeled[i - 1]:
+                    gap += self.font_size * 1.2
+                if i in previous_y and i - 1 in previous_y:
+                    gap = max(gap, previous_y[i] - previous_y[i - 1])
+                y += gap
+            layer_y.append(y)
+
+        # 与上一版对齐纵坐标原点
+        common = [i for i in range(len(layer_y)) if i in previous_y]
+        if common:
+            offset = previous_y[common[0]] - layer_y[common[0]]
+            layer_y = [y + offset for y in layer_y]
+        return layer_y, layer_height
+
+    # ---- 5. 连线 ----
+
+    def _route_edges(self, result: StoryLayout, ids: List[str], chains: List[Optional[List[int]]],
+                     reversed_edges: set, xs: List[float], layers_of: List[int],
+                     layer_y: List[float], layer_height: List[float], n: int):
+        """正交折线连线：层间水平转折，经过虚拟节点时保持竖直"""
+        nodes = [result.nodes[node_id] for node_id in ids]
+
+        # 同一节点上下两侧的端口按对端位置均匀分布
+        bottom_ports: Dict[int, List[Tuple[float, int]]] = {}
+        top_ports: Dict[int, List[Tuple[float, int]]] = {}
+        for i, chain in enumerate(chains):
+            if chain is None:
+                continue
+            bottom_ports.setdefault(chain[0], []).append((xs[chain[1]], i))
+            top_ports.setdefault(chain[-1], []).append((xs[chain[-2]], i))
+        start_x: Dict[int, float] = {}
+        end_x: Dict[int, float] = {}
+        for ports, target in ((bottom_ports, start_x), (top_ports, end_x)):
+            for v, items in ports.items():
+                items.sort()
+                span = nodes[v].width * 0.6
+                for k, (_, edge_index) in enumerate(items):
+                    offset = 0.0 if len(items) == 1 else -span / 2 + span * k / (len(items) - 1)
+                    target[edge_index] = xs[v] + offset
+
+        for i, (edge, chain) in enumerate(zip(result.edges, chains)):
+            if chain is None:
+                node = result.nodes[edge.source]
+                right = node.x + node.width / 2
+                loop = self.font_size
+                edge.points = [
+                    (right, node.y - node.height / 4),
+                    (right + loop, node.y - node.height / 4),
+                    (right + loop, node.y + node.height / 4),
+                    (right, node.y + node.height / 4),
+                ]
+                if edge.label:
+                    edge.label_pos = (right + loop + 4, node.y)
+                continue
+
+            top = chain[0]
+            points = [(start_x[i], layer_y[layers_of[top]] + nodes[top].height / 2)]
+            for a, b in zip(chain, chain[1:]):
+                layer_a = layers_of[a]
+                bottom_a = layer_y[layer_a] + layer_height[layer_a] / 2
+                top_b = layer_y[layer_a + 1] - layer_height[layer_a + 1] / 2
+                mid = (bottom_a + top_b) / 2
+                x_b = end_x[i] if b == chain[-1] else xs[b]
+                points.append((points[-1][0], mid))
+                points.append((x_b, mid))
+                if b == chain[-1]:
+                    points.append((x_b, layer_y[layers_of[b]] - nodes[b].height / 2))
+                else:
+                    points.append((x_b, layer_y[layers_of[b]] + layer_height[layers_of[b]] / 2))
+
+            points = self._simplify(points)
+            if i in reversed_edges:
+                points.reverse()
+            edge.points = points
+            if edge.label:
+                first, second = points[0], points[1]
+                edge.label_pos = ((first[0] + second[0]) / 2 + 4, (first[1] + second[1]) / 2)
+
+    @staticmethod
+    def _simplify(points: List[Point]) -> List[Point]:
+        """去掉重复点和共线的中间点"""
+        simplified: List[Point] = []
+        for point in points:
+            if simplified and abs(point[0] - simplified[-1][0]) < 1e-6 and abs(point[1] - simplified[-1][1]) < 1e-6:
+                continue
+            if len(simplified) >= 2:
+                (x0, y0), (x1, y1) = simplified[-2], simplified[-1]
+                if (abs(x0 - x1) < 1e-6 and abs(x1 - point[0]) < 1e-6) or \
+                        (abs(y0 - y1) < 1e-6 and abs(y1 - point[1]) < 1e-6):
+                    simplified[-1] = point
+                    continue
+            simplified.append(point)
+        return simplified
+
+    def _normalize(self, result: StoryLayout, keep_origin: bool = False):
+        """平移坐标使图形从边距处开始，并计算画布尺寸
+
+        keep_origin 为 True 时（增量布局）只在图形超出左上边界时平移，保持坐标稳定
+        """
+        min_x = min(node.x - node.width / 2 for node in result.nodes.values())
+        min_y = min(node.y - node.height / 2 for node in result.nodes.values())
+        max_x = max(node.x + node.width / 2 for node in result.nodes.values())
+        max_y = max(node.y + node.height / 2 for node in result.nodes.values())
+        for edge in result.edges:
+            for x, y in edge.points:
+                min_x, max_x = min(min_x, x), max(max_x, x)
+                min_y, max_y = min(min_y, y), max(max_y, y)
+            if edge.label_pos:
+                label_right = edge.label_pos[0] + measure_text(edge.label, self.font_size)
+                max_x = max(max_x, label_right)
+
+        dx = self.margin - min_x
+        dy = self.margin - min_y
+        if keep_origin:
+            dx, dy = max(0.0, dx), max(0.0, dy)
+        for node in result.nodes.values():
+            node.x += dx
+            node.y += dy
+        for edge in result.edges:
+            edge.points = [(x + dx, y + dy) for x, y in edge.points]
+            if edge.label_pos:
+                edge.label_pos = (edge.label_pos[0] + dx, edge.label_pos[1] + dy)
+        result.width = max_x + dx + self.margin
+        result.height = max_y + dy + self.margin
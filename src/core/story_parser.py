@@ -5,34 +5,120 @@
 
 import json
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Optional, Dict, List, Tuple
 
-from .models import StoryGraph, StoryNode, StoryBranch
+from .models import StoryGraph, StoryNode, StoryBranch, StoryNodeView
+from .story_storage import read_story_data, story_name_from_path, story_revision
+from .story_chapters import is_chapter_manifest
+from .columnar_graph import ColumnarStoryGraph
+from .config import STORY_GRAPH_COLORS, STORY_LAYOUT_SUFFIX, STORY_OVERVIEW_THRESHOLD
+from .story_layout import (
+    LayeredLayoutEngine, StoryLayout, layout_from_dot_json, read_layout_file, write_layout_file
+)
+from .graphviz_runner import run_dot
+from .story_svg import render_svg
+from .story_coarsen import coarsen_story
 
 
 class StoryGraphService:
     """剧情图服务"""
     
-    def parse_json_story(self, file_path: Path) -> Optional[StoryGraph]:
+    def parse_json_story(self, file_path: Path, lazy: bool = False) -> Optional[StoryGraph]:
         """解析JSON剧情文件
         
         Args:
-            file_path: JSON文件路径
+            file_path: JSON文件路径（支持 .json 与 .json.gz）
+            lazy: 是否使用只读节点视图，只读场景（预览、统计、DOT 生成）传 True
             
         Returns:
             Optional[StoryGraph]: 剧情图对象，失败返回None
         """
+        data = self.load_story_data(file_path)
+        if data is None:
+            return None
+        return self.parse_story_data(data, lazy=lazy)
+    
+    def load_story_data(self, file_path: Path) -> Optional[Dict]:
+        """读取剧情文件的数据字典，分章节剧情合并所有章节
+        
+        Args:
+            file_path: JSON文件路径（支持 .json 与 .json.gz）
+            
+        Returns:
+            Optional[Dict]: 剧情数据，失败返回None
+        """
         if not file_path.exists():
             return None
         
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                data = json.load(f)
+            data = read_story_data(file_path)
             
-            return self._parse_story_data(data)
+            # 分章节剧情：合并所有章节
+            if is_chapter_manifest(data):
+                from .story_chapters import ChapteredStory
+                chapters = ChapteredStory(file_path.parent, story_name_from_path(file_path))
+                data = chapters.to_story_data()
+            
+            return data
         except (json.JSONDecodeError, Exception):
             return None
     
+    def parse_preview_story(self, file_path: Path,
+                            overview_threshold: int = STORY_OVERVIEW_THRESHOLD) -> Tuple[Optional[StoryGraph], bool]:
+        """解析用于生成预览的剧情图，节点数达到阈值时返回概览图
+        
+        概览图中线性链和封闭分支合并为组节点，布局开销取决于决策点数量而不是节点总数
+        
+        Args:
+            file_path: JSON文件路径
+            overview_threshold: 生成概览图的节点数阈值
+            
+        Returns:
+            Tuple[Optional[StoryGraph], bool]: (剧情图, 是否为概览图)，解析失败时剧情图为None
+        """
+        data = self.load_story_data(file_path)
+        if data is None:
+            return None, False
+        return self.parse_preview_data(data, overview_threshold)
+    
+    def parse_preview_data(self, data: Dict,
+                           overview_threshold: int = STORY_OVERVIEW_THRESHOLD) -> Tuple[StoryGraph, bool]:
+        """与 parse_preview_story 相同，但使用已读取的剧情数据"""
+        if len(data.get("nodes", [])) < overview_threshold:
+            return self.parse_story_data(data, lazy=True), False
+        overview_data, _ = coarsen_story(data)
+        return self.parse_story_data(overview_data, lazy=True), True
+    
+    def parse_story_data(self, data: Dict, lazy: bool = False) -> StoryGraph:
+        """解析剧情数据字典
+        
+        默认返回可修改的 StoryNode；lazy 为 True 时返回包装原始节点字典的只读视图（StoryNodeView），
+        不复制字段，适用于预览、统计、DOT 生成等只读场景
+        
+        Args:
+            data: JSON数据字典
+            lazy: 是否使用只读节点视图
+            
+        Returns:
+            StoryGraph: 剧情图对象
+        """
+        if not lazy:
+            return self._parse_story_data(data)
+        
+        nodes = [StoryNodeView(node_data) for node_data in data.get("nodes", []) if node_data.get("id")]
+        return StoryGraph(title=data.get("title", ""), nodes=nodes)
+    
+    def parse_story_data_columnar(self, data: Dict) -> ColumnarStoryGraph:
+        """将剧情数据解析为列式剧情图（适合超大剧情）
+        
+        Args:
+            data: JSON数据字典
+            
+        Returns:
+            ColumnarStoryGraph: 列式剧情图对象
+        """
+        return ColumnarStoryGraph.from_story_data(data)
+    
     def _parse_story_data(self, data: Dict) -> StoryGraph:
         """解析剧情数据
         
@@ -170,8 +256,8 @@ class StoryGraphService:
             Optional[Path]: SVG文件路径，未找到返回None
         """
         try:
-            # 获取文件名（不含扩展名）
-            filename_without_ext = json_file_path.stem
+            # 获取文件名（不含 .json / .json.gz 扩展名）
+            filename_without_ext = story_name_from_path(json_file_path)
             
             # 在同一目录中查找SVG文件
             svg_path = json_file_path.parent / f"{filename_without_ext}.svg"
@@ -203,10 +289,10 @@ class StoryGraphService:
         lines.append("")
         
         # 颜色常量
-        MAIN_COLOR = "#4CAF50"    # 主线节点：绿色
-        BRANCH_COLOR = "#2196F3"  # 分支节点：蓝色
-        FAIL_COLOR = "#9E9E9E"    # 虚线/失败：灰色
-        CHOICE_COLOR = "#FF9800"  # 分支连线：橙色
+        MAIN_COLOR = STORY_GRAPH_COLORS["main"]
+        BRANCH_COLOR = STORY_GRAPH_COLORS["branch"]
+        FAIL_COLOR = STORY_GRAPH_COLORS["fail"]
+        CHOICE_COLOR = STORY_GRAPH_COLORS["choice"]
         
         # 节点定义
         for node in story.nodes:
@@ -237,6 +323,79 @@ class StoryGraphService:
         
         return "\n".join(lines)
     
+    def compute_layout(self, story: StoryGraph, previous: Optional[StoryLayout] = None) -> StoryLayout:
+        """计算剧情图的分层布局（纯 Python，不依赖 Graphviz）
+        
+        Args:
+            story: 剧情图对象
+            previous: 上一版本的布局，提供时只重排受修改影响的部分，其余节点位置不变
+            
+        Returns:
+            StoryLayout: 节点坐标与连线折线
+        """
+        return LayeredLayoutEngine().layout(story, previous)
+    
+    def compute_dot_layout(self, story: StoryGraph,
+                           executable: Optional[str] = None) -> Tuple[Optional[StoryLayout], str]:
+        """使用 Graphviz（`dot -Tjson`）计算布局，与 graphviz 渲染器生成的 SVG 一致
+        
+        Args:
+            story: 剧情图对象
+            executable: dot 可执行文件路径，未提供时使用缓存的查找结果
+            
+        Returns:
+            Tuple[Optional[StoryLayout], str]: (布局, 错误信息)，dot 不可用或转换失败时布局为None
+        """
+        output, error = run_dot(self.generate_dot_content(story), "json", executable)
+        if output is None:
+            return None, error
+        try:
+            return layout_from_dot_json(story, output), ""
+        except (ValueError, KeyError, TypeError) as e:
+            return None, f"无法解析 dot 输出: {e}"
+    
+    def get_cached_layout(self, file_path: Path,
+                          revision: Optional[str] = None) -> Tuple[Optional[StoryLayout], bool]:
+        """获取剧情文件的布局，按修订号缓存在 <剧情名>.layout 中
+        
+        修订号与缓存一致时直接返回缓存；否则在旧布局基础上增量计算并写回
+        
+        Args:
+            file_path: 剧情文件路径
+            revision: 剧情修订号，未提供时根据文件内容计算
+            
+        Returns:
+            Tuple[Optional[StoryLayout], bool]: (布局, 是否重新计算)，剧情无法解析时布局为 None
+        """
+        revision = revision or story_revision(file_path)
+        layout_path = file_path.parent / f"{story_name_from_path(file_path)}{STORY_LAYOUT_SUFFIX}"
+        cached_revision, previous = read_layout_file(layout_path)
+        if cached_revision == revision and previous is not None:
+            return previous, False
+        
+        story = self.parse_json_story(file_path, lazy=True)
+        if story is None:
+            return None, False
+        
+        layout = self.compute_layout(story, previous)
+        try:
+            write_layout_file(layout_path, layout, revision)
+        except OSError as e:
+            print(f"保存布局缓存失败: {e}")
+        return layout, True
+    
+    def generate_svg_content(self, story: StoryGraph, layout: Optional[StoryLayout] = None) -> str:
+        """使用内置布局直接生成SVG内容，配色与 generate_dot_content 一致
+        
+        Args:
+            story: 剧情图对象
+            layout: 已计算好的布局，未提供时重新计算
+            
+        Returns:
+            str: SVG内容
+        """
+        return render_svg(layout or self.compute_layout(story))
+    
     def validate_story_structure(self, story: StoryGraph) -> Dict[str, List[str]]:
         """验证剧情结构
         
@@ -246,6 +405,10 @@ class StoryGraphService:
         Returns:
             Dict[str, List[str]]: 验证结果，包含errors和warnings
         """
+        # 列式剧情图直接在数组上验证，避免逐个构造节点对象
+        if isinstance(story, ColumnarStoryGraph):
+            return story.validate_structure()
+        
         errors = []
         warnings = []
         
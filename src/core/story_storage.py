@@ -0,0 +1,205 @@
+"""
+剧情存储格式
+统一处理剧情 JSON 的读写，支持缩进 / 紧凑 / gzip 压缩三种磁盘格式
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from .config import (
+    STORY_STORAGE_FORMAT, STORY_STORAGE_FORMATS,
+    STORY_JSON_SUFFIX, STORY_GZIP_SUFFIX
+)
+
+
+def story_name_from_path(file_path: Path) -> str:
+    """获取剧情名称（去掉 .json / .json.gz 后缀）"""
+    name = file_path.name
+    if name.endswith(STORY_GZIP_SUFFIX):
+        return name[:-len(STORY_GZIP_SUFFIX)]
+    if name.endswith(STORY_JSON_SUFFIX):
+        return name[:-len(STORY_JSON_SUFFIX)]
+    return file_path.stem
+
+
+def is_story_file(file_path: Path) -> bool:
+    """检查是否为剧情文件（.json 或 .json.gz）"""
+    name = file_path.name.lower()
+    return name.endswith(STORY_JSON_SUFFIX) or name.endswith(STORY_GZIP_SUFFIX)
+
+
+def get_story_path(notes_dir: Path, story_name: str, storage_format: Optional[str] = None) -> Path:
+    """获取指定存储格式下的剧情文件路径"""
+    storage_format = storage_format or STORY_STORAGE_FORMAT
+    suffix = STORY_GZIP_SUFFIX if storage_format == "gzip" else STORY_JSON_SUFFIX
+    return notes_dir / f"{story_name}{suffix}"
+
+
+def find_story_file(notes_dir: Path, story_name: str) -> Optional[Path]:
+    """查找剧情文件，优先返回未压缩的 .json
+
+    Args:
+        notes_dir: 剧情目录
+        story_name: 剧情名称（不含扩展名）
+
+    Returns:
+        Optional[Path]: 剧情文件路径，未找到返回None
+    """
+    for suffix in (STORY_JSON_SUFFIX, STORY_GZIP_SUFFIX):
+        candidate = notes_dir / f"{story_name}{suffix}"
+        if candidate.exists():
+            return candidate
+    return None
+
+
+def list_story_files(notes_dir: Path) -> List[Path]:
+    """列出目录下的剧情文件，同名剧情只保留一个"""
+    if not notes_dir.exists():
+        return []
+
+    stories: Dict[str, Path] = {}
+    for file_path in notes_dir.iterdir():
+        if not file_path.is_file() or not is_story_file(file_path):
+            continue
+        name = story_name_from_path(file_path)
+        # 同时存在两种格式时，以 .json 为准（与 find_story_file 一致）
+        if name not in stories or file_path.name.endswith(STORY_JSON_SUFFIX):
+            stories[name] = file_path
+
+    return [stories[name] for name in sorted(stories)]
+
+
+def read_story_bytes(file_path: Path) -> bytes:
+    """读取剧情文件的原始 JSON 字节（自动解压 .json.gz）"""
+    with open(file_path, 'rb') as f:
+        raw = f.read()
+    if file_path.name.endswith(STORY_GZIP_SUFFIX):
+        return gzip.decompress(raw)
+    return raw
+
+
+# 修订号缓存：文件路径 → ((修改时间, 大小), 修订号)
+_revisions: Dict[str, Tuple[Tuple[int, int], str]] = {}
+_revisions_lock = threading.Lock()
+
+
+def story_revision(file_path: Path) -> str:
+    """剧情修订号：规范化 JSON（键排序、紧凑分隔符）的哈希，与存储格式无关
+
+    转换存储格式（缩进 / 紧凑 / gzip）不改变修订号，布局和预览缓存仍然有效；
+    结果按文件的修改时间和大小缓存，未修改的文件不重复解析。
+    分章节剧情的清单记录了各章节的哈希，因此任一章节变化都会改变清单的修订号
+    """
+    stat = file_path.stat()
+    key, stamp = str(file_path), (stat.st_mtime_ns, stat.st_size)
+    with _revisions_lock:
+        cached = _revisions.get(key)
+    if cached is not None and cached[0] == stamp:
+        return cached[1]
+
+    raw = read_story_bytes(file_path)
+    try:
+        canonical = json.dumps(json.loads(raw.decode('utf-8')), ensure_ascii=False,
+                               sort_keys=True, separators=(',', ':')).encode('utf-8')
+    except ValueError:
+        canonical = raw  # 无法解析的文件按原始内容计算
+    revision = hashlib.sha1(canonical).hexdigest()
+    with _revisions_lock:
+        _revisions[key] = (stamp, revision)
+    return revision
+
+
+def read_story_data(file_path: Path) -> Dict[str, Any]:
+    """读取剧情数据，透明支持 .json 与 .json.gz"""
+    return json.loads(read_story_bytes(file_path).decode('utf-8'))
+
+
+def encode_story_data(story_data: Dict[str, Any], storage_format: Optional[str] = None) -> bytes:
+    """按存储格式序列化剧情数据
+
+    Args:
+        story_data: 剧情数据
+        storage_format: 存储格式（pretty / compact / gzip），默认使用配置
+
+    Returns:
+        bytes: 写入磁盘的字节内容
+    """
+    storage_format = storage_format or STORY_STORAGE_FORMAT
+    if storage_format not in STORY_STORAGE_FORMATS:
+        raise ValueError(f"未知的剧情存储格式: {storage_format}")
+
+    if storage_format == "pretty":
+        text = json.dumps(story_data, ensure_ascii=False, indent=2)
+    else:
+        text = json.dumps(story_data, ensure_ascii=False, separators=(',', ':'))
+
+    data = text.encode('utf-8')
+    if storage_format == "gzip":
+        # mtime=0 保证相同内容产生相同字节，便于哈希比较
+        data = gzip.compress(data, compresslevel=6, mtime=0)
+    return data
+
+
+def write_story_data(notes_dir: Path, story_name: str, story_data: Dict[str, Any],
+                     storage_format: Optional[str] = None) -> Path:
+    """写入剧情数据，并移除另一种格式的旧文件
+
+    先写入同目录下的临时文件再原子替换，写入中断时原文件保持不变
+
+    Args:
+        notes_dir: 剧情目录
+        story_name: 剧情名称
+        story_data: 剧情数据
+        storage_format: 存储格式，默认使用配置
+
+    Returns:
+        Path: 写入的文件路径
+    """
+    target_path = get_story_path(notes_dir, story_name, storage_format)
+    content = encode_story_data(story_data, storage_format)
+
+    temp_path = target_path.with_name(f"{target_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    try:
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, target_path)
+    except BaseException:
+        try:
+            temp_path.unlink()
+        except OSError:
+            pass
+        raise
+
+    # 确保同名剧情只存在一种格式
+    for suffix in (STORY_JSON_SUFFIX, STORY_GZIP_SUFFIX):
+        other_path = notes_dir / f"{story_name}{suffix}"
+        if other_path != target_path and other_path.exists():
+            other_path.unlink()
+
+    return target_path
+
+
+def migrate_story_file(file_path: Path, storage_format: str) -> Optional[Path]:
+    """将单个剧情文件转换为指定存储格式
+
+    Args:
+        file_path: 剧情文件路径
+        storage_format: 目标存储格式
+
+    Returns:
+        Optional[Path]: 新文件路径，内容无变化时返回None
+    """
+    raw = read_story_bytes(file_path)
+    story_data = json.loads(raw.decode('utf-8'))
+    story_name = story_name_from_path(file_path)
+
+    target_path = get_story_path(file_path.parent, story_name, storage_format)
+    if target_path == file_path and encode_story_data(story_data, storage_format) == file_path.read_bytes():
+        return None
+
+    return write_story_data(file_path.parent, story_name, story_data, storage_format)
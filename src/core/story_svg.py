@@ -0,0 +1,110 @@
+"""
+剧情图 SVG 渲染
+将分层布局结果直接输出为 SVG，结构与 Graphviz 输出一致（g.node / g.edge 及 title），
+预览页面无需修改即可使用
+"""
+
+import math
+from html import escape
+from typing import List
+
+from .config import STORY_GRAPH_COLORS, STORY_GRAPH_FONT
+from .story_layout import LayoutEdge, LayoutNode, Point, StoryLayout
+
+ARROW_LENGTH = 10.0
+ARROW_HALF_WIDTH = 3.5
+
+
+def _fmt(value: float) -> str:
+    return f"{value:.2f}".rstrip("0").rstrip(".")
+
+
+def _points(points: List[Point]) -> str:
+    return " ".join(f"{_fmt(x)},{_fmt(y)}" for x, y in points)
+
+
+def _arrow_head(tail: Point, tip: Point) -> List[Point]:
+    """计算箭头三角形顶点"""
+    dx, dy = tip[0] - tail[0], tip[1] - tail[1]
+    length = math.hypot(dx, dy) or 1.0
+    ux, uy = dx / length, dy / length
+    base = (tip[0] - ux * ARROW_LENGTH, tip[1] - uy * ARROW_LENGTH)
+    return [
+        (base[0] - uy * ARROW_HALF_WIDTH, base[1] + ux * ARROW_HALF_WIDTH),
+        tip,
+        (base[0] + uy * ARROW_HALF_WIDTH, base[1] - ux * ARROW_HALF_WIDTH),
+    ]
+
+
+def _render_node(lines: List[str], index: int, node: LayoutNode, font_size: float):
+    color = STORY_GRAPH_COLORS["main"] if node.node_type == "main" else STORY_GRAPH_COLORS["branch"]
+    left, top = node.x - node.width / 2, node.y - node.height / 2
+    right, bottom = node.x + node.width / 2, node.y + node.height / 2
+    line_height = font_size * 1.2
+
+    lines.append(f'<g id="node{index}" class="node">')
+    lines.append(f"<title>{escape(node.id)}</title>")
+    lines.append(f'<polygon fill="{color}" stroke="black" '
+                 f'points="{_points([(right, top), (left, top), (left, bottom), (right, bottom), (right, top)])}"/>')
+    for offset, text in ((-line_height / 2, node.title), (line_height / 2, f"[{node.id}]")):
+        lines.append(f'<text text-anchor="middle" x="{_fmt(node.x)}" y="{_fmt(node.y + offset + font_size * 0.35)}" '
+                     f'font-family="{STORY_GRAPH_FONT}" font-size="{_fmt(font_size)}" fill="white">{escape(text)}</text>')
+    lines.append("</g>")
+
+
+def _render_edge(lines: List[str], index: int, edge: LayoutEdge, font_size: float):
+    if edge.kind == "choice":
+        color, dash = STORY_GRAPH_COLORS["choice"], ""
+    elif edge.kind == "exit":
+        color, dash = STORY_GRAPH_COLORS["fail"], ' stroke-dasharray="5,2"'
+    else:
+        color, dash = "black", ""
+
+    points = list(edge.points)
+    if len(points) < 2:
+        return
+    # 线段在箭头底部结束，避免线头穿出箭头
+    tail, tip = points[-2], points[-1]
+    head = _arrow_head(tail, tip)
+    length = math.hypot(tip[0] - tail[0], tip[1] - tail[1])
+    if length > ARROW_LENGTH:
+        ratio = (length - ARROW_LENGTH) / length
+        points[-1] = (tail[0] + (tip[0] - tail[0]) * ratio, tail[1] + (tip[1] - tail[1]) * ratio)
+
+    path = "M" + " L".join(f"{_fmt(x)},{_fmt(y)}" for x, y in points)
+    lines.append(f'<g id="edge{index}" class="edge">')
+    lines.append(f"<title>{escape(edge.source)}&#45;&gt;{escape(edge.target)}</title>")
+    lines.append(f'<path fill="none" stroke="{color}"{dash} d="{path}"/>')
+    lines.append(f'<polygon fill="{color}" stroke="{color}" points="{_points(head + head[:1])}"/>')
+    if edge.label and edge.label_pos:
+        lines.append(f'<text text-anchor="start" x="{_fmt(edge.label_pos[0])}" y="{_fmt(edge.label_pos[1] + font_size * 0.35)}" '
+                     f'font-family="{STORY_GRAPH_FONT}" font-size="{_fmt(font_size)}" fill="{color}">{escape(edge.label)}</text>')
+    lines.append("</g>")
+
+
+def render_svg(layout: StoryLayout, font_size: float = 14.0) -> str:
+    """将布局结果渲染为 SVG 文本
+
+    Args:
+        layout: 布局结果
+        font_size: 字号（pt）
+
+    Returns:
+        str: SVG 内容
+    """
+    width, height = _fmt(max(layout.width, 1.0)), _fmt(max(layout.height, 1.0))
+    lines = [
+        '<?xml version="1.0" encoding="UTF-8" standalone="no"?>',
+        f'<svg width="{width}pt" height="{height}pt" viewBox="0 0 {width} {height}" '
+        'xmlns="http://www.w3.org/2000/svg" xmlns:xlink="http://www.w3.org/1999/xlink">',
+        '<g id="graph0" class="graph">',
+        "<title>Story</title>",
+        f'<polygon fill="white" stroke="none" points="0,0 {width},0 {width},{height} 0,{height} 0,0"/>',
+    ]
+    for index, node in enumerate(layout.nodes.values(), 1):
+        _render_node(lines, index, node, font_size)
+    for index, edge in enumerate(layout.edges, 1):
+        _render_edge(lines, index, edge, font_size)
+    lines.append("</g>")
+    lines.append("</svg>")
+    return "\n".join(lines) + "\n"
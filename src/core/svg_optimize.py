@@ -0,0 +1,158 @@
+"""
+剧情图 SVG 后处理
+压缩 Graphviz / 内置渲染器输出的 SVG：去掉注释、title 和冗余属性，坐标按精度取整，
+公共的字体属性提升到根元素；同时为节点写入 data-node-id，并嵌入紧凑的 JSON 邻接索引，
+预览页面高亮相邻节点和路径时直接查表，不需要遍历 DOM
+"""
+
+import json
+import re
+import xml.etree.ElementTree as ET
+from collections import Counter
+from typing import Dict, List, Optional, Union
+
+from .config import STORY_GRAPH_COLORS, SVG_COORD_PRECISION
+
+SVG_NS = "http://www.w3.org/2000/svg"
+XLINK_NS = "http://www.w3.org/1999/xlink"
+# 嵌入索引所在 metadata 元素的 id
+SVG_INDEX_ID = "story-index"
+
+# 需要对其中的数字取整的属性
+_NUMERIC_ATTRIBUTES = frozenset((
+    "points", "d", "x", "y", "cx", "cy", "rx", "ry", "x1", "y1", "x2", "y2",
+    "width", "height", "viewBox", "transform", "font-size", "stroke-width",
+))
+# 可继承、可提升到根元素的文本属性
+_INHERITED_TEXT_ATTRIBUTES = ("font-family", "font-size", "text-anchor")
+_NUMBER_PATTERN = re.compile(r"-?\d*\.\d+")
+
+# 连线类型，与 /api/story/layout 的 kind 编码一致
+EDGE_KIND_NEXT, EDGE_KIND_CHOICE, EDGE_KIND_EXIT = 0, 1, 2
+
+ET.register_namespace("", SVG_NS)
+ET.register_namespace("xlink", XLINK_NS)
+
+
+def _tag(name: str) -> str:
+    return f"{{{SVG_NS}}}{name}"
+
+
+def _round_numbers(value: str, precision: int) -> str:
+    def replace(match: "re.Match") -> str:
+        text = f"{float(match.group()):.{precision}f}"
+        if "." in text:
+            text = text.rstrip("0").rstrip(".")
+        return "0" if text == "-0" else text
+    return _NUMBER_PATTERN.sub(replace, value)
+
+
+def _split_edge_title(title: str, node_ids: Dict[str, int]) -> Optional[List[int]]:
+    """将 “源->目标” 形式的连线标题拆分为节点下标（节点ID本身可能包含 ->）"""
+    start = title.find("->")
+    while start != -1:
+        source, target = title[:start], title[start + 2:]
+        if source in node_ids and target in node_ids:
+            return [node_ids[source], node_ids[target]]
+        start = title.find("->", start + 1)
+    return None
+
+
+def _edge_kind(edge: ET.Element) -> int:
+    path = edge.find(_tag("path"))
+    if path is None:
+        return EDGE_KIND_NEXT
+    if path.get("stroke-dasharray") or "dashed" in path.get("style", ""):
+        return EDGE_KIND_EXIT
+    if path.get("stroke", "").lower() == STORY_GRAPH_COLORS["choice"].lower():
+        return EDGE_KIND_CHOICE
+    return EDGE_KIND_NEXT
+
+
+def _title_text(element: ET.Element) -> Optional[str]:
+    title = element.find(_tag("title"))
+    if title is None or title.text is None:
+        return None
+    return title.text.strip()
+
+
+def optimize_svg(svg_content: Union[str, bytes], precision: int = SVG_COORD_PRECISION) -> bytes:
+    """压缩剧情图 SVG 并嵌入节点/连线索引
+
+    节点（g.node）写入 data-node-id；连线（g.edge）的顺序与索引中 edges 的顺序一致。
+    索引写在 <metadata id="story-index"> 中，格式为
+    {"nodes": [节点ID...], "edges": [[源下标, 目标下标, 类型]...]}，类型 0 为 next、1 为选项、2 为返回
+
+    Args:
+        svg_content: SVG 内容
+        precision: 坐标保留的小数位数
+
+    Returns:
+        bytes: 处理后的 SVG（UTF-8）；内容无法解析时原样返回
+    """
+    raw = svg_content.encode("utf-8") if isinstance(svg_content, str) else svg_content
+    try:
+        root = ET.fromstring(raw)
+    except ET.ParseError:
+        return raw
+    if root.tag != _tag("svg"):
+        return raw
+
+    # 先读取标题建立索引，之后统一删除 title
+    node_ids: Dict[str, int] = {}
+    for node in root.iter(_tag("g")):
+        if node.get("class") == "node":
+            node_id = _title_text(node)
+            if node_id is not None and node_id not in node_ids:
+                node.set("data-node-id", node_id)
+                node_ids[node_id] = len(node_ids)
+
+    edges = []
+    for edge in root.iter(_tag("g")):
+        if edge.get("class") != "edge":
+            continue
+        ends = _split_edge_title(_title_text(edge) or "", node_ids)
+        if ends is None:
+            # 无法识别的连线不参与交互，移除 class 以保持与索引顺序一致
+            edge.attrib.pop("class")
+            continue
+        edges.append(ends + [_edge_kind(edge)])
+
+    text_attributes: Dict[str, Counter] = {name: Counter() for name in _INHERITED_TEXT_ATTRIBUTES}
+    texts = []
+    for parent in list(root.iter()):
+        if parent.tag == _tag("title"):
+            continue
+        for child in list(parent):
+            if not isinstance(child.tag, str) or child.tag == _tag("title"):
+                parent.remove(child)
+        if parent.tag == _tag("g"):
+            parent.attrib.pop("id", None)
+        for name, value in list(parent.attrib.items()):
+            if name in _NUMERIC_ATTRIBUTES:
+                parent.set(name, _round_numbers(value, precision))
+        if parent.tag == _tag("text"):
+            texts.append(parent)
+            for name in _INHERITED_TEXT_ATTRIBUTES:
+                text_attributes[name][parent.get(name)] += 1
+        else:
+            if parent.text is not None and not parent.text.strip():
+                parent.text = None
+        parent.tail = None
+
+    # 出现最多的字体属性设置在根元素上，与之相同的文本不再重复
+    for name, counts in text_attributes.items():
+        value, count = counts.most_common(1)[0] if counts else (None, 0)
+        if value is None or count < 2:
+            continue
+        root.set(name, value)
+        for text in texts:
+            if text.get(name) == value:
+                text.attrib.pop(name)
+
+    metadata = ET.Element(_tag("metadata"), {"id": SVG_INDEX_ID})
+    metadata.text = json.dumps({"nodes": list(node_ids), "edges": edges},
+                               ensure_ascii=False, separators=(",", ":"))
+    root.insert(0, metadata)
+
+    return b'<?xml version="1.0" encoding="UTF-8"?>\n' + ET.tostring(root, encoding="utf-8", xml_declaration=False) + b"\n"
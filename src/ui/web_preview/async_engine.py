@@ -0,0 +1,517 @@
+"""
+asyncio HTTP 服务引擎
+在单个事件循环中处理所有连接：HTTP/1.1 长连接、静态文件用 loop.sendfile 直接发送，
+预览事件流（Server-Sent Events）在事件循环中推送，空闲连接和订阅者都不占用线程。
+API 等动态请求交给线程池中的 WebPreviewRequestHandler 处理，接口行为与工作线程引擎完全一致
+"""
+
+import asyncio
+import email.utils
+import functools
+import http.client
+import io
+import json
+import mimetypes
+import os
+import posixpath
+import socket
+import threading
+import time
+from http import HTTPStatus
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlsplit
+
+from .compression import is_compressible, should_compress
+from .http_cache import content_range, file_etag, is_not_modified, requested_range
+from src.core.config import (
+    HTTP_IDLE_TIMEOUT, HTTP_KEEPALIVE_MAX_REQUESTS, HTTP_KEEPALIVE_TIMEOUT, HTTP_MAX_QUEUE,
+    HTTP_READ_TIMEOUT, HTTP_WORKERS, MAX_REQUEST_BODY_SIZE, PREVIEW_EVENTS_PING_INTERVAL, SITE_EXPORT_DIR,
+    STATIC_CACHE_CONTROL
+)
+
+# 请求头的最大长度（超出返回 431）
+MAX_HEADER_BYTES = 64 * 1024
+# 由事件循环直接处理的预览事件流路径
+PREVIEW_EVENTS_PATH = "/api/story/preview-events"
+# 交给 WebPreviewRequestHandler 处理的路径前缀（其余存在的文件作为静态文件直接发送）
+_HANDLER_PREFIXES = ("/api/",)
+# 导出的静态站点路径前缀，文件位于 site_directory 下
+SITE_PREFIX = "/site/"
+# 站点中除 index.html 外的文件名都带内容哈希，可以永久缓存
+SITE_ASSET_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+class _BufferedConnection:
+    """供 WebPreviewRequestHandler 读写的内存连接：请求已完整读入，响应写入缓冲区"""
+
+    def __init__(self, request_bytes: bytes):
+        self._request = request_bytes
+        self.output = io.BytesIO()
+
+    def makefile(self, mode: str, *args, **kwargs):
+        return io.BufferedReader(io.BytesIO(self._request))
+
+    def sendall(self, data: bytes):
+        self.output.write(data)
+
+    def settimeout(self, timeout: Optional[float]):
+        pass
+
+    def gettimeout(self) -> Optional[float]:
+        return None
+
+    def setsockopt(self, *args):
+        pass
+
+
+class _Request:
+    """已解析的请求"""
+
+    __slots__ = ("method", "target", "version", "headers", "raw_head", "body")
+
+    def __init__(self, method: str, target: str, version: str,
+                 headers: http.client.HTTPMessage, raw_head: bytes, body: bytes):
+        self.method = method
+        self.target = target
+        self.version = version
+        self.headers = headers
+        self.raw_head = raw_head
+        self.body = body
+
+    @property
+    def path(self) -> str:
+        return urlsplit(self.target).path
+
+    def wants_keep_alive(self) -> bool:
+        connection = self.headers.get("Connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return "keep-alive" in connection
+        return "close" not in connection
+
+
+class _BadRequest(Exception):
+    def __init__(self, status: HTTPStatus):
+        super().__init__(status.phrase)
+        self.status = status
+
+
+class AsyncHTTPServer:
+    """基于 asyncio.start_server 的 HTTP 服务器
+
+    对外接口与 socketserver 一致（serve_forever / shutdown / server_close / server_port），
+    WebPreviewServer 可以直接替换使用
+    """
+
+    def __init__(self, server_address: Tuple[str, int], handler_class, directory: Path,
+                 workers: int = HTTP_WORKERS, max_queue: int = HTTP_MAX_QUEUE,
+                 read_timeout: float = HTTP_READ_TIMEOUT, idle_timeout: float = HTTP_IDLE_TIMEOUT,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+                 keepalive_max_requests: int = HTTP_KEEPALIVE_MAX_REQUESTS,
+                 site_directory: Path = SITE_EXPORT_DIR):
+        """
+        Args:
+            server_address: 监听地址
+            handler_class: 处理 API 等动态请求的处理器类
+            directory: 静态文件根目录
+            workers: 处理动态请求的线程数
+            max_queue: 等待线程的最大请求数，超出时返回 503
+            read_timeout: 读取请求头和正文的超时秒数
+            idle_timeout: 连接建立后等待第一个请求的最长秒数
+            keepalive_timeout: 长连接两次请求之间的最长空闲秒数
+            keepalive_max_requests: 单个连接最多处理的请求数
+            site_directory: 导出站点的根目录（/site/ 路径）
+        """
+        self.directory = Path(directory)
+        self.site_directory = Path(site_directory).resolve()
+        self.handler_class = functools.partial(handler_class, directory=str(self.directory))
+        self.extensions_map = getattr(handler_class, "extensions_map", {})
+        self.workers = max(1, workers)
+        self.max_pending = self.workers + max(1, max_queue)
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.keepalive_max_requests = max(1, keepalive_max_requests)
+
+        # 在构造时绑定端口，失败时与 HTTPServer 一样直接抛出异常
+        self.socket = socket.create_server(server_address)
+        self.server_address = self.socket.getsockname()[:2]
+        self.server_port = self.server_address[1]
+
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="http-async")
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._stop: Optional[asyncio.Event] = None
+        self._stopped = threading.Event()
+        self._pending = 0
+        self._connections: Dict[asyncio.Task, asyncio.StreamWriter] = {}
+
+    # ---- 生命周期 ----
+
+    def serve_forever(self):
+        """运行事件循环直到 shutdown"""
+        self._stopped.clear()
+        loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(loop)
+        self._loop = loop
+        try:
+            loop.run_until_complete(self._serve())
+        finally:
+            loop.run_until_complete(loop.shutdown_asyncgens())
+            loop.close()
+            self._loop = None
+            self._stopped.set()
+
+    async def _serve(self):
+        self._stop = asyncio.Event()
+        server = await asyncio.start_server(self._handle_connection, sock=self.socket,
+                                            limit=MAX_HEADER_BYTES)
+        async with server:
+            await self._stop.wait()
+            server.close()
+            # 结束仍然打开的连接（空闲长连接和事件流订阅）
+            tasks = list(self._connections)
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await server.wait_closed()
+
+    def shutdown(self):
+        """停止事件循环并等待 serve_forever 返回"""
+        loop = self._loop
+        if loop is not None and self._stop is not None:
+            loop.call_soon_threadsafe(self._stop.set)
+            self._stopped.wait(timeout=5)
+
+    def keep_alive_allowed(self, request) -> bool:
+        """连接复用由事件循环决定（_normalize_response 会改写 Connection 头）"""
+        return True
+
+    def server_close(self):
+        """释放监听端口和线程池"""
+        try:
+            self.socket.close()
+        except OSError:
+            pass
+        self._executor.shutdown(wait=False)
+
+    # ---- 连接 ----
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self._connections[asyncio.current_task()] = writer
+        client_address = writer.get_extra_info("peername")
+        try:
+            for served in range(self.keepalive_max_requests):
+                timeout = self.idle_timeout if served == 0 else self.keepalive_timeout
+                try:
+                    request = await self._read_request(reader, timeout)
+                except _BadRequest as e:
+                    await self._send_simple(writer, e.status, keep_alive=False)
+                    break
+                if request is None:
+                    break
+
+                keep_alive = request.wants_keep_alive() and served + 1 < self.keepalive_max_requests
+                self._touch()
+                if request.path == PREVIEW_EVENTS_PATH and request.method == "GET":
+                    await self._stream_preview_events(request, writer)
+                    break
+                if not await self._send_static(request, writer, keep_alive):
+                    keep_alive = await self._dispatch(request, client_address, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.CancelledError):
+            pass  # 客户端断开或服务器关闭
+        finally:
+            self._connections.pop(asyncio.current_task(), None)
+            writer.close()
+
+    async def _read_request(self, reader: asyncio.StreamReader, timeout: float) -> Optional[_Request]:
+        """读取一个完整的请求，连接关闭或空闲超时返回 None"""
+        try:
+            raw_head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+            return None
+        except asyncio.LimitOverrunError:
+            raise _BadRequest(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE)
+
+        request_line, _, header_bytes = raw_head.partition(b"\r\n")
+        parts = request_line.decode("latin-1").split()
+        if len(parts) != 3 or not parts[2].startswith("HTTP/"):
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        method, target, version = parts
+        headers = http.client.parse_headers(io.BytesIO(header_bytes))
+
+        if headers.get("Transfer-Encoding"):
+            raise _BadRequest(HTTPStatus.NOT_IMPLEMENTED)
+        try:
+            length = int(headers.get("Content-Length", 0))
+        except ValueError:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        if length < 0:
+            raise _BadRequest(HTTPStatus.BAD_REQUEST)
+        # 超长的请求体不读取，回复 413 后关闭连接
+        if length > MAX_REQUEST_BODY_SIZE:
+            raise _BadRequest(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        body = b""
+        if length > 0:
+            try:
+                body = await asyncio.wait_for(reader.readexactly(length), self.read_timeout)
+            except (asyncio.TimeoutError, asyncio.IncompleteReadError):
+                return None
+        return _Request(method, target, version, headers, raw_head, body)
+
+    def _touch(self):
+        preview_server = getattr(self, "_preview_server", None)
+        if preview_server is not None:
+            preview_server.last_access_time = time.time()
+
+    async def _send_simple(self, writer: asyncio.StreamWriter, status: HTTPStatus,
+                           keep_alive: bool, extra_headers: Optional[List[Tuple[str, str]]] = None):
+        body = json.dumps({"error": status.phrase, "status": status.value}).encode("utf-8")
+        headers = [("Content-Type", "application/json; charset=utf-8"), ("Content-Length", str(len(body)))]
+        writer.write(self._format_head(status.value, status.phrase, headers + (extra_headers or []), keep_alive) + body)
+        await writer.drain()
+
+    @staticmethod
+    def _format_head(code: int, reason: str, headers: List[Tuple[str, str]], keep_alive: bool) -> bytes:
+        lines = [f"HTTP/1.1 {code} {reason}"]
+        lines += [f"{name}: {value}" for name, value in headers]
+        lines.append("Connection: keep-alive" if keep_alive else "Connection: close")
+        return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1")
+
+    # ---- 静态文件 ----
+
+    def _static_file(self, path: str) -> Optional[Path]:
+        """与 SimpleHTTPRequestHandler.translate_path 相同的规则映射为文件，不是普通文件时返回 None"""
+        try:
+            path = unquote(path, errors="surrogatepass")
+        except UnicodeDecodeError:
+            path = unquote(path)
+        file_path = self.directory
+        for word in filter(None, posixpath.normpath(path).split("/")):
+            if os.path.dirname(word) or word in (os.curdir, os.pardir):
+                continue
+            file_path = file_path / word
+        return file_path if file_path.is_file() else None
+
+    def _site_file(self, path: str) -> Optional[Tuple[Path, str]]:
+        """将 /site/ 下的路径映射为导出站点中的文件，规则与 WebPreviewRequestHandler._send_site_file 相同
+
+        越出站点目录、隐藏文件、需要补全结尾 / 的目录等情况返回 None，由处理器发送 403 / 404 / 301
+
+        Returns:
+            Optional[Tuple[Path, str]]: (文件路径, Cache-Control)
+        """
+        relative = unquote(path[len(SITE_PREFIX):])
+        file_path = (self.site_directory / relative).resolve()
+        if file_path != self.site_directory and self.site_directory not in file_path.parents:
+            return None
+        if file_path.is_dir():
+            if relative and not relative.endswith("/"):
+                return None
+            file_path = file_path / "index.html"
+        if not file_path.is_file() or file_path.name.startswith("."):
+            return None
+        return file_path, "no-cache" if file_path.name == "index.html" else SITE_ASSET_CACHE_CONTROL
+
+    def _guess_type(self, path: Path) -> str:
+        suffix = path.suffix.lower()
+        if suffix in self.extensions_map:
+            return self.extensions_map[suffix]
+        guess, _ = mimetypes.guess_type(path.name)
+        return guess or "application/octet-stream"
+
+    async def _send_static(self, request: _Request, writer: asyncio.StreamWriter, keep_alive: bool) -> bool:
+        """直接发送静态文件
+
+        Returns:
+            bool: 是否已处理（不是静态文件的请求交给处理器）
+        """
+        if request.method not in ("GET", "HEAD") or request.path.startswith(_HANDLER_PREFIXES):
+            return False
+        if request.path.startswith(SITE_PREFIX):
+            site_file = self._site_file(request.path)
+            if site_file is None:
+                return False
+            file_path, cache_control = site_file
+        else:
+            file_path, cache_control = self._static_file(request.path), STATIC_CACHE_CONTROL
+        if file_path is None:
+            return False
+
+        try:
+            f = open(file_path, "rb")
+        except OSError:
+            return False
+        with f:
+            stat = os.fstat(f.fileno())
+            etag = file_etag(stat)
+            if is_not_modified(request.headers, etag, stat.st_mtime):
+                writer.write(self._format_head(304, "Not Modified", [
+                    ("ETag", etag), ("Cache-Control", cache_control),
+                ], keep_alive))
+                await writer.drain()
+                return True
+
+            try:
+                byte_range = requested_range(request.headers, etag, stat.st_mtime, stat.st_size)
+            except ValueError:
+                writer.write(self._format_head(416, "Range Not Satisfiable", [
+                    ("Content-Range", f"bytes */{stat.st_size}"), ("Content-Length", "0"),
+                ], keep_alive))
+                await writer.drain()
+                return True
+
+            content_type = self._guess_type(file_path)
+            if byte_range is None and should_compress(content_type, stat.st_size,
+                                                      request.headers.get("Accept-Encoding")):
+                return False  # 由处理器从压缩缓存发送
+
+            offset, count = byte_range or (0, stat.st_size)
+            headers = [
+                ("Content-Type", content_type),
+                ("Content-Length", str(count)),
+                ("Accept-Ranges", "bytes"),
+                ("Last-Modified", email.utils.formatdate(stat.st_mtime, usegmt=True)),
+                ("ETag", etag),
+                ("Cache-Control", cache_control),
+            ]
+            if byte_range:
+                headers.append(("Content-Range", content_range(offset, count, stat.st_size)))
+            if is_compressible(content_type):
+                headers.append(("Vary", "Accept-Encoding"))
+            if byte_range:
+                writer.write(self._format_head(206, "Partial Content", headers, keep_alive))
+            else:
+                writer.write(self._format_head(200, "OK", headers, keep_alive))
+            await writer.drain()
+            if request.method == "GET" and count:
+                await asyncio.get_running_loop().sendfile(writer.transport, f, offset, count)
+        return True
+
+    # ---- 动态请求 ----
+
+    async def _dispatch(self, request: _Request, client_address, writer: asyncio.StreamWriter,
+                        keep_alive: bool) -> bool:
+        """在线程池中运行处理器并发送其响应
+
+        Returns:
+            bool: 连接是否可以继续使用
+        """
+        if self._pending >= self.max_pending:
+            await self._send_simple(writer, HTTPStatus.SERVICE_UNAVAILABLE, keep_alive,
+                                    [("Retry-After", "1")])
+            return keep_alive
+
+        self._pending += 1
+        try:
+            loop = asyncio.get_running_loop()
+            output = await loop.run_in_executor(
+                self._executor, self._run_handler, request.raw_head + request.body, client_address
+            )
+        finally:
+            self._pending -= 1
+
+        response = self._normalize_response(output, request.method, keep_alive)
+        if response is None:
+            return False
+        data, keep_alive = response
+        writer.write(data)
+        await writer.drain()
+        return keep_alive
+
+    def _run_handler(self, request_bytes: bytes, client_address) -> bytes:
+        connection = _BufferedConnection(request_bytes)
+        try:
+            self.handler_class(connection, client_address, self)
+        except Exception as e:
+            print(f"[ERROR] 处理请求失败: {e}")
+        return connection.output.getvalue()
+
+    def _normalize_response(self, output: bytes, method: str,
+                            keep_alive: bool) -> Optional[Tuple[bytes, bool]]:
+        """处理器的响应统一改为 HTTP/1.1，并按缓冲的正文补全 Content-Length，使连接可以复用"""
+        head, separator, body = output.partition(b"\r\n\r\n")
+        if not separator:
+            return None
+        lines = head.decode("latin-1").split("\r\n")
+        status_parts = lines[0].split(" ", 2)
+        if len(status_parts) < 2:
+            return None
+        code = int(status_parts[1])
+        reason = status_parts[2] if len(status_parts) > 2 else ""
+
+        headers = []
+        declared_length = None
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            lower = name.strip().lower()
+            if lower == "connection":
+                keep_alive = keep_alive and "close" not in value.lower()
+                continue
+            if lower in ("keep-alive", "transfer-encoding"):
+                continue
+            if lower == "content-length":
+                declared_length = value.strip()
+                continue
+            headers.append((name.strip(), value.strip()))
+
+        if code >= 200 and code not in (204, 304):
+            if method == "HEAD":
+                if declared_length is not None:
+                    headers.append(("Content-Length", declared_length))
+                else:
+                    keep_alive = False
+                body = b""
+            else:
+                headers.append(("Content-Length", str(len(body))))
+        return self._format_head(code, reason, headers, keep_alive) + body, keep_alive
+
+    # ---- 预览事件流 ----
+
+    async def _stream_preview_events(self, request: _Request, writer: asyncio.StreamWriter):
+        """推送剧情预览的重建状态（text/event-stream），每次状态变化发送一个 build 事件"""
+        params = {key: values[0] for key, values in parse_qs(urlsplit(request.target).query).items()}
+        campaign_name, story_name = params.get("campaign"), params.get("story")
+        if not campaign_name or not story_name:
+            await self._send_simple(writer, HTTPStatus.BAD_REQUEST, keep_alive=False)
+            return
+
+        from .editor_api import EditorAPIHandler
+        loop = asyncio.get_running_loop()
+        generator = await loop.run_in_executor(self._executor, EditorAPIHandler.get_preview_generator)
+        exists = await loop.run_in_executor(
+            self._executor, lambda: generator.get_preview_status(campaign_name, story_name) is not None)
+        if not exists:
+            await self._send_simple(writer, HTTPStatus.NOT_FOUND, keep_alive=False)
+            return
+        scheduler = await loop.run_in_executor(self._executor, EditorAPIHandler.get_preview_scheduler)
+        updates: asyncio.Queue = asyncio.Queue()
+
+        def listener(campaign: str, story: str, status: Dict[str, Any]):
+            if campaign == campaign_name and story == story_name:
+                loop.call_soon_threadsafe(updates.put_nowait, status)
+
+        scheduler.add_listener(listener)
+        try:
+            writer.write(self._format_head(200, "OK", [
+                ("Content-Type", "text/event-stream; charset=utf-8"),
+                ("Cache-Control", "no-cache"),
+            ], keep_alive=False))
+            status = scheduler.get_status(campaign_name, story_name)
+            while True:
+                if status is None:
+                    writer.write(b": ping\n\n")
+                else:
+                    data = json.dumps(status, ensure_ascii=False)
+                    writer.write(f"event: build\ndata: {data}\n\n".encode("utf-8"))
+                await writer.drain()
+                try:
+                    status = await asyncio.wait_for(updates.get(), PREVIEW_EVENTS_PING_INTERVAL)
+                except asyncio.TimeoutError:
+                    status = None
+                if self._stop is not None and self._stop.is_set():
+                    break
+        finally:
+            scheduler.remove_listener(listener)
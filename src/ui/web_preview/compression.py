@@ -0,0 +1,132 @@
+"""
+响应压缩
+Accept-Encoding 协商、可压缩类型判断、按修改时间缓存的静态文件压缩结果，以及 gzip 请求体的解压
+"""
+
+import gzip
+import io
+import os
+import threading
+import zlib
+from collections import OrderedDict
+from pathlib import Path
+from typing import Optional, Tuple
+
+from src.core.config import (
+    GZIP_CACHE_MAX_BYTES, GZIP_COMPRESSIBLE_TYPES, GZIP_LEVEL, GZIP_MIN_SIZE, MAX_REQUEST_BODY_SIZE
+)
+
+
+def accepts_gzip(accept_encoding: Optional[str]) -> bool:
+    """客户端是否接受 gzip（支持 q 值，gzip;q=0 表示不接受）"""
+    if not accept_encoding:
+        return False
+    wildcard = False
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        coding = coding.strip().lower()
+        quality = 1.0
+        params = params.strip().lower()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if coding in ("gzip", "x-gzip"):
+            return quality > 0
+        if coding == "*":
+            wildcard = quality > 0
+    return wildcard
+
+
+def is_compressible(content_type: Optional[str]) -> bool:
+    """内容类型是否值得压缩（文本类：JSON、HTML、JS、CSS、SVG 等）"""
+    if not content_type:
+        return False
+    return content_type.split(";")[0].strip().lower() in GZIP_COMPRESSIBLE_TYPES
+
+
+def should_compress(content_type: Optional[str], size: int, accept_encoding: Optional[str]) -> bool:
+    """是否以 gzip 发送：类型可压缩、大小达到阈值且客户端接受"""
+    return size >= GZIP_MIN_SIZE and is_compressible(content_type) and accepts_gzip(accept_encoding)
+
+
+def gzip_bytes(data: bytes) -> bytes:
+    """压缩数据（固定 mtime，相同内容得到相同结果）"""
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+
+def decode_request_body(data: bytes, content_encoding: Optional[str]) -> bytes:
+    """按 Content-Encoding 解码请求体
+
+    Raises:
+        ValueError: 不支持的编码、数据损坏或解压后超过 MAX_REQUEST_BODY_SIZE
+    """
+    encoding = (content_encoding or "identity").strip().lower()
+    if encoding == "identity":
+        return data
+    if encoding not in ("gzip", "x-gzip"):
+        raise ValueError(f"不支持的请求体编码: {content_encoding}")
+    try:
+        with gzip.GzipFile(fileobj=io.BytesIO(data)) as f:
+            decoded = f.read(MAX_REQUEST_BODY_SIZE + 1)
+    except (OSError, EOFError, zlib.error) as e:
+        raise ValueError(f"请求体解压失败: {e}")
+    if len(decoded) > MAX_REQUEST_BODY_SIZE:
+        raise ValueError("请求体解压后过大")
+    return decoded
+
+
+class GzipFileCache:
+    """静态文件的压缩结果缓存（内存 LRU），文件的修改时间或大小变化后重新压缩"""
+
+    def __init__(self, max_bytes: int = GZIP_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[int, int, bytes]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, path: Path, stat: Optional[os.stat_result] = None) -> Optional[bytes]:
+        """获取文件的 gzip 内容
+
+        Args:
+            path: 文件路径
+            stat: 调用方已获取的文件状态（用于与缓存比较）
+
+        Returns:
+            Optional[bytes]: 压缩后的内容，读取失败时返回 None
+        """
+        key = str(path)
+        try:
+            stat = stat or os.stat(path)
+        except OSError:
+            return None
+        stamp = (stat.st_mtime_ns, stat.st_size)
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[:2] == stamp:
+                self._entries.move_to_end(key)
+                return entry[2]
+
+        # 在锁外读取和压缩，大文件不会阻塞其他请求
+        try:
+            data = gzip_bytes(Path(path).read_bytes())
+        except OSError:
+            return None
+
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._size -= len(old[2])
+            if len(data) <= self.max_bytes:
+                self._entries[key] = (stamp[0], stamp[1], data)
+                self._size += len(data)
+                while self._size > self.max_bytes:
+                    _, (_, _, evicted) = self._entries.popitem(last=False)
+                    self._size -= len(evicted)
+        return data
+
+
+# 两种服务器引擎共用的静态文件压缩缓存
+static_gzip_cache = GzipFileCache()
@@ -4,6 +4,7 @@ Web 编辑器 API
 """
 
 import json
+import threading
 import urllib.parse
 from http.server import BaseHTTPRequestHandler
 from typing import Dict, Any, Optional
@@ -17,6 +18,7 @@ project_root = Path(__file__).parent.parent.parent.parent
 sys.path.insert(0, str(project_root))
 
 from src.core.campaign import CampaignService
+from src.core.config import MAX_REQUEST_BODY_SIZE
 from src.core.story_editor_service import StoryEditorService
 from src.core.file_manager import FileManagerService
 
@@ -28,47 +30,83 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
     _campaign_service = None
     _editor_service = None
     _file_manager_service = None
+    _preview_generator = None
+    _preview_scheduler = None
+    # 单例创建锁（可重入：创建服务时会获取预览调度器）
+    _init_lock = threading.RLock()
     
     @classmethod
     def get_services(cls):
-        """获取服务实例（单例模式）"""
-        if cls._campaign_service is None:
+        """获取服务实例（单例模式）
+        
+        服务不保存请求相关的状态，所有请求线程共享同一组实例；首次创建时加锁，
+        最后一个实例创建完成后才对其他线程可见
+        """
+        if cls._file_manager_service is None:
+            with cls._init_lock:
+                if cls._file_manager_service is None:
+                    cls._create_services()
+        return cls._campaign_service, cls._editor_service, cls._file_manager_service
+    
+    @classmethod
+    def _create_services(cls):
+        """创建服务实例（调用方持有 _init_lock）"""
+        try:
+            print("[DEBUG] 初始化服务实例...")
+            # 确保使用正确的工作目录
+            import os
+            from pathlib import Path
+            
+            # 保存当前工作目录
+            original_cwd = os.getcwd()
+            print(f"[DEBUG] 当前工作目录: {original_cwd}")
+            
             try:
-                print("[DEBUG] 初始化服务实例...")
-                # 确保使用正确的工作目录
-                import os
-                from pathlib import Path
+                # 切换到项目根目录
+                project_root = Path(__file__).parent.parent.parent.parent
+                print(f"[DEBUG] 项目根目录: {project_root}")
+                os.chdir(project_root)
                 
-                # 保存当前工作目录
-                original_cwd = os.getcwd()
-                print(f"[DEBUG] 当前工作目录: {original_cwd}")
+                # 创建服务实例
+                print("[DEBUG] 创建CampaignService...")
+                cls._campaign_service = CampaignService()
+                print("[DEBUG] 创建StoryEditorService...")
+                cls._editor_service = StoryEditorService(cls._campaign_service)
+                # 保存剧情后在后台重建预览
+                cls._editor_service.set_save_callback(cls.get_preview_scheduler().schedule)
+                print("[DEBUG] 创建FileManagerService...")
+                cls._file_manager_service = FileManagerService(cls._campaign_service)
+                print("[DEBUG] 服务实例创建完成")
                 
-                try:
-                    # 切换到项目根目录
-                    project_root = Path(__file__).parent.parent.parent.parent
-                    print(f"[DEBUG] 项目根目录: {project_root}")
-                    os.chdir(project_root)
-                    
-                    # 创建服务实例
-                    print("[DEBUG] 创建CampaignService...")
-                    cls._campaign_service = CampaignService()
-                    print("[DEBUG] 创建StoryEditorService...")
-                    cls._editor_service = StoryEditorService(cls._campaign_service)
-                    print("[DEBUG] 创建FileManagerService...")
-                    cls._file_manager_service = FileManagerService(cls._campaign_service)
-                    print("[DEBUG] 服务实例创建完成")
-                    
-                finally:
-                    # 恢复原始工作目录
-                    os.chdir(original_cwd)
-                    
-            except Exception as e:
-                print(f"[ERROR] 服务实例初始化失败: {e}")
-                import traceback
-                traceback.print_exc()
-                raise e
+            finally:
+                # 恢复原始工作目录
+                os.chdir(original_cwd)
                 
-        return cls._campaign_service, cls._editor_service, cls._file_manager_service
+        except Exception as e:
+            print(f"[ERROR] 服务实例初始化失败: {e}")
+            import traceback
+            traceback.print_exc()
+            raise e
+    
+    @classmethod
+    def get_preview_generator(cls):
+        """获取预览生成器实例（单例模式）"""
+        if cls._preview_generator is None:
+            with cls._init_lock:
+                if cls._preview_generator is None:
+                    from .preview_generator import PreviewGenerator
+                    cls._preview_generator = PreviewGenerator(project_root)
+        return cls._preview_generator
+    
+    @classmethod
+    def get_preview_scheduler(cls):
+        """获取预览重建调度器实例（单例模式）"""
+        if cls._preview_scheduler is None:
+            with cls._init_lock:
+                if cls._preview_scheduler is None:
+                    from .preview_scheduler import PreviewScheduler
+                    cls._preview_scheduler = PreviewScheduler(cls.get_preview_generator())
+        return cls._preview_scheduler
     
     def __init__(self, *args, **kwargs):
         # 获取共享的服务实例
@@ -121,8 +159,17 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
             url_parts = urllib.parse.urlparse(self.path)
             path = url_parts.path
             
-            # 读取请求体
-            content_length = int(self.headers.get('Content-Length', 0))
+            # 读取请求体（超长或长度无效的不读取）
+            try:
+                content_length = int(self.headers.get('Content-Length', 0))
+            except ValueError:
+                content_length = -1
+            if content_length < 0:
+                self._send_error(400, "Invalid Content-Length")
+                return
+            if content_length > MAX_REQUEST_BODY_SIZE:
+                self._send_error(413, "Request body too large")
+                return
             post_data = self.rfile.read(content_length)
             
             try:
@@ -239,16 +286,17 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
     
     def _send_json_response(self, data: Any, status_code: int = 200):
         """发送 JSON 响应"""
-        response_data = json.dumps(data, ensure_ascii=False, indent=2)
+        body = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
         
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
         
-        self.wfile.write(response_data.encode('utf-8'))
+        self.wfile.write(body)
     
     def _send_error(self, status_code: int, message: str):
         """发送错误响应"""
@@ -263,6 +311,7 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
         self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def _handle_list_characters(self, params: Dict[str, list]):
@@ -273,14 +322,14 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_error(404, "Campaign not found")
                 return
             
             # 获取人物卡文件列表
-            files = self.file_manager_service.list_files("characters")
+            files = self.file_manager_service.list_files(campaign, "characters")
             
             # 转换为 API 响应格式
             characters = []
@@ -308,14 +357,14 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_error(404, "Campaign not found")
                 return
             
             # 读取人物卡内容
-            content = self.file_manager_service.read_file_content("characters", character_name)
+            content = self.file_manager_service.read_file_content(campaign, "characters", character_name)
             if content is None:
                 self._send_error(404, "Character not found")
                 return
@@ -335,14 +384,14 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_error(404, "Campaign not found")
                 return
             
             # 获取怪物卡文件列表
-            files = self.file_manager_service.list_files("monsters")
+            files = self.file_manager_service.list_files(campaign, "monsters")
             
             # 转换为 API 响应格式
             monsters = []
@@ -370,14 +419,14 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_error(404, "Campaign not found")
                 return
             
             # 读取怪物卡内容
-            content = self.file_manager_service.read_file_content("monsters", monster_name)
+            content = self.file_manager_service.read_file_content(campaign, "monsters", monster_name)
             if content is None:
                 self._send_error(404, "Monster not found")
                 return
@@ -397,14 +446,14 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_error(404, "Campaign not found")
                 return
             
             # 获取地图文件列表
-            files = self.file_manager_service.list_files("maps")
+            files = self.file_manager_service.list_files(campaign, "maps")
             
             # 转换为 API 响应格式
             maps = []
@@ -432,20 +481,20 @@ class EditorAPIHandler(BaseHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = self.campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = self.campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_error(404, "Campaign not found")
                 return
             
             # 读取地图内容
-            content = self.file_manager_service.read_file_content("maps", map_name)
+            content = self.file_manager_service.read_file_content(campaign, "maps", map_name)
             if content is None:
                 self._send_error(404, "Map not found")
                 return
             
             # 获取文件信息
-            files = self.file_manager_service.list_files("maps")
+            files = self.file_manager_service.list_files(campaign, "maps")
             file_info = next((f for f in files if f.display_name == map_name), None)
             
             if file_info and file_info.file_type == "image":
@@ -0,0 +1,137 @@
+"""
+条件请求与范围请求
+ETag 的生成、If-None-Match / If-Modified-Since 的判断，以及 Range / If-Range 的解析，两种服务器引擎共用
+"""
+
+import datetime
+import email.utils
+import hashlib
+import os
+from typing import Optional, Tuple
+
+
+def version_etag(version: str) -> str:
+    """由资源版本号（修订号、文件修改时间和大小等）生成强 ETag"""
+    return f'"{version}"'
+
+
+def file_etag(stat: os.stat_result) -> str:
+    """文件的强 ETag（修改时间和大小）"""
+    return version_etag(f"{stat.st_mtime_ns:x}-{stat.st_size:x}")
+
+
+def content_etag(body: bytes) -> str:
+    """响应内容的强 ETag（内容哈希），用于没有版本号的资源"""
+    return version_etag(hashlib.sha1(body).hexdigest())
+
+
+def gzip_etag(etag: str) -> str:
+    """gzip 表示的 ETag（与未压缩表示区分）"""
+    return etag[:-1] + '-gz"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中（弱比较，同一内容的 gzip 和未压缩表示都算命中）"""
+    if not if_none_match:
+        return False
+    candidates = {etag, gzip_etag(etag)}
+    for tag in if_none_match.split(","):
+        tag = tag.strip()
+        if tag == "*":
+            return True
+        if tag.startswith("W/"):
+            tag = tag[2:]
+        if tag in candidates:
+            return True
+    return False
+
+
+def not_modified_since(if_modified_since: Optional[str], mtime: float) -> bool:
+    """If-Modified-Since 之后是否未修改（调用方需在有 If-None-Match 时忽略它）"""
+    if not if_modified_since:
+        return False
+    try:
+        since = email.utils.parsedate_to_datetime(if_modified_since)
+    except (TypeError, IndexError, OverflowError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=datetime.timezone.utc)
+    return int(mtime) <= since.timestamp()
+
+
+def is_not_modified(headers, etag: Optional[str], mtime: Optional[float] = None) -> bool:
+    """按请求头判断是否可以返回 304：有 If-None-Match 时只比较 ETag，否则比较 If-Modified-Since"""
+    if "If-None-Match" in headers:
+        return etag is not None and etag_matches(headers.get("If-None-Match"), etag)
+    if mtime is None:
+        return False
+    return not_modified_since(headers.get("If-Modified-Since"), mtime)
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """解析单段字节范围（bytes=起始-结束、bytes=起始-、bytes=-末尾长度）
+
+    Returns:
+        Optional[Tuple[int, int]]: (起始位置, 长度)；格式无效、不是 bytes 单位或有多段时返回 None（发送完整内容）
+
+    Raises:
+        ValueError: 范围无法满足（起始位置超出文件大小），应返回 416
+    """
+    if not range_header:
+        return None
+    unit, _, spec = range_header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, dash, last = spec.strip().partition("-")
+    if not dash or not (first or last) or not (first + last).isdigit():
+        return None
+    if first:
+        start = int(first)
+        end = int(last) if last else size - 1
+        if last and end < start:
+            return None
+    else:
+        # 末尾 N 个字节
+        start, end = max(0, size - int(last)), size - 1
+        if int(last) == 0:
+            raise ValueError("范围无法满足")
+    if start >= size:
+        raise ValueError("范围无法满足")
+    end = min(end, size - 1)
+    return start, end - start + 1
+
+
+def if_range_matches(if_range: Optional[str], etag: str, mtime: float) -> bool:
+    """If-Range 是否仍指向当前内容（ETag 强比较或与 Last-Modified 相同），没有 If-Range 时为 True"""
+    if not if_range:
+        return True
+    if_range = if_range.strip()
+    if if_range.startswith(('"', 'W/')):
+        return if_range == etag
+    try:
+        since = email.utils.parsedate_to_datetime(if_range)
+    except (TypeError, IndexError, OverflowError, ValueError):
+        return False
+    if since.tzinfo is None:
+        since = since.replace(tzinfo=datetime.timezone.utc)
+    return int(mtime) == since.timestamp()
+
+
+def requested_range(headers, etag: str, mtime: float, size: int) -> Optional[Tuple[int, int]]:
+    """按请求头确定要发送的字节范围：If-Range 不匹配时忽略 Range，发送完整内容
+
+    Returns:
+        Optional[Tuple[int, int]]: (起始位置, 长度)，发送完整内容时返回 None
+
+    Raises:
+        ValueError: 范围无法满足，应返回 416
+    """
+    range_header = headers.get("Range")
+    if not range_header or not if_range_matches(headers.get("If-Range"), etag, mtime):
+        return None
+    return parse_range(range_header, size)
+
+
+def content_range(start: int, length: int, size: int) -> str:
+    """206 响应的 Content-Range"""
+    return f"bytes {start}-{start + length - 1}/{size}"
@@ -0,0 +1,263 @@
+"""
+HTTP 服务引擎
+固定数量的工作线程处理请求：新连接先由等待线程用 selector 监视，客户端发来数据后才交给工作线程，
+打开后迟迟不发送请求的连接不会占用工作线程；等待工作线程的连接超过队列上限时直接返回 503；
+读取请求时有超时，慢速客户端最多占用一个工作线程 read_timeout 秒。
+长连接处理完一个请求后回到等待线程，空闲的长连接同样不占用工作线程
+"""
+
+import json
+import queue
+import selectors
+import socket
+import threading
+import time
+from http.server import HTTPServer
+from typing import Any, Dict, List, Tuple
+
+from src.core.config import (
+    HTTP_IDLE_TIMEOUT, HTTP_KEEPALIVE_MAX_REQUESTS, HTTP_KEEPALIVE_TIMEOUT, HTTP_MAX_QUEUE,
+    HTTP_READ_TIMEOUT, HTTP_WORKERS
+)
+
+# 等待线程检查空闲连接的间隔（秒）
+_IDLE_CHECK_INTERVAL = 0.5
+
+
+def _busy_response() -> bytes:
+    body = json.dumps({"error": "服务器繁忙，请稍后重试", "status": 503}, ensure_ascii=False).encode("utf-8")
+    head = (
+        "HTTP/1.1 503 Service Unavailable\r\n"
+        "Content-Type: application/json; charset=utf-8\r\n"
+        "Retry-After: 1\r\n"
+        "Connection: close\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n"
+    )
+    return head.encode("ascii") + body
+
+
+class PooledHTTPServer(HTTPServer):
+    """工作线程数和排队数都有上限的 HTTP 服务器
+
+    工作线程同时处理的请求数固定为 workers（预览状态的长轮询也占用一个工作线程），
+    连接的流转：接受连接的线程（serve_forever）→ 等待线程（可读前）→ 请求队列 → 工作线程，
+    处理器保持的长连接由工作线程交回等待线程（处理器的 handle 需要在没有下一个请求时返回）
+    """
+
+    def __init__(self, server_address, handler_class, workers: int = HTTP_WORKERS,
+                 max_queue: int = HTTP_MAX_QUEUE, read_timeout: float = HTTP_READ_TIMEOUT,
+                 idle_timeout: float = HTTP_IDLE_TIMEOUT,
+                 keepalive_timeout: float = HTTP_KEEPALIVE_TIMEOUT,
+                 keepalive_max_requests: int = HTTP_KEEPALIVE_MAX_REQUESTS,
+                 bind_and_activate: bool = True):
+        """
+        Args:
+            server_address: 监听地址
+            handler_class: 请求处理器类
+            workers: 工作线程数
+            max_queue: 等待工作线程的最大连接数，超出时返回 503
+            read_timeout: 读取请求（请求行、头部和正文）时每次读取的超时秒数
+            idle_timeout: 连接建立后等待客户端发送请求的最长秒数
+            keepalive_timeout: 长连接两次请求之间的最长空闲秒数
+            keepalive_max_requests: 单个连接最多处理的请求数
+        """
+        self.workers = max(1, workers)
+        self.max_queue = max(1, max_queue)
+        self.read_timeout = read_timeout
+        self.idle_timeout = idle_timeout
+        self.keepalive_timeout = keepalive_timeout
+        self.keepalive_max_requests = max(1, keepalive_max_requests)
+        self._requests: "queue.Queue" = queue.Queue(maxsize=self.max_queue)
+        # 等待交给等待线程的连接：(连接, 客户端地址, 已处理的请求数)
+        self._incoming: List[Tuple[socket.socket, Any, int]] = []
+        # 工作线程正在处理的连接已处理的请求数
+        self._served: Dict[socket.socket, int] = {}
+        self._incoming_lock = threading.Lock()
+        self._selector = selectors.DefaultSelector()
+        self._wakeup_reader, self._wakeup_writer = socket.socketpair()
+        self._wakeup_reader.setblocking(False)
+        self._selector.register(self._wakeup_reader, selectors.EVENT_READ)
+        self._closed = False
+        self._stats_lock = threading.Lock()
+        self._busy_workers = 0
+        self._rejected = 0
+        self._timed_out = 0
+        self._reused = 0
+        self._idle = 0
+
+        super().__init__(server_address, handler_class, bind_and_activate)
+
+        self._threads = [threading.Thread(target=self._watch_connections, name="http-idle", daemon=True)]
+        self._threads += [threading.Thread(target=self._work, name=f"http-worker-{i}", daemon=True)
+                          for i in range(self.workers)]
+        for thread in self._threads:
+            thread.start()
+
+    # ---- 接受连接（serve_forever 所在线程）----
+
+    def process_request(self, request, client_address):
+        """新连接交给等待线程，不在接受连接的线程中读取"""
+        self._watch(request, client_address, 0)
+
+    def _watch(self, request, client_address, served: int):
+        with self._incoming_lock:
+            if self._closed:
+                self.shutdown_request(request)
+                return
+            self._incoming.append((request, client_address, served))
+        self._wakeup()
+
+    def _wakeup(self):
+        try:
+            self._wakeup_writer.send(b"\0")
+        except OSError:
+            pass  # 缓冲区已满时等待线程本来就会被唤醒
+
+    # ---- 等待线程 ----
+
+    def _watch_connections(self):
+        """监视尚未发送请求的连接：可读时放入请求队列，
+        超过 idle_timeout（新连接）或 keepalive_timeout（长连接）仍无数据则关闭"""
+        deadlines: Dict[socket.socket, float] = {}
+        while not self._closed:
+            with self._incoming_lock:
+                incoming, self._incoming = self._incoming, []
+            now = time.monotonic()
+            for request, client_address, served in incoming:
+                try:
+                    self._selector.register(request, selectors.EVENT_READ, (client_address, served))
+                    timeout = self.idle_timeout if served == 0 else self.keepalive_timeout
+                    deadlines[request] = now + timeout
+                except (ValueError, OSError):
+                    self.shutdown_request(request)
+
+            try:
+                events = self._selector.select(_IDLE_CHECK_INTERVAL)
+            except OSError:
+                break
+            for key, _ in events:
+                if key.fileobj is self._wakeup_reader:
+                    try:
+                        while self._wakeup_reader.recv(4096):
+                            pass
+                    except OSError:
+                        pass
+                    continue
+                self._selector.unregister(key.fileobj)
+                deadlines.pop(key.fileobj, None)
+                client_address, served = key.data
+                self._dispatch(key.fileobj, client_address, served)
+
+            now = time.monotonic()
+            for request in [request for request, deadline in deadlines.items() if deadline <= now]:
+                del deadlines[request]
+                served = self._selector.unregister(request).data[1]
+                if served == 0:
+                    with self._stats_lock:
+                        self._timed_out += 1
+                self.shutdown_request(request)
+            with self._stats_lock:
+                self._idle = len(deadlines)
+
+        for request in deadlines:
+            self.shutdown_request(request)
+
+    def _dispatch(self, request, client_address, served: int):
+        """放入请求队列，队列已满时返回 503"""
+        try:
+            self._requests.put_nowait((request, client_address, served))
+        except queue.Full:
+            with self._stats_lock:
+                self._rejected += 1
+            self._reject(request)
+
+    def _reject(self, request):
+        try:
+            request.settimeout(1.0)
+            request.sendall(_busy_response())
+        except OSError:
+            pass
+        self.shutdown_request(request)
+
+    # ---- 工作线程 ----
+
+    def finish_request(self, request, client_address):
+        """处理请求并返回处理器（工作线程据此判断连接能否复用）"""
+        return self.RequestHandlerClass(request, client_address, self)
+
+    def keep_alive_allowed(self, request) -> bool:
+        """连接在当前请求之后能否继续复用（处理器在发送响应头时调用）"""
+        return self._served.get(request, 0) + 1 < self.keepalive_max_requests
+
+    def _work(self):
+        while True:
+            try:
+                request, client_address, served = self._requests.get(timeout=_IDLE_CHECK_INTERVAL)
+            except queue.Empty:
+                if self._closed:
+                    return
+                continue
+            with self._stats_lock:
+                self._busy_workers += 1
+                if served:
+                    self._reused += 1
+            self._served[request] = served
+            keep_alive = False
+            try:
+                # 慢速客户端：每次读取最多等待 read_timeout 秒，超时后处理器关闭连接
+                request.settimeout(self.read_timeout)
+                handler = self.finish_request(request, client_address)
+                keep_alive = (not getattr(handler, "close_connection", True)
+                              and served + 1 < self.keepalive_max_requests)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                del self._served[request]
+                if keep_alive:
+                    self._watch(request, client_address, served + 1)
+                else:
+                    self.shutdown_request(request)
+                with self._stats_lock:
+                    self._busy_workers -= 1
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取运行状态
+
+        Returns:
+            Dict: workers（工作线程数）、busy（处理中）、queued（排队中）、idle（等待请求的连接数）、
+                  rejected（因排队已满返回 503 的次数）、timed_out（新连接空闲超时关闭的次数）、
+                  reused（长连接复用处理的请求数）
+        """
+        with self._stats_lock:
+            return {
+                "workers": self.workers,
+                "busy": self._busy_workers,
+                "queued": self._requests.qsize(),
+                "idle": self._idle,
+                "rejected": self._rejected,
+                "timed_out": self._timed_out,
+                "reused": self._reused,
+            }
+
+    def server_close(self):
+        """停止接受新连接，关闭等待中的连接并通知工作线程退出（处理中的请求会继续完成）"""
+        super().server_close()
+        with self._incoming_lock:
+            self._closed = True
+            incoming, self._incoming = self._incoming, []
+        for request, _, _ in incoming:
+            self.shutdown_request(request)
+        self._wakeup()
+        self._threads[0].join(timeout=2 * _IDLE_CHECK_INTERVAL)
+
+        # 已排队但尚未处理的连接直接关闭，空闲的工作线程随后自行退出
+        while True:
+            try:
+                request, _, _ = self._requests.get_nowait()
+            except queue.Empty:
+                break
+            self.shutdown_request(request)
+
+        self._selector.close()
+        self._wakeup_reader.close()
+        self._wakeup_writer.close()
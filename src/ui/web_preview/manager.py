@@ -116,18 +116,16 @@ class WebPreviewManager:
         """
         # 构建文件路径
         story_dir = self.project_root / "data" / "campaigns" / campaign_name / "notes"
-        json_path = story_dir / f"{story_name}.json"
-        svg_path = story_dir / f"{story_name}.svg"
         
-        # 检查 JSON 文件
-        if not json_path.exists():
+        # 检查 JSON 文件（.json 或 .json.gz）
+        from src.core.story_storage import find_story_file
+        if not find_story_file(story_dir, story_name):
             return False
         
-        # 如果 SVG 文件不存在，尝试生成
-        if not svg_path.exists():
-            from .preview_generator import PreviewGenerator
-            generator = PreviewGenerator(self.project_root)
-            generator.generate_preview_for_story(campaign_name, story_name)
+        # SVG 不存在或剧情已修改时重新生成（预览清单未变化时直接跳过）
+        from .preview_generator import PreviewGenerator
+        generator = PreviewGenerator(self.project_root)
+        generator.generate_preview_for_story(campaign_name, story_name)
         
         return True
     
@@ -4,121 +4,342 @@
 与核心逻辑层交互，但不直接暴露给 UI 层
 """
 
-import subprocess
-import sys
+import math
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from dataclasses import dataclass
 from pathlib import Path
-from typing import Optional, List, Tuple
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.core.config import GRAPHVIZ_MAX_QUEUE, GRAPHVIZ_MAX_WORKERS, PREVIEW_RENDERER
+from src.core.graphviz_runner import find_dot_executable, run_dot, run_dot_batch
+from src.core.story_parser import StoryGraphService
+from src.core.story_storage import find_story_file, list_story_files, story_name_from_path
+from src.core.story_svg import render_svg
+from src.core.svg_optimize import optimize_svg
+
+from .preview_manifest import PreviewManifest, preview_input_hash
+
+
+@dataclass
+class PreviewResult:
+    """单个剧情的预览生成结果"""
+    campaign: str
+    story: str
+    status: str  # skipped（已是最新）、generated（已重新生成）或 failed（生成失败）
+    elapsed: float = 0.0
+    error: str = ""
+
+
+# 每批交给同一个工作进程（graphviz 渲染器下为同一个 dot 进程）处理的剧情数
+PREVIEW_BATCH_SIZE = 16
+
+# 工作进程内复用的生成器，键为 (项目根目录, 渲染器)
+_worker_generators: Dict[Tuple[str, str], "PreviewGenerator"] = {}
+
+
+def _build_preview_job(project_root: str, renderer: str, json_paths: List[str],
+                       dot_executable: Optional[str]) -> List[Tuple[bool, str, float]]:
+    """工作进程入口：生成一批剧情的预览"""
+    key = (project_root, renderer)
+    generator = _worker_generators.get(key)
+    if generator is None:
+        generator = _worker_generators[key] = PreviewGenerator(Path(project_root), renderer)
+    return generator._build_batch([Path(json_path) for json_path in json_paths], dot_executable)
 
 
 class PreviewGenerator:
     """预览文件生成器"""
     
-    def __init__(self, project_root: Optional[Path] = None):
+    def __init__(self, project_root: Optional[Path] = None, renderer: str = PREVIEW_RENDERER):
         """
         初始化生成器
         
         Args:
             project_root: 项目根目录
+            renderer: 渲染器，builtin（内置布局，进程内生成）或 graphviz（调用 dot）
         """
         if project_root is None:
             project_root = Path(__file__).parent.parent.parent.parent
         
         self.project_root = project_root
         self.tools_dir = project_root / "tools"
+        self.renderer = renderer
+        self.story_service = StoryGraphService()
+    
+    def _get_story_dir(self, campaign_name: str) -> Path:
+        """获取跑团的剧情目录"""
+        return self.project_root / "data" / "campaigns" / campaign_name / "notes"
     
-    def generate_preview_for_story(self, campaign_name: str, story_name: str) -> bool:
+    def generate_preview_for_story(self, campaign_name: str, story_name: str, force: bool = False) -> bool:
         """
-        为指定剧情生成预览文件
+        为指定剧情生成预览文件，预览清单显示输入未变化时直接跳过
         
         Args:
             campaign_name: 跑团名称
             story_name: 剧情名称
+            force: 是否忽略清单强制重新生成
+        
+        Returns:
+            bool: 预览是否可用（已是最新或生成成功）
+        """
+        result = self.generate_previews([(campaign_name, story_name)], jobs=1, force=force)[0]
+        return result.status != "failed"
+    
+    def generate_previews(self, stories: Optional[List[Tuple[str, str]]] = None,
+                          jobs: Optional[int] = None, force: bool = False,
+                          batch_size: int = PREVIEW_BATCH_SIZE) -> List[PreviewResult]:
+        """
+        批量生成预览：先按预览清单筛出需要重新生成的剧情，再并行生成
+        
+        Args:
+            stories: (跑团名, 剧情名) 列表，未提供时处理所有剧情
+            jobs: 并行进程数，默认为 CPU 核数；为 1 时在当前进程内依次生成
+            force: 是否忽略清单全部重新生成
+            batch_size: 每批剧情数，graphviz 渲染器下同一批共用一个 dot 进程
+        
+        Returns:
+            List[PreviewResult]: 与 stories 顺序一致的生成结果
+        """
+        if stories is None:
+            stories = self.list_available_stories()
+        
+        results: List[Optional[PreviewResult]] = [None] * len(stories)
+        manifests: Dict[str, PreviewManifest] = {}
+        pending = []  # (结果下标, 剧情文件, 输入哈希)
+        
+        for i, (campaign_name, story_name) in enumerate(stories):
+            story_dir = self._get_story_dir(campaign_name)
+            json_path = find_story_file(story_dir, story_name)
+            if not json_path:
+                results[i] = PreviewResult(campaign_name, story_name, "failed", error="剧情文件不存在")
+                continue
             
+            # 每个目录只读写一次清单
+            manifest = manifests.get(campaign_name)
+            if manifest is None:
+                manifest = manifests[campaign_name] = PreviewManifest(story_dir)
+            try:
+                input_hash = preview_input_hash(json_path, self.renderer)
+            except OSError as e:
+                results[i] = PreviewResult(campaign_name, story_name, "failed", error=str(e))
+                continue
+            
+            if not force and manifest.is_fresh(story_name, input_hash):
+                results[i] = PreviewResult(campaign_name, story_name, "skipped")
+            else:
+                pending.append((i, json_path, input_hash))
+        
+        builds = self._run_builds([json_path for _, json_path, _ in pending], jobs, batch_size)
+        for (i, json_path, input_hash), (success, error, elapsed) in zip(pending, builds):
+            campaign_name, story_name = stories[i]
+            if success:
+                manifests[campaign_name].record(story_name, input_hash, self.renderer,
+                                                [json_path.parent / f"{story_name}.svg"])
+                results[i] = PreviewResult(campaign_name, story_name, "generated", elapsed)
+            else:
+                results[i] = PreviewResult(campaign_name, story_name, "failed", elapsed, error)
+        
+        for manifest in manifests.values():
+            self._save_manifest(manifest)
+        
+        return results
+    
+    def _run_builds(self, json_paths: List[Path], jobs: Optional[int] = None,
+                    batch_size: int = PREVIEW_BATCH_SIZE) -> List[Tuple[bool, str, float]]:
+        """
+        分批生成一组剧情的预览，并行数大于 1 时并行生成
+        
+        builtin 渲染器的布局是纯 Python 计算，使用进程池；graphviz 渲染器的耗时在 dot 子进程中，
+        改用线程池，各线程共用进程内的 Graphviz 转换池，同时运行的 dot 进程总数不超过 GRAPHVIZ_MAX_WORKERS
+        
+        Args:
+            json_paths: 剧情文件路径列表
+            jobs: 并行数
+            batch_size: 每批最多包含的剧情数
+        
         Returns:
-            bool: 生成是否成功
+            List[Tuple[bool, str, float]]: 每个剧情的 (是否成功, 错误信息, 耗时秒数)
         """
-        story_dir = self.project_root / "data" / "campaigns" / campaign_name / "notes"
-        json_path = story_dir / f"{story_name}.json"
+        if not json_paths:
+            return []
+        
+        # dot 路径只在主进程探测一次，再传给各工作进程
+        dot_executable = find_dot_executable() if self.renderer == "graphviz" else None
+        jobs = min(jobs or os.cpu_count() or 1, len(json_paths))
+        # 剧情较少时缩小批次，保证每个进程都分到任务
+        size = max(1, min(batch_size, math.ceil(len(json_paths) / jobs)))
+        batches = [json_paths[i:i + size] for i in range(0, len(json_paths), size)]
+        
+        results = []
+        if jobs <= 1:
+            for batch in batches:
+                results.extend(self._build_batch(batch, dot_executable))
+            return results
         
-        if not json_path.exists():
-            return False
+        if self.renderer == "graphviz":
+            # 等待 dot 的线程不超过转换池的并发数与排队长度之和，避免任务因队列已满被拒绝
+            with ThreadPoolExecutor(max_workers=min(jobs, GRAPHVIZ_MAX_WORKERS + GRAPHVIZ_MAX_QUEUE),
+                                    thread_name_prefix="preview") as pool:
+                futures = [pool.submit(self._build_batch, batch, dot_executable) for batch in batches]
+                return self._collect_builds(batches, futures)
         
-        # 生成 DOT 文件
-        dot_success = self._generate_dot_file(json_path)
-        if not dot_success:
-            return False
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(_build_preview_job, str(self.project_root), self.renderer,
+                            [str(json_path) for json_path in batch], dot_executable)
+                for batch in batches
+            ]
+            return self._collect_builds(batches, futures)
+    
+    @staticmethod
+    def _collect_builds(batches: List[List[Path]], futures: List[Future]) -> List[Tuple[bool, str, float]]:
+        """按批次顺序收集生成结果，工作进程或线程异常时整批记为失败"""
+        results = []
+        for batch, future in zip(batches, futures):
+            try:
+                results.extend(future.result())
+            except Exception as e:
+                results.extend((False, f"工作进程异常: {e}", 0.0) for _ in batch)
+        return results
+    
+    def _build_batch(self, json_paths: List[Path], dot_executable: Optional[str] = None) -> List[Tuple[bool, str, float]]:
+        """
+        生成一批剧情的预览
+        
+        graphviz 渲染器下先在进程内生成全部 DOT 内容，再交给同一个 dot 进程转换；
+        批量转换失败（例如其中某个图有错误）时逐个转换，以便定位出错的剧情
+        
+        Args:
+            json_paths: 剧情文件路径列表
+            dot_executable: dot 可执行文件路径
+        
+        Returns:
+            List[Tuple[bool, str, float]]: 每个剧情的 (是否成功, 错误信息, 耗时秒数)
+        """
+        if self.renderer == "builtin" or len(json_paths) == 1:
+            return [self._timed_build(json_path, dot_executable) for json_path in json_paths]
+        
+        results: List[Optional[Tuple[bool, str, float]]] = [None] * len(json_paths)
+        converting = []  # (下标, DOT内容, 生成DOT的耗时)
+        for i, json_path in enumerate(json_paths):
+            start = time.perf_counter()
+            try:
+                story, _ = self.story_service.parse_preview_story(json_path)
+                if story is None:
+                    results[i] = (False, "无法解析剧情文件", time.perf_counter() - start)
+                    continue
+                converting.append((i, self.story_service.generate_dot_content(story), time.perf_counter() - start))
+            except Exception as e:
+                results[i] = (False, str(e), time.perf_counter() - start)
+        
+        if converting:
+            start = time.perf_counter()
+            outputs, _ = run_dot_batch([content for _, content, _ in converting], "svg", dot_executable)
+            # dot 的耗时平摊到同批各剧情
+            share = (time.perf_counter() - start) / len(converting)
+            if outputs is None:
+                for i, _, _ in converting:
+                    results[i] = self._timed_build(json_paths[i], dot_executable)
+            else:
+                for (i, _, elapsed), svg_content in zip(converting, outputs):
+                    svg_path = json_paths[i].parent / f"{story_name_from_path(json_paths[i])}.svg"
+                    try:
+                        svg_path.write_bytes(optimize_svg(svg_content))
+                        results[i] = (True, "", elapsed + share)
+                    except OSError as e:
+                        results[i] = (False, str(e), elapsed + share)
+        return results
+    
+    def _timed_build(self, json_path: Path, dot_executable: Optional[str] = None) -> Tuple[bool, str, float]:
+        """生成单个剧情的预览并计时"""
+        start = time.perf_counter()
+        success, error = self._build_preview(json_path, dot_executable)
+        return success, error, time.perf_counter() - start
+    
+    def _save_manifest(self, manifest: PreviewManifest):
+        """保存预览清单，失败时只影响下次是否跳过"""
+        try:
+            manifest.save()
+        except OSError as e:
+            print(f"保存预览清单失败: {e}")
+    
+    def _build_preview(self, json_path: Path, dot_executable: Optional[str] = None) -> Tuple[bool, str]:
+        """
+        使用当前渲染器生成预览文件
         
-        # 生成 SVG 文件
-        dot_path = json_path.with_suffix('.dot')
-        svg_success = self._generate_svg_file(dot_path)
+        Args:
+            json_path: 剧情文件路径
+            dot_executable: dot 可执行文件路径（graphviz 渲染器使用）
         
-        return svg_success
+        Returns:
+            Tuple[bool, str]: (是否成功, 错误信息)
+        """
+        if self.renderer == "builtin":
+            return self._generate_builtin_svg(json_path)
+        return self._generate_graphviz_svg(json_path, dot_executable)
     
-    def _generate_dot_file(self, json_path: Path) -> bool:
+    def _generate_builtin_svg(self, json_path: Path) -> Tuple[bool, str]:
         """
-        生成 DOT 文件
+        使用内置分层布局在进程内直接生成 SVG 文件
+        
+        上一次的布局保存在 <剧情名>.layout 中：剧情未变化时直接复用，
+        有修改时在旧布局基础上增量调整，使节点位置保持稳定。
+        超大剧情只渲染概览图（不缓存布局）。
+        是否需要重新生成由预览清单判断，这里总是写出 SVG
         
         Args:
             json_path: JSON 文件路径
-            
+        
         Returns:
-            bool: 生成是否成功
+            Tuple[bool, str]: (是否成功, 错误信息)
         """
         try:
-            dot_path = json_path.with_suffix('.dot')
-            
-            # 调用 json_to_dot.py 工具
-            cmd = [
-                sys.executable,
-                str(self.tools_dir / "json_to_dot.py"),
-                str(json_path),
-                str(dot_path)
-            ]
+            svg_path = json_path.parent / f"{story_name_from_path(json_path)}.svg"
             
-            result = subprocess.run(
-                cmd,
-                cwd=self.project_root,
-                capture_output=True,
-                text=True
-            )
-            
-            return result.returncode == 0 and dot_path.exists()
-            
-        except Exception:
-            return False
+            story, overview = self.story_service.parse_preview_story(json_path)
+            if story is None:
+                return False, "无法解析剧情文件"
+            if overview:
+                layout = self.story_service.compute_layout(story)
+            else:
+                layout, _ = self.story_service.get_cached_layout(json_path)
+            if layout is None:
+                return False, "无法解析剧情文件"
+            svg_path.write_bytes(optimize_svg(render_svg(layout)))
+            return True, ""
+        
+        except Exception as e:
+            return False, str(e)
     
-    def _generate_svg_file(self, dot_path: Path) -> bool:
+    def _generate_graphviz_svg(self, json_path: Path, dot_executable: Optional[str] = None) -> Tuple[bool, str]:
         """
-        生成 SVG 文件
+        在进程内生成 DOT 内容，通过标准输入交给 dot 转换为 SVG（不写临时 .dot 文件），
+        超大剧情只转换概览图
         
         Args:
-            dot_path: DOT 文件路径
-            
+            json_path: JSON 文件路径
+            dot_executable: dot 可执行文件路径，未提供时使用缓存的查找结果
+        
         Returns:
-            bool: 生成是否成功
+            Tuple[bool, str]: (是否成功, 错误信息)
         """
         try:
-            svg_path = dot_path.with_suffix('.svg')
-            
-            # 调用 dot_to_svg.py 工具
-            cmd = [
-                sys.executable,
-                str(self.tools_dir / "dot_to_svg.py"),
-                str(dot_path),
-                str(svg_path)
-            ]
-            
-            result = subprocess.run(
-                cmd,
-                cwd=self.project_root,
-                capture_output=True,
-                text=True
-            )
+            svg_path = json_path.parent / f"{story_name_from_path(json_path)}.svg"
             
-            return result.returncode == 0 and svg_path.exists()
+            story, _ = self.story_service.parse_preview_story(json_path)
+            if story is None:
+                return False, "无法解析剧情文件"
             
-        except Exception:
-            return False
+            svg_content, error = run_dot(self.story_service.generate_dot_content(story), "svg", dot_executable)
+            if svg_content is None:
+                return False, error
+            svg_path.write_bytes(optimize_svg(svg_content))
+            return True, ""
+        
+        except Exception as e:
+            return False, str(e)
     
     def check_preview_files_exist(self, campaign_name: str, story_name: str) -> Tuple[bool, bool]:
         """
@@ -127,16 +348,60 @@ class PreviewGenerator:
         Args:
             campaign_name: 跑团名称
             story_name: 剧情名称
-            
+        
         Returns:
             Tuple[bool, bool]: (DOT文件存在, SVG文件存在)
         """
-        story_dir = self.project_root / "data" / "campaigns" / campaign_name / "notes"
+        story_dir = self._get_story_dir(campaign_name)
         dot_path = story_dir / f"{story_name}.dot"
         svg_path = story_dir / f"{story_name}.svg"
         
         return dot_path.exists(), svg_path.exists()
     
+    def get_preview_status(self, campaign_name: str, story_name: str) -> Optional[Dict[str, Any]]:
+        """
+        获取剧情预览的状态（是否存在、是否过期）
+        
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+        
+        Returns:
+            Optional[Dict[str, Any]]: 预览状态，剧情不存在时返回 None
+        """
+        story_dir = self._get_story_dir(campaign_name)
+        json_path = find_story_file(story_dir, story_name)
+        if not json_path:
+            return None
+        return self._get_status(PreviewManifest(story_dir), json_path)
+    
+    def list_preview_status(self, campaign_name: str) -> List[Dict[str, Any]]:
+        """
+        获取跑团下所有剧情的预览状态
+        
+        Args:
+            campaign_name: 跑团名称
+        
+        Returns:
+            List[Dict[str, Any]]: 各剧情的预览状态
+        """
+        story_dir = self._get_story_dir(campaign_name)
+        manifest = PreviewManifest(story_dir)
+        return [self._get_status(manifest, json_path) for json_path in list_story_files(story_dir)]
+    
+    def _get_status(self, manifest: PreviewManifest, json_path: Path) -> Dict[str, Any]:
+        story_name = story_name_from_path(json_path)
+        entry = manifest.get(story_name) or {}
+        input_hash = preview_input_hash(json_path, self.renderer)
+        return {
+            "story": story_name,
+            "renderer": self.renderer,
+            "exists": (json_path.parent / f"{story_name}.svg").exists(),
+            "stale": not manifest.is_fresh(story_name, input_hash),
+            "input_hash": input_hash,
+            "generated_at": entry.get("generated_at"),
+        }
+    
     def list_available_stories(self) -> List[Tuple[str, str]]:
         """
         列出所有可用的剧情
@@ -154,27 +419,35 @@ class PreviewGenerator:
             if campaign_dir.is_dir():
                 notes_dir = campaign_dir / "notes"
                 if notes_dir.exists():
-                    for json_file in notes_dir.glob("*.json"):
-                        story_name = json_file.stem
+                    for json_file in list_story_files(notes_dir):
+                        story_name = story_name_from_path(json_file)
                         stories.append((campaign_dir.name, story_name))
         
         return sorted(stories)
     
-    def generate_all_missing_previews(self) -> Tuple[int, int]:
+    def generate_stale_previews(self, force: bool = False, jobs: Optional[int] = None) -> Dict[str, int]:
         """
-        为所有缺少预览文件的剧情生成预览
+        为所有缺少或已过期的剧情预览重新生成，未变化的剧情直接跳过
+        
+        Args:
+            force: 是否忽略清单全部重新生成
+            jobs: 并行进程数，默认为 CPU 核数
         
         Returns:
-            Tuple[int, int]: (成功数量, 总数量)
+            Dict[str, int]: total / generated / skipped / failed 计数
         """
-        stories = self.list_available_stories()
-        success_count = 0
-        
-        for campaign_name, story_name in stories:
-            dot_exists, svg_exists = self.check_preview_files_exist(campaign_name, story_name)
-            
-            if not svg_exists:  # 如果 SVG 不存在，尝试生成
-                if self.generate_preview_for_story(campaign_name, story_name):
-                    success_count += 1
+        summary = {"total": 0, "generated": 0, "skipped": 0, "failed": 0}
+        for result in self.generate_previews(jobs=jobs, force=force):
+            summary[result.status] += 1
+            summary["total"] += 1
+        return summary
+    
+    def generate_all_missing_previews(self) -> Tuple[int, int]:
+        """
+        为所有缺少或已过期预览的剧情生成预览
         
-        return success_count, len(stories)
\ No newline at end of file
+        Returns:
+            Tuple[int, int]: (重新生成的数量, 总数量)
+        """
+        summary = self.generate_stale_previews()
+        return summary["generated"], summary["total"]
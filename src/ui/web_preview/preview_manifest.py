@@ -0,0 +1,150 @@
+"""
+预览清单
+记录每个剧情预览产物对应的输入哈希（剧情内容 + 渲染器及其版本），
+只有输入变化时才需要重新生成 DOT / SVG
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows 使用 msvcrt 加锁
+    fcntl = None
+    import msvcrt
+
+from src.core.config import (
+    PREVIEW_MANIFEST_NAME, PREVIEW_RENDERER_VERSION,
+    STORY_GRAPH_COLORS, STORY_GRAPH_FONT, STORY_OVERVIEW_THRESHOLD
+)
+from src.core.story_layout import LAYOUT_VERSION
+from src.core.story_storage import story_revision
+
+MANIFEST_VERSION = 1
+
+# 每个清单文件的进程内锁
+_manifest_locks: Dict[str, threading.Lock] = {}
+_manifest_locks_guard = threading.Lock()
+
+
+@contextmanager
+def _manifest_lock(manifest_path: Path):
+    """独占清单文件：线程之间用进程内锁，进程之间（Web 服务与批量生成命令）用锁文件"""
+    with _manifest_locks_guard:
+        lock = _manifest_locks.setdefault(str(manifest_path), threading.Lock())
+    with lock, open(manifest_path.with_name(manifest_path.name + ".lock"), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def preview_input_hash(story_path: Path, renderer: str) -> str:
+    """计算预览输入哈希
+
+    包含剧情修订号、渲染器名称与版本、配色以及概览阈值，任一变化都会使预览过期
+
+    Args:
+        story_path: 剧情文件路径
+        renderer: 渲染器名称
+
+    Returns:
+        str: 输入哈希
+    """
+    inputs = {
+        "story": story_revision(story_path),
+        "renderer": renderer,
+        "renderer_version": PREVIEW_RENDERER_VERSION,
+        "layout_version": LAYOUT_VERSION if renderer == "builtin" else None,
+        "colors": STORY_GRAPH_COLORS,
+        "font": STORY_GRAPH_FONT,
+        "overview_threshold": STORY_OVERVIEW_THRESHOLD,
+    }
+    encoded = json.dumps(inputs, sort_keys=True, ensure_ascii=False).encode("utf-8")
+    return hashlib.sha1(encoded).hexdigest()
+
+
+class PreviewManifest:
+    """单个 notes 目录的预览清单
+
+    调度线程、打开预览和批量生成命令可能同时写同一份清单：record / remove 只记下本实例的修改，
+    save 时在锁内重新读取磁盘上的清单，合并修改后再替换，不会丢掉其他写入者的记录
+    """
+
+    def __init__(self, notes_dir: Path):
+        self.notes_dir = notes_dir
+        self.path = notes_dir / PREVIEW_MANIFEST_NAME
+        self._entries: Dict[str, Dict[str, Any]] = self._load()
+        # 未保存的修改：剧情名 -> 新记录，None 表示删除
+        self._changes: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    def _load(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                return {}
+            return dict(data.get("stories", {}))
+        except (OSError, ValueError, AttributeError):
+            return {}
+
+    def get(self, story_name: str) -> Optional[Dict[str, Any]]:
+        """获取剧情的清单记录"""
+        return self._entries.get(story_name)
+
+    def is_fresh(self, story_name: str, input_hash: str) -> bool:
+        """预览是否为最新：哈希一致且记录的产物都存在"""
+        entry = self._entries.get(story_name)
+        if not entry or entry.get("input_hash") != input_hash:
+            return False
+        return all((self.notes_dir / name).exists() for name in entry.get("artifacts", []))
+
+    def record(self, story_name: str, input_hash: str, renderer: str, artifacts: List[Path]):
+        """记录新生成的预览"""
+        entry = {
+            "input_hash": input_hash,
+            "renderer": renderer,
+            "artifacts": [path.name for path in artifacts],
+            "generated_at": datetime.datetime.now().isoformat(timespec="seconds"),
+        }
+        self._entries[story_name] = entry
+        self._changes[story_name] = entry
+
+    def remove(self, story_name: str):
+        """删除剧情的清单记录"""
+        if self._entries.pop(story_name, None) is not None:
+            self._changes[story_name] = None
+
+    def save(self):
+        """与磁盘上的清单合并后写回（先写临时文件再替换，避免中断时留下损坏的清单）"""
+        if not self._changes:
+            return
+        with _manifest_lock(self.path):
+            entries = self._load()
+            for story_name, entry in self._changes.items():
+                if entry is None:
+                    entries.pop(story_name, None)
+                else:
+                    entries[story_name] = entry
+            data = {"version": MANIFEST_VERSION, "stories": entries}
+            temp_path = self.path.with_name(self.path.name + ".tmp")
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+        self._entries = entries
+        self._changes = {}
@@ -0,0 +1,166 @@
+"""
+预览后台重建
+剧情保存后在后台重新生成预览：同一剧情在防抖间隔内的多次保存只触发一次重建，
+排队中被新保存取代的任务直接丢弃；预览页面可以长轮询等待新的 SVG
+"""
+
+import datetime
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from src.core.config import PREVIEW_REBUILD_DELAY
+
+from .preview_generator import PreviewGenerator
+
+# 重建状态：idle 未触发过，pending 等待防抖/排队，building 生成中，ready 已完成，failed 生成失败
+BUILD_STATES = ("idle", "pending", "building", "ready", "failed")
+
+# 未触发过重建的剧情的状态（只读，查询时不为其创建记录）
+_IDLE_JOB = {"state": "idle", "generation": 0, "version": 0, "error": "", "updated_at": None}
+
+
+class PreviewScheduler:
+    """预览重建调度器
+
+    所有重建在同一个后台线程中依次执行；每个剧情记录一个递增的 generation（每次保存加一），
+    任务开始前 generation 已变化说明被更新的保存取代，直接跳过。
+    每次重建完成 version 加一，长轮询以此判断是否有新的预览
+    """
+
+    def __init__(self, generator: PreviewGenerator, delay: float = PREVIEW_REBUILD_DELAY):
+        self.generator = generator
+        self.delay = delay
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._jobs: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._timers: Dict[Tuple[str, str], threading.Timer] = {}
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preview-rebuild")
+        # 状态变化的订阅者（参数为跑团名称、剧情名称、状态），用于事件流推送
+        self._listeners: List[Callable[[str, str, Dict[str, Any]], None]] = []
+
+    def add_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]):
+        """订阅重建状态变化，回调在调度器的线程中执行，不应阻塞"""
+        with self._lock:
+            self._listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[str, str, Dict[str, Any]], None]):
+        """取消订阅"""
+        with self._lock:
+            if listener in self._listeners:
+                self._listeners.remove(listener)
+
+    def _publish(self, key: Tuple[str, str], status: Dict[str, Any]):
+        """通知订阅者（在锁外调用，回调中可以再访问调度器）"""
+        with self._lock:
+            listeners = list(self._listeners)
+        for listener in listeners:
+            try:
+                listener(key[0], key[1], status)
+            except Exception as e:
+                print(f"预览状态通知失败: {e}")
+
+    def schedule(self, campaign_name: str, story_name: str):
+        """剧情已保存：在防抖间隔后重建预览（间隔内再次保存会重新计时）"""
+        key = (campaign_name, story_name)
+        with self._lock:
+            # 只有保存过的剧情才有记录，查询状态不会创建记录
+            job = self._jobs.get(key)
+            if job is None:
+                job = self._jobs[key] = dict(_IDLE_JOB)
+            job["generation"] += 1
+            if job["state"] != "building":
+                job["state"] = "pending"
+            timer = self._timers.pop(key, None)
+            if timer is not None:
+                timer.cancel()
+            timer = threading.Timer(self.delay, self._enqueue, (key, job["generation"]))
+            timer.daemon = True
+            self._timers[key] = timer
+            timer.start()
+            status = self._status(key)
+        self._publish(key, status)
+
+    def _enqueue(self, key: Tuple[str, str], generation: int):
+        with self._lock:
+            # 计时期间又有新的保存时，旧计时器可能已触发，由新的计时器负责
+            if key not in self._timers or self._jobs[key]["generation"] != generation:
+                return
+            del self._timers[key]
+        try:
+            self._executor.submit(self._build, key, generation)
+        except RuntimeError:
+            pass  # 已关闭
+
+    def _build(self, key: Tuple[str, str], generation: int):
+        with self._lock:
+            job = self._jobs[key]
+            if job["generation"] != generation:
+                return  # 排队期间又有新的保存，由新的任务重建
+            job["state"] = "building"
+            status = self._status(key)
+        self._publish(key, status)
+
+        try:
+            result = self.generator.generate_previews([key], jobs=1)[0]
+            failed, error = result.status == "failed", result.error
+        except Exception as e:
+            failed, error = True, str(e)
+
+        with self._changed:
+            job["version"] += 1
+            job["error"] = error if failed else ""
+            job["updated_at"] = datetime.datetime.now().isoformat(timespec="seconds")
+            if job["generation"] != generation:
+                job["state"] = "pending"
+            else:
+                job["state"] = "failed" if failed else "ready"
+            self._changed.notify_all()
+            status = self._status(key)
+        self._publish(key, status)
+
+    def _status(self, key: Tuple[str, str]) -> Dict[str, Any]:
+        job = self._jobs.get(key, _IDLE_JOB)
+        return {
+            "state": job["state"],
+            "version": job["version"],
+            "error": job["error"],
+            "updated_at": job["updated_at"],
+        }
+
+    def get_status(self, campaign_name: str, story_name: str) -> Dict[str, Any]:
+        """获取剧情预览的重建状态
+
+        只读查询：未保存过的剧情返回 idle，不会为其创建记录；剧情是否存在由调用方检查
+
+        Returns:
+            Dict: state（见 BUILD_STATES）、version（完成的重建次数）、error、updated_at
+        """
+        with self._lock:
+            return self._status((campaign_name, story_name))
+
+    def wait_for_update(self, campaign_name: str, story_name: str, since_version: int,
+                        timeout: Optional[float]) -> Dict[str, Any]:
+        """等待重建版本超过 since_version（长轮询），超时后返回当前状态
+
+        Args:
+            campaign_name: 跑团名称
+            story_name: 剧情名称
+            since_version: 客户端已知的版本
+            timeout: 最长等待秒数
+
+        Returns:
+            Dict: 与 get_status 相同
+        """
+        key = (campaign_name, story_name)
+        with self._changed:
+            self._changed.wait_for(lambda: self._jobs.get(key, _IDLE_JOB)["version"] > since_version, timeout)
+            return self._status(key)
+
+    def shutdown(self):
+        """取消等待中的重建并关闭后台线程（正在进行的重建会继续完成）"""
+        with self._lock:
+            for timer in self._timers.values():
+                timer.cancel()
+            self._timers.clear()
+        self._executor.shutdown(wait=False)
@@ -9,11 +9,14 @@ import threading
 import time
 import webbrowser
 import json
+import gzip
 import datetime
+import io
+import shutil
 from pathlib import Path
-from http.server import HTTPServer, SimpleHTTPRequestHandler
-from urllib.parse import urlencode, urlparse
-from typing import Optional, Callable
+from http.server import SimpleHTTPRequestHandler
+from urllib.parse import quote, unquote, urlencode, urlparse
+from typing import Optional, Callable, Union
 
 # 日志文件路径
 LOG_FILE = Path(__file__).parent.parent.parent.parent / "web_editor_debug.log"
@@ -30,27 +33,116 @@ def log_debug(message):
         print(f"[ERROR] 写入日志失败: {e}")
 
 from .editor_api import EditorAPIHandler
+from .async_engine import AsyncHTTPServer
+from .compression import (
+    accepts_gzip, decode_request_body, gzip_bytes, is_compressible, should_compress, static_gzip_cache
+)
+from .http_cache import (
+    content_etag, content_range, file_etag, gzip_etag, is_not_modified, requested_range, version_etag
+)
+from .http_engine import PooledHTTPServer
+from src.core.config import (
+    API_CACHE_CONTROL, HTTP_ENGINE, HTTP_MAX_QUEUE, HTTP_WORKERS, PREVIEW_STATUS_MAX_WAIT,
+    MAP_THUMBNAIL_WIDTHS, MAP_TILE_SIZE, MAX_REQUEST_BODY_SIZE, PREVIEW_RENDERER, PREVIEW_RENDERER_VERSION,
+    SITE_EXPORT_DIR, STATIC_CACHE_CONTROL, get_file_type
+)
+from src.core import map_images
+from src.core.story_layout import LAYOUT_VERSION
+
+# 由版本号生成 ETag 的 API：未修改时直接返回 304，不读取文件内容
+_STORY_API_PATHS = frozenset({
+    '/api/story', '/api/story/layout', '/api/story/overview', '/api/story/statistics',
+    '/api/story/chapters', '/api/story/chapter', '/api/story/chapter/statistics', '/api/story/node',
+})
+# 布局接口的结果还取决于布局算法和预览渲染器，版本号变化后旧 ETag 失效
+_LAYOUT_API_PATHS = frozenset({'/api/story/layout', '/api/story/overview'})
+_CATALOG_API_PATHS = {'/api/characters': 'characters', '/api/monsters': 'monsters', '/api/maps': 'maps'}
+_CARD_API_PATHS = {'/api/character': 'characters', '/api/monster': 'monsters', '/api/map': 'maps'}
 
 
 class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
-    """Web 预览请求处理器"""
+    """Web 预览请求处理器
+    
+    使用 HTTP/1.1 长连接，所有响应都带准确的 Content-Length
+    """
+    
+    protocol_version = "HTTP/1.1"
+    # 响应头和正文分两次写入，长连接上需要关闭 Nagle 算法，否则正文会等待客户端的延迟确认
+    disable_nagle_algorithm = True
+    # 当前请求的正文是否已读取
+    _body_read = False
+    # 当前 API 请求由资源版本号生成的 ETag
+    _api_etag = None
+    # 当前文件响应要发送的字节范围 (起始位置, 长度)，None 表示完整内容
+    _copy_range = None
+    # 地图和缩略图可能是 WebP（部分系统的 mimetypes 不认识）
+    extensions_map = {**SimpleHTTPRequestHandler.extensions_map, '.webp': 'image/webp'}
     
     def log_message(self, format, *args):
         """静默处理请求日志"""
         pass
     
+    def handle(self):
+        """处理客户端已发送的请求
+        
+        与 BaseHTTPRequestHandler 不同，长连接上没有待处理的数据时直接返回而不阻塞等待下一个请求：
+        连接交还给服务器引擎，由它在客户端发送下一个请求时再分配工作线程，空闲的长连接不占用工作线程
+        """
+        self.close_connection = True
+        self._body_read = False
+        self.handle_one_request()
+        while not self.close_connection and self._has_pending_request():
+            self._body_read = False
+            self.handle_one_request()
+    
+    def _has_pending_request(self) -> bool:
+        """连接上是否已经有下一个请求的数据（不阻塞）"""
+        timeout = self.request.gettimeout()
+        try:
+            self.request.settimeout(0)
+            return bool(self.rfile.peek(1))
+        except OSError:
+            return False
+        finally:
+            try:
+                self.request.settimeout(timeout)
+            except OSError:
+                pass
+    
+    def _has_unread_body(self) -> bool:
+        """请求正文是否还没有读取（剩余的数据会被当成下一个请求，这时不能复用连接）"""
+        if self.headers.get('Transfer-Encoding'):
+            return True
+        try:
+            content_length = int(self.headers.get('Content-Length', 0))
+        except ValueError:
+            return True
+        return content_length > 0 and not self._body_read
+    
+    def end_headers(self):
+        """确定连接是否复用：正文未读取或达到服务器的复用上限时通知客户端关闭"""
+        if not self.close_connection:
+            keep_alive_allowed = getattr(self.server, 'keep_alive_allowed', None)
+            if self._has_unread_body() or (keep_alive_allowed and not keep_alive_allowed(self.request)):
+                self.send_header('Connection', 'close')
+            elif self.request_version == 'HTTP/1.0':
+                # HTTP/1.0 客户端只有收到 keep-alive 才会复用连接
+                self.send_header('Connection', 'keep-alive')
+        super().end_headers()
+    
     def _send_error_response(self, status_code, message):
         """发送错误响应，避免中文编码问题"""
+        error_response = json.dumps({
+            "error": message,
+            "status": status_code
+        }, ensure_ascii=False, indent=2).encode('utf-8')
+        
         self.send_response(status_code)
         self.send_header('Content-Type', 'application/json; charset=utf-8')
         self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('Content-Length', str(len(error_response)))
         self.end_headers()
-        
-        error_response = json.dumps({
-            "error": message,
-            "status": status_code
-        }, ensure_ascii=False, indent=2)
-        self.wfile.write(error_response.encode('utf-8'))
+        self.wfile.write(error_response)
     
     def do_GET(self):
         """处理 GET 请求"""
@@ -67,8 +159,234 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
                 self._send_error_response(500, f"API请求处理失败: {str(e)}")
             return
         
+        # 导出的静态站点（build/site/跑团名/）
+        if urlparse(self.path).path.startswith('/site/'):
+            self._send_site_file()
+            return
+        
+        # 剧情文件可能以 .json.gz 存储，透明提供给静态预览页
+        if self._send_compressed_story_if_needed():
+            return
+        
         return super().do_GET()
     
+    def do_HEAD(self):
+        """处理 HEAD 请求（响应头与 GET 相同）"""
+        if urlparse(self.path).path.startswith('/site/'):
+            self._send_site_file()
+            return
+        return super().do_HEAD()
+    
+    def send_head(self):
+        """发送静态文件的响应头，目录和不存在的文件沿用默认实现"""
+        path = self.translate_path(self.path)
+        if path.endswith('/') or not os.path.isfile(path):
+            return super().send_head()
+        try:
+            return self._send_file_head(Path(path), STATIC_CACHE_CONTROL)
+        except OSError:
+            return super().send_head()
+    
+    def _send_file_head(self, file_path: Path, cache_control: str, vary: Optional[str] = None):
+        """发送文件的响应头
+        
+        带 ETag（修改时间和大小）和 Cache-Control，缓存仍有效时返回 304；
+        带 Range 时只发送请求的部分（206，无法满足时 416），If-Range 不匹配时发送完整内容；
+        类型可压缩且客户端接受 gzip 时发送缓存的压缩内容（范围请求总是按未压缩内容计算）
+        
+        Args:
+            file_path: 文件路径
+            cache_control: Cache-Control
+            vary: 按请求头协商内容时的 Vary（如缩略图格式按 Accept 选择）
+        
+        Returns:
+            打开的文件或压缩内容，由 copyfile 发送；已发送 304 / 416 时返回 None
+        
+        Raises:
+            OSError: 文件无法打开
+        """
+        self._copy_range = None
+        f = open(file_path, 'rb')
+        try:
+            stat = os.fstat(f.fileno())
+            etag = file_etag(stat)
+            if self._send_not_modified(etag, stat.st_mtime, cache_control):
+                f.close()
+                return None
+            
+            content_type = self.guess_type(str(file_path))
+            try:
+                byte_range = requested_range(self.headers, etag, stat.st_mtime, stat.st_size)
+            except ValueError:
+                f.close()
+                self.send_response(416)
+                self.send_header('Content-Range', f'bytes */{stat.st_size}')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return None
+            
+            body = None
+            if byte_range is None and should_compress(content_type, stat.st_size,
+                                                      self.headers.get('Accept-Encoding')):
+                body = static_gzip_cache.get(file_path, stat)
+            
+            self.send_response(206 if byte_range else 200)
+            self.send_header('Content-Type', content_type)
+            if body is not None:
+                f.close()
+                f = io.BytesIO(body)
+                etag = gzip_etag(etag)
+                self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Content-Length', str(len(body)))
+            else:
+                self.send_header('Accept-Ranges', 'bytes')
+                if byte_range:
+                    self._copy_range = byte_range
+                    self.send_header('Content-Range', content_range(*byte_range, stat.st_size))
+                    self.send_header('Content-Length', str(byte_range[1]))
+                else:
+                    self.send_header('Content-Length', str(stat.st_size))
+            vary = [vary] if vary else []
+            if is_compressible(content_type):
+                vary.append('Accept-Encoding')
+            if vary:
+                self.send_header('Vary', ', '.join(vary))
+            self.send_header('Last-Modified', self.date_time_string(stat.st_mtime))
+            self.send_header('ETag', etag)
+            self.send_header('Cache-Control', cache_control)
+            self.end_headers()
+            return f
+        except Exception:
+            f.close()
+            raise
+    
+    def copyfile(self, source, outputfile):
+        """发送文件内容
+        
+        磁盘文件用 socket.sendfile 发送（Linux 上为 os.sendfile，由内核直接从页缓存复制到套接字），
+        内存中的压缩内容和 asyncio 引擎的缓冲连接逐块复制；范围请求只发送请求的部分
+        """
+        offset, count = self._copy_range or (0, None)
+        self._copy_range = None
+        sendfile = getattr(self.request, 'sendfile', None)
+        try:
+            source.fileno()
+        except (AttributeError, OSError):
+            sendfile = None
+        if sendfile is not None:
+            outputfile.flush()
+            sendfile(source, offset, count)
+            return
+        
+        source.seek(offset)
+        if count is None:
+            shutil.copyfileobj(source, outputfile)
+            return
+        while count > 0:
+            chunk = source.read(min(count, 64 * 1024))
+            if not chunk:
+                break
+            outputfile.write(chunk)
+            count -= len(chunk)
+    
+    def _send_not_modified(self, etag: str, mtime: Optional[float] = None,
+                           cache_control: str = API_CACHE_CONTROL) -> bool:
+        """客户端缓存仍然有效（If-None-Match / If-Modified-Since）时发送 304
+        
+        Returns:
+            bool: 是否已发送 304
+        """
+        if not is_not_modified(self.headers, etag, mtime):
+            return False
+        self.send_response(304)
+        self.send_header('ETag', etag)
+        self.send_header('Cache-Control', cache_control)
+        self.end_headers()
+        return True
+    
+    def _send_site_file(self):
+        """提供静态站点导出的文件
+        
+        除入口 index.html 外的文件名都带内容哈希，可以永久缓存；index.html 每次都需要验证
+        """
+        relative = unquote(urlparse(self.path).path[len('/site/'):])
+        site_root = SITE_EXPORT_DIR.resolve()
+        file_path = (site_root / relative).resolve()
+        if file_path != site_root and site_root not in file_path.parents:
+            self._send_error_response(403, "禁止访问")
+            return
+        if file_path.is_dir():
+            # 页面中的相对路径以目录为基准，缺少结尾的 / 时先重定向
+            if not relative.endswith('/') and relative:
+                self.send_response(301)
+                self.send_header('Location', urlparse(self.path).path + '/')
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            file_path = file_path / 'index.html'
+        if not file_path.is_file() or file_path.name.startswith('.'):
+            self._send_error_response(404, "文件不存在")
+            return
+        
+        if file_path.name == 'index.html':
+            cache_control = 'no-cache'
+        else:
+            cache_control = 'public, max-age=31536000, immutable'
+        try:
+            f = self._send_file_head(file_path, cache_control)
+        except OSError as e:
+            self._send_error_response(500, f"读取站点文件失败: {str(e)}")
+            return
+        if f is None:
+            return
+        try:
+            if self.command != 'HEAD':
+                self.copyfile(f, self.wfile)
+        finally:
+            f.close()
+    
+    def _send_compressed_story_if_needed(self) -> bool:
+        """请求的 .json 不存在但存在 .json.gz 时，直接返回压缩剧情
+        
+        Returns:
+            bool: 是否已处理该请求
+        """
+        file_path = Path(self.translate_path(self.path))
+        if file_path.suffix != '.json' or file_path.exists():
+            return False
+        
+        gz_path = file_path.with_name(file_path.name + '.gz')
+        if not gz_path.is_file():
+            return False
+        
+        try:
+            with open(gz_path, 'rb') as f:
+                stat = os.fstat(f.fileno())
+                etag = file_etag(stat)
+                if self._send_not_modified(etag, stat.st_mtime, STATIC_CACHE_CONTROL):
+                    return True
+                body = f.read()
+            
+            # 浏览器支持 gzip 时直接发送压缩内容，否则在服务端解压
+            use_gzip = accepts_gzip(self.headers.get('Accept-Encoding'))
+            if not use_gzip:
+                body = gzip.decompress(body)
+            
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            if use_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Vary', 'Accept-Encoding')
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('ETag', gzip_etag(etag) if use_gzip else etag)
+            self.send_header('Cache-Control', STATIC_CACHE_CONTROL)
+            self.end_headers()
+            self.wfile.write(body)
+        except Exception as e:
+            log_debug(f"读取压缩剧情失败: {e}")
+            self._send_error_response(500, f"读取压缩剧情失败: {str(e)}")
+        return True
+    
     def do_POST(self):
         """处理 POST 请求"""
         # 记录访问时间
@@ -102,6 +420,8 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             return
         
         return super().do_DELETE() if hasattr(super(), 'do_DELETE') else self._send_error_response(405, "Method not allowed")
+    
+    def do_OPTIONS(self):
         """处理 OPTIONS 请求（CORS 预检）"""
         # 记录访问时间
         if hasattr(self.server, '_preview_server'):
@@ -120,7 +440,8 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Content-Encoding')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
     def _handle_api_request(self):
@@ -154,8 +475,17 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             if self.command in ['POST', 'DELETE']:
                 try:
                     content_length = int(self.headers.get('Content-Length', 0))
+                    if content_length < 0:
+                        raise ValueError("negative Content-Length")
+                    # 超长的请求体不读取（连接随响应关闭），解压后的大小由 decode_request_body 检查
+                    if content_length > MAX_REQUEST_BODY_SIZE:
+                        self._send_api_error(413, "Request body too large")
+                        return
                     if content_length > 0:
                         post_data = self.rfile.read(content_length)
+                        self._body_read = True
+                        # 保存大剧情时前端会以 gzip 压缩请求体
+                        post_data = decode_request_body(post_data, self.headers.get('Content-Encoding'))
                         request_data = json.loads(post_data.decode('utf-8'))
                         log_debug(f"请求数据: {str(request_data)[:200]}...")  # 只记录前200个字符
                 except (ValueError, json.JSONDecodeError) as e:
@@ -187,6 +517,11 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
     
     def _handle_api_get(self, path, params, campaign_service, editor_service, file_manager_service):
         """处理 GET API 请求"""
+        # 有版本号的资源先检查 If-None-Match，未修改时不读取和序列化内容
+        self._api_etag = self._api_resource_etag(path, params, campaign_service, editor_service, file_manager_service)
+        if self._api_etag and self._send_not_modified(self._api_etag):
+            return
+        
         if path == '/api/campaigns':
             campaigns = campaign_service.list_campaigns()
             self._send_api_response({"campaigns": campaigns})
@@ -208,6 +543,65 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
                 self._send_api_error(404, "Story not found")
                 return
             self._send_api_response(story_data)
+        elif path == '/api/story/layout':
+            campaign_name = params.get('campaign')
+            story_name = params.get('story')
+            if not campaign_name or not story_name:
+                self._send_api_error(400, "Missing campaign or story parameter")
+                return
+            layout_data = editor_service.get_story_layout(campaign_name, story_name)
+            if layout_data is None:
+                self._send_api_error(404, "Story not found")
+                return
+            self._send_api_response(layout_data, compact=True)
+        elif path == '/api/story/overview':
+            campaign_name = params.get('campaign')
+            story_name = params.get('story')
+            if not campaign_name or not story_name:
+                self._send_api_error(400, "Missing campaign or story parameter")
+                return
+            group_path = [group_id for group_id in params.get('path', '').split(',') if group_id]
+            success, message, overview_data = editor_service.get_story_overview(
+                campaign_name, story_name, group_path, params.get('group_by') or None
+            )
+            if not success:
+                status_code = 404 if message in ("跑团不存在", "剧情不存在") else 400
+                self._send_api_error(status_code, message)
+                return
+            self._send_api_response(overview_data, compact=True)
+        elif path == '/api/story/preview-status':
+            campaign_name = params.get('campaign')
+            story_name = params.get('story')
+            if not campaign_name:
+                self._send_api_error(400, "Missing campaign parameter")
+                return
+            generator = EditorAPIHandler.get_preview_generator()
+            if not story_name:
+                self._send_api_response({"previews": generator.list_preview_status(campaign_name)}, cacheable=False)
+                return
+            # wait 参数：长轮询，等待后台重建版本超过 since 后再返回
+            try:
+                since = int(params.get('since', 0))
+                wait = min(max(float(params.get('wait', 0)), 0.0), PREVIEW_STATUS_MAX_WAIT)
+            except ValueError:
+                self._send_api_error(400, "Invalid since or wait parameter")
+                return
+            # 先确认剧情存在，不存在的剧情不进入调度器
+            if generator.get_preview_status(campaign_name, story_name) is None:
+                self._send_api_error(404, "Story not found")
+                return
+            scheduler = EditorAPIHandler.get_preview_scheduler()
+            if wait > 0:
+                build = scheduler.wait_for_update(campaign_name, story_name, since, wait)
+            else:
+                build = scheduler.get_status(campaign_name, story_name)
+            # 等待期间预览可能已重新生成，返回最新的状态
+            status = generator.get_preview_status(campaign_name, story_name)
+            if status is None:
+                self._send_api_error(404, "Story not found")
+                return
+            status["build"] = build
+            self._send_api_response(status, cacheable=False)
         elif path == '/api/story/statistics':
             campaign_name = params.get('campaign')
             story_name = params.get('story')
@@ -220,6 +614,53 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
                 return
             statistics = editor_service.get_story_statistics(story_data)
             self._send_api_response(statistics)
+        elif path == '/api/story/chapters':
+            campaign_name = params.get('campaign')
+            story_name = params.get('story')
+            if not campaign_name or not story_name:
+                self._send_api_error(400, "Missing campaign or story parameter")
+                return
+            chapters = editor_service.list_story_chapters(campaign_name, story_name)
+            if chapters is None:
+                self._send_api_error(404, "Chaptered story not found")
+                return
+            self._send_api_response(chapters)
+        elif path == '/api/story/chapter':
+            campaign_name = params.get('campaign')
+            story_name = params.get('story')
+            chapter_id = params.get('chapter')
+            if not campaign_name or not story_name or not chapter_id:
+                self._send_api_error(400, "Missing campaign, story or chapter parameter")
+                return
+            chapter_data = editor_service.load_story_chapter(campaign_name, story_name, chapter_id)
+            if chapter_data is None:
+                self._send_api_error(404, "Chapter not found")
+                return
+            self._send_api_response(chapter_data)
+        elif path == '/api/story/chapter/statistics':
+            campaign_name = params.get('campaign')
+            story_name = params.get('story')
+            chapter_id = params.get('chapter')
+            if not campaign_name or not story_name or not chapter_id:
+                self._send_api_error(400, "Missing campaign, story or chapter parameter")
+                return
+            statistics = editor_service.get_chapter_statistics(campaign_name, story_name, chapter_id)
+            if statistics is None:
+                self._send_api_error(404, "Chapter not found")
+                return
+            self._send_api_response(statistics)
+        elif path == '/api/story/node':
+            campaign_name = params.get('campaign')
+            story_name = params.get('story')
+            node_id = params.get('node')
+            if not campaign_name or not story_name or not node_id:
+                self._send_api_error(400, "Missing campaign, story or node parameter")
+                return
+            node_data = editor_service.get_story_node(campaign_name, story_name, node_id)
+            if node_data is None:
+                self._send_api_error(404, "Node not found")
+                return
+            self._send_api_response(node_data)
         elif path == '/api/characters':
             self._handle_character_list(params, campaign_service, file_manager_service)
         elif path == '/api/character':
@@ -232,9 +673,36 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             self._handle_map_list(params, campaign_service, file_manager_service)
         elif path == '/api/map':
             self._handle_map_detail(params, campaign_service, file_manager_service)
+        elif path == '/api/map/thumbnail':
+            self._handle_map_thumbnail(params, campaign_service, file_manager_service)
+        elif path.startswith('/api/map/tile/'):
+            self._handle_map_tile(path, params, campaign_service, file_manager_service)
         else:
             self._send_api_error(404, "API endpoint not found")
     
+    def _api_resource_etag(self, path, params, campaign_service, editor_service, file_manager_service) -> Optional[str]:
+        """剧情、卡片列表和卡片详情的 ETag（由版本号生成，不需要读取文件内容），其他 API 返回 None"""
+        campaign_name = params.get('campaign')
+        if not campaign_name:
+            return None
+        
+        version = None
+        if path in _STORY_API_PATHS:
+            story_name = params.get('story')
+            if story_name:
+                version = editor_service.get_story_version(campaign_name, story_name)
+            if version and path in _LAYOUT_API_PATHS:
+                version = f"{version}-{LAYOUT_VERSION}-{PREVIEW_RENDERER}{PREVIEW_RENDERER_VERSION}"
+        elif path in _CATALOG_API_PATHS or path in _CARD_API_PATHS:
+            campaign = campaign_service.get_campaign(campaign_name)
+            if not campaign:
+                return None
+            if path in _CATALOG_API_PATHS:
+                version = file_manager_service.get_catalog_version(campaign, _CATALOG_API_PATHS[path])
+            elif params.get('name'):
+                version = file_manager_service.get_file_version(campaign, _CARD_API_PATHS[path], params['name'])
+        return version_etag(version) if version else None
+    
     def _handle_api_post(self, path, request_data, campaign_service, editor_service, file_manager_service):
         """处理 POST API 请求"""
         if path == '/api/campaigns':
@@ -260,14 +728,14 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
                 self._send_api_error(400, "Missing required parameters")
                 return
             
-            # 选择跑团
-            campaign = campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_api_error(404, "Campaign not found")
                 return
             
             # 创建文件
-            success = file_manager_service.create_file(category, filename)
+            success = file_manager_service.create_file(campaign, category, filename)
             if success:
                 self._send_api_response({"success": True, "message": f"文件 {filename} 创建成功"})
             else:
@@ -294,6 +762,55 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
                 self._send_api_response({"success": True, "message": message})
             else:
                 self._send_api_response({"success": False, "error": message}, status_code=400)
+        elif path == '/api/story/chapter/save':
+            campaign_name = request_data.get('campaign')
+            story_name = request_data.get('story')
+            chapter_id = request_data.get('chapter')
+            chapter_data = request_data.get('data')
+            
+            if not campaign_name or not story_name or not chapter_id or not chapter_data:
+                self._send_api_error(400, "Missing required parameters")
+                return
+            
+            success, message = editor_service.save_story_chapter(campaign_name, story_name, chapter_id, chapter_data)
+            if success:
+                self._send_api_response({"success": True, "message": message})
+            else:
+                self._send_api_response({"success": False, "error": message}, status_code=400)
+        elif path == '/api/story/split':
+            campaign_name = request_data.get('campaign')
+            story_name = request_data.get('story')
+            
+            if not campaign_name or not story_name:
+                self._send_api_error(400, "Missing required parameters")
+                return
+            
+            chapter_size = request_data.get('chapter_size')
+            if chapter_size is None:
+                success, message = editor_service.split_story_into_chapters(campaign_name, story_name)
+            else:
+                success, message = editor_service.split_story_into_chapters(campaign_name, story_name, int(chapter_size))
+            if success:
+                self._send_api_response({"success": True, "message": message})
+            else:
+                self._send_api_response({"success": False, "error": message}, status_code=400)
+        elif path == '/api/story/bulk':
+            campaign_name = request_data.get('campaign')
+            story_name = request_data.get('story')
+            operations = request_data.get('operations')
+            
+            if not campaign_name or not story_name or not operations:
+                self._send_api_error(400, "Missing required parameters")
+                return
+            
+            dry_run = bool(request_data.get('dry_run', False))
+            success, message, result = editor_service.apply_bulk_operations(
+                campaign_name, story_name, operations, dry_run
+            )
+            if success:
+                self._send_api_response({"success": True, "message": message, **result})
+            else:
+                self._send_api_response({"success": False, "error": message}, status_code=400)
         elif path == '/api/story/validate':
             story_data = request_data.get('data')
             if not story_data:
@@ -320,8 +837,14 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
                 self._send_api_error(400, "Missing required parameters")
                 return
             
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
+            if not campaign:
+                self._send_api_error(404, "Campaign not found")
+                return
+            
             success, message = file_manager_service.save_file_content(
-                campaign_name, category, filename, content
+                campaign, category, filename, content
             )
             
             if success:
@@ -355,14 +878,14 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
                 self._send_api_error(400, "Missing required parameters")
                 return
             
-            # 选择跑团
-            campaign = campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_api_error(404, "Campaign not found")
                 return
             
             # 删除文件（软删除）
-            success = file_manager_service.delete_file(category, filename)
+            success = file_manager_service.delete_file(campaign, category, filename)
             if success:
                 self._send_api_response({"success": True, "message": f"文件 {filename} 删除成功"})
             else:
@@ -375,21 +898,51 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
         self.send_response(200)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Content-Encoding')
+        self.send_header('Content-Length', '0')
         self.end_headers()
     
-    def _send_api_response(self, data, status_code=200):
-        """发送 API 响应"""
-        response_data = json.dumps(data, ensure_ascii=False, indent=2)
+    def _send_api_response(self, data, status_code=200, compact=False, cacheable=True):
+        """发送 API 响应
+        
+        compact 为 True 时不缩进，用于大体积数据；客户端接受时以 gzip 发送。
+        GET 请求成功时带 ETag（资源版本号，没有版本号时为内容哈希），缓存仍有效时返回 304；
+        cacheable 为 False 的实时状态不缓存
+        """
+        if compact:
+            response_data = json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+        else:
+            response_data = json.dumps(data, ensure_ascii=False, indent=2)
+        body = response_data.encode('utf-8')
+        
+        etag = None
+        if cacheable and status_code == 200 and self.command == 'GET':
+            etag = self._api_etag or content_etag(body)
+            if self._send_not_modified(etag):
+                return
+        
+        content_type = 'application/json; charset=utf-8'
+        compressed = should_compress(content_type, len(body), self.headers.get('Accept-Encoding'))
+        if compressed:
+            body = gzip_bytes(body)
         
         self.send_response(status_code)
-        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Type', content_type)
         self.send_header('Access-Control-Allow-Origin', '*')
         self.send_header('Access-Control-Allow-Methods', 'GET, POST, DELETE, OPTIONS')
-        self.send_header('Access-Control-Allow-Headers', 'Content-Type')
+        self.send_header('Access-Control-Allow-Headers', 'Content-Type, Content-Encoding')
+        if compressed:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Vary', 'Accept-Encoding')
+        if etag:
+            self.send_header('ETag', gzip_etag(etag) if compressed else etag)
+            self.send_header('Cache-Control', API_CACHE_CONTROL)
+        elif not cacheable:
+            self.send_header('Cache-Control', 'no-store')
+        self.send_header('Content-Length', str(len(body)))
         self.end_headers()
         
-        self.wfile.write(response_data.encode('utf-8'))
+        self.wfile.write(body)
     
     def _send_api_error(self, status_code, message):
         """发送 API 错误响应"""
@@ -406,14 +959,14 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_api_error(404, "Campaign not found")
                 return
             
             # 获取人物卡文件列表
-            files = file_manager_service.list_files("characters")
+            files = file_manager_service.list_files(campaign, "characters")
             
             # 转换为 API 响应格式
             characters = []
@@ -441,14 +994,14 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_api_error(404, "Campaign not found")
                 return
             
             # 读取人物卡内容
-            content = file_manager_service.read_file_content("characters", character_name)
+            content = file_manager_service.read_file_content(campaign, "characters", character_name)
             if content is None:
                 self._send_api_error(404, "Character not found")
                 return
@@ -468,14 +1021,14 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_api_error(404, "Campaign not found")
                 return
             
             # 获取怪物卡文件列表
-            files = file_manager_service.list_files("monsters")
+            files = file_manager_service.list_files(campaign, "monsters")
             
             # 转换为 API 响应格式
             monsters = []
@@ -503,14 +1056,14 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_api_error(404, "Campaign not found")
                 return
             
             # 读取怪物卡内容
-            content = file_manager_service.read_file_content("monsters", monster_name)
+            content = file_manager_service.read_file_content(campaign, "monsters", monster_name)
             if content is None:
                 self._send_api_error(404, "Monster not found")
                 return
@@ -530,14 +1083,14 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_api_error(404, "Campaign not found")
                 return
             
             # 获取地图文件列表
-            files = file_manager_service.list_files("maps")
+            files = file_manager_service.list_files(campaign, "maps")
             
             # 转换为 API 响应格式
             maps = []
@@ -547,7 +1100,9 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
                         "name": file_info.get_display_name(),
                         "filename": file_info.name,
                         "file_type": file_info.file_type,
-                        "is_hidden": file_info.is_hidden
+                        "is_hidden": file_info.is_hidden,
+                        "width": file_info.width,
+                        "height": file_info.height
                     })
             
             self._send_api_response({"maps": maps})
@@ -565,46 +1120,137 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
             return
         
         try:
-            # 选择跑团
-            campaign = campaign_service.select_campaign(campaign_name)
+            # 获取跑团
+            campaign = campaign_service.get_campaign(campaign_name)
             if not campaign:
                 self._send_api_error(404, "Campaign not found")
                 return
             
-            # 读取地图内容
-            content = file_manager_service.read_file_content("maps", map_name)
-            if content is None:
+            file_path = file_manager_service.get_file_path(campaign, "maps", map_name)
+            try:
+                stat = file_path.stat() if file_path else None
+            except OSError:
+                stat = None
+            if stat is None:
                 self._send_api_error(404, "Map not found")
                 return
             
-            # 获取文件信息
-            files = file_manager_service.list_files("maps")
-            file_info = next((f for f in files if f.get_display_name() == map_name), None)
-            
-            if file_info and file_info.file_type == "image":
-                # 对于图片文件，返回文件路径信息
-                map_data = {
-                    "name": map_name,
-                    "type": "image",
-                    "file_type": file_info.file_type,
-                    "filename": file_info.name,
-                    "content": None  # 图片内容通过单独的接口获取
-                }
+            file_type = get_file_type(file_path)
+            map_data = {
+                "name": map_name,
+                "type": "image" if file_type == "image" else "text",
+                "file_type": file_type,
+                "filename": file_path.name,
+                "size": stat.st_size,
+                "modified": stat.st_mtime,
+                "content": None
+            }
+            if file_type == "image":
+                # 图片只返回文件信息（不读取内容），图片本身由 url 作为静态文件获取（支持 Range）
+                size = map_images.image_size(file_path)
+                map_data["width"], map_data["height"] = size or (None, None)
+                map_data["url"] = self._static_url(file_path)
+                # 深度缩放瓦片（/api/map/tile/{z}/{x}/{y}）
+                if size and map_images.is_available():
+                    map_data["tile_size"] = MAP_TILE_SIZE
+                    map_data["max_zoom"] = map_images.max_zoom(size)
             else:
                 # 对于文本文件，返回内容
-                map_data = {
-                    "name": map_name,
-                    "type": "text",
-                    "file_type": file_info.file_type if file_info else "text",
-                    "filename": file_info.name if file_info else map_name,
-                    "content": content
-                }
+                content = file_manager_service.read_text_file(file_path)
+                if content is None:
+                    self._send_api_error(404, "Map not found")
+                    return
+                map_data["content"] = content
             
             self._send_api_response(map_data)
             
         except Exception as e:
             self._send_api_error(500, f"获取地图失败: {str(e)}")
     
+    def _handle_map_thumbnail(self, params, campaign_service, file_manager_service):
+        """处理地图缩略图请求（w 为宽度，格式按 Accept 选择 WebP 或 JPEG）"""
+        try:
+            width = int(params.get('w') or MAP_THUMBNAIL_WIDTHS[0])
+        except ValueError:
+            self._send_api_error(400, "Invalid w parameter")
+            return
+        file_path = self._get_map_image_path(params, campaign_service, file_manager_service)
+        if file_path is None:
+            return
+        
+        ext = map_images.thumbnail_format(self.headers.get('Accept'))
+        thumbnail = map_images.map_thumbnails.get(file_path, map_images.thumbnail_width(width), ext)
+        if thumbnail is None:
+            self._send_api_error(500, "生成缩略图失败")
+            return
+        self._send_map_image(thumbnail)
+    
+    def _handle_map_tile(self, path, params, campaign_service, file_manager_service):
+        """处理地图瓦片请求（/api/map/tile/{z}/{x}/{y}，格式按 Accept 选择 WebP 或 JPEG）"""
+        try:
+            zoom, x, y = (int(part) for part in path[len('/api/map/tile/'):].split('/'))
+        except ValueError:
+            self._send_api_error(400, "Invalid tile coordinates")
+            return
+        file_path = self._get_map_image_path(params, campaign_service, file_manager_service)
+        if file_path is None:
+            return
+        
+        size = map_images.image_size(file_path)
+        if size is None or not map_images.tile_in_range(size, zoom, x, y):
+            self._send_api_error(404, "Tile not found")
+            return
+        ext = map_images.thumbnail_format(self.headers.get('Accept'))
+        tile = map_images.map_tiles.get(file_path, zoom, x, y, ext)
+        if tile is None:
+            self._send_api_error(500, "生成瓦片失败")
+            return
+        self._send_map_image(tile)
+    
+    def _get_map_image_path(self, params, campaign_service, file_manager_service) -> Optional[Path]:
+        """缩略图和瓦片请求的地图图片路径，参数错误或找不到时发送错误响应并返回 None"""
+        campaign_name = params.get('campaign')
+        map_name = params.get('name')
+        
+        if not campaign_name or not map_name:
+            self._send_api_error(400, "Missing campaign or name parameter")
+            return None
+        if not map_images.is_available():
+            self._send_api_error(503, "处理地图图片需要安装 Pillow")
+            return None
+        
+        campaign = campaign_service.get_campaign(campaign_name)
+        if not campaign:
+            self._send_api_error(404, "Campaign not found")
+            return None
+        file_path = file_manager_service.get_file_path(campaign, "maps", map_name)
+        if not file_path or get_file_type(file_path) != "image":
+            self._send_api_error(404, "Map not found")
+            return None
+        return file_path
+    
+    def _send_map_image(self, file_path: Path):
+        """发送缓存的缩略图或瓦片（格式按 Accept 选择，因此带 Vary: Accept）"""
+        try:
+            f = self._send_file_head(file_path, API_CACHE_CONTROL, vary='Accept')
+        except OSError as e:
+            self._send_api_error(500, f"读取地图图片失败: {str(e)}")
+            return
+        if f is None:
+            return
+        try:
+            self.copyfile(f, self.wfile)
+        finally:
+            f.close()
+    
+    def _static_url(self, file_path: Path) -> Optional[str]:
+        """文件作为静态文件的 URL（不在服务根目录下时返回 None）"""
+        try:
+            relative = file_path.resolve().relative_to(Path(self.directory).resolve())
+        except ValueError:
+            return None
+        return '/' + quote(relative.as_posix())
+    
     def _parse_character_content(self, content: str, name: str):
         """解析人物卡内容"""
         character_data = {
@@ -647,20 +1293,27 @@ class WebPreviewRequestHandler(SimpleHTTPRequestHandler):
 class WebPreviewServer:
     """Web 预览服务器管理器"""
     
-    def __init__(self, base_dir: Optional[Path] = None):
+    def __init__(self, base_dir: Optional[Path] = None, workers: int = HTTP_WORKERS,
+                 max_queue: int = HTTP_MAX_QUEUE, engine: str = HTTP_ENGINE):
         """
         初始化服务器
         
         Args:
             base_dir: 服务器根目录，默认为项目根目录
+            workers: 处理请求的工作线程数
+            max_queue: 等待工作线程的最大连接数，超出时返回 503
+            engine: 服务引擎，threaded（工作线程）或 asyncio（事件循环，支持长连接和预览事件流）
         """
         if base_dir is None:
             # 默认使用项目根目录
             base_dir = Path(__file__).parent.parent.parent.parent
         
         self.base_dir = base_dir
+        self.workers = workers
+        self.max_queue = max_queue
+        self.engine = engine
         self.port = self._find_free_port()
-        self.httpd: Optional[HTTPServer] = None
+        self.httpd: Optional[Union[PooledHTTPServer, AsyncHTTPServer]] = None
         self.server_thread: Optional[threading.Thread] = None
         self.running = False
         self.last_access_time = 0
@@ -700,9 +1353,14 @@ class WebPreviewServer:
             log_debug(f"切换工作目录: {original_cwd} -> {self.base_dir}")
             os.chdir(self.base_dir)
             
-            # 创建 HTTP 服务器
-            log_debug(f"创建HTTP服务器...")
-            self.httpd = HTTPServer(('localhost', self.port), WebPreviewRequestHandler)
+            # 创建 HTTP 服务器（固定数量的工作线程并行处理请求，排队已满时返回 503）
+            log_debug(f"创建HTTP服务器: engine={self.engine}, workers={self.workers}, max_queue={self.max_queue}")
+            if self.engine == "asyncio":
+                self.httpd = AsyncHTTPServer(('localhost', self.port), WebPreviewRequestHandler, self.base_dir,
+                                             workers=self.workers, max_queue=self.max_queue)
+            else:
+                self.httpd = PooledHTTPServer(('localhost', self.port), WebPreviewRequestHandler,
+                                              workers=self.workers, max_queue=self.max_queue)
             self.httpd._preview_server = self  # 让处理器能访问到服务器实例
             self.running = True
             self.last_access_time = time.time()
@@ -1,34 +1,17 @@
-import subprocess
 import sys
 import os
 from pathlib import Path
 
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.graphviz_runner import find_dot_executable as _find_dot_executable, get_graphviz_pool
+from src.core.svg_optimize import optimize_svg
+
 def find_dot_executable():
-    """查找dot可执行文件的路径"""
-    # 常见的Graphviz安装路径
-    possible_paths = [
-        "dot",  # 如果在PATH中
-        "C:\\Program Files\\Graphviz\\bin\\dot.exe",
-        "C:\\Program Files (x86)\\Graphviz\\bin\\dot.exe",
-        "C:\\Graphviz\\bin\\dot.exe",
-        "/usr/bin/dot",  # Linux
-        "/usr/local/bin/dot",  # macOS
-        "/opt/homebrew/bin/dot",  # macOS with Homebrew
-    ]
-    
-    for path in possible_paths:
-        try:
-            # 测试是否可以执行
-            result = subprocess.run([path, "-V"], 
-                                  capture_output=True, 
-                                  text=True, 
-                                  timeout=5)
-            if result.returncode == 0:
-                return path
-        except (subprocess.CalledProcessError, FileNotFoundError, subprocess.TimeoutExpired):
-            continue
-    
-    return None
+    """查找dot可执行文件的路径（探测结果在进程内缓存）"""
+    return _find_dot_executable()
 
 def convert_dot_to_svg(dot_path: Path, svg_path: Path):
     """将DOT文件转换为SVG"""
@@ -41,20 +24,23 @@ def convert_dot_to_svg(dot_path: Path, svg_path: Path):
         return False
     
     try:
-        subprocess.run([
-            dot_executable,
-            "-Tsvg",
-            str(dot_path),
-            "-o",
-            str(svg_path)
-        ], check=True)
-        
+        dot_content = dot_path.read_text(encoding="utf-8")
+    except OSError as e:
+        print(f"[ERROR] 读取失败：{e}")
+        return False
+    
+    # 经由 Graphviz 转换池执行：有超时和资源限制，超出时自动改用更简单的连线方式
+    svg_content, error = get_graphviz_pool().run(dot_content, "svg", dot_executable)
+    if svg_content is None:
+        print(f"[ERROR] 转换失败：{error}")
+        return False
+    
+    try:
+        # 压缩输出并嵌入节点/连线索引，供预览页面查表高亮
+        svg_path.write_bytes(optimize_svg(svg_content))
         print(f"[OK] SVG 已生成：{svg_path}")
         return True
         
-    except subprocess.CalledProcessError as e:
-        print(f"[ERROR] 转换失败：{e}")
-        return False
     except Exception as e:
         print(f"[ERROR] 执行出错：{e}")
         return False
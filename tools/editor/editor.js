@@ -3,6 +3,14 @@
  * 提供完整的剧情编辑功能
  */
 
+// 超过该长度的请求体以 gzip 压缩后发送（浏览器支持 CompressionStream 时）
+const GZIP_REQUEST_MIN_LENGTH = 8192;
+
+async function gzipRequestBody(text) {
+    const stream = new Blob([text]).stream().pipeThrough(new CompressionStream('gzip'));
+    return new Response(stream).arrayBuffer();
+}
+
 class StoryEditor {
     constructor() {
         this.currentCampaign = null;
@@ -169,12 +177,20 @@ class StoryEditor {
     // API 调用方法
     async apiCall(endpoint, options = {}) {
         try {
+            const headers = {
+                'Content-Type': 'application/json',
+                ...options.headers
+            };
+            let body = options.body;
+            if (typeof body === 'string' && body.length >= GZIP_REQUEST_MIN_LENGTH && window.CompressionStream) {
+                body = await gzipRequestBody(body);
+                headers['Content-Encoding'] = 'gzip';
+            }
+            
             const response = await fetch(`/api/${endpoint}`, {
-                headers: {
-                    'Content-Type': 'application/json',
-                    ...options.headers
-                },
-                ...options
+                ...options,
+                headers,
+                body
             });
             
             if (!response.ok) {
@@ -565,9 +581,8 @@ class StoryEditor {
         // 保存状态用于撤销
         this.saveState(`添加${type === 'main' ? '主线' : '分支'}节点`);
         
-        const nodeCount = this.storyData.nodes.length;
         const newNode = {
-            id: `node_${String(nodeCount + 1).padStart(2, '0')}`,
+            id: this.allocateNodeId(),
             type: type,
             title: '新节点',
             content: '',
@@ -587,6 +602,25 @@ class StoryEditor {
         this.selectNode(newNode);
     }
     
+    // 按已有最大序号分配节点ID，删除节点后不会与现有ID重复
+    allocateNodeId(prefix = 'node_') {
+        const usedIds = new Set(this.storyData.nodes.map(node => node.id));
+        let maxNumber = 0;
+        for (const id of usedIds) {
+            const match = typeof id === 'string' && id.startsWith(prefix) && /^\d+$/.test(id.slice(prefix.length));
+            if (match) {
+                maxNumber = Math.max(maxNumber, parseInt(id.slice(prefix.length), 10));
+            }
+        }
+        
+        let candidate;
+        do {
+            maxNumber += 1;
+            candidate = `${prefix}${String(maxNumber).padStart(2, '0')}`;
+        } while (usedIds.has(candidate));
+        return candidate;
+    }
+    
     async deleteNode() {
         if (!this.currentNode) {
             this.showModal('错误', '请先选择要删除的节点');
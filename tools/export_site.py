@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+"""
+静态站点导出工具
+将跑团导出为可直接由静态文件服务器提供的站点（默认输出到 build/site/跑团名/）：
+只重新生成有变化的内容，文件名带内容哈希可长期缓存
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.campaign import CampaignService
+from src.core.config import SITE_EXPORT_DIR
+from src.core.site_export import CampaignSiteExporter
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="导出跑团静态站点（未修改的内容会复用）"
+    )
+    parser.add_argument("campaigns", nargs="*",
+                        help="要导出的跑团（默认全部）")
+    parser.add_argument("-o", "--output", type=Path, default=SITE_EXPORT_DIR,
+                        help=f"输出目录，每个跑团一个子目录（默认 {SITE_EXPORT_DIR}）")
+    parser.add_argument("--force", action="store_true",
+                        help="忽略导出清单，全部重新生成")
+    return parser.parse_args(argv)
+
+
+def export_campaigns(args):
+    """导出指定的跑团
+
+    Returns:
+        int: 失败的数量（找不到的跑团和导出失败的文件）
+    """
+    service = CampaignService()
+    names = args.campaigns or service.list_campaigns()
+    failures = 0
+
+    for name in names:
+        campaign = service.get_campaign(name)
+        if campaign is None:
+            print(f"[失败] 找不到跑团: {name}")
+            failures += 1
+            continue
+
+        output_dir = args.output / name
+        start = time.perf_counter()
+        summary = CampaignSiteExporter(campaign, output_dir).export(force=args.force)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: 重新生成 {summary['rendered']} 个，未修改复用 {summary['reused']} 个，"
+              f"失败 {summary['failed']} 个，清理旧文件 {summary['removed']} 个，耗时 {elapsed:.2f} 秒")
+        print(f"  入口: {output_dir / 'index.html'}")
+        for source, error in summary["errors"].items():
+            print(f"  [失败] {source}: {error}")
+        failures += summary["failed"]
+
+    return failures
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("=== 静态站点导出工具 ===")
+    failures = export_campaigns(args)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
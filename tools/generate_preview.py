@@ -1,68 +1,122 @@
 #!/usr/bin/env python3
 """
 剧情预览生成工具
-自动化执行 JSON -> DOT -> SVG 的转换流程
+批量生成 data/campaigns/ 下所有剧情的 SVG 预览：
+只处理内容有变化的剧情，多进程并行，并可输出 JSON 格式的耗时报告
 """
 
-import sys
+import argparse
+import datetime
+import json
 import os
-import subprocess
+import sys
+import time
+from dataclasses import asdict
 from pathlib import Path
 
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.config import PREVIEW_RENDERER, PREVIEW_RENDERERS
+from src.ui.web_preview.preview_generator import PREVIEW_BATCH_SIZE, PreviewGenerator
+
+
+def parse_args(argv=None):
+    """解析命令行参数"""
+    parser = argparse.ArgumentParser(
+        description="批量生成剧情预览（未修改的剧情会跳过）"
+    )
+    parser.add_argument("-j", "--jobs", type=int, default=os.cpu_count() or 1,
+                        help="并行数（默认为 CPU 核数）；graphviz 渲染器下同时运行的 dot 进程另受 GRAPHVIZ_MAX_WORKERS 限制")
+    parser.add_argument("--renderer", choices=PREVIEW_RENDERERS, default=PREVIEW_RENDERER,
+                        help=f"渲染器（默认 {PREVIEW_RENDERER}）")
+    parser.add_argument("--batch-size", type=int, default=PREVIEW_BATCH_SIZE,
+                        help="每批剧情数，graphviz 渲染器下同一批共用一个 dot 进程")
+    parser.add_argument("--campaign", action="append",
+                        help="只处理指定跑团（可重复指定）")
+    parser.add_argument("--force", action="store_true",
+                        help="忽略预览清单，全部重新生成")
+    parser.add_argument("--report",
+                        help="JSON 报告输出路径，'-' 表示输出到标准输出")
+    return parser.parse_args(argv)
+
+
+def generate_all_previews(args):
+    """生成所有剧情的预览文件
+
+    Returns:
+        dict: 报告数据（参数、汇总计数和每个剧情的结果）
+    """
+    generator = PreviewGenerator(project_root, renderer=args.renderer)
+    stories = generator.list_available_stories()
+    if args.campaign:
+        stories = [story for story in stories if story[0] in args.campaign]
+
+    started_at = datetime.datetime.now().isoformat(timespec="seconds")
+    start = time.perf_counter()
+    results = generator.generate_previews(stories, jobs=max(1, args.jobs), force=args.force,
+                                          batch_size=max(1, args.batch_size))
+    elapsed = time.perf_counter() - start
 
-def run_command(command, description):
-    """运行命令并显示结果"""
-    print(f"\n{description}...")
-    try:
-        result = subprocess.run(command, shell=True, capture_output=True, text=True, cwd=Path(__file__).parent.parent)
-        
-        if result.stdout:
-            print(result.stdout)
-        if result.stderr:
-            print(result.stderr)
-        
-        return result.returncode == 0
-    except Exception as e:
-        print(f"执行失败: {e}")
-        return False
-
-
-def generate_all_previews():
-    """生成所有剧情的预览文件"""
-    print("=== 剧情预览生成工具 ===")
-    
-    # 步骤1：JSON -> DOT（自动跳过已存在的文件）
-    success1 = run_command("echo s | python tools/json_to_dot.py", "步骤1：生成DOT文件")
-    
-    if not success1:
-        print("DOT文件生成失败，停止处理")
-        return False
-    
-    # 步骤2：DOT -> SVG（使用自动模式，跳过已存在的文件）
-    success2 = run_command("python tools/dot_to_svg.py --auto", "步骤2：生成SVG文件")
-    
-    if success2:
-        print("\n=== 处理完成 ===")
-        print("所有预览文件已生成完成！")
-        print("\n使用方法：")
-        print("  python tools/open_preview.py                    # 查看所有可用剧情")
-        print("  python tools/open_preview.py 跑团名 剧情名          # 打开指定预览")
+    summary = {"total": len(results), "generated": 0, "skipped": 0, "failed": 0}
+    for result in results:
+        summary[result.status] += 1
+
+    return {
+        "renderer": args.renderer,
+        "jobs": args.jobs,
+        "force": args.force,
+        "started_at": started_at,
+        "elapsed": round(elapsed, 4),
+        "summary": summary,
+        "stories": [dict(asdict(result), elapsed=round(result.elapsed, 4)) for result in results],
+    }
+
+
+def write_report(report, report_path):
+    """输出 JSON 报告"""
+    content = json.dumps(report, ensure_ascii=False, indent=2)
+    if report_path == "-":
+        print(content)
     else:
-        print("SVG文件生成失败")
-    
-    return success2
+        Path(report_path).write_text(content + "\n", encoding="utf-8")
+        print(f"报告已写入: {report_path}")
+
+
+def print_summary(report):
+    """打印处理结果"""
+    summary = report["summary"]
+    print(f"共 {summary['total']} 个剧情：重新生成 {summary['generated']} 个，"
+          f"未修改跳过 {summary['skipped']} 个，失败 {summary['failed']} 个，"
+          f"耗时 {report['elapsed']:.2f} 秒")
+    for story in report["stories"]:
+        if story["status"] == "failed":
+            print(f"  [失败] {story['campaign']}/{story['story']}: {story['error']}")
 
 
-def main():
-    if len(sys.argv) == 1:
-        # 处理所有文件
-        generate_all_previews()
+def print_usage_hint():
+    """打印使用说明"""
+    print("\n使用方法：")
+    print("  python tools/open_preview.py                    # 查看所有可用剧情")
+    print("  python tools/open_preview.py 跑团名 剧情名          # 打开指定预览")
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    report = generate_all_previews(args)
+
+    if args.report == "-":
+        write_report(report, "-")
     else:
-        print("用法：")
-        print("  python generate_preview.py                         # 处理所有剧情文件")
-        print("\n注意：此工具会自动处理 data/campaigns/ 目录下的所有JSON剧情文件")
-        sys.exit(1)
+        print("=== 剧情预览生成工具 ===")
+        print_summary(report)
+        if args.report:
+            write_report(report, args.report)
+        print_usage_hint()
+
+    return 1 if report["summary"]["failed"] else 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
@@ -7,11 +7,12 @@ project_root = Path(__file__).parent.parent
 sys.path.insert(0, str(project_root))
 
 from src.core.story_parser import StoryGraphService
+from src.core.story_storage import list_story_files, story_name_from_path
 
 def load_story(path: Path) -> dict:
     """加载剧情文件（保留向后兼容）"""
     story_service = StoryGraphService()
-    story = story_service.parse_json_story(path)
+    story = story_service.parse_json_story(path, lazy=True)
     
     if story:
         # 转换为原始格式
@@ -42,33 +43,20 @@ def generate_dot(story: dict) -> str:
     """生成DOT格式内容（保留向后兼容）"""
     story_service = StoryGraphService()
     
-    # 创建StoryGraph对象
-    from src.core.models import StoryGraph, StoryNode, StoryBranch
-    
-    graph = StoryGraph(title=story.get("title", ""))
-    
-    for node_data in story.get("nodes", []):
-        branches = []
-        for branch_data in node_data.get("branches", []):
-            branch = StoryBranch(
-                choice=branch_data.get("choice", ""),
-                entry=branch_data.get("entry"),
-                exit=branch_data.get("exit")
-            )
-            branches.append(branch)
-        
-        node = StoryNode(
-            id=node_data.get("id", ""),
-            title=node_data.get("title", ""),
-            content=node_data.get("content", ""),
-            node_type=node_data.get("type", "main"),
-            next_id=node_data.get("next"),
-            branches=branches
-        )
-        graph.nodes.append(node)
+    # 只读节点视图直接包装原始字典，无需复制节点
+    graph = story_service.parse_story_data(story, lazy=True)
     
     return story_service.generate_dot_content(graph)
 
+
+def generate_dot_from_file(path: Path) -> str:
+    """直接从剧情文件生成DOT内容（不经过字典转换）"""
+    story_service = StoryGraphService()
+    story = story_service.parse_json_story(path, lazy=True)
+    if story is None:
+        story = story_service.parse_story_data({})
+    return story_service.generate_dot_content(story)
+
 # --- 以下为原有的文件处理和 CLI 逻辑，保持不变 ---
 
 def find_json_files():
@@ -82,8 +70,8 @@ def find_json_files():
             if campaign_dir.is_dir():
                 notes_dir = campaign_dir / "notes"
                 if notes_dir.exists():
-                    for json_file in notes_dir.glob("*.json"):
-                        json_files.append(json_file)
+                    # 同时包含 .json 与 .json.gz
+                    json_files.extend(list_story_files(notes_dir))
     return json_files
 
 def ask_user_confirmation(json_files):
@@ -98,9 +86,8 @@ def ask_user_confirmation(json_files):
 
 def process_json_file(json_path: Path):
     try:
-        story = load_story(json_path)
-        dot_content = generate_dot(story)
-        dot_path = json_path.with_suffix('.dot')
+        dot_content = generate_dot_from_file(json_path)
+        dot_path = json_path.parent / f"{story_name_from_path(json_path)}.dot"
         with open(dot_path, "w", encoding="utf-8") as f:
             f.write(dot_content)
         print(f"[OK] DOT 文件已生成：{dot_path}")
@@ -120,13 +107,12 @@ def main():
     elif len(sys.argv) == 3:
         input_path = Path(sys.argv[1])
         output_path = Path(sys.argv[2])
-        story = load_story(input_path)
-        dot = generate_dot(story)
+        dot = generate_dot_from_file(input_path)
         with open(output_path, "w", encoding="utf-8") as f:
             f.write(dot)
         print(f"[OK] DOT 文件已生成：{output_path}")
     else:
-        print("用法：python json_to_dot.py [input.json output.dot]")
+        print("用法：python json_to_dot.py [input.json|input.json.gz output.dot]")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+剧情存储格式迁移工具
+将 data/campaigns/*/notes 下的剧情在 pretty / compact / gzip 三种格式之间转换
+"""
+
+import sys
+import argparse
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+project_root = Path(__file__).parent.parent
+sys.path.insert(0, str(project_root))
+
+from src.core.config import DATA_DIR, STORY_STORAGE_FORMATS
+from src.core.story_storage import list_story_files, migrate_story_file
+
+
+def find_story_files(campaign_name=None):
+    """查找需要迁移的剧情文件"""
+    if not DATA_DIR.exists():
+        return []
+
+    story_files = []
+    for campaign_dir in sorted(DATA_DIR.iterdir()):
+        if not campaign_dir.is_dir():
+            continue
+        if campaign_name and campaign_dir.name != campaign_name:
+            continue
+        story_files.extend(list_story_files(campaign_dir / "notes"))
+    return story_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description='剧情存储格式迁移工具')
+    parser.add_argument(
+        'format',
+        choices=STORY_STORAGE_FORMATS,
+        help='目标格式：pretty（缩进JSON）、compact（紧凑JSON）、gzip（.json.gz）'
+    )
+    parser.add_argument(
+        '--campaign', '-c',
+        default=None,
+        help='只迁移指定跑团（默认迁移全部）'
+    )
+    args = parser.parse_args()
+
+    story_files = find_story_files(args.campaign)
+    if not story_files:
+        print("未找到任何剧情文件")
+        return
+
+    print(f"找到 {len(story_files)} 个剧情文件，目标格式：{args.format}")
+
+    migrated_count = 0
+    skipped_count = 0
+    failed_count = 0
+    saved_bytes = 0
+
+    for story_file in story_files:
+        try:
+            old_size = story_file.stat().st_size
+            new_path = migrate_story_file(story_file, args.format)
+            if new_path is None:
+                skipped_count += 1
+                continue
+
+            new_size = new_path.stat().st_size
+            saved_bytes += old_size - new_size
+            migrated_count += 1
+            print(f"[OK] {story_file.name} -> {new_path.name} ({old_size} -> {new_size} 字节)")
+        except Exception as e:
+            failed_count += 1
+            print(f"[ERROR] 迁移 {story_file} 失败：{e}")
+
+    print(f"\n迁移完成：{migrated_count} 个成功，{skipped_count} 个无需变更，{failed_count} 个失败")
+    print(f"磁盘占用变化：{-saved_bytes:+d} 字节")
+
+    if failed_count:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,7 +1,38 @@
 let storyData = {};
 let activeNodeId = null;
-let allNodes = [];
-let allEdges = [];
+
+// SVG 模式的节点/连线索引（优先读取 SVG 后处理嵌入的 metadata，旧版 SVG 从 title 重建）
+let svgIndex = null;
+let svgHighlighted = [];
+
+// canvas 渲染状态（服务器提供 /api/story/layout 时使用，否则回退到 SVG）
+let graphLayout = null;
+let canvasView = null;
+let nodeGrid = null;
+let edgeGrid = null;
+let activeEdges = null;
+let drawScheduled = false;
+let canvasReady = false;
+
+// 概览模式（?view=overview）：当前展开的组路径
+let overviewPath = [];
+
+// 后台重建的预览版本（事件流 /api/story/preview-events 或长轮询 /api/story/preview-status 得到），null 表示尚未连接
+let previewVersion = null;
+const PREVIEW_POLL_WAIT = 25;
+const PREVIEW_POLL_RETRY_MS = 10000;
+
+const GRID_CELL_SIZE = 256;
+const GRAPH_COLORS = {
+  main: "#4CAF50",
+  branch: "#2196F3",
+  fail: "#9E9E9E",
+  choice: "#FF9800",
+  next: "#000000",
+  active: "#e91e63"
+};
+const EDGE_KIND_COLORS = [GRAPH_COLORS.next, GRAPH_COLORS.choice, GRAPH_COLORS.fail];
+const GRAPH_FONT = '"Microsoft YaHei", sans-serif';
 
 // 从URL参数获取跑团、剧本和剧情名称
 function getUrlParams() {
@@ -9,47 +40,194 @@ function getUrlParams() {
   return {
     campaign: params.get('campaign') || '失落的矿坑',
     script: params.get('script') || null,
-    story: params.get('story') || '失落的矿坑'
+    story: params.get('story') || '失落的矿坑',
+    view: params.get('view') || null,
+    groupBy: params.get('group_by') || null
   };
 }
 
 // 动态构建文件路径
 function buildFilePaths() {
-  const { campaign, script, story } = getUrlParams();
-  
+  const { campaign, script, story, groupBy } = getUrlParams();
+  const query = `campaign=${encodeURIComponent(campaign)}&story=${encodeURIComponent(story)}`;
+  const overviewQuery = groupBy ? `${query}&group_by=${encodeURIComponent(groupBy)}` : query;
+
   // 新的文件结构：data/campaigns/跑团/notes/文件
   return {
     jsonPath: `../../data/campaigns/${campaign}/notes/${story}.json`,
-    svgPath: `../../data/campaigns/${campaign}/notes/${story}.svg`
+    svgPath: `../../data/campaigns/${campaign}/notes/${story}.svg`,
+    storyApiPath: `/api/story?${query}`,
+    layoutApiPath: `/api/story/layout?${query}`,
+    previewStatusApiPath: `/api/story/preview-status?${query}`,
+    previewEventsApiPath: `/api/story/preview-events?${query}`,
+    overviewApiPath: path => `/api/story/overview?${overviewQuery}&path=${encodeURIComponent(path.join(","))}`
   };
 }
 
-// 加载剧情数据和SVG
+function fetchJson(path) {
+  return fetch(path).then(res => {
+    if (!res.ok) {
+      throw new Error(`请求失败: ${path} (${res.status})`);
+    }
+    return res.json();
+  });
+}
+
+// 加载剧情数据和图形
 function loadStoryData() {
-  const { jsonPath, svgPath } = buildFilePaths();
-  
-  // 加载JSON数据
-  fetch(jsonPath)
-    .then(res => {
-      if (!res.ok) {
-        throw new Error(`无法加载剧情文件: ${jsonPath}`);
-      }
-      return res.json();
-    })
+  const { jsonPath, storyApiPath } = buildFilePaths();
+
+  // 加载JSON数据（优先使用 API，可读取压缩和分章节剧情）
+  fetchJson(storyApiPath)
+    .catch(() => fetchJson(jsonPath))
     .then(data => {
-      for (const node of data.nodes) {
-        storyData[node.id] = node;
-      }
+      setStoryData(data);
       console.log('剧情数据加载成功');
     })
     .catch(error => {
       console.error('加载剧情数据失败:', error);
-      document.getElementById("content").innerHTML = 
+      document.getElementById("content").innerHTML =
         `<p style="color: red;">加载剧情数据失败: ${error.message}</p>`;
     });
 
-  // 加载SVG图形
-  fetch(svgPath)
+  if (getUrlParams().view === "overview") {
+    loadOverview([]);
+  } else {
+    loadLayout();
+  }
+
+  document.getElementById("clearBtn").addEventListener("click", clearSelection);
+  document.getElementById("backBtn").addEventListener("click", () => loadOverview(overviewPath.slice(0, -1)));
+  updateTitles();
+  subscribePreviewEvents();
+}
+
+function setStoryData(data) {
+  storyData = {};
+  for (const node of data.nodes) {
+    storyData[node.id] = node;
+  }
+}
+
+// 处理一次重建状态：版本更新且重建成功时重新加载图形
+function applyPreviewBuild(build) {
+  if (previewVersion !== null && build.version > previewVersion) {
+    if (build.state === "ready") {
+      reloadGraph(build.version);
+    } else if (build.state === "failed") {
+      console.warn('预览重建失败:', build.error);
+    }
+  }
+  previewVersion = build.version;
+}
+
+// 优先订阅服务器推送的重建事件（asyncio 引擎提供），不可用时回退到长轮询
+function subscribePreviewEvents() {
+  if (!window.EventSource) {
+    watchPreviewBuilds();
+    return;
+  }
+  const { previewEventsApiPath } = buildFilePaths();
+  const source = new EventSource(previewEventsApiPath);
+  let opened = false;
+  source.addEventListener("open", () => { opened = true; });
+  source.addEventListener("build", event => applyPreviewBuild(JSON.parse(event.data)));
+  source.addEventListener("error", () => {
+    // 连接成功过的事件流由浏览器自动重连；从未连接成功说明服务器不支持
+    if (opened) return;
+    source.close();
+    watchPreviewBuilds();
+  });
+}
+
+// 剧情保存后服务器在后台重建预览：长轮询重建状态，新版本就绪时重新加载图形
+function watchPreviewBuilds() {
+  const { previewStatusApiPath } = buildFilePaths();
+  const wait = previewVersion === null ? "" : `&since=${previewVersion}&wait=${PREVIEW_POLL_WAIT}`;
+  fetchJson(previewStatusApiPath + wait)
+    .then(status => {
+      const build = status.build;
+      if (!build) return;  // 服务器不支持后台重建
+      applyPreviewBuild(build);
+      watchPreviewBuilds();
+    })
+    .catch(error => {
+      // 从未连接成功（静态文件等没有 API 的情况）时不再轮询，连接中断时稍后重试
+      if (previewVersion === null) return;
+      console.warn('预览状态请求失败，稍后重试:', error.message);
+      setTimeout(watchPreviewBuilds, PREVIEW_POLL_RETRY_MS);
+    });
+}
+
+function reloadGraph(version) {
+  const { storyApiPath, layoutApiPath } = buildFilePaths();
+  fetchJson(storyApiPath)
+    .then(setStoryData)
+    .catch(error => console.warn('重新加载剧情数据失败:', error.message));
+
+  // 保持当前缩放位置和选中的节点
+  const selected = activeNodeId;
+  const reselect = () => {
+    if (selected) activateNode(selected);
+  };
+  if (!graphLayout) {
+    loadSvg(version, reselect);
+  } else if (getUrlParams().view === "overview" || graphLayout.groups) {
+    // 超大剧情的布局接口直接返回概览图，重新加载时保持当前展开的层级
+    loadOverview(overviewPath, true);
+  } else {
+    fetchJson(layoutApiPath)
+      .then(layout => {
+        setupCanvas(layout, true);
+        reselect();
+      })
+      .catch(error => console.warn('重新加载布局失败:', error.message));
+  }
+  console.log(`预览已更新（版本 ${version}）`);
+}
+
+// 加载布局坐标并用 canvas 绘制；静态部署等没有 API 的情况下回退到 SVG
+function loadLayout() {
+  fetchJson(buildFilePaths().layoutApiPath)
+    .then(layout => {
+      if (layout.overview) overviewPath = layout.path || [];
+      setupCanvas(layout);
+      console.log(layout.overview ? '剧情较大，已加载概览图' : '布局数据加载成功');
+    })
+    .catch(error => {
+      console.warn('布局数据不可用，改用SVG:', error.message);
+      loadSvg();
+    });
+}
+
+// 加载概览图（链、分支等合并为组节点），path 为逐级展开的组ID
+function loadOverview(path, keepView) {
+  fetchJson(buildFilePaths().overviewApiPath(path))
+    .then(layout => {
+      overviewPath = layout.path || path;
+      setupCanvas(layout, keepView);
+      document.getElementById("backBtn").style.display = overviewPath.length ? "" : "none";
+      console.log(`概览数据加载成功（层级 ${overviewPath.length}）`);
+    })
+    .catch(error => {
+      if (graphLayout) {
+        console.error('加载概览失败:', error);
+        return;
+      }
+      console.warn('概览数据不可用，改用完整布局:', error.message);
+      loadLayout();
+    });
+}
+
+function isGroupNode(nodeId) {
+  return Boolean(graphLayout && graphLayout.groups && graphLayout.groups[nodeId]);
+}
+
+function loadSvg(version, onLoaded) {
+  const { svgPath } = buildFilePaths();
+
+  // 重建后的 SVG 带上版本号，避免浏览器使用缓存
+  fetch(version ? `${svgPath}?v=${version}` : svgPath)
     .then(res => {
       if (!res.ok) {
         throw new Error(`无法加载SVG文件: ${svgPath}`);
@@ -59,15 +237,35 @@ function loadStoryData() {
     .then(svgText => {
       document.getElementById("graph").innerHTML = svgText;
       setupSvgInteraction();
+      if (onLoaded) onLoaded();
       console.log('SVG图形加载成功');
     })
     .catch(error => {
       console.error('加载SVG失败:', error);
-      document.getElementById("graph").innerHTML = 
+      document.getElementById("graph").innerHTML =
         `<p style="color: red; padding: 20px;">加载SVG图形失败: ${error.message}</p>`;
     });
 }
 
+function updateTitles() {
+  const { campaign, script, story } = getUrlParams();
+  if (script) {
+    document.title = `剧情预览 - ${campaign}/${script}/${story}`;
+  } else {
+    document.title = `剧情预览 - ${campaign}/${story}`;
+  }
+
+  // 更新面板标题
+  const panelTitle = document.querySelector("#panel h2");
+  if (panelTitle) {
+    if (script) {
+      panelTitle.textContent = `${campaign} - ${script} - ${story}`;
+    } else {
+      panelTitle.textContent = `${campaign} - ${story}`;
+    }
+  }
+}
+
 // 设置SVG交互
 function setupSvgInteraction() {
   const svg = document.querySelector("svg");
@@ -76,91 +274,578 @@ function setupSvgInteraction() {
     return;
   }
 
-  allNodes = Array.from(svg.querySelectorAll("g.node"));
-  allEdges = Array.from(svg.querySelectorAll("g.edge"));
-
-  allNodes.forEach(node => {
-    const title = node.querySelector("title");
-    if (!title) return;
+  svgIndex = buildSvgIndex(svg);
 
-    const nodeId = title.textContent.trim();
-    node.dataset.id = nodeId;
-    node.style.cursor = "pointer";
+  // 事件委托：整张图只注册一个监听器；按住 Shift 点击高亮从当前节点到该节点的路径
+  svg.addEventListener("click", event => {
+    const element = event.target.closest("g.node");
+    if (!element) return;
+    const nodeId = svgIndex.nodes[svgIndex.elementIndex.get(element)];
+    if (nodeId === undefined) return;
+    if (event.shiftKey && activeNodeId && activeNodeId !== nodeId) {
+      showPath(activeNodeId, nodeId);
+      return;
+    }
+    activateNode(nodeId);
+    showNode(nodeId);
+  });
+  svgIndex.nodeEls.forEach(element => {
+    if (element) element.style.cursor = "pointer";
+  });
+}
 
-    node.addEventListener("click", () => {
-      activateNode(nodeId);
-      showNode(nodeId);
+function buildSvgIndex(svg) {
+  const metadata = svg.querySelector("metadata#story-index");
+  let nodes, edges, nodeEls;
+  if (metadata) {
+    ({ nodes, edges } = JSON.parse(metadata.textContent));
+    const position = new Map(nodes.map((id, i) => [id, i]));
+    nodeEls = new Array(nodes.length).fill(null);
+    svg.querySelectorAll("g.node[data-node-id]").forEach(element => {
+      const index = position.get(element.dataset.nodeId);
+      if (index !== undefined) nodeEls[index] = element;
     });
+  } else {
+    nodeEls = Array.from(svg.querySelectorAll("g.node"));
+    nodes = nodeEls.map(element => {
+      const title = element.querySelector("title");
+      return title ? title.textContent.trim() : "";
+    });
+    const position = new Map(nodes.map((id, i) => [id, i]));
+    edges = Array.from(svg.querySelectorAll("g.edge")).map(element => {
+      const title = element.querySelector("title");
+      const text = title ? title.textContent : "";
+      for (let at = text.indexOf("->"); at !== -1; at = text.indexOf("->", at + 1)) {
+        const source = position.get(text.slice(0, at));
+        const target = position.get(text.slice(at + 2));
+        if (source !== undefined && target !== undefined) return [source, target, 0];
+      }
+      return null;
+    });
+  }
+
+  const indexOf = new Map(nodes.map((id, i) => [id, i]));
+  const outEdges = nodes.map(() => []);
+  const inEdges = nodes.map(() => []);
+  edges.forEach((edge, i) => {
+    if (!edge) return;
+    outEdges[edge[0]].push(i);
+    inEdges[edge[1]].push(i);
   });
+  return {
+    svg: svg,
+    nodes: nodes,
+    edges: edges,
+    nodeEls: nodeEls,
+    elementIndex: new Map(nodeEls.map((element, i) => [element, i])),
+    edgeEls: Array.from(svg.querySelectorAll("g.edge")),
+    indexOf: indexOf,
+    outEdges: outEdges,
+    inEdges: inEdges
+  };
+}
 
-  // 清除按钮
-  document.getElementById("clearBtn").addEventListener("click", clearSelection);
-  
-  // 更新页面标题
-  const { campaign, script, story } = getUrlParams();
-  if (script) {
-    document.title = `剧情预览 - ${campaign}/${script}/${story}`;
-  } else {
-    document.title = `剧情预览 - ${campaign}/${story}`;
+// 只修改需要高亮的元素，其余元素由 has-selection 样式统一变暗
+function highlightSvg(nodeIndexes, edgeIndexes, activeIndex) {
+  clearSvgHighlight();
+  svgIndex.svg.classList.add("has-selection");
+  for (const i of nodeIndexes) {
+    const element = svgIndex.nodeEls[i];
+    if (!element) continue;
+    element.classList.add(i === activeIndex ? "active" : "neighbor");
+    svgHighlighted.push(element);
   }
-  
-  // 更新面板标题
-  const panelTitle = document.querySelector("#panel h2");
-  if (panelTitle) {
-    if (script) {
-      panelTitle.textContent = `${campaign} - ${script} - ${story}`;
-    } else {
-      panelTitle.textContent = `${campaign} - ${story}`;
+  for (const i of edgeIndexes) {
+    const element = svgIndex.edgeEls[i];
+    if (!element) continue;
+    element.classList.add("highlighted");
+    svgHighlighted.push(element);
+  }
+}
+
+function clearSvgHighlight() {
+  for (const element of svgHighlighted) {
+    element.classList.remove("active", "neighbor", "highlighted");
+  }
+  svgHighlighted = [];
+  if (svgIndex) svgIndex.svg.classList.remove("has-selection");
+}
+
+// 沿连线方向广度优先搜索最短路径，返回经过的连线下标
+function findSvgPath(fromIndex, toIndex) {
+  const via = new Map([[fromIndex, -1]]);
+  const queue = [fromIndex];
+  for (let head = 0; head < queue.length; head++) {
+    const current = queue[head];
+    if (current === toIndex) {
+      const path = [];
+      for (let node = toIndex; via.get(node) !== -1; node = svgIndex.edges[via.get(node)][0]) {
+        path.push(via.get(node));
+      }
+      return path.reverse();
+    }
+    for (const edgeIndex of svgIndex.outEdges[current]) {
+      const target = svgIndex.edges[edgeIndex][1];
+      if (!via.has(target)) {
+        via.set(target, edgeIndex);
+        queue.push(target);
+      }
     }
   }
+  return null;
 }
 
-function activateNode(nodeId) {
-  activeNodeId = nodeId;
+function showPath(fromId, toId) {
+  const fromIndex = svgIndex.indexOf.get(fromId);
+  const toIndex = svgIndex.indexOf.get(toId);
+  // 目标在当前节点之前时反向查找
+  const path = findSvgPath(fromIndex, toIndex) || findSvgPath(toIndex, fromIndex);
+  showNode(toId);
+  if (!path) {
+    document.getElementById("content").insertAdjacentHTML("afterbegin",
+      `<p class="hint">${fromId} 与 ${toId} 之间没有路径</p>`);
+    return;
+  }
+  const nodeIndexes = [fromIndex, toIndex];
+  path.forEach(i => nodeIndexes.push(svgIndex.edges[i][1]));
+  highlightSvg(nodeIndexes, path, fromIndex);
+  document.getElementById("content").insertAdjacentHTML("afterbegin",
+    `<p class="hint">从 ${fromId} 到 ${toId}：${path.length} 步</p>`);
+}
+
+// ===== 空间网格：按单元格索引节点和连线，用于视口裁剪和点击检测 =====
+
+class SpatialGrid {
+  constructor(cellSize) {
+    this.cellSize = cellSize;
+    this.cells = new Map();
+  }
 
-  allNodes.forEach(n => {
-    if (n.dataset.id === nodeId) {
-      n.classList.add("active");
-      n.classList.remove("dimmed");
+  insert(item, minX, minY, maxX, maxY) {
+    const size = this.cellSize;
+    for (let cx = Math.floor(minX / size); cx <= Math.floor(maxX / size); cx++) {
+      for (let cy = Math.floor(minY / size); cy <= Math.floor(maxY / size); cy++) {
+        const key = `${cx},${cy}`;
+        let cell = this.cells.get(key);
+        if (!cell) {
+          cell = [];
+          this.cells.set(key, cell);
+        }
+        cell.push(item);
+      }
+    }
+  }
+
+  // 遍历与矩形相交的单元格中的条目（同一条目可能出现多次，由调用方去重）
+  query(minX, minY, maxX, maxY, visit) {
+    const size = this.cellSize;
+    for (let cx = Math.floor(minX / size); cx <= Math.floor(maxX / size); cx++) {
+      for (let cy = Math.floor(minY / size); cy <= Math.floor(maxY / size); cy++) {
+        const cell = this.cells.get(`${cx},${cy}`);
+        if (cell) {
+          for (let i = 0; i < cell.length; i++) {
+            visit(cell[i]);
+          }
+        }
+      }
+    }
+  }
+}
+
+function buildSpatialIndex(layout) {
+  const nodes = layout.nodes;
+  nodeGrid = new SpatialGrid(GRID_CELL_SIZE);
+  for (let i = 0; i < nodes.id.length; i++) {
+    const halfW = nodes.w[i] / 2;
+    const halfH = nodes.h[i] / 2;
+    nodeGrid.insert(i, nodes.x[i] - halfW, nodes.y[i] - halfH, nodes.x[i] + halfW, nodes.y[i] + halfH);
+  }
+
+  // 连线按线段插入，长连线只占用沿途的单元格
+  edgeGrid = new SpatialGrid(GRID_CELL_SIZE);
+  const points = layout.edges.points;
+  for (let i = 0; i < points.length; i++) {
+    const p = points[i];
+    for (let j = 0; j + 3 < p.length; j += 2) {
+      edgeGrid.insert(i, Math.min(p[j], p[j + 2]), Math.min(p[j + 1], p[j + 3]),
+                      Math.max(p[j], p[j + 2]), Math.max(p[j + 1], p[j + 3]));
+    }
+  }
+
+  layout.nodeStamp = new Uint32Array(nodes.id.length);
+  layout.edgeStamp = new Uint32Array(points.length);
+  layout.frame = 0;
+  layout.indexOf = new Map(nodes.id.map((id, i) => [id, i]));
+}
+
+// ===== canvas 渲染 =====
+
+function setupCanvas(layout, keepView) {
+  graphLayout = layout;
+  activeNodeId = null;
+  activeEdges = null;
+  buildSpatialIndex(layout);
+
+  // 概览展开或预览更新时只替换布局，画布和事件监听保持不变
+  if (canvasReady) {
+    if (keepView) {
+      scheduleDraw();
     } else {
-      n.classList.remove("active");
-      n.classList.add("dimmed");
+      fitToView();
     }
+    return;
+  }
+  canvasReady = true;
+
+  const container = document.getElementById("graph");
+  container.innerHTML = "";
+  container.classList.add("canvas-mode");
+  const canvas = document.createElement("canvas");
+  container.appendChild(canvas);
+
+  canvasView = {
+    canvas: canvas,
+    ctx: canvas.getContext("2d"),
+    scale: 1,
+    offsetX: 0,
+    offsetY: 0,
+    width: 0,
+    height: 0,
+    dpr: window.devicePixelRatio || 1
+  };
+
+  resizeCanvas();
+  fitToView();
+  setupCanvasInteraction(canvas);
+  window.addEventListener("resize", () => {
+    resizeCanvas();
+    scheduleDraw();
   });
+}
 
-  allEdges.forEach(e => {
-    const title = e.querySelector("title");
-    if (!title) return;
+function resizeCanvas() {
+  const container = canvasView.canvas.parentElement;
+  canvasView.width = container.clientWidth;
+  canvasView.height = container.clientHeight;
+  canvasView.dpr = window.devicePixelRatio || 1;
+  canvasView.canvas.width = Math.round(canvasView.width * canvasView.dpr);
+  canvasView.canvas.height = Math.round(canvasView.height * canvasView.dpr);
+}
 
-    const text = title.textContent;
-    if (text.includes(nodeId)) {
-      e.classList.remove("dimmed");
-    } else {
-      e.classList.add("dimmed");
+function fitToView() {
+  const padding = 20;
+  const scale = Math.min(
+    (canvasView.width - padding * 2) / Math.max(graphLayout.width, 1),
+    (canvasView.height - padding * 2) / Math.max(graphLayout.height, 1),
+    1
+  );
+  canvasView.scale = Math.max(scale, 0.01);
+  canvasView.offsetX = (canvasView.width - graphLayout.width * canvasView.scale) / 2;
+  canvasView.offsetY = Math.max(padding, (canvasView.height - graphLayout.height * canvasView.scale) / 2);
+  scheduleDraw();
+}
+
+function scheduleDraw() {
+  if (!drawScheduled) {
+    drawScheduled = true;
+    requestAnimationFrame(drawCanvas);
+  }
+}
+
+function screenToWorld(screenX, screenY) {
+  return {
+    x: (screenX - canvasView.offsetX) / canvasView.scale,
+    y: (screenY - canvasView.offsetY) / canvasView.scale
+  };
+}
+
+function drawCanvas() {
+  drawScheduled = false;
+  const { ctx, scale, offsetX, offsetY, dpr, width, height } = canvasView;
+  const layout = graphLayout;
+
+  ctx.setTransform(1, 0, 0, 1, 0, 0);
+  ctx.fillStyle = "#fafafa";
+  ctx.fillRect(0, 0, canvasView.canvas.width, canvasView.canvas.height);
+  ctx.setTransform(dpr * scale, 0, 0, dpr * scale, dpr * offsetX, dpr * offsetY);
+
+  // 只绘制视口内的节点和连线
+  const topLeft = screenToWorld(0, 0);
+  const bottomRight = screenToWorld(width, height);
+  const frame = ++layout.frame;
+  const visibleEdges = [];
+  const visibleNodes = [];
+  edgeGrid.query(topLeft.x, topLeft.y, bottomRight.x, bottomRight.y, i => {
+    if (layout.edgeStamp[i] !== frame) {
+      layout.edgeStamp[i] = frame;
+      visibleEdges.push(i);
     }
   });
+  nodeGrid.query(topLeft.x, topLeft.y, bottomRight.x, bottomRight.y, i => {
+    if (layout.nodeStamp[i] !== frame) {
+      layout.nodeStamp[i] = frame;
+      visibleNodes.push(i);
+    }
+  });
+
+  drawEdges(ctx, visibleEdges, scale);
+  drawNodes(ctx, visibleNodes, scale);
 }
 
-function clearSelection() {
-  activeNodeId = null;
+// 按样式分组批量描边，减少状态切换
+function drawEdges(ctx, edgeIndexes, scale) {
+  const edges = graphLayout.edges;
+  const groups = new Map();
+  for (const i of edgeIndexes) {
+    const dimmed = activeEdges !== null && !activeEdges.has(i);
+    const key = edges.kind[i] * 2 + (dimmed ? 1 : 0);
+    if (!groups.has(key)) groups.set(key, []);
+    groups.get(key).push(i);
+  }
+
+  const showArrows = scale > 0.2;
+  const showLabels = scale > 0.45;
+  ctx.lineWidth = 1 / Math.max(scale, 0.5);
+  for (const [key, indexes] of groups) {
+    const kind = key >> 1;
+    const color = EDGE_KIND_COLORS[kind];
+    ctx.globalAlpha = key & 1 ? 0.15 : 1;
+    ctx.strokeStyle = color;
+    ctx.fillStyle = color;
+    ctx.setLineDash(kind === 2 ? [5, 2] : []);
+
+    ctx.beginPath();
+    for (const i of indexes) {
+      const p = edges.points[i];
+      ctx.moveTo(p[0], p[1]);
+      for (let j = 2; j < p.length; j += 2) {
+        ctx.lineTo(p[j], p[j + 1]);
+      }
+    }
+    ctx.stroke();
 
-  allNodes.forEach(n => {
-    n.classList.remove("active");
-    n.classList.remove("dimmed");
+    if (showArrows) {
+      ctx.beginPath();
+      for (const i of indexes) {
+        const p = edges.points[i];
+        if (p.length >= 4) {
+          addArrowHead(ctx, p[p.length - 4], p[p.length - 3], p[p.length - 2], p[p.length - 1]);
+        }
+      }
+      ctx.fill();
+    }
+
+    if (showLabels && kind === 1) {
+      ctx.font = `14px ${GRAPH_FONT}`;
+      ctx.textBaseline = "middle";
+      ctx.textAlign = "left";
+      for (const i of indexes) {
+        if (edges.label[i] && edges.label_x[i] !== null) {
+          ctx.fillText(edges.label[i], edges.label_x[i], edges.label_y[i]);
+        }
+      }
+    }
+  }
+  ctx.setLineDash([]);
+  ctx.globalAlpha = 1;
+}
+
+function addArrowHead(ctx, x0, y0, x1, y1) {
+  const length = Math.hypot(x1 - x0, y1 - y0) || 1;
+  const ux = (x1 - x0) / length;
+  const uy = (y1 - y0) / length;
+  const baseX = x1 - ux * 10;
+  const baseY = y1 - uy * 10;
+  ctx.moveTo(x1, y1);
+  ctx.lineTo(baseX - uy * 3.5, baseY + ux * 3.5);
+  ctx.lineTo(baseX + uy * 3.5, baseY - ux * 3.5);
+  ctx.closePath();
+}
+
+function drawNodes(ctx, nodeIndexes, scale) {
+  const nodes = graphLayout.nodes;
+  const activeIndex = activeNodeId === null ? -1 : graphLayout.indexOf.get(activeNodeId);
+  const groups = [[], [], [], []];
+  for (const i of nodeIndexes) {
+    const dimmed = activeIndex !== -1 && i !== activeIndex;
+    groups[nodes.type[i] * 2 + (dimmed ? 1 : 0)].push(i);
+  }
+
+  const showBorder = scale > 0.15;
+  const showText = scale > 0.4;
+  for (let key = 0; key < groups.length; key++) {
+    const indexes = groups[key];
+    if (!indexes.length) continue;
+    ctx.globalAlpha = key & 1 ? 0.15 : 1;
+    ctx.fillStyle = key >> 1 ? GRAPH_COLORS.branch : GRAPH_COLORS.main;
+
+    ctx.beginPath();
+    for (const i of indexes) {
+      ctx.rect(nodes.x[i] - nodes.w[i] / 2, nodes.y[i] - nodes.h[i] / 2, nodes.w[i], nodes.h[i]);
+    }
+    ctx.fill();
+    if (showBorder) {
+      ctx.strokeStyle = "#000000";
+      ctx.lineWidth = 1 / Math.max(scale, 0.5);
+      ctx.stroke();
+    }
+
+    if (showText) {
+      ctx.fillStyle = "#ffffff";
+      ctx.font = `14px ${GRAPH_FONT}`;
+      ctx.textAlign = "center";
+      ctx.textBaseline = "middle";
+      for (const i of indexes) {
+        ctx.fillText(nodes.title[i], nodes.x[i], nodes.y[i] - 8.4);
+        ctx.fillText(`[${nodes.id[i]}]`, nodes.x[i], nodes.y[i] + 8.4);
+      }
+    }
+  }
+  ctx.globalAlpha = 1;
+
+  if (activeIndex !== -1 && activeIndex !== undefined) {
+    ctx.strokeStyle = GRAPH_COLORS.active;
+    ctx.lineWidth = 4 / Math.max(scale, 0.25);
+    ctx.strokeRect(nodes.x[activeIndex] - nodes.w[activeIndex] / 2, nodes.y[activeIndex] - nodes.h[activeIndex] / 2,
+                   nodes.w[activeIndex], nodes.h[activeIndex]);
+  }
+}
+
+function hitTestNode(screenX, screenY) {
+  const point = screenToWorld(screenX, screenY);
+  const nodes = graphLayout.nodes;
+  let found = null;
+  nodeGrid.query(point.x, point.y, point.x, point.y, i => {
+    if (Math.abs(point.x - nodes.x[i]) <= nodes.w[i] / 2 && Math.abs(point.y - nodes.y[i]) <= nodes.h[i] / 2) {
+      found = nodes.id[i];
+    }
   });
+  return found;
+}
+
+function setupCanvasInteraction(canvas) {
+  let dragging = false;
+  let moved = false;
+  let lastX = 0;
+  let lastY = 0;
 
-  allEdges.forEach(e => {
-    e.classList.remove("dimmed");
+  canvas.addEventListener("mousedown", event => {
+    dragging = true;
+    moved = false;
+    lastX = event.clientX;
+    lastY = event.clientY;
+    canvas.style.cursor = "";
+    canvas.classList.add("dragging");
   });
 
+  window.addEventListener("mousemove", event => {
+    if (dragging) {
+      const dx = event.clientX - lastX;
+      const dy = event.clientY - lastY;
+      if (Math.abs(dx) + Math.abs(dy) > 2) {
+        moved = true;
+      }
+      canvasView.offsetX += dx;
+      canvasView.offsetY += dy;
+      lastX = event.clientX;
+      lastY = event.clientY;
+      scheduleDraw();
+    } else if (event.target === canvas) {
+      const rect = canvas.getBoundingClientRect();
+      canvas.style.cursor = hitTestNode(event.clientX - rect.left, event.clientY - rect.top) ? "pointer" : "grab";
+    }
+  });
+
+  window.addEventListener("mouseup", event => {
+    if (!dragging) return;
+    dragging = false;
+    canvas.classList.remove("dragging");
+    if (!moved && event.target === canvas) {
+      const rect = canvas.getBoundingClientRect();
+      const nodeId = hitTestNode(event.clientX - rect.left, event.clientY - rect.top);
+      if (nodeId && isGroupNode(nodeId)) {
+        showGroup(nodeId);
+        loadOverview(overviewPath.concat([nodeId]));
+      } else if (nodeId) {
+        activateNode(nodeId);
+        showNode(nodeId);
+      }
+    }
+  });
+
+  // 以鼠标位置为中心缩放
+  canvas.addEventListener("wheel", event => {
+    event.preventDefault();
+    const rect = canvas.getBoundingClientRect();
+    const screenX = event.clientX - rect.left;
+    const screenY = event.clientY - rect.top;
+    const world = screenToWorld(screenX, screenY);
+    const factor = Math.exp(-event.deltaY * 0.0015);
+    canvasView.scale = Math.min(8, Math.max(0.005, canvasView.scale * factor));
+    canvasView.offsetX = screenX - world.x * canvasView.scale;
+    canvasView.offsetY = screenY - world.y * canvasView.scale;
+    scheduleDraw();
+  }, { passive: false });
+
+  canvas.addEventListener("dblclick", fitToView);
+}
+
+function activateNode(nodeId) {
+  activeNodeId = nodeId;
+
+  if (graphLayout) {
+    const index = graphLayout.indexOf.get(nodeId);
+    const edges = graphLayout.edges;
+    activeEdges = new Set();
+    for (let i = 0; i < edges.source.length; i++) {
+      if (edges.source[i] === index || edges.target[i] === index) {
+        activeEdges.add(i);
+      }
+    }
+    scheduleDraw();
+    return;
+  }
+
+  if (!svgIndex) return;
+  const index = svgIndex.indexOf.get(nodeId);
+  if (index === undefined) return;
+  const edgeIndexes = svgIndex.outEdges[index].concat(svgIndex.inEdges[index]);
+  const nodeIndexes = [index];
+  for (const i of edgeIndexes) {
+    nodeIndexes.push(svgIndex.edges[i][0], svgIndex.edges[i][1]);
+  }
+  highlightSvg(nodeIndexes, edgeIndexes, index);
+}
+
+function clearSelection() {
+  activeNodeId = null;
+  activeEdges = null;
+
+  if (graphLayout) {
+    scheduleDraw();
+  }
+
+  clearSvgHighlight();
+
   const div = document.getElementById("content");
   div.innerHTML = "<p class='hint'>已清除选择，点击节点查看剧情内容</p>";
 }
 
+function showGroup(groupId) {
+  const group = graphLayout.groups[groupId];
+  const kindNames = { chain: "线性链", branch: "分支", chapter: "章节", scc: "循环" };
+  document.getElementById("content").innerHTML = `
+    <h3>${group.title}</h3>
+    <p><strong>类型：</strong>${kindNames[group.kind] || group.kind}</p>
+    <p><strong>节点数：</strong>${group.size}</p>
+    <p class="hint">已展开该组，点击“返回上一级”回到上一层</p>
+  `;
+}
+
 function showNode(nodeId) {
   const node = storyData[nodeId];
   if (!node) {
-    document.getElementById("content").innerHTML = 
+    document.getElementById("content").innerHTML =
       `<p style="color: orange;">未找到节点数据: ${nodeId}</p>`;
     return;
   }
@@ -0,0 +1,232 @@
+// 静态站点页面：目录、搜索和内容查看（数据均为导出时生成的静态 JSON）
+let catalog = null;
+let searchIndex = null;
+let searchLoading = null;
+let currentLink = null;
+let storyNodes = {};
+
+// 与 site_export.search_terms 相同的切分规则
+const CJK_RUN = /[㐀-鿿豈-﫿]+/g;
+const WORD = /[0-9a-z]+/g;
+const MAX_RESULTS = 50;
+
+function searchTerms(text) {
+  text = text.toLowerCase();
+  const terms = new Set();
+  for (const run of text.match(CJK_RUN) || []) {
+    const chars = Array.from(run);
+    // 有相邻两字时只需要查两字词，单字的结果必然包含它们
+    if (chars.length === 1) terms.add(chars[0]);
+    for (let i = 0; i < chars.length - 1; i++) terms.add(chars[i] + chars[i + 1]);
+  }
+  for (const word of text.match(WORD) || []) {
+    if (word.length >= 2) terms.add(word);
+  }
+  return Array.from(terms);
+}
+
+function fetchJson(url) {
+  return fetch(url).then(response => {
+    if (!response.ok) throw new Error(`${url}: ${response.status}`);
+    return response.json();
+  });
+}
+
+function loadSearchIndex() {
+  if (!searchLoading) {
+    searchLoading = fetchJson(catalog.search).then(index => {
+      searchIndex = index;
+      return index;
+    });
+  }
+  return searchLoading;
+}
+
+// 按所有搜索词的倒排列表求交集
+function search(query) {
+  const terms = searchTerms(query);
+  if (!terms.length) return [];
+  let result = null;
+  for (const term of terms) {
+    const postings = searchIndex.terms[term];
+    if (!postings) return [];
+    result = result === null ? postings : result.filter(i => postings.includes(i));
+    if (!result.length) return [];
+  }
+  return result.slice(0, MAX_RESULTS).map(i => {
+    const [title, category, url] = searchIndex.docs[i];
+    return { title, category, url, kind: kindOf(url) };
+  });
+}
+
+function kindOf(url) {
+  if (url.endsWith(".html")) return "card";
+  if (url.endsWith(".json")) return "story";
+  return "map";
+}
+
+function createLink(item) {
+  const link = document.createElement("a");
+  link.href = "#" + item.url;
+  link.textContent = item.title;
+  link.addEventListener("click", event => {
+    event.preventDefault();
+    showItem(item, link);
+  });
+  return link;
+}
+
+function renderCatalog() {
+  const container = document.getElementById("catalog");
+  container.innerHTML = "";
+  for (const category of catalog.categories) {
+    if (!category.items.length) continue;
+    const heading = document.createElement("h2");
+    heading.textContent = `${category.title} (${category.items.length})`;
+    container.appendChild(heading);
+    for (const item of category.items) container.appendChild(createLink(item));
+  }
+}
+
+function renderResults(query) {
+  const container = document.getElementById("results");
+  container.innerHTML = "";
+  if (!query.trim()) return;
+  loadSearchIndex().then(() => {
+    const results = search(query);
+    if (document.getElementById("search").value !== query) return;  // 已输入新的查询
+    container.innerHTML = "";
+    const heading = document.createElement("h2");
+    heading.textContent = results.length ? `搜索结果 (${results.length})` : "没有匹配的内容";
+    container.appendChild(heading);
+    for (const item of results) container.appendChild(createLink(item));
+  }).catch(error => {
+    container.textContent = "搜索索引加载失败: " + error.message;
+  });
+}
+
+function showItem(item, link) {
+  if (currentLink) currentLink.classList.remove("current");
+  currentLink = link;
+  if (link) link.classList.add("current");
+  location.hash = item.url;
+
+  const viewer = document.getElementById("viewer");
+  document.getElementById("nodePanel").hidden = true;
+  viewer.innerHTML = "";
+
+  if (item.kind === "card") {
+    const frame = document.createElement("iframe");
+    frame.src = item.url;
+    viewer.appendChild(frame);
+  } else if (item.kind === "map") {
+    const image = document.createElement("img");
+    image.src = item.url;
+    image.alt = item.title;
+    viewer.appendChild(image);
+  } else {
+    showStory(item.url, viewer);
+  }
+}
+
+function showStory(url, viewer) {
+  viewer.innerHTML = '<p class="hint">加载中...</p>';
+  fetchJson(url)
+    .then(story => {
+      storyNodes = story.nodes;
+      return fetch(story.svg).then(response => response.text());
+    })
+    .then(svgText => {
+      viewer.innerHTML = svgText;
+      const svg = viewer.querySelector("svg");
+      if (svg) setupStorySvg(svg);
+    })
+    .catch(error => {
+      viewer.innerHTML = "";
+      const message = document.createElement("p");
+      message.className = "hint";
+      message.textContent = "剧情加载失败: " + error.message;
+      viewer.appendChild(message);
+    });
+}
+
+// 使用 SVG 中嵌入的索引，点击节点时高亮它和相邻节点
+function setupStorySvg(svg) {
+  const metadata = svg.querySelector("metadata#story-index");
+  const index = metadata ? JSON.parse(metadata.textContent) : { nodes: [], edges: [] };
+  const position = new Map(index.nodes.map((id, i) => [id, i]));
+  const edgeEls = Array.from(svg.querySelectorAll("g.edge"));
+  const nodeEls = new Map();
+  svg.querySelectorAll("g.node[data-node-id]").forEach(element => {
+    nodeEls.set(element.dataset.nodeId, element);
+  });
+
+  svg.addEventListener("click", event => {
+    svg.querySelectorAll(".active, .neighbor").forEach(element => {
+      element.classList.remove("active", "neighbor");
+    });
+    const node = event.target.closest("g.node[data-node-id]");
+    if (!node) {
+      svg.classList.remove("has-selection");
+      document.getElementById("nodePanel").hidden = true;
+      return;
+    }
+
+    const nodeId = node.dataset.nodeId;
+    const at = position.get(nodeId);
+    node.classList.add("active");
+    index.edges.forEach(([source, target], i) => {
+      if (source !== at && target !== at) return;
+      if (edgeEls[i]) edgeEls[i].classList.add("neighbor");
+      const other = nodeEls.get(index.nodes[source === at ? target : source]);
+      if (other) other.classList.add("neighbor");
+    });
+    svg.classList.add("has-selection");
+    showNode(nodeId);
+  });
+}
+
+function showNode(nodeId) {
+  const node = storyNodes[nodeId] || { title: nodeId, content: "" };
+  document.getElementById("nodeTitle").textContent = node.title || nodeId;
+  const content = document.getElementById("nodeContent");
+  content.innerHTML = "";
+  for (const paragraph of (node.content || "").split(/\n+/)) {
+    if (!paragraph.trim()) continue;
+    const element = document.createElement("p");
+    element.textContent = paragraph;
+    content.appendChild(element);
+  }
+  document.getElementById("nodePanel").hidden = false;
+}
+
+// 打开地址中 # 之后指向的内容（刷新或分享链接时）
+function showItemFromHash() {
+  const url = decodeURIComponent(location.hash.slice(1));
+  if (!url) return;
+  const links = document.querySelectorAll("#catalog a");
+  for (const category of catalog.categories) {
+    const position = category.items.findIndex(item => item.url === url);
+    if (position === -1) continue;
+    const link = Array.from(links).find(element => element.getAttribute("href") === "#" + url);
+    showItem(category.items[position], link || null);
+    return;
+  }
+}
+
+function init() {
+  fetchJson(document.body.dataset.catalog)
+    .then(data => {
+      catalog = data;
+      renderCatalog();
+      showItemFromHash();
+      const input = document.getElementById("search");
+      input.addEventListener("focus", () => loadSearchIndex().catch(() => {}), { once: true });
+      input.addEventListener("input", () => renderResults(input.value));
+    })
+    .catch(error => {
+      document.getElementById("catalog").textContent = "目录加载失败: " + error.message;
+    });
+}
+
+init();
@@ -11,6 +11,7 @@ class DNDManager {
         this.currentCategory = 'characters';
         this.currentFile = null;
         this.showHidden = false;
+        this.mapViewer = null;
         
         console.log('DNDManager属性初始化完成');
         
@@ -358,12 +359,18 @@ class DNDManager {
             const isDirectory = file.name.startsWith('[DIR]');
             const displayName = isDirectory ? file.name.replace('[DIR] ', '') : file.name;
             const icon = this.getFileIcon(file, isDirectory);
+            // 图片地图显示缩略图和尺寸（只下载几 KB 的缩略图，不加载原图）
+            const isMapImage = this.currentCategory === 'maps' && file.file_type === 'image';
+            const iconHtml = isMapImage
+                ? `<img class="file-thumb" loading="lazy" alt="" src="${this.getMapThumbnailUrl(file.name, 128)}">`
+                : icon;
+            const typeLabel = isMapImage && file.width ? `${file.width}×${file.height}` : file.file_type;
             
             return `
                 <div class="file-item ${isDirectory ? 'directory' : ''}" data-file="${file.name}">
-                    <div class="file-icon">${icon}</div>
+                    <div class="file-icon">${iconHtml}</div>
                     <div class="file-name">${displayName}</div>
-                    ${file.file_type ? `<div class="file-type">${file.file_type}</div>` : ''}
+                    ${typeLabel ? `<div class="file-type">${typeLabel}</div>` : ''}
                 </div>
             `;
         }).join('');
@@ -383,6 +390,21 @@ class DNDManager {
         });
     }
     
+    getMapThumbnailUrl(fileName, width) {
+        return `/api/map/thumbnail?campaign=${encodeURIComponent(this.currentCampaign)}&name=${encodeURIComponent(fileName)}&w=${width}`;
+    }
+    
+    getMapTileUrl(fileName, z, x, y) {
+        return `/api/map/tile/${z}/${x}/${y}?campaign=${encodeURIComponent(this.currentCampaign)}&name=${encodeURIComponent(fileName)}`;
+    }
+    
+    closeMapViewer() {
+        if (this.mapViewer) {
+            this.mapViewer.destroy();
+            this.mapViewer = null;
+        }
+    }
+    
     getFileIcon(file, isDirectory) {
         if (isDirectory) return '📁';
         
@@ -410,6 +432,7 @@ class DNDManager {
         if (!this.currentCampaign || !fileName) return;
         
         const viewerContent = document.getElementById('viewerContent');
+        this.closeMapViewer();
         viewerContent.innerHTML = '<div class="loading">正在加载文件内容...</div>';
         
         try {
@@ -435,13 +458,33 @@ class DNDManager {
     renderFileContent(data) {
         const viewerContent = document.getElementById('viewerContent');
         
-        if (data.type === 'image') {
-            // 图片文件
-            const imagePath = `/data/campaigns/${this.currentCampaign}/maps/${data.filename}`;
+        if (data.type === 'image' && data.max_zoom !== undefined) {
+            // 有瓦片的地图：深度缩放查看器，只加载视野内的瓦片
+            const imagePath = data.url || `/data/campaigns/${this.currentCampaign}/maps/${data.filename}`;
+            viewerContent.innerHTML = `
+                <div id="mapViewer"></div>
+                <p class="map-viewer-info">
+                    拖动平移，滚轮或双击缩放 · <a href="${imagePath}" target="_blank">查看原图</a>（${data.width}×${data.height}，${this.formatFileSize(data.size)}）
+                </p>
+            `;
+            this.mapViewer = new MapTileViewer(document.getElementById('mapViewer'), {
+                width: data.width,
+                height: data.height,
+                tileSize: data.tile_size,
+                maxZoom: data.max_zoom,
+                tileUrl: (z, x, y) => this.getMapTileUrl(data.name, z, x, y)
+            });
+        } else if (data.type === 'image') {
+            // 图片文件：显示适合查看器宽度的缩略图，原图（url 由服务端按文件位置生成）在新窗口打开
+            const imagePath = data.url || `/data/campaigns/${this.currentCampaign}/maps/${data.filename}`;
+            const preview = this.getMapThumbnailUrl(data.name, 1024);
+            const preview2x = this.getMapThumbnailUrl(data.name, 2048);
+            const sizeLabel = data.width ? `${data.width}×${data.height}，` : '';
             viewerContent.innerHTML = `
                 <div style="text-align: center;">
-                    <img src="${imagePath}" alt="${data.name}" class="viewer-image" 
+                    <img src="${preview}" srcset="${preview} 1x, ${preview2x} 2x" alt="${data.name}" class="viewer-image" 
                          onerror="this.parentElement.innerHTML='<div class=\\"empty-state\\"><div class=\\"empty-icon\\">🖼️</div><p>无法显示图片</p></div>'">
+                    <p><a href="${imagePath}" target="_blank">查看原图</a>（${sizeLabel}${this.formatFileSize(data.size)}）</p>
                 </div>
             `;
         } else if (data.raw_content) {
@@ -667,6 +710,7 @@ class DNDManager {
     // ==================== 查看器管理 ====================
     
     clearViewer() {
+        this.closeMapViewer();
         document.getElementById('viewerContent').innerHTML = `
             <div class="viewer-placeholder">
                 <span class="placeholder-icon">📄</span>
@@ -732,6 +776,13 @@ class DNDManager {
         return div.innerHTML;
     }
     
+    formatFileSize(bytes) {
+        if (!bytes) return '0 B';
+        if (bytes < 1024) return `${bytes} B`;
+        if (bytes < 1024 * 1024) return `${(bytes / 1024).toFixed(1)} KB`;
+        return `${(bytes / 1024 / 1024).toFixed(1)} MB`;
+    }
+    
     refresh() {
         this.loadCampaigns();
         if (this.currentCampaign) {
@@ -0,0 +1,210 @@
+/**
+ * DND 跑团管理器 - 地图瓦片查看器
+ * 深度缩放浏览大地图：只加载当前视野内、当前缩放所需级别的瓦片（/api/map/tile/{z}/{x}/{y}），
+ * 内存和流量与地图大小无关。拖动平移，滚轮 / 双击 / 按钮缩放
+ */
+
+class MapTileViewer {
+    /**
+     * @param {HTMLElement} container 查看器容器
+     * @param {Object} options width / height（原图尺寸）、tileSize、maxZoom、tileUrl(z, x, y)
+     */
+    constructor(container, options) {
+        this.container = container;
+        this.width = options.width;
+        this.height = options.height;
+        this.tileSize = options.tileSize;
+        this.maxZoom = options.maxZoom;
+        this.tileUrl = options.tileUrl;
+
+        // 缩放比例（屏幕像素 / 原图像素）与原图左上角在容器中的位置
+        this.scale = 1;
+        this.offsetX = 0;
+        this.offsetY = 0;
+        this.tiles = new Map();  // "z/x/y" -> img
+        this.frame = null;
+        this.drag = null;
+
+        this.container.classList.add('map-viewer');
+        this.layer = document.createElement('div');
+        this.layer.className = 'map-viewer-layer';
+        // 第 0 级（整张图一个瓦片）作为底图，切换级别或瓦片加载前不会出现空白
+        this.backdrop = document.createElement('img');
+        this.backdrop.className = 'map-viewer-backdrop';
+        this.backdrop.alt = '';
+        this.backdrop.src = this.tileUrl(0, 0, 0);
+        this.layer.appendChild(this.backdrop);
+        this.container.appendChild(this.layer);
+        this.container.appendChild(this.createControls());
+
+        this.bindEvents();
+        this.fit();
+    }
+
+    createControls() {
+        const controls = document.createElement('div');
+        controls.className = 'map-viewer-controls';
+        const buttons = [
+            ['＋', '放大', () => this.zoomBy(2)],
+            ['－', '缩小', () => this.zoomBy(0.5)],
+            ['⤢', '适应窗口', () => this.fit()],
+        ];
+        buttons.forEach(([label, title, action]) => {
+            const button = document.createElement('button');
+            button.type = 'button';
+            button.className = 'btn btn-secondary btn-sm';
+            button.textContent = label;
+            button.title = title;
+            button.addEventListener('click', action);
+            button.addEventListener('pointerdown', event => event.stopPropagation());
+            controls.appendChild(button);
+        });
+        return controls;
+    }
+
+    bindEvents() {
+        this.container.addEventListener('wheel', event => {
+            event.preventDefault();
+            const [x, y] = this.pointerPosition(event);
+            this.zoomAt(x, y, event.deltaY < 0 ? 1.25 : 0.8);
+        }, { passive: false });
+
+        this.container.addEventListener('dblclick', event => {
+            const [x, y] = this.pointerPosition(event);
+            this.zoomAt(x, y, 2);
+        });
+
+        this.container.addEventListener('pointerdown', event => {
+            this.drag = { x: event.clientX, y: event.clientY };
+            this.container.setPointerCapture(event.pointerId);
+            this.container.classList.add('dragging');
+        });
+        this.container.addEventListener('pointermove', event => {
+            if (!this.drag) return;
+            this.offsetX += event.clientX - this.drag.x;
+            this.offsetY += event.clientY - this.drag.y;
+            this.drag = { x: event.clientX, y: event.clientY };
+            this.scheduleRender();
+        });
+        const endDrag = () => {
+            this.drag = null;
+            this.container.classList.remove('dragging');
+        };
+        this.container.addEventListener('pointerup', endDrag);
+        this.container.addEventListener('pointercancel', endDrag);
+
+        this.resizeObserver = new ResizeObserver(() => this.scheduleRender());
+        this.resizeObserver.observe(this.container);
+    }
+
+    pointerPosition(event) {
+        const rect = this.container.getBoundingClientRect();
+        return [event.clientX - rect.left, event.clientY - rect.top];
+    }
+
+    // ==================== 缩放 ====================
+
+    fitScale() {
+        const { clientWidth, clientHeight } = this.container;
+        return Math.min(clientWidth / this.width, clientHeight / this.height) || 1;
+    }
+
+    clampScale(scale) {
+        // 最小为适应窗口的一半，最大为原图的 4 倍
+        const minScale = Math.min(this.fitScale(), 1) / 2;
+        return Math.max(minScale, Math.min(4, scale));
+    }
+
+    fit() {
+        this.scale = this.fitScale();
+        this.offsetX = (this.container.clientWidth - this.width * this.scale) / 2;
+        this.offsetY = (this.container.clientHeight - this.height * this.scale) / 2;
+        this.scheduleRender();
+    }
+
+    zoomBy(factor) {
+        this.zoomAt(this.container.clientWidth / 2, this.container.clientHeight / 2, factor);
+    }
+
+    zoomAt(x, y, factor) {
+        // 以 (x, y) 为中心缩放：该点下的原图位置保持不变
+        const scale = this.clampScale(this.scale * factor);
+        this.offsetX = x - (x - this.offsetX) * scale / this.scale;
+        this.offsetY = y - (y - this.offsetY) * scale / this.scale;
+        this.scale = scale;
+        this.scheduleRender();
+    }
+
+    // ==================== 绘制 ====================
+
+    scheduleRender() {
+        if (this.frame) return;
+        this.frame = requestAnimationFrame(() => {
+            this.frame = null;
+            this.render();
+        });
+    }
+
+    place(element, left, top, right, bottom) {
+        // 边缘取整后再计算宽高，相邻瓦片之间不会出现缝隙
+        const x0 = Math.round(this.offsetX + left * this.scale);
+        const y0 = Math.round(this.offsetY + top * this.scale);
+        element.style.left = `${x0}px`;
+        element.style.top = `${y0}px`;
+        element.style.width = `${Math.round(this.offsetX + right * this.scale) - x0}px`;
+        element.style.height = `${Math.round(this.offsetY + bottom * this.scale) - y0}px`;
+    }
+
+    render() {
+        this.place(this.backdrop, 0, 0, this.width, this.height);
+
+        // 选择分辨率不低于屏幕所需的最小级别（第 maxZoom 级为原图）
+        const needed = this.scale * (window.devicePixelRatio || 1);
+        const zoom = Math.max(0, Math.min(this.maxZoom, this.maxZoom + Math.ceil(Math.log2(needed))));
+        const factor = 2 ** (this.maxZoom - zoom);
+        const span = this.tileSize * factor;  // 一个瓦片覆盖的原图像素
+        const columns = Math.ceil(Math.ceil(this.width / factor) / this.tileSize);
+        const rows = Math.ceil(Math.ceil(this.height / factor) / this.tileSize);
+
+        // 视野范围内的瓦片
+        const { clientWidth, clientHeight } = this.container;
+        const firstX = Math.max(0, Math.floor(-this.offsetX / this.scale / span));
+        const lastX = Math.min(columns - 1, Math.floor((clientWidth - this.offsetX) / this.scale / span));
+        const firstY = Math.max(0, Math.floor(-this.offsetY / this.scale / span));
+        const lastY = Math.min(rows - 1, Math.floor((clientHeight - this.offsetY) / this.scale / span));
+
+        const visible = new Set();
+        for (let y = firstY; y <= lastY; y++) {
+            for (let x = firstX; x <= lastX; x++) {
+                const key = `${zoom}/${x}/${y}`;
+                visible.add(key);
+                let tile = this.tiles.get(key);
+                if (!tile) {
+                    tile = document.createElement('img');
+                    tile.className = 'map-viewer-tile';
+                    tile.alt = '';
+                    tile.src = this.tileUrl(zoom, x, y);
+                    this.tiles.set(key, tile);
+                    this.layer.appendChild(tile);
+                }
+                this.place(tile, x * span, y * span,
+                           Math.min((x + 1) * span, this.width), Math.min((y + 1) * span, this.height));
+            }
+        }
+
+        // 移除视野外和其他级别的瓦片
+        for (const [key, tile] of this.tiles) {
+            if (!visible.has(key)) {
+                tile.remove();
+                this.tiles.delete(key);
+            }
+        }
+    }
+
+    destroy() {
+        this.resizeObserver.disconnect();
+        if (this.frame) cancelAnimationFrame(this.frame);
+        this.container.innerHTML = '';
+        this.tiles.clear();
+    }
+}